@@ -69,6 +69,9 @@ def __init__(self, name = "Object3D"):
         # vertex selection mode
         self._vertexSelectionMode = False
 
+        # the scene is being interactively moved
+        self._interactive = False
+
         #bounding box gl list
         self.boundingBoxList = 0
 
@@ -112,6 +115,11 @@ def setVertexSelectionMode(self, flag):
         # to get information about a vertex.
         self._vertexSelectionMode = flag
 
+    def setInteractive(self, flag):
+        # This is to tell the object the scene is being rotated or moved.
+        # Objects can use a faster, less accurate, drawing meanwhile.
+        self._interactive = flag
+
     def initCommonConfiguration(self, name):
         """
         Fills the default configuration features
@@ -0,0 +1,622 @@
+#/*##########################################################################
+# Copyright (C) 2004-2014 V.A. Sole, European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# This file is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Lesser General Public License as published by the
+# Free Software Foundation; either version 2 of the License, or (at your option)
+# any later version.
+#
+# This file is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+#
+# Please contact the ESRF industrial unit (industry@esrf.fr) if this license
+# is a problem for you.
+#
+#############################################################################*/
+__author__ = "V.A. Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "LGPL2+"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+__doc__ = """
+Marching cubes returning indexed triangle arrays instead of emitting OpenGL
+calls.
+
+The surface of the regions of a 3D array with values above isovalue is
+calculated with the same tables and conventions as the marching cubes of
+Object3DCTools: the array has shape (xSize, ySize, zSize), a grid point
+is considered inside the surface when its value is lower or equal to
+isovalue and the normals are given by the interpolated gradient of the
+values.
+
+The cubes are processed by slabs along the first axis in several threads
+(numpy releases the GIL during most of the work). The vertices shared by
+neighbouring cubes of a slab are only stored once, the vertices on the
+planes separating two slabs are stored by both of them. A step larger than one samples
+the array every step points (always keeping the last one) to get a fast
+preview of the surface.
+"""
+import sys
+import time
+import threading
+import numpy
+# ordered dictionary to keep track of the least recently used surfaces
+from collections import OrderedDict
+
+DEBUG = 0
+
+# number of threads used by default
+MARCHING_CUBES_N_THREADS = 4
+
+# approximate number of cubes processed in one go
+SLAB_SIZE = 4 * 1024 * 1024
+
+# position of the eight vertices of a cube relative to vertex 0
+_VERTEX_OFFSET = numpy.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+                              [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]],
+                             dtype=numpy.int64)
+
+# vertices at both ends of each of the twelve edges of a cube
+_EDGE_CONNECTION = numpy.array([[0, 1], [1, 2], [2, 3], [3, 0],
+                                [4, 5], [5, 6], [6, 7], [7, 4],
+                                [0, 4], [1, 5], [2, 6], [3, 7]],
+                               dtype=numpy.int64)
+
+# triangulation of the 256 cube configurations as lists of edge triples
+_TRIANGLE_CONNECTION = [
+    [],
+    [0, 8, 3],
+    [0, 1, 9],
+    [1, 8, 3, 9, 8, 1],
+    [1, 2, 10],
+    [0, 8, 3, 1, 2, 10],
+    [9, 2, 10, 0, 2, 9],
+    [2, 8, 3, 2, 10, 8, 10, 9, 8],
+    [3, 11, 2],
+    [0, 11, 2, 8, 11, 0],
+    [1, 9, 0, 2, 3, 11],
+    [1, 11, 2, 1, 9, 11, 9, 8, 11],
+    [3, 10, 1, 11, 10, 3],
+    [0, 10, 1, 0, 8, 10, 8, 11, 10],
+    [3, 9, 0, 3, 11, 9, 11, 10, 9],
+    [9, 8, 10, 10, 8, 11],
+    [4, 7, 8],
+    [4, 3, 0, 7, 3, 4],
+    [0, 1, 9, 8, 4, 7],
+    [4, 1, 9, 4, 7, 1, 7, 3, 1],
+    [1, 2, 10, 8, 4, 7],
+    [3, 4, 7, 3, 0, 4, 1, 2, 10],
+    [9, 2, 10, 9, 0, 2, 8, 4, 7],
+    [2, 10, 9, 2, 9, 7, 2, 7, 3, 7, 9, 4],
+    [8, 4, 7, 3, 11, 2],
+    [11, 4, 7, 11, 2, 4, 2, 0, 4],
+    [9, 0, 1, 8, 4, 7, 2, 3, 11],
+    [4, 7, 11, 9, 4, 11, 9, 11, 2, 9, 2, 1],
+    [3, 10, 1, 3, 11, 10, 7, 8, 4],
+    [1, 11, 10, 1, 4, 11, 1, 0, 4, 7, 11, 4],
+    [4, 7, 8, 9, 0, 11, 9, 11, 10, 11, 0, 3],
+    [4, 7, 11, 4, 11, 9, 9, 11, 10],
+    [9, 5, 4],
+    [9, 5, 4, 0, 8, 3],
+    [0, 5, 4, 1, 5, 0],
+    [8, 5, 4, 8, 3, 5, 3, 1, 5],
+    [1, 2, 10, 9, 5, 4],
+    [3, 0, 8, 1, 2, 10, 4, 9, 5],
+    [5, 2, 10, 5, 4, 2, 4, 0, 2],
+    [2, 10, 5, 3, 2, 5, 3, 5, 4, 3, 4, 8],
+    [9, 5, 4, 2, 3, 11],
+    [0, 11, 2, 0, 8, 11, 4, 9, 5],
+    [0, 5, 4, 0, 1, 5, 2, 3, 11],
+    [2, 1, 5, 2, 5, 8, 2, 8, 11, 4, 8, 5],
+    [10, 3, 11, 10, 1, 3, 9, 5, 4],
+    [4, 9, 5, 0, 8, 1, 8, 10, 1, 8, 11, 10],
+    [5, 4, 0, 5, 0, 11, 5, 11, 10, 11, 0, 3],
+    [5, 4, 8, 5, 8, 10, 10, 8, 11],
+    [9, 7, 8, 5, 7, 9],
+    [9, 3, 0, 9, 5, 3, 5, 7, 3],
+    [0, 7, 8, 0, 1, 7, 1, 5, 7],
+    [1, 5, 3, 3, 5, 7],
+    [9, 7, 8, 9, 5, 7, 10, 1, 2],
+    [10, 1, 2, 9, 5, 0, 5, 3, 0, 5, 7, 3],
+    [8, 0, 2, 8, 2, 5, 8, 5, 7, 10, 5, 2],
+    [2, 10, 5, 2, 5, 3, 3, 5, 7],
+    [7, 9, 5, 7, 8, 9, 3, 11, 2],
+    [9, 5, 7, 9, 7, 2, 9, 2, 0, 2, 7, 11],
+    [2, 3, 11, 0, 1, 8, 1, 7, 8, 1, 5, 7],
+    [11, 2, 1, 11, 1, 7, 7, 1, 5],
+    [9, 5, 8, 8, 5, 7, 10, 1, 3, 10, 3, 11],
+    [5, 7, 0, 5, 0, 9, 7, 11, 0, 1, 0, 10, 11, 10, 0],
+    [11, 10, 0, 11, 0, 3, 10, 5, 0, 8, 0, 7, 5, 7, 0],
+    [11, 10, 5, 7, 11, 5],
+    [10, 6, 5],
+    [0, 8, 3, 5, 10, 6],
+    [9, 0, 1, 5, 10, 6],
+    [1, 8, 3, 1, 9, 8, 5, 10, 6],
+    [1, 6, 5, 2, 6, 1],
+    [1, 6, 5, 1, 2, 6, 3, 0, 8],
+    [9, 6, 5, 9, 0, 6, 0, 2, 6],
+    [5, 9, 8, 5, 8, 2, 5, 2, 6, 3, 2, 8],
+    [2, 3, 11, 10, 6, 5],
+    [11, 0, 8, 11, 2, 0, 10, 6, 5],
+    [0, 1, 9, 2, 3, 11, 5, 10, 6],
+    [5, 10, 6, 1, 9, 2, 9, 11, 2, 9, 8, 11],
+    [6, 3, 11, 6, 5, 3, 5, 1, 3],
+    [0, 8, 11, 0, 11, 5, 0, 5, 1, 5, 11, 6],
+    [3, 11, 6, 0, 3, 6, 0, 6, 5, 0, 5, 9],
+    [6, 5, 9, 6, 9, 11, 11, 9, 8],
+    [5, 10, 6, 4, 7, 8],
+    [4, 3, 0, 4, 7, 3, 6, 5, 10],
+    [1, 9, 0, 5, 10, 6, 8, 4, 7],
+    [10, 6, 5, 1, 9, 7, 1, 7, 3, 7, 9, 4],
+    [6, 1, 2, 6, 5, 1, 4, 7, 8],
+    [1, 2, 5, 5, 2, 6, 3, 0, 4, 3, 4, 7],
+    [8, 4, 7, 9, 0, 5, 0, 6, 5, 0, 2, 6],
+    [7, 3, 9, 7, 9, 4, 3, 2, 9, 5, 9, 6, 2, 6, 9],
+    [3, 11, 2, 7, 8, 4, 10, 6, 5],
+    [5, 10, 6, 4, 7, 2, 4, 2, 0, 2, 7, 11],
+    [0, 1, 9, 4, 7, 8, 2, 3, 11, 5, 10, 6],
+    [9, 2, 1, 9, 11, 2, 9, 4, 11, 7, 11, 4, 5, 10, 6],
+    [8, 4, 7, 3, 11, 5, 3, 5, 1, 5, 11, 6],
+    [5, 1, 11, 5, 11, 6, 1, 0, 11, 7, 11, 4, 0, 4, 11],
+    [0, 5, 9, 0, 6, 5, 0, 3, 6, 11, 6, 3, 8, 4, 7],
+    [6, 5, 9, 6, 9, 11, 4, 7, 9, 7, 11, 9],
+    [10, 4, 9, 6, 4, 10],
+    [4, 10, 6, 4, 9, 10, 0, 8, 3],
+    [10, 0, 1, 10, 6, 0, 6, 4, 0],
+    [8, 3, 1, 8, 1, 6, 8, 6, 4, 6, 1, 10],
+    [1, 4, 9, 1, 2, 4, 2, 6, 4],
+    [3, 0, 8, 1, 2, 9, 2, 4, 9, 2, 6, 4],
+    [0, 2, 4, 4, 2, 6],
+    [8, 3, 2, 8, 2, 4, 4, 2, 6],
+    [10, 4, 9, 10, 6, 4, 11, 2, 3],
+    [0, 8, 2, 2, 8, 11, 4, 9, 10, 4, 10, 6],
+    [3, 11, 2, 0, 1, 6, 0, 6, 4, 6, 1, 10],
+    [6, 4, 1, 6, 1, 10, 4, 8, 1, 2, 1, 11, 8, 11, 1],
+    [9, 6, 4, 9, 3, 6, 9, 1, 3, 11, 6, 3],
+    [8, 11, 1, 8, 1, 0, 11, 6, 1, 9, 1, 4, 6, 4, 1],
+    [3, 11, 6, 3, 6, 0, 0, 6, 4],
+    [6, 4, 8, 11, 6, 8],
+    [7, 10, 6, 7, 8, 10, 8, 9, 10],
+    [0, 7, 3, 0, 10, 7, 0, 9, 10, 6, 7, 10],
+    [10, 6, 7, 1, 10, 7, 1, 7, 8, 1, 8, 0],
+    [10, 6, 7, 10, 7, 1, 1, 7, 3],
+    [1, 2, 6, 1, 6, 8, 1, 8, 9, 8, 6, 7],
+    [2, 6, 9, 2, 9, 1, 6, 7, 9, 0, 9, 3, 7, 3, 9],
+    [7, 8, 0, 7, 0, 6, 6, 0, 2],
+    [7, 3, 2, 6, 7, 2],
+    [2, 3, 11, 10, 6, 8, 10, 8, 9, 8, 6, 7],
+    [2, 0, 7, 2, 7, 11, 0, 9, 7, 6, 7, 10, 9, 10, 7],
+    [1, 8, 0, 1, 7, 8, 1, 10, 7, 6, 7, 10, 2, 3, 11],
+    [11, 2, 1, 11, 1, 7, 10, 6, 1, 6, 7, 1],
+    [8, 9, 6, 8, 6, 7, 9, 1, 6, 11, 6, 3, 1, 3, 6],
+    [0, 9, 1, 11, 6, 7],
+    [7, 8, 0, 7, 0, 6, 3, 11, 0, 11, 6, 0],
+    [7, 11, 6],
+    [7, 6, 11],
+    [3, 0, 8, 11, 7, 6],
+    [0, 1, 9, 11, 7, 6],
+    [8, 1, 9, 8, 3, 1, 11, 7, 6],
+    [10, 1, 2, 6, 11, 7],
+    [1, 2, 10, 3, 0, 8, 6, 11, 7],
+    [2, 9, 0, 2, 10, 9, 6, 11, 7],
+    [6, 11, 7, 2, 10, 3, 10, 8, 3, 10, 9, 8],
+    [7, 2, 3, 6, 2, 7],
+    [7, 0, 8, 7, 6, 0, 6, 2, 0],
+    [2, 7, 6, 2, 3, 7, 0, 1, 9],
+    [1, 6, 2, 1, 8, 6, 1, 9, 8, 8, 7, 6],
+    [10, 7, 6, 10, 1, 7, 1, 3, 7],
+    [10, 7, 6, 1, 7, 10, 1, 8, 7, 1, 0, 8],
+    [0, 3, 7, 0, 7, 10, 0, 10, 9, 6, 10, 7],
+    [7, 6, 10, 7, 10, 8, 8, 10, 9],
+    [6, 8, 4, 11, 8, 6],
+    [3, 6, 11, 3, 0, 6, 0, 4, 6],
+    [8, 6, 11, 8, 4, 6, 9, 0, 1],
+    [9, 4, 6, 9, 6, 3, 9, 3, 1, 11, 3, 6],
+    [6, 8, 4, 6, 11, 8, 2, 10, 1],
+    [1, 2, 10, 3, 0, 11, 0, 6, 11, 0, 4, 6],
+    [4, 11, 8, 4, 6, 11, 0, 2, 9, 2, 10, 9],
+    [10, 9, 3, 10, 3, 2, 9, 4, 3, 11, 3, 6, 4, 6, 3],
+    [8, 2, 3, 8, 4, 2, 4, 6, 2],
+    [0, 4, 2, 4, 6, 2],
+    [1, 9, 0, 2, 3, 4, 2, 4, 6, 4, 3, 8],
+    [1, 9, 4, 1, 4, 2, 2, 4, 6],
+    [8, 1, 3, 8, 6, 1, 8, 4, 6, 6, 10, 1],
+    [10, 1, 0, 10, 0, 6, 6, 0, 4],
+    [4, 6, 3, 4, 3, 8, 6, 10, 3, 0, 3, 9, 10, 9, 3],
+    [10, 9, 4, 6, 10, 4],
+    [4, 9, 5, 7, 6, 11],
+    [0, 8, 3, 4, 9, 5, 11, 7, 6],
+    [5, 0, 1, 5, 4, 0, 7, 6, 11],
+    [11, 7, 6, 8, 3, 4, 3, 5, 4, 3, 1, 5],
+    [9, 5, 4, 10, 1, 2, 7, 6, 11],
+    [6, 11, 7, 1, 2, 10, 0, 8, 3, 4, 9, 5],
+    [7, 6, 11, 5, 4, 10, 4, 2, 10, 4, 0, 2],
+    [3, 4, 8, 3, 5, 4, 3, 2, 5, 10, 5, 2, 11, 7, 6],
+    [7, 2, 3, 7, 6, 2, 5, 4, 9],
+    [9, 5, 4, 0, 8, 6, 0, 6, 2, 6, 8, 7],
+    [3, 6, 2, 3, 7, 6, 1, 5, 0, 5, 4, 0],
+    [6, 2, 8, 6, 8, 7, 2, 1, 8, 4, 8, 5, 1, 5, 8],
+    [9, 5, 4, 10, 1, 6, 1, 7, 6, 1, 3, 7],
+    [1, 6, 10, 1, 7, 6, 1, 0, 7, 8, 7, 0, 9, 5, 4],
+    [4, 0, 10, 4, 10, 5, 0, 3, 10, 6, 10, 7, 3, 7, 10],
+    [7, 6, 10, 7, 10, 8, 5, 4, 10, 4, 8, 10],
+    [6, 9, 5, 6, 11, 9, 11, 8, 9],
+    [3, 6, 11, 0, 6, 3, 0, 5, 6, 0, 9, 5],
+    [0, 11, 8, 0, 5, 11, 0, 1, 5, 5, 6, 11],
+    [6, 11, 3, 6, 3, 5, 5, 3, 1],
+    [1, 2, 10, 9, 5, 11, 9, 11, 8, 11, 5, 6],
+    [0, 11, 3, 0, 6, 11, 0, 9, 6, 5, 6, 9, 1, 2, 10],
+    [11, 8, 5, 11, 5, 6, 8, 0, 5, 10, 5, 2, 0, 2, 5],
+    [6, 11, 3, 6, 3, 5, 2, 10, 3, 10, 5, 3],
+    [5, 8, 9, 5, 2, 8, 5, 6, 2, 3, 8, 2],
+    [9, 5, 6, 9, 6, 0, 0, 6, 2],
+    [1, 5, 8, 1, 8, 0, 5, 6, 8, 3, 8, 2, 6, 2, 8],
+    [1, 5, 6, 2, 1, 6],
+    [1, 3, 6, 1, 6, 10, 3, 8, 6, 5, 6, 9, 8, 9, 6],
+    [10, 1, 0, 10, 0, 6, 9, 5, 0, 5, 6, 0],
+    [0, 3, 8, 5, 6, 10],
+    [10, 5, 6],
+    [11, 5, 10, 7, 5, 11],
+    [11, 5, 10, 11, 7, 5, 8, 3, 0],
+    [5, 11, 7, 5, 10, 11, 1, 9, 0],
+    [10, 7, 5, 10, 11, 7, 9, 8, 1, 8, 3, 1],
+    [11, 1, 2, 11, 7, 1, 7, 5, 1],
+    [0, 8, 3, 1, 2, 7, 1, 7, 5, 7, 2, 11],
+    [9, 7, 5, 9, 2, 7, 9, 0, 2, 2, 11, 7],
+    [7, 5, 2, 7, 2, 11, 5, 9, 2, 3, 2, 8, 9, 8, 2],
+    [2, 5, 10, 2, 3, 5, 3, 7, 5],
+    [8, 2, 0, 8, 5, 2, 8, 7, 5, 10, 2, 5],
+    [9, 0, 1, 5, 10, 3, 5, 3, 7, 3, 10, 2],
+    [9, 8, 2, 9, 2, 1, 8, 7, 2, 10, 2, 5, 7, 5, 2],
+    [1, 3, 5, 3, 7, 5],
+    [0, 8, 7, 0, 7, 1, 1, 7, 5],
+    [9, 0, 3, 9, 3, 5, 5, 3, 7],
+    [9, 8, 7, 5, 9, 7],
+    [5, 8, 4, 5, 10, 8, 10, 11, 8],
+    [5, 0, 4, 5, 11, 0, 5, 10, 11, 11, 3, 0],
+    [0, 1, 9, 8, 4, 10, 8, 10, 11, 10, 4, 5],
+    [10, 11, 4, 10, 4, 5, 11, 3, 4, 9, 4, 1, 3, 1, 4],
+    [2, 5, 1, 2, 8, 5, 2, 11, 8, 4, 5, 8],
+    [0, 4, 11, 0, 11, 3, 4, 5, 11, 2, 11, 1, 5, 1, 11],
+    [0, 2, 5, 0, 5, 9, 2, 11, 5, 4, 5, 8, 11, 8, 5],
+    [9, 4, 5, 2, 11, 3],
+    [2, 5, 10, 3, 5, 2, 3, 4, 5, 3, 8, 4],
+    [5, 10, 2, 5, 2, 4, 4, 2, 0],
+    [3, 10, 2, 3, 5, 10, 3, 8, 5, 4, 5, 8, 0, 1, 9],
+    [5, 10, 2, 5, 2, 4, 1, 9, 2, 9, 4, 2],
+    [8, 4, 5, 8, 5, 3, 3, 5, 1],
+    [0, 4, 5, 1, 0, 5],
+    [8, 4, 5, 8, 5, 3, 9, 0, 5, 0, 3, 5],
+    [9, 4, 5],
+    [4, 11, 7, 4, 9, 11, 9, 10, 11],
+    [0, 8, 3, 4, 9, 7, 9, 11, 7, 9, 10, 11],
+    [1, 10, 11, 1, 11, 4, 1, 4, 0, 7, 4, 11],
+    [3, 1, 4, 3, 4, 8, 1, 10, 4, 7, 4, 11, 10, 11, 4],
+    [4, 11, 7, 9, 11, 4, 9, 2, 11, 9, 1, 2],
+    [9, 7, 4, 9, 11, 7, 9, 1, 11, 2, 11, 1, 0, 8, 3],
+    [11, 7, 4, 11, 4, 2, 2, 4, 0],
+    [11, 7, 4, 11, 4, 2, 8, 3, 4, 3, 2, 4],
+    [2, 9, 10, 2, 7, 9, 2, 3, 7, 7, 4, 9],
+    [9, 10, 7, 9, 7, 4, 10, 2, 7, 8, 7, 0, 2, 0, 7],
+    [3, 7, 10, 3, 10, 2, 7, 4, 10, 1, 10, 0, 4, 0, 10],
+    [1, 10, 2, 8, 7, 4],
+    [4, 9, 1, 4, 1, 7, 7, 1, 3],
+    [4, 9, 1, 4, 1, 7, 0, 8, 1, 8, 7, 1],
+    [4, 0, 3, 7, 4, 3],
+    [4, 8, 7],
+    [9, 10, 8, 10, 11, 8],
+    [3, 0, 9, 3, 9, 11, 11, 9, 10],
+    [0, 1, 10, 0, 10, 8, 8, 10, 11],
+    [3, 1, 10, 11, 3, 10],
+    [1, 2, 11, 1, 11, 9, 9, 11, 8],
+    [3, 0, 9, 3, 9, 11, 1, 2, 9, 2, 11, 9],
+    [0, 2, 11, 8, 0, 11],
+    [3, 2, 11],
+    [2, 3, 8, 2, 8, 10, 10, 8, 9],
+    [9, 10, 2, 0, 9, 2],
+    [2, 3, 8, 2, 8, 10, 0, 1, 8, 1, 10, 8],
+    [1, 10, 2],
+    [1, 3, 8, 9, 1, 8],
+    [0, 9, 1],
+    [0, 3, 8],
+    [],
+]
+
+def _buildTables():
+    nTriangles = numpy.array([len(x) // 3 for x in _TRIANGLE_CONNECTION],
+                             dtype=numpy.int64)
+    triangles = -numpy.ones((256, 15), dtype=numpy.int64)
+    for i, edges in enumerate(_TRIANGLE_CONNECTION):
+        triangles[i, :len(edges)] = edges
+    # each edge is identified by the grid point at its lower end
+    # and by the axis it is parallel to
+    start = _VERTEX_OFFSET[_EDGE_CONNECTION[:, 0]]
+    end = _VERTEX_OFFSET[_EDGE_CONNECTION[:, 1]]
+    edgeOrigin = numpy.minimum(start, end)
+    edgeAxis = numpy.argmax(numpy.abs(end - start), axis=1)
+    return nTriangles, triangles, edgeOrigin, edgeAxis
+
+_N_TRIANGLES, _TRIANGLES, _EDGE_ORIGIN, _EDGE_AXIS = _buildTables()
+
+def _getSampling(size, step):
+    """
+    Indices of the grid points used with the given step
+    """
+    index = numpy.arange(0, size, step)
+    if index[-1] != (size - 1):
+        index = numpy.append(index, size - 1)
+    return index
+
+def _gradient(values, coordinates, points):
+    """
+    Gradient of values at the given (n, 3) grid points by central
+    differences (one sided at the borders).
+    """
+    result = numpy.zeros(points.shape, dtype=numpy.float32)
+    for axis in range(3):
+        size = values.shape[axis]
+        if size < 2:
+            continue
+        before = points.copy()
+        after = points.copy()
+        before[:, axis] = numpy.maximum(points[:, axis] - 1, 0)
+        after[:, axis] = numpy.minimum(points[:, axis] + 1, size - 1)
+        delta = coordinates[axis][after[:, axis]] - \
+                coordinates[axis][before[:, axis]]
+        delta[delta == 0] = 1.0
+        result[:, axis] = (values[after[:, 0], after[:, 1], after[:, 2]] - \
+                           values[before[:, 0], before[:, 1], before[:, 2]]) / \
+                          delta
+    return result
+
+def _marchSlab(values, coordinates, isovalue, start, stop):
+    """
+    Surface going through the cubes with the first index in [start, stop)
+
+    :return: vertices, normals and triangle indices relative to the slab
+    """
+    block = values[start:stop + 1]
+    inside = block <= isovalue
+    shape = tuple([x - 1 for x in block.shape])
+    cubeIndex = numpy.zeros(shape, dtype=numpy.uint8)
+    for vertex in range(8):
+        x, y, z = _VERTEX_OFFSET[vertex]
+        corner = inside[x:x + shape[0], y:y + shape[1], z:z + shape[2]]
+        cubeIndex |= corner.astype(numpy.uint8) << vertex
+    del inside
+    cubeIndex = cubeIndex.ravel()
+    nTriangles = _N_TRIANGLES[cubeIndex]
+    cubes = numpy.flatnonzero(nTriangles)
+    if not cubes.size:
+        return None
+    cases = cubeIndex[cubes]
+    nTriangles = nTriangles[cubes]
+    # one row per triangle
+    total = int(nTriangles.sum())
+    first = numpy.cumsum(nTriangles) - nTriangles
+    triangle = numpy.arange(total) - numpy.repeat(first, nTriangles)
+    cases = numpy.repeat(cases, nTriangles)
+    cubes = numpy.repeat(cubes, nTriangles)
+    edges = numpy.empty((total, 3), dtype=numpy.int64)
+    for corner in range(3):
+        edges[:, corner] = _TRIANGLES[cases, 3 * triangle + corner]
+    del cases, triangle
+    # global identifier of each edge within the slab
+    cx, cy, cz = numpy.unravel_index(cubes, shape)
+    del cubes
+    py = shape[1] + 1
+    pz = shape[2] + 1
+    origin = _EDGE_ORIGIN[edges]
+    edgeId = (((cx[:, None] + origin[:, :, 0]) * py + \
+               (cy[:, None] + origin[:, :, 1])) * pz + \
+               (cz[:, None] + origin[:, :, 2])) * 3 + _EDGE_AXIS[edges]
+    del origin, edges, cx, cy, cz
+    edgeId, indices = numpy.unique(edgeId, return_inverse=True)
+    indices = indices.reshape(-1, 3).astype(numpy.uint32)
+    # the vertices along the edges
+    axis = edgeId % 3
+    point0 = numpy.array(numpy.unravel_index(edgeId // 3,
+                                   (block.shape[0], py, pz))).T
+    point0[:, 0] += start
+    point1 = point0.copy()
+    point1[numpy.arange(axis.size), axis] += 1
+    value0 = values[point0[:, 0], point0[:, 1], point0[:, 2]]
+    value1 = values[point1[:, 0], point1[:, 1], point1[:, 2]]
+    delta = value1 - value0
+    equal = delta == 0
+    delta[equal] = 1.0
+    offset = ((isovalue - value0) / delta).astype(numpy.float32)
+    offset[equal] = 0.5
+    vertices = numpy.empty((edgeId.size, 3), dtype=numpy.float32)
+    for i in range(3):
+        vertices[:, i] = coordinates[i][point0[:, i]]
+        index = numpy.flatnonzero(axis == i)
+        c0 = coordinates[i][point0[index, i]]
+        c1 = coordinates[i][point1[index, i]]
+        vertices[index, i] = c0 + offset[index] * (c1 - c0)
+    offset.shape = -1, 1
+    normals = (1.0 - offset) * _gradient(values, coordinates, point0) + \
+              offset * _gradient(values, coordinates, point1)
+    norm = numpy.sqrt((normals * normals).sum(axis=1))
+    norm[norm == 0] = 1.0
+    normals /= norm[:, None]
+    return vertices, normals.astype(numpy.float32), indices
+
+def marchingCubes(values, isovalue, x=None, y=None, z=None,
+                  step=1, nThreads=None):
+    """
+    Calculate an isosurface of a 3D array.
+
+    :param values: 3D array of shape (xSize, ySize, zSize)
+    :param isovalue: Value of the isosurface
+    :param x, y, z: Grid coordinates along each axis. Default are indices.
+    :param step: Sampling step of the array. Default is 1.
+    :param nThreads: Number of threads. Default is MARCHING_CUBES_N_THREADS.
+    :return: Tuple with the vertices (float32, shape (n, 3)), the vertex
+             normals (float32, shape (n, 3)) and the vertex indices of the
+             triangles (uint32, shape (m, 3)).
+    """
+    values = numpy.asarray(values)
+    if len(values.shape) != 3:
+        raise ValueError("Only 3D arrays are supported")
+    step = max(int(step), 1)
+    if nThreads is None:
+        nThreads = MARCHING_CUBES_N_THREADS
+    nThreads = max(int(nThreads), 1)
+    coordinates = []
+    for axis, c in enumerate([x, y, z]):
+        size = values.shape[axis]
+        if c is None:
+            c = numpy.arange(size)
+        c = numpy.asarray(c, dtype=numpy.float32).ravel()
+        if c.size != size:
+            raise ValueError("Coordinates of axis %d do not match data size" \
+                             % axis)
+        coordinates.append(c)
+    if step > 1:
+        sampling = [_getSampling(size, step) for size in values.shape]
+        values = values[numpy.ix_(*sampling)]
+        coordinates = [c[s] for c, s in zip(coordinates, sampling)]
+    if values.dtype not in [numpy.float32, numpy.float64]:
+        values = values.astype(numpy.float32)
+    isovalue = values.dtype.type(isovalue)
+
+    empty = (numpy.zeros((0, 3), dtype=numpy.float32),
+             numpy.zeros((0, 3), dtype=numpy.float32),
+             numpy.zeros((0, 3), dtype=numpy.uint32))
+    if min(values.shape) < 2:
+        return empty
+
+    # the slabs to be processed
+    nCubes = values.shape[0] - 1
+    slab = max(1, SLAB_SIZE // (values.shape[1] * values.shape[2]))
+    slab = min(slab, max(1, (nCubes + nThreads - 1) // nThreads))
+    slabs = [(i, min(i + slab, nCubes)) for i in range(0, nCubes, slab)]
+    results = [None] * len(slabs)
+    def run(first):
+        for i in range(first, len(slabs), nThreads):
+            results[i] = _marchSlab(values, coordinates, isovalue, *slabs[i])
+    if DEBUG:
+        t0 = time.time()
+    if (nThreads == 1) or (len(slabs) == 1):
+        run(0)
+    else:
+        threads = []
+        for i in range(min(nThreads, len(slabs))):
+            thread = threading.Thread(target=run, args=(i,))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+    results = [r for r in results if r is not None]
+    if not results:
+        return empty
+    # merge the slabs
+    vertices = numpy.concatenate([r[0] for r in results])
+    normals = numpy.concatenate([r[1] for r in results])
+    indices = []
+    offset = 0
+    for r in results:
+        indices.append(r[2] + numpy.uint32(offset))
+        offset += r[0].shape[0]
+    indices = numpy.concatenate(indices)
+    if DEBUG:
+        print("Marching cubes elapsed = %f" % (time.time() - t0))
+        print("Vertices = %d Triangles = %d" % (vertices.shape[0],
+                                                 indices.shape[0]))
+    return vertices, normals, indices
+
+def getNormalColors(normals):
+    """
+    Vertex colors (float32, shape (n, 3)) derived from the normals as done
+    by the C marching cubes when no isosurface color is given.
+    """
+    nx = normals[:, 0]
+    ny = normals[:, 1]
+    nz = normals[:, 2]
+    px = numpy.maximum(nx, 0.0)
+    py = numpy.maximum(ny, 0.0)
+    pz = numpy.maximum(nz, 0.0)
+    mx = -0.5 * numpy.minimum(nx, 0.0)
+    my = -0.5 * numpy.minimum(ny, 0.0)
+    mz = -0.5 * numpy.minimum(nz, 0.0)
+    colors = numpy.empty(normals.shape, dtype=numpy.float32)
+    colors[:, 0] = px + my + mz
+    colors[:, 1] = py + mz + mx
+    colors[:, 2] = pz + mx + my
+    return colors
+
+class IsosurfaceCache(object):
+    """
+    Cache of the isosurfaces of 3D arrays keyed by the identity of the
+    array, the isovalue and the sampling step. A reference to each array
+    is kept while its surfaces are cached, so that its identity cannot be
+    reused by another array.
+    """
+    def __init__(self, maxSize=8):
+        self._maxSize = max(int(maxSize), 1)
+        self._cache = OrderedDict()
+
+    def getKey(self, values, isovalue, step=1):
+        return (id(values), float(isovalue), max(int(step), 1))
+
+    def getIsosurface(self, values, isovalue, x=None, y=None, z=None,
+                      step=1, nThreads=None):
+        """
+        Return the marchingCubes output for the given parameters,
+        calculating it if it is not cached.
+        """
+        key = self.getKey(values, isovalue, step)
+        if key in self._cache:
+            data, surface = self._cache.pop(key)
+            self._cache[key] = (data, surface)
+            return surface
+        surface = marchingCubes(values, isovalue, x, y, z,
+                                step=step, nThreads=nThreads)
+        self._cache[key] = (values, surface)
+        while len(self._cache) > self._maxSize:
+            self._cache.popitem(last=False)
+        return surface
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        self._cache.clear()
+
+def benchmark(size=256, isovalue=0.5, step=1, nThreads=None):
+    """
+    Calculate the isosurface of a sphere in a size**3 array.
+
+    :return: Tuple with the elapsed time, the number of vertices and
+             the number of triangles
+    """
+    c = numpy.linspace(-1.0, 1.0, size).astype(numpy.float32)
+    values = c[:, None, None] ** 2 + c[None, :, None] ** 2 + \
+             c[None, None, :] ** 2
+    t0 = time.time()
+    vertices, normals, indices = marchingCubes(values, isovalue,
+                                               step=step, nThreads=nThreads)
+    return time.time() - t0, vertices.shape[0], indices.shape[0]
+
+if __name__ == "__main__":
+    size = 256
+    step = 1
+    if len(sys.argv) > 1:
+        size = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        step = int(sys.argv[2])
+    elapsed, nVertices, nTriangles = benchmark(size, step=step)
+    print("Elapsed = %.3f s Vertices = %d Triangles = %d" % \
+          (elapsed, nVertices, nTriangles))
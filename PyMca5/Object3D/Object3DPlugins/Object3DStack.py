@@ -32,6 +32,11 @@
     import OpenGL.GLU as GLU
 except ImportError:
     raise ImportError("OpenGL must be installed to use these functionalities")
+try:
+    from OpenGL.arrays import vbo
+except ImportError:
+    # use client side vertex arrays
+    vbo = None
 import numpy
 try:
     from PyMca5 import spslut
@@ -42,6 +47,11 @@
 except ImportError:
     from Object3D import Object3DBase
 
+try:
+    from PyMca5.Object3D import Object3DMarchingCubes
+except ImportError:
+    from Object3D import Object3DMarchingCubes
+
 try:
     from PyMca5.Object3D import Object3DCTools
 except ImportError:
@@ -72,6 +82,14 @@
               'LIGHT',
               'POINT_SELECTION']
 
+# while interacting, isosurfaces are calculated on a grid of
+# about this number of points
+PREVIEW_SIZE = 128 * 128 * 128
+
+# number of triangles above which a full detail isosurface is
+# not drawn while interacting
+PREVIEW_TRIANGLES = 1000000
+
 COLORMAPLIST = [spslut.GREYSCALE, spslut.REVERSEGREY, spslut.TEMP,
                 spslut.RED, spslut.GREEN, spslut.BLUE, spslut.MANY]
 
@@ -88,16 +106,10 @@ def __init__(self, name = "3D-Array"):
         self._selected     = False
         self._vertexSelectionMode = False
         self.drawMode = 'POINT'
-        self.__isosurfacesDict = {}
-        for i in range(5):
-            self.__isosurfacesDict[i] = {}
-            self.__isosurfacesDict[i]['list'] = 0
-            self.__isosurfacesDict[i]['value'] = 0
-            self.__isosurfacesDict[i]['color'] = 'red'
-            self.__isosurfacesDict[i]['r'] = 0xFF
-            self.__isosurfacesDict[i]['g'] = 0
-            self.__isosurfacesDict[i]['b'] = 0
-            self.__isosurfacesDict[i]['a'] = 0xFF
+        self.values = None
+        self._volume = None
+        self._isosurfaceCache = Object3DMarchingCubes.IsosurfaceCache()
+        self._isosurfaceBuffers = {}
         self._configuration['common']['supportedmodes'] = [1, 1, 1, 1]
         self._configuration['common']['mode'] = 1
 
@@ -129,9 +141,7 @@ def __del__(self):
                 if self.drawListDict[key] > 0:
                     GL.glDeleteLists(self.drawListDict[key], 1)
 
-        for key in self.__isosurfacesDict.keys():
-            if self.__isosurfacesDict[key]['list'] > 0:
-                GL.glDeleteLists(self.__isosurfacesDict[key]['list'], 1)
+        self._deleteIsosurfaceBuffers()
 
         try:
             Object3DBase.Object3D.__del__(self)
@@ -236,6 +246,11 @@ def setStack(self, data, x=None, y=None, z=None, xyz=None):
         #restore original shape
         self.values.shape = old_shape
 
+        # the isosurfaces of the previous data are not needed any more
+        self._volume = self.values.reshape(self.xSize, self.ySize, self.zSize)
+        self._isosurfaceCache.clear()
+        self._deleteIsosurfaceBuffers()
+
     def getColors(self):
         old_shape = self.values.shape
         self.values.shape = -1, 1
@@ -297,7 +312,7 @@ def drawObject(self):
                                        self._configuration['private']['useminmax'])
         elif self.drawMode == "SURFACE":
             flag = 1
-            i = 0
+            usedBuffers = []
             for use, value, label, cr, cg, cb, ca in self._configuration['private']['isosurfaces']:
                 color = (cr, cg, cb, ca)
                 if None in color:
@@ -310,35 +325,12 @@ def drawObject(self):
                                       color[1],
                                       color[2],
                                       self._alpha)
-                    colorflag = False
-                    if self.__isosurfacesDict[i]['list'] > 0:
-                        if self.__isosurfacesDict[i]['color'] == color:
-                            colorflag = True
-                        elif (self.__isosurfacesDict[i]['color'] != None) and\
-                             (color != None):
-                            colorflag = True
-                    if self.__isosurfacesDict[i]['list'] > 0:
-                        if (self.__isosurfacesDict[i]['value'] == value) and\
-                           colorflag:
-                            GL.glCallList(self.__isosurfacesDict[i]['list'])
-                            i += 1
-                            continue
-                        GL.glDeleteLists(self.__isosurfacesDict[i]['list'],
-                                            1)
-                    self.__isosurfacesDict[i]['value']= value
-                    self.__isosurfacesDict[i]['color']= color
-                    self.__isosurfacesDict[i]['list'] = GL.glGenLists(1)
-                    GL.glNewList(self.__isosurfacesDict[i]['list'],
-                                                 GL.GL_COMPILE)
-
-                    GL.glBegin(GL.GL_TRIANGLES)
-                    Object3DCTools.gridMarchingCubes(self._x, self._y, self._z, self.values, value, color, (1, 1, 1), 1)
-                    #Object3DCTools.gridMarchingCubes(self._x, self._y, self._z, self.values, value, None, (1, 1, 1), 1)
-                    GL.glEnd()
-                    GL.glEndList()
-                    GL.glCallList(self.__isosurfacesDict[i]['list'])
+                    key, surface = self._getIsosurface(value)
+                    bufferKey = key + (color is None,)
+                    self._drawIsosurface(bufferKey, surface)
+                    usedBuffers.append(bufferKey)
                     GL.glDisable(GL.GL_LIGHTING)
-                i += 1
+            self._deleteIsosurfaceBuffers(keep=usedBuffers)
             if flag:
                 #This is useless, only isosurfaces makes sense
                 Object3DCTools.draw3DGridQuads(self._x,
@@ -354,6 +346,82 @@ def drawObject(self):
         if DEBUG:
             print("Drawing takes ", time.time() - t0)
 
+    def _getIsosurface(self, value):
+        """
+        Return the cache key and the (vertices, normals, indices) arrays
+        of the isosurface. While interacting, a decimated surface is used
+        if the full detail one is not available or too large.
+        """
+        cache = self._isosurfaceCache
+        step = 1
+        if self._interactive and (self.nVertices > PREVIEW_SIZE):
+            key = cache.getKey(self._volume, value, 1)
+            if (key not in cache) or \
+               (cache.getIsosurface(self._volume, value)[2].shape[0] > \
+                                                        PREVIEW_TRIANGLES):
+                step = int(numpy.ceil(pow(self.nVertices / float(PREVIEW_SIZE),
+                                          1.0 / 3.0)))
+        surface = cache.getIsosurface(self._volume, value,
+                                      self._x, self._y, self._z, step=step)
+        return cache.getKey(self._volume, value, step), surface
+
+    def _drawIsosurface(self, bufferKey, surface):
+        """
+        Draw the triangles of the surface from vertex buffer objects (or
+        vertex arrays) created the first time the surface is drawn.
+        """
+        vertices, normals, indices = surface
+        if not indices.shape[0]:
+            return
+        normalColors = bufferKey[-1]
+        if bufferKey not in self._isosurfaceBuffers:
+            arrays = [vertices, normals]
+            if normalColors:
+                arrays.append(Object3DMarchingCubes.getNormalColors(normals))
+            if vbo is not None:
+                arrays = [vbo.VBO(x) for x in arrays]
+                arrays.append(vbo.VBO(indices,
+                                      target=GL.GL_ELEMENT_ARRAY_BUFFER))
+            else:
+                arrays.append(indices)
+            self._isosurfaceBuffers[bufferKey] = arrays
+        arrays = self._isosurfaceBuffers[bufferKey]
+        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glEnableClientState(GL.GL_NORMAL_ARRAY)
+        if normalColors:
+            GL.glEnableClientState(GL.GL_COLOR_ARRAY)
+        try:
+            for buffer in arrays:
+                if vbo is not None:
+                    buffer.bind()
+                if buffer is arrays[0]:
+                    GL.glVertexPointer(3, GL.GL_FLOAT, 0, buffer)
+                elif buffer is arrays[1]:
+                    GL.glNormalPointer(GL.GL_FLOAT, 0, buffer)
+                elif buffer is not arrays[-1]:
+                    GL.glColorPointer(3, GL.GL_FLOAT, 0, buffer)
+                if (vbo is not None) and (buffer is not arrays[-1]):
+                    buffer.unbind()
+            GL.glDrawElements(GL.GL_TRIANGLES, indices.size,
+                              GL.GL_UNSIGNED_INT, arrays[-1])
+        finally:
+            if vbo is not None:
+                arrays[-1].unbind()
+            GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+            GL.glDisableClientState(GL.GL_NORMAL_ARRAY)
+            GL.glDisableClientState(GL.GL_COLOR_ARRAY)
+
+    def _deleteIsosurfaceBuffers(self, keep=None):
+        if keep is None:
+            keep = []
+        for key in list(self._isosurfaceBuffers.keys()):
+            if key in keep:
+                continue
+            arrays = self._isosurfaceBuffers.pop(key)
+            if vbo is not None:
+                for buffer in arrays:
+                    buffer.delete()
+
     def _getVertexSelectionColors(self):
         self.vertexSelectionColors = numpy.zeros((self.nVertices,4),
                                                  numpy.uint8)
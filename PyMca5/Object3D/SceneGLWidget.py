@@ -86,6 +86,8 @@ def __init__(self, parent = None, scene=None):
         self._objectSelectionMode = False
         self._vertexSelectionMode = False
         self.__selectingVertex    = False
+        # the scene is being rotated with the mouse
+        self.__interactive = False
         self.setAutoBufferSwap(False)
         self.autoScale = True
         self.coordinates = Object3DCoordinates.Object3DCoordinates(self)
@@ -497,6 +499,7 @@ def drawTree(self, tree):
             GL.glPushMatrix()
             GL.glPushName(self.scene.getIndex(name))
             object3D.setVertexSelectionMode(False)
+            object3D.setInteractive(self.__interactive)
             configDict = object3D.getConfiguration()['common']
             #This call could be made at the object if needed ...
             GL.glPointSize(configDict['pointsize'])
@@ -1255,6 +1258,10 @@ def mouseReleaseEvent(self, event):
             print("Release event = L", event.button() & qt.Qt.LeftButton)
             print("Release event = M", event.button() & qt.Qt.MidButton)
             print("Release event = R", event.button() & qt.Qt.RightButton)
+        if self.__interactive:
+            # redraw the objects at full detail
+            self.__interactive = False
+            self.cacheUpdateGL()
         if self._objectSelectionMode:
             self.setCacheEnabled(True)
             return
@@ -1296,6 +1303,7 @@ def mouseMoveEvent(self, event):
             self.cacheUpdateGL()
         elif event.buttons() & qt.Qt.RightButton:
             self.setCacheEnabled(False)
+            self.__interactive = True
             angleX =  0.3*dy
             angleZ =  0.3*dx
             xmin, ymin, zmin, xmax, ymax, zmax = self.scene.getLimits()
@@ -35,6 +35,32 @@
 import time
 from . import PyMcaLogo
 
+# comment separating the entries of an index from its end
+ENTRIES_END = "<!-- PyMca entries end -->"
+
+def saveLogo(filename):
+    """
+    Save the PyMca logo into filename as PNG if a Qt application is running.
+
+    Qt is not imported by this function: without an already running
+    application the logo is not saved.
+    """
+    qt = sys.modules.get("PyMca5.PyMcaGui.PyMcaQt", None)
+    if qt is None:
+        return False
+    try:
+        if qt.QApplication.instance() is None:
+            return False
+        pixmap = qt.QPixmap(PyMcaLogo.PyMcaLogo)
+        return pixmap.save(filename, "PNG")
+    except:
+        return False
+
+def _writeText(filename, text):
+    f = open(filename, 'wb')
+    f.write(text.encode('utf-8'))
+    f.close()
+
 class HtmlIndex(object):
     def __init__(self, htmldir):
         if htmldir is None:htmldir = "/tmp/HTML"
@@ -71,12 +97,7 @@ def getHeader(self,addlink=None):
         text+= "        <a HREF=""http://www.esrf.fr/"">"
         logofile = self.htmldir + "/" + "PyMcaLogo.png"
         if not os.path.exists(logofile):
-            try:
-                import qt
-                pixmap = qt.QPixmap(PyMcaLogo.PyMcaLogo)
-                pixmap.save(logofile,"PNG")
-            except:
-                pass
+            saveLogo(logofile)
         text+= "        <img SRC=%s ALT=""ESRF home"" WIDTH=55 HEIGHT=68 BORDER=0></a>" % "PyMcaLogo.png"
         text+= "    </td>"
         text+= "  </tr>"
@@ -173,10 +194,9 @@ def buildIndex(self, directory = None):
         text += self.getHeader()
         for file in filelist:
             text +="<a href=""%s"">%s</a><BR>" % (file, file.split(".html")[0])
+        text += ENTRIES_END
         text += self.getFooter()
-        file=open(index,'wb')
-        file.write(text)
-        file.close()
+        _writeText(index, text)
 
     def buildRecursiveIndex(self, directory = None):
         if directory is None: directory = self.htmldir
@@ -196,10 +216,49 @@ def buildRecursiveIndex(self, directory = None):
             fileroot = file.split('_HTMLDIR')[0]
             link     = "./"+file+"/index.html"
             text +="<a href=""%s"">%s</a><BR>" % (link, fileroot)
+        text += ENTRIES_END
         text += self.getFooter()
-        file=open(index,'wb')
-        file.write(text)
-        file.close()
+        _writeText(index, text)
+
+    def getEntry(self, link, label=None):
+        """
+        Return the text of the index entry pointing to link
+        """
+        if label is None:
+            label = os.path.basename(link).split(".html")[0]
+        return "<a href=""%s"">%s</a><BR>" % (link, label)
+
+    def appendEntry(self, text, directory=None, filename="index.html",
+                    prefix="", suffix=""):
+        """
+        Add text at the end of the entries of an index without scanning
+        the directory or reading the previous entries.
+
+        If the index does not exist (or was not written by this class)
+        it is created with the given prefix and suffix around the entries.
+        """
+        if directory is None:
+            directory = self.htmldir
+        index = os.path.join(directory, filename)
+        marker = ENTRIES_END.encode('utf-8')
+        position = -1
+        if os.path.exists(index):
+            f = open(index, 'rb')
+            f.seek(0, 2)
+            start = max(0, f.tell() - 8192)
+            f.seek(start)
+            tail = f.read()
+            f.close()
+            position = tail.rfind(marker)
+        if position < 0:
+            _writeText(index, self.getHeader() + prefix + text + \
+                              ENTRIES_END + suffix + self.getFooter())
+            return
+        # the end of the file after the entries is kept as it is
+        f = open(index, 'r+b')
+        f.seek(start + position)
+        f.write(text.encode('utf-8') + tail[position:])
+        f.close()
 
 
 if __name__ == "__main__":
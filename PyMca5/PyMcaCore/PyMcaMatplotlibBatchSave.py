@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2014 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V.A. Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+__doc__ = """
+Headless saving of many images (typically elemental maps) to PNG, SVG,
+PDF or EPS files.
+
+PyMcaMatplotlibBatchSaveImage keeps its figure, axes, image and colorbar
+between calls to saveImage. When the new image has the same shape and the
+same display settings (colormap, colorbar, axes, extent, ...) as the
+previous one, only the image data, the colormap limits, the title and the
+labels are updated before printing the figure.
+
+saveImages distributes a list of images among a pool of processes, each
+of them using its own PyMcaMatplotlibBatchSaveImage instance.
+"""
+import os
+import sys
+import time
+import multiprocessing
+from . import PyMcaMatplotlibSave
+
+DEBUG = 0
+
+# configuration keys requiring the figure to be built again when changed
+LAYOUT_KEYS = ['xaxis', 'yaxis', 'nxlabels', 'nylabels', 'colorbar',
+               'colormap', 'linlogcolormap', 'interpolation', 'origin',
+               'xpixelsize', 'ypixelsize', 'xorigin', 'yorigin', 'extent']
+
+class PyMcaMatplotlibBatchSaveImage(PyMcaMatplotlibSave.PyMcaMatplotlibSaveImage):
+    def __init__(self, *var, **kw):
+        self._layout = None
+        self._xlim = None
+        self._ylim = None
+        PyMcaMatplotlibSave.PyMcaMatplotlibSaveImage.__init__(self,
+                                                              *var, **kw)
+        self._defaultConfig = self.config.copy()
+
+    def resetParameters(self):
+        """
+        Restore the configuration given at construction time
+        """
+        self.config = self._defaultConfig.copy()
+
+    def _getLayout(self):
+        """
+        Return the settings defining the figure apart from the image
+        values or None if the figure cannot be reused.
+        """
+        if (self.imageData is None) or (self.pixmapImage is not None):
+            return None
+        if self.config['contour'] != 'off':
+            return None
+        layout = [self.imageData.shape]
+        for key in LAYOUT_KEYS:
+            value = self.config[key]
+            if isinstance(value, list):
+                value = tuple(value)
+            layout.append(value)
+        return tuple(layout)
+
+    def saveImage(self, filename):
+        """
+        Save the current image into filename. The format is deduced from
+        the file extension.
+        """
+        layout = self._getLayout()
+        if (layout is None) or (layout != self._layout):
+            if DEBUG:
+                print("Building figure")
+            self._layout = None
+            PyMcaMatplotlibSave.PyMcaMatplotlibSaveImage.saveImage(self,
+                                                                   filename)
+            if (layout is not None) and hasattr(self, "_image"):
+                self._layout = layout
+            return
+        imageData, vmin, vmax = self._getImageData()
+        displayData, norm = self._getDisplayData(imageData, vmin, vmax)
+        callbacks = getattr(self._image, "callbacks", None)
+        if hasattr(callbacks, "blocked"):
+            # update the colorbar once instead of at each change
+            with callbacks.blocked():
+                self._image.set_data(displayData)
+                self._image.set_clim(vmin, vmax)
+            if self.config['colorbar'] is not None:
+                self._colorbar.update_normal(self._image)
+        else:
+            self._image.set_data(displayData)
+            self._image.set_clim(vmin, vmax)
+        # limits or zoom of the previous image do not apply to this one
+        self.axes.set_xlim(self._xlim[0], self._xlim[1])
+        self._postImage(self._ylim, filename)
+
+    def _postImage(self, ylim, filename):
+        # axes limits of the whole image, before applying limits and zoom
+        self._xlim = self.axes.get_xlim()
+        self._ylim = ylim
+        PyMcaMatplotlibSave.PyMcaMatplotlibSaveImage._postImage(self, ylim,
+                                                                filename)
+
+# figure reused by the calls to _saveJob in the current process
+_SAVER = None
+
+def _getSaver():
+    global _SAVER
+    if _SAVER is None:
+        _SAVER = PyMcaMatplotlibBatchSaveImage()
+    return _SAVER
+
+def _saveJob(args):
+    """
+    Save one image into one or several files.
+
+    :param args: Tuple (image, filenames, config)
+    :return: List of the written files
+    """
+    image, filenames, config = args
+    saver = _getSaver()
+    saver.resetParameters()
+    saver.setParameters(config)
+    saver.setImage(image)
+    for filename in filenames:
+        saver.saveImage(filename)
+    return list(filenames)
+
+def saveImages(images, filenames, config=None, configList=None,
+               formats=None, nProcesses=None):
+    """
+    Save a list of images.
+
+    :param images: List of 2D arrays
+    :param filenames: List of output files, one per image. When formats
+                      is given, file names without extension.
+    :param config: Configuration dictionary (as in setParameters) common
+                   to all images
+    :param configList: Optional list with a configuration dictionary per
+                       image (title, labels, limits, ...) updating config
+    :param formats: Optional list of extensions (for instance ["png", "pdf"])
+                    each image is written to
+    :param nProcesses: Number of processes. Default is the number of CPUs.
+                       If 1, images are saved in the calling process.
+    :return: List of the written files
+    """
+    if len(images) != len(filenames):
+        raise ValueError("The number of images and of file names differ")
+    if (configList is not None) and (len(configList) != len(images)):
+        raise ValueError("The number of images and of configurations differ")
+    jobs = []
+    for i in range(len(images)):
+        ddict = {}
+        if config is not None:
+            ddict.update(config)
+        if configList is not None:
+            ddict.update(configList[i])
+        if formats is None:
+            output = [filenames[i]]
+        else:
+            output = [filenames[i] + "." + x.lower() for x in formats]
+        jobs.append((images[i], output, ddict))
+    if nProcesses is None:
+        nProcesses = multiprocessing.cpu_count()
+    nProcesses = max(1, min(int(nProcesses), len(jobs)))
+    if nProcesses == 1:
+        results = [_saveJob(job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(nProcesses)
+        try:
+            chunkSize = max(1, len(jobs) // (4 * nProcesses))
+            results = pool.map(_saveJob, jobs, chunkSize)
+        finally:
+            pool.close()
+            pool.join()
+    written = []
+    for result in results:
+        written.extend(result)
+    return written
+
+def benchmark(nImages=50, shape=(200, 300), outputDir=None, nProcesses=None):
+    """
+    Compare the time needed to save nImages images into PNG files
+    building one figure per image as done by the interactive tools
+    with the time needed by the reused figure and by saveImages.
+
+    :return: Tuple with the times per image in seconds
+    """
+    import numpy
+    import tempfile
+    import shutil
+    if outputDir is None:
+        directory = tempfile.mkdtemp()
+    else:
+        directory = outputDir
+    try:
+        images = [numpy.random.random(shape) * (i + 1) \
+                  for i in range(nImages)]
+        config = {"colorbar": "vertical", "colormap": "temperature",
+                  "xaxis": "on", "yaxis": "on"}
+        configList = [{"title": "Element %d" % i} for i in range(nImages)]
+        filenames = [os.path.join(directory, "image%04d.png" % i) \
+                     for i in range(nImages)]
+        t0 = time.time()
+        for i in range(nImages):
+            saver = PyMcaMatplotlibSave.PyMcaMatplotlibSaveImage(images[i])
+            saver.setParameters(config)
+            saver.setParameters(configList[i])
+            saver.saveImage(filenames[i])
+        single = (time.time() - t0) / nImages
+        t0 = time.time()
+        saveImages(images, filenames, config, configList, nProcesses=1)
+        reused = (time.time() - t0) / nImages
+        t0 = time.time()
+        saveImages(images, filenames, config, configList,
+                   nProcesses=nProcesses)
+        pool = (time.time() - t0) / nImages
+    finally:
+        if outputDir is None:
+            shutil.rmtree(directory)
+    return single, reused, pool
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        nImages = int(sys.argv[1])
+    else:
+        nImages = 50
+    single, reused, pool = benchmark(nImages)
+    print("One figure per image = %.4f s per image" % single)
+    print("Reused figure        = %.4f s per image" % reused)
+    print("Process pool         = %.4f s per image" % pool)
@@ -418,6 +418,98 @@ def saveImage(self, filename):
         interpolation = self.config['interpolation']
         origin = self.config['origin']
 
+        cmap, ccmap = self._getColormaps()
+
+        extent = self._getExtent(self.imageData.shape)
+        imageData, vmin, vmax = self._getImageData()
+
+        displayData, norm = self._getDisplayData(imageData, vmin, vmax)
+        self._image  = self.axes.imshow(displayData,
+                                        interpolation=interpolation,
+                                        origin=origin,
+                                        cmap=cmap,
+                                        extent=extent,
+                                        norm=norm)
+
+        ylim = self.axes.get_ylim()
+
+        if self.config['colorbar'] is not None:
+            barorientation = self.config['colorbar']
+            self._colorbar = self.figure.colorbar(self._image,
+                                        orientation=barorientation)
+
+        #contour plot
+        if self.config['contour'] != 'off':
+            dataMin = imageData.min()
+            dataMax = imageData.max()
+            ncontours = int(self.config['contourlevels'])
+            contourlinewidth = int(self.config['contourlinewidth'])/10.
+            levels = (numpy.arange(ncontours)) *\
+                     (dataMax - dataMin)/float(ncontours)
+            if self.config['contour'] == 'filled':
+                self._contour = self.axes.contourf(imageData, levels,
+                     origin=origin,
+                     cmap=ccmap,
+                     extent=extent)
+            else:
+                self._contour = self.axes.contour(imageData, levels,
+                     origin=origin,
+                     cmap=ccmap,
+                     linewidths=contourlinewidth,
+                     extent=extent)
+            if self.config['contourlabels'] != 'off':
+                self.axes.clabel(self._contour, fontsize=9,
+                         inline=1, fmt=self.config['contourlabelformat'])
+            if 0 and  self.config['colorbar'] is not None:
+                if barorientation == 'horizontal':
+                    barorientation = 'vertical'
+                else:
+                    barorientation = 'horizontal'
+                self._ccolorbar=self.figure.colorbar(self._contour,
+                                                     orientation=barorientation,
+                                                     extend='both')
+
+        self._postImage(ylim, filename)
+
+
+    def setPixmapImage(self, image=None, bgr=False):
+        if bgr:
+            self.pixmapImage = image * 1
+            self.pixmapImage[:,:,0] = image[:,:,2]
+            self.pixmapImage[:,:,2] = image[:,:,0]
+        else:
+            self.pixmapImage = image
+
+    def _savePixmapFigure(self, filename):
+        interpolation = self.config['interpolation']
+        origin = self.config['origin']
+        if self.config['extent'] is None:
+            h= self.pixmapImage.shape[0]
+            w= self.pixmapImage.shape[1]
+            x0 = self.config['xorigin']
+            y0 = self.config['yorigin']
+            w = w * self.config['xpixelsize']
+            h = h * self.config['ypixelsize']
+            if origin == 'upper':
+                extent = (x0, w+x0,
+                          h+y0, y0)
+            else:
+                extent = (x0, w+x0,
+                          y0, h+y0)
+        else:
+            extent = self.config['extent']
+        self._image = self.axes.imshow(self.pixmapImage,
+                                       interpolation=interpolation,
+                                       origin=origin,
+                                       extent=extent)
+
+        ylim = self.axes.get_ylim()
+        self._postImage(ylim, filename)
+
+    def _getColormaps(self):
+        """
+        Return the colormaps of the image and of the contour lines
+        """
         cmap = self.__temperatureCmap
         ccmap = cm.gray
         if self.config['colormap'] in ['grey','gray']:
@@ -474,9 +566,12 @@ def saveImage(self, filename):
             cmap = cm.YlGnBu_r
         else:
             print("Unsupported colormap %s" % self.config['colormap'])
+        return cmap, ccmap
 
+    def _getExtent(self, shape):
+        origin = self.config['origin']
         if self.config['extent'] is None:
-            h, w = self.imageData.shape
+            h, w = shape[0], shape[1]
             x0 = self.config['xorigin']
             y0 = self.config['yorigin']
             w = w * self.config['xpixelsize']
@@ -489,8 +584,13 @@ def saveImage(self, filename):
                           y0, h+y0)
         else:
             extent = self.config['extent']
+        return extent
 
-        vlimits = self.__getValueLimits()
+    def _getImageData(self):
+        """
+        Return the image data to be displayed and the limits of the colormap
+        """
+        vlimits = self._getValueLimits()
         if vlimits is None:
             imageData = self.imageData
             vmin = self.imageData.min()
@@ -507,96 +607,18 @@ def saveImage(self, filename):
                 else:
                     vmin = 0.0
                     vmax = 1.0
-            self._image  = self.axes.imshow(imageData.clip(vmin,vmax),
-                                        interpolation=interpolation,
-                                        origin=origin,
-                                        cmap=cmap,
-                                        extent=extent,
-                                        norm=LogNorm(vmin, vmax))
-        else:
-            self._image  = self.axes.imshow(imageData,
-                                        interpolation=interpolation,
-                                        origin=origin,
-                                        cmap=cmap,
-                                        extent=extent,
-                                        norm=Normalize(vmin, vmax))
-
-        ylim = self.axes.get_ylim()
+        return imageData, vmin, vmax
 
-        if self.config['colorbar'] is not None:
-            barorientation = self.config['colorbar']
-            self._colorbar = self.figure.colorbar(self._image,
-                                        orientation=barorientation)
-
-        #contour plot
-        if self.config['contour'] != 'off':
-            dataMin = imageData.min()
-            dataMax = imageData.max()
-            ncontours = int(self.config['contourlevels'])
-            contourlinewidth = int(self.config['contourlinewidth'])/10.
-            levels = (numpy.arange(ncontours)) *\
-                     (dataMax - dataMin)/float(ncontours)
-            if self.config['contour'] == 'filled':
-                self._contour = self.axes.contourf(imageData, levels,
-                     origin=origin,
-                     cmap=ccmap,
-                     extent=extent)
-            else:
-                self._contour = self.axes.contour(imageData, levels,
-                     origin=origin,
-                     cmap=ccmap,
-                     linewidths=contourlinewidth,
-                     extent=extent)
-            if self.config['contourlabels'] != 'off':
-                self.axes.clabel(self._contour, fontsize=9,
-                         inline=1, fmt=self.config['contourlabelformat'])
-            if 0 and  self.config['colorbar'] is not None:
-                if barorientation == 'horizontal':
-                    barorientation = 'vertical'
-                else:
-                    barorientation = 'horizontal'
-                self._ccolorbar=self.figure.colorbar(self._contour,
-                                                     orientation=barorientation,
-                                                     extend='both')
-
-        self.__postImage(ylim, filename)
-
-
-    def setPixmapImage(self, image=None, bgr=False):
-        if bgr:
-            self.pixmapImage = image * 1
-            self.pixmapImage[:,:,0] = image[:,:,2]
-            self.pixmapImage[:,:,2] = image[:,:,0]
-        else:
-            self.pixmapImage = image
-
-    def _savePixmapFigure(self, filename):
-        interpolation = self.config['interpolation']
-        origin = self.config['origin']
-        if self.config['extent'] is None:
-            h= self.pixmapImage.shape[0]
-            w= self.pixmapImage.shape[1]
-            x0 = self.config['xorigin']
-            y0 = self.config['yorigin']
-            w = w * self.config['xpixelsize']
-            h = h * self.config['ypixelsize']
-            if origin == 'upper':
-                extent = (x0, w+x0,
-                          h+y0, y0)
-            else:
-                extent = (x0, w+x0,
-                          y0, h+y0)
+    def _getDisplayData(self, imageData, vmin, vmax):
+        """
+        Return the data given to imshow and the associated normalization
+        """
+        if self.config['linlogcolormap'] != 'linear':
+            return imageData.clip(vmin, vmax), LogNorm(vmin, vmax)
         else:
-            extent = self.config['extent']
-        self._image = self.axes.imshow(self.pixmapImage,
-                                       interpolation=interpolation,
-                                       origin=origin,
-                                       extent=extent)
-
-        ylim = self.axes.get_ylim()
-        self.__postImage(ylim, filename)
+            return imageData, Normalize(vmin, vmax)
 
-    def __getValueLimits(self):
+    def _getValueLimits(self):
         if (self.config['valuemin'] is not None) and\
            (self.config['valuemax'] is not None) and\
            (self.config['valuemin'] != self.config['valuemax']):
@@ -608,7 +630,7 @@ def __getValueLimits(self):
             vlimits = None
         return vlimits
 
-    def __postImage(self, ylim, filename):
+    def _postImage(self, ylim, filename):
         self.axes.set_title(self.config['title'])
         self.axes.set_xlabel(self.config['xlabel'])
         self.axes.set_ylabel(self.config['ylabel'])
@@ -0,0 +1,558 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V.A. Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+__doc__ = """
+Image handling of the RGB correlator without graphical interface.
+
+- ImageExpression compiles once the image expressions of the RGB image
+  calculator, where {1}, {2}, ... refer to the images, and evaluates them
+  over blocks of pixels to limit the size of the temporary arrays.
+
+- RGBCorrelatorCore keeps the images and caches their statistics (finite
+  minimum and maximum and histogram used to calculate percentiles), the
+  normalized images of the last used channels and the 2D histograms used
+  to display the correlation of two images as a density instead of a cloud
+  of points.
+"""
+import sys
+import re
+import ast
+import time
+import numpy
+try:
+    from collections import OrderedDict
+except ImportError:
+    # Python 2.6
+    OrderedDict = dict
+
+DEBUG = 0
+
+# number of pixels processed in one go
+BLOCK_SIZE = 262144
+
+# number of bins of the histograms used for the percentiles
+HISTOGRAM_BINS = 4096
+
+# number of normalized images kept in memory (one per channel)
+CACHED_CHANNELS = 3
+
+# names usable in the expressions besides the numpy ufuncs
+_CONSTANTS = {"pi": numpy.pi, "e": numpy.e}
+_FUNCTIONS = {"where": numpy.where, "clip": numpy.clip}
+_MODULES = ["numpy", "np"]
+
+_AST_NODES = ["Expression", "BinOp", "UnaryOp", "Compare", "Call", "Name",
+              "Load", "Attribute", "Num", "Constant",
+              "Add", "Sub", "Mult", "Div", "FloorDiv", "Mod", "Pow",
+              "USub", "UAdd", "Invert", "BitAnd", "BitOr", "BitXor",
+              "Eq", "NotEq", "Lt", "LtE", "Gt", "GtE"]
+
+class ExpressionError(ValueError):
+    pass
+
+def _isUfunc(name):
+    return isinstance(getattr(numpy, name, None), numpy.ufunc)
+
+class ImageExpression(object):
+    def __init__(self, expression):
+        """
+        :param expression: String where {n} refers to the image n (first
+                           image is 1). numpy ufuncs (either as log(...),
+                           numpy.log(...) or np.log(...)), where, clip,
+                           pi and e can be used.
+        :raise ExpressionError: If the expression is not an element wise
+                                operation on images.
+        """
+        self.expression = expression
+        self.indices = sorted(set([int(x) for x in \
+                                   re.findall(r"\{(\d+)\}", expression)]))
+        text = re.sub(r"\{(\d+)\}", r"_image_\1", expression)
+        try:
+            tree = ast.parse(text.strip(), mode="eval")
+        except SyntaxError:
+            raise ExpressionError("Invalid expression %s" % expression)
+        self._globals = {"__builtins__": {}}
+        self._globals.update(_CONSTANTS)
+        self._globals.update(_FUNCTIONS)
+        for module in _MODULES:
+            self._globals[module] = numpy
+        for node in ast.walk(tree):
+            nodeType = type(node).__name__
+            if nodeType not in _AST_NODES:
+                raise ExpressionError("Unsupported %s in expression" % \
+                                      nodeType)
+            if nodeType == "Call":
+                if node.keywords or \
+                   (getattr(node, "starargs", None) is not None) or \
+                   (getattr(node, "kwargs", None) is not None):
+                    raise ExpressionError("Only positional arguments allowed")
+                if isinstance(node.func, ast.Attribute):
+                    if (not isinstance(node.func.value, ast.Name)) or \
+                       (node.func.value.id not in _MODULES) or \
+                       ((not _isUfunc(node.func.attr)) and \
+                        (node.func.attr not in _FUNCTIONS)):
+                        raise ExpressionError("Unsupported function call")
+                elif not isinstance(node.func, ast.Name):
+                    raise ExpressionError("Unsupported function call")
+            elif nodeType == "Attribute":
+                if (not isinstance(node.value, ast.Name)) or \
+                   (node.value.id not in _MODULES):
+                    raise ExpressionError("Unsupported attribute access")
+            elif nodeType == "Name":
+                name = node.id
+                if name.startswith("_image_") or \
+                   (name in self._globals):
+                    continue
+                if _isUfunc(name):
+                    self._globals[name] = getattr(numpy, name)
+                else:
+                    raise ExpressionError("Unknown name %s" % name)
+        self._code = compile(tree, "<expression>", "eval")
+
+    def evaluate(self, images, blockSize=None):
+        """
+        :param images: Sequence of arrays of the same shape. {n} refers to
+                       images[n - 1].
+        :param blockSize: Number of pixels evaluated in one go.
+                          Default is BLOCK_SIZE.
+        :return: Array with the shape of the images
+        """
+        if blockSize is None:
+            blockSize = BLOCK_SIZE
+        for index in self.indices:
+            if (index < 1) or (index > len(images)):
+                raise ExpressionError("Image {%d} not defined" % index)
+        if not len(self.indices):
+            return numpy.asarray(eval(self._code, self._globals, {}))
+        arrays = {}
+        shape = None
+        for index in self.indices:
+            image = numpy.asarray(images[index - 1])
+            if shape is None:
+                shape = image.shape
+            elif image.shape != shape:
+                raise ExpressionError("Images of different shape")
+            arrays["_image_%d" % index] = image.reshape(-1)
+        size = int(numpy.prod(shape))
+        output = None
+        for start in range(0, size, blockSize):
+            stop = min(start + blockSize, size)
+            namespace = {}
+            for key in arrays:
+                namespace[key] = arrays[key][start:stop]
+            result = eval(self._code, self._globals, namespace)
+            result = numpy.asarray(result)
+            if output is None:
+                output = numpy.empty((size,), dtype=result.dtype)
+            output[start:stop] = result
+        if output is None:
+            output = numpy.zeros((0,), dtype=numpy.float64)
+        output.shape = shape
+        return output
+
+def getStatistics(image, bins=None):
+    """
+    :param image: Image data
+    :param bins: Number of bins of the histogram. Default is HISTOGRAM_BINS.
+    :return: Dictionary with the finite minimum ("min") and maximum ("max"),
+             the number of finite values ("size") and the histogram of them
+             ("histogram" and "edges").
+    """
+    if bins is None:
+        bins = HISTOGRAM_BINS
+    data = numpy.asarray(image).reshape(-1)
+    ddict = {"min": numpy.nan, "max": numpy.nan, "size": 0,
+             "histogram": numpy.zeros((bins,), numpy.int64),
+             "edges": numpy.zeros((bins + 1,), numpy.float64)}
+    if data.dtype.kind not in "fc":
+        finite = data
+    else:
+        finite = data[numpy.isfinite(data)]
+    if not finite.size:
+        return ddict
+    ddict["min"] = finite.min()
+    ddict["max"] = finite.max()
+    ddict["size"] = finite.size
+    ddict["histogram"], ddict["edges"] = numpy.histogram(finite, bins=bins,
+                                                range=(float(ddict["min"]),
+                                                       float(ddict["max"])))
+    return ddict
+
+def _binIndex(values, nBins, valueRange):
+    """
+    Bin index of the values or -1 if outside of the range or not finite.
+    The last bin includes its upper edge as in numpy.histogram.
+    """
+    vmin, vmax = valueRange
+    values = numpy.asarray(values, dtype=numpy.float64)
+    inside = (values >= vmin) & (values <= vmax)
+    if vmax > vmin:
+        index = (values - vmin) * (nBins / (vmax - vmin))
+    else:
+        index = numpy.zeros(values.shape, dtype=numpy.float64)
+    index[~inside] = -1
+    index = index.astype(numpy.intp)
+    index[index >= nBins] = nBins - 1
+    index[~inside] = -1
+    return index
+
+def histogram2d(x, y, bins=10, ranges=None, mask=None, blockSize=None):
+    """
+    2D histogram with regular bins calculated blockwise with bincount.
+
+    :param x: Array of x values
+    :param y: Array of y values with the same size as x
+    :param bins: Number of bins or (x bins, y bins)
+    :param ranges: ((xmin, xmax), (ymin, ymax)). Default is the range
+                   of the finite values of x and y.
+    :param mask: Optional array, only the values where mask is non zero
+                 are counted.
+    :param blockSize: Number of values processed in one go.
+                      Default is BLOCK_SIZE.
+    :return: Tuple (counts, xEdges, yEdges) with counts[i, j] the number
+             of values in x bin i and y bin j as in numpy.histogram2d.
+    """
+    if blockSize is None:
+        blockSize = BLOCK_SIZE
+    if not hasattr(bins, "__len__"):
+        bins = (bins, bins)
+    bins = (int(bins[0]), int(bins[1]))
+    x = numpy.asarray(x).reshape(-1)
+    y = numpy.asarray(y).reshape(-1)
+    if x.size != y.size:
+        raise ValueError("x and y must have the same size")
+    if mask is not None:
+        mask = numpy.asarray(mask).reshape(-1)
+        if mask.size != x.size:
+            raise ValueError("Mask and data of different size")
+    if ranges is None:
+        ranges = []
+        for data in [x, y]:
+            ddict = getStatistics(data, bins=1)
+            if ddict["size"]:
+                ranges.append((float(ddict["min"]), float(ddict["max"])))
+            else:
+                ranges.append((0.0, 1.0))
+    ranges = [[float(v) for v in r] for r in ranges]
+    for r in ranges:
+        if r[0] == r[1]:
+            # same convention as numpy.histogram
+            r[0] -= 0.5
+            r[1] += 0.5
+    counts = numpy.zeros((bins[0] * bins[1],), dtype=numpy.int64)
+    for start in range(0, x.size, blockSize):
+        stop = start + blockSize
+        ix = _binIndex(x[start:stop], bins[0], ranges[0])
+        iy = _binIndex(y[start:stop], bins[1], ranges[1])
+        valid = (ix >= 0) & (iy >= 0)
+        if mask is not None:
+            valid &= (mask[start:stop] != 0)
+        index = ix[valid] * bins[1] + iy[valid]
+        counts += numpy.bincount(index, minlength=counts.size)
+    counts.shape = bins
+    return (counts,
+            numpy.linspace(ranges[0][0], ranges[0][1], bins[0] + 1),
+            numpy.linspace(ranges[1][0], ranges[1][1], bins[1] + 1))
+
+class RGBCorrelatorCore(object):
+    def __init__(self, blockSize=None, cachedChannels=None):
+        if blockSize is None:
+            blockSize = BLOCK_SIZE
+        if cachedChannels is None:
+            cachedChannels = CACHED_CHANNELS
+        self.blockSize = blockSize
+        self.cachedChannels = cachedChannels
+        self._imageList = []
+        self._imageDict = {}
+        self._statistics = {}
+        self._normalized = OrderedDict()
+        self._density = {}
+        self._expressions = {}
+
+    def reset(self):
+        self._imageList = []
+        self._imageDict = {}
+        self._clearCache()
+
+    def _clearCache(self, label=None):
+        if label is None:
+            self._statistics = {}
+            self._normalized = OrderedDict()
+            self._density = {}
+            return
+        if label in self._statistics:
+            del self._statistics[label]
+        if label in self._normalized:
+            del self._normalized[label]
+        for key in list(self._density.keys()):
+            if label in key[0:2]:
+                del self._density[key]
+
+    def addImage(self, image, label):
+        """
+        Add or replace the image associated to label.
+        The image is not copied.
+        """
+        self._imageDict[label] = image
+        if label not in self._imageList:
+            self._imageList.append(label)
+        self._clearCache(label)
+
+    def removeImage(self, label):
+        if label in self._imageList:
+            self._imageList.remove(label)
+            del self._imageDict[label]
+        self._clearCache(label)
+
+    def getImageNames(self):
+        return self._imageList[:]
+
+    def getImage(self, label):
+        return self._imageDict[label]
+
+    def getStatistics(self, label):
+        """
+        Cached output of getStatistics for the image associated to label
+        """
+        if label not in self._statistics:
+            self._statistics[label] = getStatistics(self._imageDict[label])
+        return self._statistics[label]
+
+    def getPercentile(self, label, q):
+        """
+        Percentile q (0 to 100) of the finite values of the image estimated
+        from the cached histogram. The error is below the bin width.
+        """
+        ddict = self.getStatistics(label)
+        if not ddict["size"]:
+            return numpy.nan
+        cumulated = numpy.cumsum(ddict["histogram"])
+        target = min(max(q, 0.0), 100.0) * 0.01 * ddict["size"]
+        i = int(numpy.searchsorted(cumulated, target, side="left"))
+        i = min(i, cumulated.size - 1)
+        previous = cumulated[i - 1] if i > 0 else 0
+        counts = cumulated[i] - previous
+        edges = ddict["edges"]
+        if counts <= 0:
+            return edges[i]
+        fraction = min(max((target - previous) / float(counts), 0.0), 1.0)
+        return edges[i] + fraction * (edges[i + 1] - edges[i])
+
+    def getNormalizedImage(self, label):
+        """
+        float32 image scaled between 0 (minimum) and 1 (maximum). Only the
+        last cachedChannels normalized images are kept.
+        """
+        if label in self._normalized:
+            image = self._normalized.pop(label)
+            self._normalized[label] = image
+            return image
+        ddict = self.getStatistics(label)
+        data = numpy.asarray(self._imageDict[label])
+        image = numpy.empty(data.shape, dtype=numpy.float32)
+        vmin = ddict["min"]
+        delta = ddict["max"] - vmin
+        if not (delta > 0):
+            delta = 1.0
+        if not numpy.isfinite(vmin):
+            vmin = 0.0
+        flatIn = data.reshape(-1)
+        flatOut = image.reshape(-1)
+        for start in range(0, flatIn.size, self.blockSize):
+            stop = start + self.blockSize
+            numpy.subtract(flatIn[start:stop], vmin, flatOut[start:stop],
+                           casting="unsafe")
+            flatOut[start:stop] /= delta
+        while len(self._normalized) >= max(self.cachedChannels, 1):
+            self._normalized.pop(next(iter(self._normalized)))
+        self._normalized[label] = image
+        return image
+
+    def getChannel(self, label, minValue=None, maxValue=None, out=None):
+        """
+        Return the uint8 image corresponding to the linear scaling of the
+        image between minValue (0) and maxValue (255).
+
+        :param minValue: Default is the minimum of the image
+        :param maxValue: Default is the maximum of the image
+        :param out: Optional uint8 array with the shape of the image
+        """
+        ddict = self.getStatistics(label)
+        normalized = self.getNormalizedImage(label)
+        if out is None:
+            out = numpy.empty(normalized.shape, dtype=numpy.uint8)
+        elif (out.dtype != numpy.uint8) or (out.shape != normalized.shape):
+            raise ValueError("Output must be an uint8 array of shape %s" % \
+                             (normalized.shape,))
+        delta = ddict["max"] - ddict["min"]
+        if not (delta > 0):
+            delta = 1.0
+        if (minValue is None) or (not ddict["size"]):
+            a = 0.0
+        else:
+            a = (minValue - ddict["min"]) / float(delta)
+        if (maxValue is None) or (not ddict["size"]):
+            b = 1.0
+        else:
+            b = (maxValue - ddict["min"]) / float(delta)
+        if b > a:
+            scale = 255.0 / (b - a)
+        else:
+            scale = 0.0
+        flatIn = normalized.reshape(-1)
+        flatOut = out.reshape(-1)
+        tmp = numpy.empty((min(self.blockSize, flatIn.size),),
+                          dtype=numpy.float32)
+        for start in range(0, flatIn.size, self.blockSize):
+            stop = min(start + self.blockSize, flatIn.size)
+            buf = tmp[:stop - start]
+            numpy.subtract(flatIn[start:stop], a, buf)
+            buf *= scale
+            numpy.clip(buf, 0, 255, buf)
+            # NaN values are set to 0
+            buf[numpy.isnan(buf)] = 0
+            flatOut[start:stop] = buf
+        return out
+
+    def getRGBImage(self, red=None, green=None, blue=None):
+        """
+        Return an uint8 array (rows, columns, 3) with the given channels.
+        Each channel is None or a tuple (label, minValue, maxValue).
+        """
+        shape = None
+        for channel in [red, green, blue]:
+            if channel is not None:
+                shape = numpy.asarray(self._imageDict[channel[0]]).shape
+                break
+        if shape is None:
+            raise ValueError("At least one channel must be defined")
+        rgb = numpy.zeros(shape + (3,), dtype=numpy.uint8)
+        tmp = numpy.empty(shape, dtype=numpy.uint8)
+        for i, channel in enumerate([red, green, blue]):
+            if channel is not None:
+                self.getChannel(channel[0], channel[1], channel[2], out=tmp)
+                rgb[..., i] = tmp
+        return rgb
+
+    def compileExpression(self, expression):
+        """
+        Return the ImageExpression associated to the expression string
+        (compiled once).
+        """
+        if expression not in self._expressions:
+            self._expressions[expression] = ImageExpression(expression)
+        return self._expressions[expression]
+
+    def evaluate(self, expression, labels=None):
+        """
+        Evaluate the expression with {n} referring to labels[n - 1]
+        (by default the images in the order they were added).
+        """
+        if labels is None:
+            labels = self._imageList
+        images = [self._imageDict[label] for label in labels]
+        return self.compileExpression(expression).evaluate(images,
+                                                    blockSize=self.blockSize)
+
+    def getDensity(self, xLabel, yLabel, bins=256, ranges=None, mask=None):
+        """
+        2D histogram of the pixel values of two images to display their
+        correlation as a density image.
+
+        :param bins: Number of bins or (x bins, y bins)
+        :param ranges: ((xmin, xmax), (ymin, ymax)). Default is the range
+                       of the finite values of each image.
+        :param mask: Optional array, only the pixels where mask is non zero
+                     are counted. Results are not cached if given.
+        :return: Tuple (counts, xEdges, yEdges) with counts[i, j] the number
+                 of pixels in x bin i and y bin j as in numpy.histogram2d.
+        """
+        if not hasattr(bins, "__len__"):
+            bins = (bins, bins)
+        bins = (int(bins[0]), int(bins[1]))
+        if ranges is None:
+            ranges = []
+            for label in [xLabel, yLabel]:
+                ddict = self.getStatistics(label)
+                if ddict["size"]:
+                    ranges.append((float(ddict["min"]), float(ddict["max"])))
+                else:
+                    ranges.append((0.0, 1.0))
+        ranges = tuple([tuple([float(x) for x in r]) for r in ranges])
+        key = (xLabel, yLabel, bins, ranges)
+        if (mask is None) and (key in self._density):
+            return self._density[key]
+        result = histogram2d(self._imageDict[xLabel], self._imageDict[yLabel],
+                             bins=bins, ranges=ranges, mask=mask,
+                             blockSize=self.blockSize)
+        if mask is None:
+            self._density[key] = result
+        return result
+
+def benchmark(shape=(4096, 4096), nImages=4, repeat=3):
+    """
+    Compare the blockwise evaluation of an expression with the direct
+    evaluation and the density calculation with numpy.histogram2d.
+
+    :return: Dictionary with the best times in seconds
+    """
+    images = [numpy.random.random(shape) + 0.1 for i in range(nImages)]
+    core = RGBCorrelatorCore()
+    for i, image in enumerate(images):
+        core.addImage(image, "image_%d" % i)
+    text = "log({1}) * {2} + sqrt({3}) / ({1} + {2})"
+
+    def best(function):
+        times = []
+        for i in range(repeat):
+            t0 = time.time()
+            function()
+            times.append(time.time() - t0)
+        return min(times)
+
+    result = {}
+    result["direct"] = best(lambda: numpy.log(images[0]) * images[1] + \
+                            numpy.sqrt(images[2]) / (images[0] + images[1]))
+    result["blockwise"] = best(lambda: core.evaluate(text))
+    result["histogram2d"] = best(lambda: numpy.histogram2d(images[0].ravel(),
+                                                   images[1].ravel(), 256))
+    result["density"] = best(lambda: core._density.clear() or \
+                             core.getDensity("image_0", "image_1", 256))
+    return result
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        result = benchmark((int(sys.argv[1]), int(sys.argv[2])))
+    else:
+        result = benchmark()
+    for key in ["direct", "blockwise", "histogram2d", "density"]:
+        print("%-12s = %.4f s" % (key, result[key]))
@@ -35,6 +35,7 @@
 
 """
 from . import DataObject
+from .StackSelectionSum import StackSelectionSum
 import numpy
 import time
 import os
@@ -74,6 +75,7 @@ def __init__(self):
         self._stack.x = None
         self._stackImageData = None
         self._selectionMask = None
+        self._selectionSum = None
         self._finiteData = True
         self._ROIDict = {'name': "ICR",
                          'type': "CHANNEL",
@@ -256,6 +258,10 @@ def stackUpdated(self):
             # is not a numpy ndarray in any case
             self._tryNumpy = False
 
+        if self._selectionSum is not None:
+            self._selectionSum.cancel()
+            self._selectionSum = None
+
         previousStackImageSize = None
         if self._stackImageData is not None:
             previousStackImageSize = self._stackImageData.size
@@ -545,18 +551,7 @@ def calculateMcaDataObject(self, normalize=False):
             return dataObject
 
         #deal with NaN and inf values
-        if self._selectionMask is None:
-            if (self._ROIImageDict["ROI"] is not None) and\
-               (self.mcaIndex != 0):
-                actualSelectionMask = numpy.isfinite(self._ROIImageDict["ROI"])
-            else:
-                actualSelectionMask = numpy.isfinite(self._stackImageData)
-        else:
-            if (self._ROIImageDict["ROI"] is not None) and\
-               (self.mcaIndex != 0):
-                actualSelectionMask = self._selectionMask * numpy.isfinite(self._ROIImageDict["ROI"])
-            else:
-                actualSelectionMask = self._selectionMask * numpy.isfinite(self._stackImageData)
+        actualSelectionMask = self._getActualSelectionMask()
 
         npixels = actualSelectionMask.sum()
         if (npixels == 0) and goodData:
@@ -574,6 +569,16 @@ def calculateMcaDataObject(self, normalize=False):
                 dataObject = self._mcaData0
             return dataObject
 
+        selectionSum = None
+        if goodData:
+            selectionSum = self._getSelectionSum()
+        if selectionSum is not None:
+            # only the pixels changed since the previous mask are read
+            mcaData = selectionSum.getSum(actualSelectionMask)
+            if normalize:
+                mcaData = mcaData / npixels
+            return self._getSelectionDataObject(mcaData)
+
         mcaData = numpy.zeros(self._mcaData0.y[0].shape, numpy.float)
 
         n_nonselected = self._stackImageData.shape[0] *\
@@ -732,6 +737,9 @@ def calculateMcaDataObject(self, normalize=False):
         if normalize:
             mcaData = mcaData / npixels
 
+        return self._getSelectionDataObject(mcaData)
+
+    def _getSelectionDataObject(self, mcaData):
         calib = self._stack.info['McaCalib']
         dataObject = DataObject.DataObject()
         dataObject.info = {"McaCalib": calib,
@@ -743,6 +751,50 @@ def calculateMcaDataObject(self, normalize=False):
 
         return dataObject
 
+    def _getActualSelectionMask(self):
+        """
+        Selection mask excluding the pixels with NaN or inf values
+        """
+        if self._selectionMask is None:
+            if (self._ROIImageDict["ROI"] is not None) and\
+               (self.mcaIndex != 0):
+                actualSelectionMask = numpy.isfinite(self._ROIImageDict["ROI"])
+            else:
+                actualSelectionMask = numpy.isfinite(self._stackImageData)
+        else:
+            if (self._ROIImageDict["ROI"] is not None) and\
+               (self.mcaIndex != 0):
+                actualSelectionMask = self._selectionMask * numpy.isfinite(self._ROIImageDict["ROI"])
+            else:
+                actualSelectionMask = self._selectionMask * numpy.isfinite(self._stackImageData)
+        return actualSelectionMask
+
+    def _getSelectionSum(self):
+        """
+        Return the object keeping the sum spectrum of the selected pixels
+        or None if the stack is not an in-memory 3D array.
+        """
+        if self._selectionSum is None:
+            data = self._stack.data
+            if isinstance(data, numpy.ndarray) and (len(data.shape) == 3):
+                self._selectionSum = StackSelectionSum(data,
+                                            mcaIndex=self.mcaIndex,
+                                            total=self._mcaData0.y[0])
+        return self._selectionSum
+
+    def _selectionMaskUpdated(self):
+        """
+        Start the update of the sum spectrum of the selected pixels in
+        a background thread.
+        """
+        if self._stackImageData is None:
+            return
+        if not numpy.isfinite(self._mcaData0.y[0].sum()):
+            return
+        selectionSum = self._getSelectionSum()
+        if selectionSum is not None:
+            selectionSum.startUpdate(self._getActualSelectionMask())
+
     def calculateROIImages(self, index1, index2, imiddle=None, energy=None):
         if DEBUG:
             print("Calculating ROI images")
@@ -1013,6 +1065,7 @@ def setSelectionMask(self, mask):
                 self._selectionMask = mask * numpy.isfinite(self._ROIImageDict["ROI"])
             else:
                 self._selectionMask = mask * numpy.isfinite(self._stackImageData)
+        self._selectionMaskUpdated()
 
         for key in self.pluginInstanceDict.keys():
             self.pluginInstanceDict[key].selectionMaskUpdated()
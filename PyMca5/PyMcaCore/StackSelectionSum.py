@@ -0,0 +1,296 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V.A. Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+__doc__ = """
+Incremental calculation of the sum spectrum of the pixels selected by a mask.
+
+The mask and the sum spectrum of the last calculation are kept. When a new
+mask is supplied only the spectra of the pixels added to or removed from the
+selection are read and added to or subtracted from the previous sum. If the
+number of changed pixels is larger than the number of pixels needed to
+calculate the sum from scratch (either the selected pixels or, knowing the
+total spectrum, the non selected ones) the sum is calculated from scratch.
+
+The spectra are read in batches. Calculations started with startUpdate are
+performed in a background thread and are cancelled by the next call to
+startUpdate or cancel. A cancelled calculation does not modify the stored
+mask and sum.
+"""
+import sys
+import time
+import threading
+import numpy
+
+DEBUG = 0
+
+# number of spectra elements read in one go
+BATCH_SIZE = 1000000
+
+class StackSelectionSum(object):
+    def __init__(self, data, mcaIndex=2, total=None, batchSize=None):
+        """
+        :param data: 3D numpy array
+        :param mcaIndex: Index of the spectra axis
+        :param total: Sum spectrum of all the pixels. Calculated if not given.
+        :param batchSize: Number of data elements to read in one go.
+                          Default is BATCH_SIZE.
+        """
+        if len(data.shape) != 3:
+            raise ValueError("Only 3D data are supported")
+        if mcaIndex < 0:
+            mcaIndex += 3
+        if mcaIndex not in [0, 1, 2]:
+            raise IndexError("Invalid spectra axis %d" % mcaIndex)
+        if batchSize is None:
+            batchSize = BATCH_SIZE
+        self._data = data
+        self._mcaIndex = mcaIndex
+        self.nChannels = data.shape[mcaIndex]
+        self.imageShape = tuple([data.shape[i] for i in range(3) \
+                                 if i != mcaIndex])
+        self.batchPixels = max(1, int(batchSize) // max(1, self.nChannels))
+        self._total = total
+        self._lock = threading.Lock()
+        self._thread = None
+        self._event = None
+        self._threadMask = None
+        self._mask = numpy.zeros(self.imageShape, dtype=numpy.bool_)
+        self._sum = numpy.zeros((self.nChannels,), dtype=numpy.float64)
+
+    def _getMask(self, mask):
+        if mask is None:
+            return numpy.zeros(self.imageShape, dtype=numpy.bool_)
+        mask = numpy.asarray(mask)
+        if mask.shape != self.imageShape:
+            raise ValueError("Mask shape %s does not match image shape %s" % \
+                             (mask.shape, self.imageShape))
+        return mask > 0
+
+    def getTotal(self):
+        """
+        Sum spectrum of all the pixels
+        """
+        if self._total is None:
+            self._total = self._sumPixels(\
+                        numpy.ones(self.imageShape, dtype=numpy.bool_))
+        return self._total
+
+    def _sumPixels(self, mask, event=None):
+        """
+        Sum of the spectra of the pixels where mask is True or None if
+        the event gets set during the calculation.
+        """
+        result = numpy.zeros((self.nChannels,), dtype=numpy.float64)
+        rows, columns = numpy.nonzero(mask)
+        for start in range(0, rows.size, self.batchPixels):
+            if (event is not None) and event.is_set():
+                return None
+            r = rows[start:start + self.batchPixels]
+            c = columns[start:start + self.batchPixels]
+            if self._mcaIndex == 0:
+                result += self._data[:, r, c].sum(axis=1, dtype=numpy.float64)
+            elif self._mcaIndex == 1:
+                # advanced indices separated by a slice go first
+                result += self._data[r, :, c].sum(axis=0, dtype=numpy.float64)
+            else:
+                result += self._data[r, c, :].sum(axis=0, dtype=numpy.float64)
+        return result
+
+    def _calculate(self, mask, event=None):
+        """
+        Calculate the sum for the boolean mask from the stored state.
+        The result is stored unless the event gets set.
+        """
+        with self._lock:
+            oldMask = self._mask
+            oldSum = self._sum
+        if numpy.array_equal(oldMask, mask):
+            return True
+        added = mask & ~oldMask
+        removed = oldMask & ~mask
+        nChanged = int(added.sum()) + int(removed.sum())
+        nSelected = int(mask.sum())
+        nUnselected = mask.size - nSelected
+        if DEBUG:
+            t0 = time.time()
+        if nChanged <= min(nSelected, nUnselected):
+            if DEBUG:
+                print("Incremental update of %d pixels" % nChanged)
+            result = self._sumPixels(added, event)
+            if result is None:
+                return False
+            toRemove = self._sumPixels(removed, event)
+            if toRemove is None:
+                return False
+            result += oldSum
+            result -= toRemove
+        elif nSelected <= nUnselected:
+            if DEBUG:
+                print("Sum of %d selected pixels" % nSelected)
+            result = self._sumPixels(mask, event)
+        else:
+            if DEBUG:
+                print("Sum of %d non selected pixels" % nUnselected)
+            result = self._sumPixels(~mask, event)
+            if result is not None:
+                result = self.getTotal() - result
+        if result is None:
+            return False
+        if nSelected == 0:
+            # do not propagate rounding errors
+            result[:] = 0
+        with self._lock:
+            if (event is not None) and event.is_set():
+                return False
+            self._mask = mask
+            self._sum = result
+        if DEBUG:
+            print("Selection sum elapsed = %f" % (time.time() - t0))
+        return True
+
+    def update(self, mask):
+        """
+        Calculate in the calling thread the sum spectrum of the pixels
+        where mask is non zero cancelling any background calculation.
+        """
+        self.cancel()
+        self._calculate(self._getMask(mask))
+
+    def startUpdate(self, mask, callback=None):
+        """
+        Calculate in a background thread the sum spectrum of the pixels
+        where mask is non zero cancelling any previous background calculation.
+
+        :param callback: Function called from the background thread with
+                         the sum spectrum once the calculation is finished.
+        """
+        mask = self._getMask(mask)
+        self.cancel()
+        event = threading.Event()
+        def run():
+            if self._calculate(mask, event) and (callback is not None):
+                callback(self.getSum())
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        self._event = event
+        self._threadMask = mask
+        self._thread = thread
+        thread.start()
+        return thread
+
+    def cancel(self):
+        """
+        Cancel the background calculation if any. The stored state is
+        not modified.
+        """
+        if self._event is not None:
+            self._event.set()
+        self._event = None
+        self._thread = None
+        self._threadMask = None
+
+    def isRunning(self):
+        thread = self._thread
+        return (thread is not None) and thread.is_alive()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the background calculation to finish.
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return not self.isRunning()
+
+    def getMask(self):
+        """
+        Boolean mask corresponding to the stored sum
+        """
+        with self._lock:
+            return self._mask.copy()
+
+    def getSum(self, mask=None):
+        """
+        Return the sum spectrum of the pixels where mask is non zero.
+
+        A background calculation for the same mask is waited for. Otherwise
+        the sum is updated in the calling thread. If mask is None, the
+        stored sum is returned.
+        """
+        if mask is not None:
+            mask = self._getMask(mask)
+            threadMask = self._threadMask
+            if (threadMask is not None) and \
+               numpy.array_equal(threadMask, mask):
+                self.wait()
+            with self._lock:
+                current = numpy.array_equal(self._mask, mask)
+            if not current:
+                self.update(mask)
+        with self._lock:
+            return self._sum.copy()
+
+def benchmark(shape=(500, 500, 2048), brush=10, nStrokes=20):
+    """
+    Compare the time needed to update the selection sum after a brush
+    stroke of brush x brush pixels with the time needed to calculate it
+    from scratch.
+
+    :return: Tuple with the average times in seconds
+    """
+    data = numpy.random.poisson(5, shape).astype(numpy.float32)
+    mask = numpy.zeros(shape[:2], numpy.uint8)
+    mask[:shape[0] // 4, :shape[1] // 4] = 1
+    selectionSum = StackSelectionSum(data, mcaIndex=2)
+    selectionSum.update(mask)
+    incremental = 0.0
+    full = 0.0
+    for i in range(nStrokes):
+        r = numpy.random.randint(0, shape[0] - brush)
+        c = numpy.random.randint(0, shape[1] - brush)
+        mask[r:r + brush, c:c + brush] = 1
+        t0 = time.time()
+        selectionSum.update(mask)
+        incremental += time.time() - t0
+        t0 = time.time()
+        StackSelectionSum(data, mcaIndex=2).update(mask)
+        full += time.time() - t0
+    return incremental / nStrokes, full / nStrokes
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3:
+        shape = tuple([int(x) for x in sys.argv[1:4]])
+        incremental, full = benchmark(shape)
+    else:
+        incremental, full = benchmark()
+    print("Incremental update = %.4f s" % incremental)
+    print("Full calculation   = %.4f s" % full)
@@ -35,6 +35,8 @@
 
 # import ######################################################################
 
+import sys
+import time
 import numpy as np
 from . import ctools
 
@@ -90,10 +92,13 @@
 
 # colormap ####################################################################
 
-def applyColormap(data, colormap='gray', norm='linear', bounds=None):
+def applyColormap(data, colormap='gray', norm='linear', bounds=None,
+                  output=None):
     """Convert data to a RGBA pixmap using a colormap.
 
     The returned pixmap has the same shape as data plus one dimension of 4.
+    Large data are processed by several threads (see
+    ctools.COLORMAP_N_THREADS).
 
     :param numpy.ndarray data: The data to convert to a pixmap.
                                Any dimension is supported.
@@ -106,6 +111,11 @@ def applyColormap(data, colormap='gray', norm='linear', bounds=None):
                    or None (the default) to use auto-scale.
                    As is, start value must be <= end value.
     :type bounds: tuple of two floats (startValue, endValue) or None.
+    :param output: The uint8 C-contiguous array with the shape of data plus
+                   one dimension of 4 where to write the pixmap, in order to
+                   reuse the same buffer for each frame, or None (the
+                   default) to allocate a new one.
+    :type output: numpy.ndarray or None.
     :returns: The RGBA pixmap and the used start and end value.
     :rtype: (numpy.ndarray with dtype=numpy.uint8, (float, float))
     """
@@ -120,12 +130,61 @@ def applyColormap(data, colormap='gray', norm='linear', bounds=None):
         start, end = None, None
     else:
         start, end = bounds
-    return ctools.dataToRGBAColormap(data, colormap, start, end, isLog10, None)
+    return ctools.dataToRGBAColormap(data, colormap, start, end, isLog10, None,
+                                     output=output)
+
+
+# benchmark ###################################################################
+
+def benchmark(sizes=(4096, 8192, 16384), dtypes=(np.uint16, np.float32),
+              repeat=3):
+    """Measure the time needed to apply a colormap to square images.
+
+    :param sizes: The number of rows and columns of the images.
+    :param dtypes: The data types to test.
+    :param int repeat: The number of times each measure is done.
+    :returns: Dictionary (size, dtype name, norm, nThreads) -> best time (s)
+    """
+    colormap = COLORMAPS['temperature']
+    threads = sorted(set((1, ctools.COLORMAP_N_THREADS)))
+    result = {}
+    for size in sizes:
+        for dtype in dtypes:
+            data = np.random.random((size, size)) * 1000. + 1.
+            data = data.astype(dtype)
+            output = np.empty(data.shape + (4,), dtype=np.uint8)
+            for norm in ('linear', 'log'):
+                for nThreads in threads:
+                    times = []
+                    for i in range(repeat):
+                        t0 = time.time()
+                        ctools.dataToRGBAColormap(data, colormap,
+                                                  None, None,
+                                                  norm == 'log', None,
+                                                  output=output,
+                                                  nThreads=nThreads)
+                        times.append(time.time() - t0)
+                    key = (size, np.dtype(dtype).name, norm, nThreads)
+                    result[key] = min(times)
+            data = None
+            output = None
+    return result
 
 
 # demo ########################################################################
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        if len(sys.argv) > 2:
+            sizes = [int(size) for size in sys.argv[2:]]
+        else:
+            sizes = (4096, 8192, 16384)
+        result = benchmark(sizes)
+        for key in sorted(result.keys()):
+            print("%5d x %5d %8s %6s %d thread(s) = %.4f s" % \
+                  ((key[0],) + key + (result[key],)))
+        sys.exit(0)
+
     data = np.arange(1024 * 1024.)
     data.shape = 1024, -1
 
@@ -0,0 +1,246 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V.A. Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+__doc__ = """
+Level of detail (LOD) handling of curves with a large number of points.
+
+A min/max pyramid of the y values of a curve with sorted x values is built
+once. Level 0 contains the minimum and maximum of blocks of BLOCK_SIZE
+consecutive points and each following level merges pairs of blocks of the
+previous one.
+
+For a visible x range and a resolution (the number of pixel columns), the
+envelope sent to the plot backends contains two points per block (the
+minimum at the first x of the block and the maximum at its last x) of the
+level giving about one block per column. Outside the visible range a coarse
+envelope of the whole curve is used, so that the limits of the data seen by
+the backends are those of the full curve.
+"""
+import sys
+import time
+import numpy
+from .ctools import minMaxBlocks
+
+DEBUG = 0
+
+BLOCK_SIZE = 8
+
+# data types handled by the ctools minMax functions
+_SUPPORTED_TYPES = ['f2', 'f4', 'f8', 'i1', 'u1', 'i2', 'u2',
+                    'i4', 'u4', 'i8', 'u8']
+
+def isSorted(x):
+    """
+    Return True if the 1D array x is sorted in increasing order
+    (NaN values are not allowed).
+    """
+    x = numpy.asarray(x)
+    if x.ndim != 1:
+        return False
+    if x.size < 2:
+        return True
+    return bool(numpy.all(x[1:] >= x[:-1]))
+
+class CurveLOD(object):
+    def __init__(self, x, y, blockSize=None):
+        """
+        :param x: 1D array of x values sorted in increasing order
+        :param y: 1D array of y values with the same size as x
+        :param blockSize: Number of points per block of the first level.
+                          Default is BLOCK_SIZE.
+        """
+        if blockSize is None:
+            blockSize = BLOCK_SIZE
+        x = numpy.asarray(x)
+        y = numpy.asarray(y)
+        if (x.ndim != 1) or (x.shape != y.shape) or (not x.size):
+            raise ValueError("x and y must be non empty 1D arrays of the same size")
+        if (y.dtype.str[1:] not in _SUPPORTED_TYPES) or \
+           (not y.dtype.isnative):
+            y = y.astype(numpy.float64)
+        self._x = x
+        self._y = y
+        self._levels = []
+        size = int(blockSize)
+        minValues, maxValues = minMaxBlocks(y, size)
+        while True:
+            self._levels.append((size, minValues, maxValues))
+            if minValues.size < 2:
+                break
+            # merge pairs of blocks ignoring NaNs as the C function does
+            n = (minValues.size // 2) * 2
+            newMin = numpy.fmin(minValues[0:n:2], minValues[1:n:2])
+            newMax = numpy.fmax(maxValues[0:n:2], maxValues[1:n:2])
+            if n < minValues.size:
+                newMin = numpy.append(newMin, minValues[-1])
+                newMax = numpy.append(newMax, maxValues[-1])
+            minValues, maxValues = newMin, newMax
+            size *= 2
+
+    def getSize(self):
+        """
+        Number of points of the curve
+        """
+        return self._x.size
+
+    def _getLevel(self, npoints, resolution):
+        """
+        Index of the coarsest level giving at least resolution blocks for
+        npoints points or None if the points are to be used as they are.
+        """
+        if npoints <= 2 * resolution:
+            return None
+        level = None
+        for i in range(len(self._levels)):
+            if (npoints // self._levels[i][0]) >= resolution:
+                level = i
+            else:
+                break
+        return level
+
+    def getKey(self, xmin, xmax, resolution):
+        """
+        Return a tuple identifying the data returned by getData for the
+        given visible range and resolution.
+        """
+        resolution = max(int(resolution), 1)
+        n = self._x.size
+        if xmin > xmax:
+            xmin, xmax = xmax, xmin
+        # keep one point at each side of the visible range
+        start = max(int(numpy.searchsorted(self._x, xmin, side='left')) - 1, 0)
+        stop = min(int(numpy.searchsorted(self._x, xmax, side='right')) + 1, n)
+        if stop <= start:
+            start, stop = 0, 0
+        coarseLevel = self._getLevel(n, resolution)
+        if coarseLevel is None:
+            # the whole curve fits in the resolution
+            return (0, n, None, None)
+        fineLevel = self._getLevel(stop - start, resolution)
+        # align the visible part with the blocks of the coarse level
+        coarseSize = self._levels[coarseLevel][0]
+        start = (start // coarseSize) * coarseSize
+        stop = min(((stop + coarseSize - 1) // coarseSize) * coarseSize, n)
+        return (start, stop, fineLevel, coarseLevel)
+
+    def _getEnvelope(self, start, stop, level):
+        if stop <= start:
+            return numpy.zeros((0,), numpy.float64), \
+                   numpy.zeros((0,), numpy.float64)
+        if level is None:
+            return self._x[start:stop], self._y[start:stop]
+        size, minValues, maxValues = self._levels[level]
+        first = start // size
+        last = (stop + size - 1) // size
+        index = numpy.arange(first, last) * size
+        xEnvelope = numpy.empty((2 * index.size,), dtype=self._x.dtype)
+        yEnvelope = numpy.empty((2 * index.size,), dtype=numpy.float64)
+        xEnvelope[0::2] = self._x[index]
+        xEnvelope[1::2] = self._x[numpy.minimum(index + size, self._x.size) - 1]
+        yEnvelope[0::2] = minValues[first:last]
+        yEnvelope[1::2] = maxValues[first:last]
+        return xEnvelope, yEnvelope
+
+    def getData(self, xmin, xmax, resolution):
+        """
+        Return the x and y arrays to be plotted for the visible range
+        [xmin, xmax] and a resolution of the given number of columns.
+        """
+        start, stop, fineLevel, coarseLevel = self.getKey(xmin, xmax,
+                                                          resolution)
+        if coarseLevel is None:
+            return self._x, self._y
+        n = self._x.size
+        xList = []
+        yList = []
+        for (first, last, level) in [(0, start, coarseLevel),
+                                     (start, stop, fineLevel),
+                                     (stop, n, coarseLevel)]:
+            xEnvelope, yEnvelope = self._getEnvelope(first, last, level)
+            xList.append(xEnvelope)
+            yList.append(yEnvelope)
+        return numpy.concatenate(xList), \
+               numpy.concatenate(yList).astype(numpy.float64)
+
+def benchmark(npoints=10000000, resolution=1024, repeat=3):
+    """
+    Measure the time needed to render a curve of npoints points with the
+    matplotlib Agg backend with and without decimation.
+
+    :return: Dictionary with the best times in seconds to build the
+             pyramid ("pyramid"), to draw the full curve ("full") and to
+             get and draw the envelope ("lod") of the whole curve and of a
+             zoom on 1 % of it ("zoom").
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    x = numpy.arange(npoints, dtype=numpy.float64)
+    y = numpy.cumsum(numpy.random.random(npoints) - 0.5)
+
+    def draw(xplot, yplot, xlimits):
+        figure = Figure(figsize=(resolution / 100., 6), dpi=100)
+        canvas = FigureCanvasAgg(figure)
+        axes = figure.add_subplot(111)
+        axes.plot(xplot, yplot, "-")
+        axes.set_xlim(xlimits)
+        canvas.draw()
+
+    def best(function):
+        times = []
+        for i in range(repeat):
+            t0 = time.time()
+            function()
+            times.append(time.time() - t0)
+        return min(times)
+
+    result = {}
+    result["pyramid"] = best(lambda: CurveLOD(x, y))
+    lod = CurveLOD(x, y)
+    full = (x[0], x[-1])
+    zoom = (x[npoints // 2], x[npoints // 2 + npoints // 100])
+    result["full"] = best(lambda: draw(x, y, full))
+    result["lod"] = best(lambda: draw(*(lod.getData(full[0], full[1],
+                                                    resolution) + (full,))))
+    result["zoom"] = best(lambda: draw(*(lod.getData(zoom[0], zoom[1],
+                                                     resolution) + (zoom,))))
+    return result
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        result = benchmark(int(float(sys.argv[1])))
+    else:
+        result = benchmark()
+    print("Pyramid building        = %.4f s" % result["pyramid"])
+    print("Full curve drawing      = %.4f s" % result["full"])
+    print("Decimated curve drawing = %.4f s" % result["lod"])
+    print("Zoomed curve drawing    = %.4f s" % result["zoom"])
@@ -0,0 +1,365 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V.A. Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+__doc__ = """
+Multi-resolution tiled representation of large images.
+
+Level 0 of an ImagePyramid is the image itself and each following level
+is obtained averaging blocks of 2x2 pixels of the previous one until the
+image fits in a single tile. Levels are built on request or in a worker
+thread (see ImagePyramid.startBuilding) and the plot backends only have to
+take the part of the level matching the resolution of the visible area.
+
+The minimum, minimum positive and maximum values of each tile of the image
+are computed once with the ctools minMax function and kept, so that the
+autoscale of the colormaps does not need to go through the whole data.
+"""
+import math
+import threading
+import weakref
+import numpy
+from .ctools import minMax
+
+DEBUG = 0
+
+TILE_SIZE = 512
+
+def _pairSum(data):
+    """
+    Sum pairs of consecutive rows of data. The last row is duplicated when
+    the number of rows is odd.
+    """
+    if data.dtype == numpy.float64:
+        dtype = numpy.float64
+    else:
+        dtype = numpy.float32
+    result = numpy.array(data[0::2], dtype=dtype)
+    n = data.shape[0] // 2
+    result[:n] += data[1::2]
+    if n < result.shape[0]:
+        result[-1] += data[-1]
+    return result
+
+def downsample(data):
+    """
+    Return the image obtained averaging blocks of 2x2 pixels of data.
+
+    Scalar images are returned as float32 (float64 if data is float64) and
+    uint8 RGB(A) images keep their type.
+
+    :param data: 2D array or 3D array of RGB(A) pixels
+    :type data: numpy.ndarray
+    """
+    data = numpy.asarray(data)
+    result = _pairSum(data)
+    result = _pairSum(result.swapaxes(0, 1)).swapaxes(0, 1)
+    result *= 0.25
+    if data.dtype == numpy.uint8:
+        result = numpy.ascontiguousarray(numpy.round(result).astype(numpy.uint8))
+    else:
+        result = numpy.ascontiguousarray(result)
+    return result
+
+def _mergeStatistics(statisticsList):
+    """
+    Combine a list of (min, minPositive, max) tuples ignoring NaNs.
+    """
+    dataMin = numpy.nan
+    dataMax = numpy.nan
+    dataMinPos = None
+    for tileMin, tileMinPos, tileMax in statisticsList:
+        dataMin = numpy.fmin(dataMin, tileMin)
+        dataMax = numpy.fmax(dataMax, tileMax)
+        if tileMinPos is not None:
+            if dataMinPos is None:
+                dataMinPos = tileMinPos
+            else:
+                dataMinPos = min(dataMinPos, tileMinPos)
+    return float(dataMin), dataMinPos, float(dataMax)
+
+class ImagePyramid(object):
+    def __init__(self, data, tileSize=None):
+        """
+        :param data: 2D array or 3D array of RGB(A) pixels
+        :type data: numpy.ndarray
+        :param tileSize: Size in pixels of the square tiles. Default is
+                         TILE_SIZE.
+        """
+        data = numpy.asarray(data)
+        if (data.ndim not in [2, 3]) or (not data.size):
+            raise ValueError("Expected a non empty 2D or RGB(A) image")
+        if tileSize is None:
+            tileSize = TILE_SIZE
+        self.data = data
+        self._tileSize = int(tileSize)
+        self._levels = [data]
+        self._shapes = [data.shape[0:2]]
+        height, width = data.shape[0:2]
+        while max(height, width) > self._tileSize:
+            height = (height + 1) // 2
+            width = (width + 1) // 2
+            self._shapes.append((height, width))
+        self._statistics = {}
+        self._lock = threading.RLock()
+        self._thread = None
+        self._abort = False
+
+    def getTileSize(self):
+        return self._tileSize
+
+    def getNumberOfLevels(self):
+        return len(self._shapes)
+
+    def getLevelShape(self, level):
+        """
+        Shape (rows, columns) of the given level
+        """
+        return self._shapes[level]
+
+    def getLevel(self, level):
+        """
+        Return the image of the given level building it if needed.
+        """
+        level = min(max(int(level), 0), len(self._shapes) - 1)
+        if level < len(self._levels):
+            return self._levels[level]
+        with self._lock:
+            while len(self._levels) <= level:
+                self._levels.append(downsample(self._levels[-1]))
+        return self._levels[level]
+
+    def getAvailableLevel(self, level):
+        """
+        Return the index of the coarsest level already built not coarser
+        than level. It does not wait for levels being built.
+        """
+        return min(max(int(level), 0), len(self._levels) - 1)
+
+    def getLevelForFactor(self, factor):
+        """
+        Index of the coarsest level whose pixels are not bigger than factor
+        pixels of the original image.
+        """
+        if factor < 2:
+            return 0
+        level = int(math.floor(math.log(factor, 2) + 1.0e-9))
+        return min(level, len(self._shapes) - 1)
+
+    def getLevelForViewport(self, x0, x1, y0, y1, width, height):
+        """
+        Level to be used to display the columns [x0, x1) and the rows
+        [y0, y1) of the image in an area of width x height pixels.
+        """
+        factor = min((x1 - x0) / float(max(width, 1)),
+                     (y1 - y0) / float(max(height, 1)))
+        return self.getLevelForFactor(factor)
+
+    def getViewport(self, x0, x1, y0, y1, level=None, width=None, height=None):
+        """
+        Return the part of a level covering the columns [x0, x1) and the
+        rows [y0, y1) of the original image.
+
+        :param level: Level to use. If None, it is obtained from the size
+                      width x height in pixels of the display area.
+        :return: (image, (xmin, xmax, ymin, ymax), level) where the second
+                 element is the area covered by the returned image in pixels
+                 of the original image.
+        """
+        if level is None:
+            level = self.getLevelForViewport(x0, x1, y0, y1, width, height)
+        image = self.getLevel(level)
+        factor = 2 ** level
+        nRows, nColumns = self.data.shape[0:2]
+        x0 = min(max(int(x0), 0), nColumns)
+        x1 = min(max(int(math.ceil(x1)), x0), nColumns)
+        y0 = min(max(int(y0), 0), nRows)
+        y1 = min(max(int(math.ceil(y1)), y0), nRows)
+        i0, i1 = y0 // factor, (y1 + factor - 1) // factor
+        j0, j1 = x0 // factor, (x1 + factor - 1) // factor
+        extent = (j0 * factor, min(j1 * factor, nColumns),
+                  i0 * factor, min(i1 * factor, nRows))
+        return image[i0:i1, j0:j1], extent, level
+
+    def getTiles(self, level, x0=None, x1=None, y0=None, y1=None):
+        """
+        Return the tiles of a level covering the columns [x0, x1) and the
+        rows [y0, y1) of the original image (the whole image by default).
+
+        :return: List of (tile, (row, column)) where (row, column) is the
+                 position of the first pixel of the tile in the level.
+        """
+        factor = 2 ** level
+        image = self.getLevel(level)
+        tileSize = self._tileSize
+        rows, columns = self._getTileRange(image.shape[0:2],
+                            None if y0 is None else y0 / factor,
+                            None if y1 is None else y1 / factor,
+                            None if x0 is None else x0 / factor,
+                            None if x1 is None else x1 / factor)
+        tiles = []
+        for row in rows:
+            for column in columns:
+                tiles.append((image[row * tileSize:(row + 1) * tileSize,
+                                    column * tileSize:(column + 1) * tileSize],
+                              (row * tileSize, column * tileSize)))
+        return tiles
+
+    def _getTileRange(self, shape, y0, y1, x0, x1):
+        tileSize = self._tileSize
+        nRows = (shape[0] + tileSize - 1) // tileSize
+        nColumns = (shape[1] + tileSize - 1) // tileSize
+        def clip(value, default, n):
+            if value is None:
+                return default
+            return min(max(int(value), 0), n)
+        first = clip(None if y0 is None else y0 // tileSize, 0, nRows)
+        last = clip(None if y1 is None else \
+                    math.ceil(y1 / float(tileSize)), nRows, nRows)
+        rows = range(first, last)
+        first = clip(None if x0 is None else x0 // tileSize, 0, nColumns)
+        last = clip(None if x1 is None else \
+                    math.ceil(x1 / float(tileSize)), nColumns, nColumns)
+        columns = range(first, last)
+        return rows, columns
+
+    def getTileStatistics(self, row, column):
+        """
+        Return the (min, minPositive, max) values of a tile of the original
+        image. minPositive is None if there are no positive values.
+        """
+        key = (row, column)
+        if key not in self._statistics:
+            tileSize = self._tileSize
+            tile = self.data[row * tileSize:(row + 1) * tileSize,
+                             column * tileSize:(column + 1) * tileSize]
+            self._statistics[key] = minMax(tile, minPositive=True)
+        return self._statistics[key]
+
+    def getStatistics(self, x0=None, x1=None, y0=None, y1=None):
+        """
+        Return the (min, minPositive, max) values of the original image
+        (NaNs are ignored). If a range of columns [x0, x1) or rows [y0, y1)
+        is given, the values correspond to the tiles covering it.
+        """
+        rows, columns = self._getTileRange(self.data.shape[0:2],
+                                           y0, y1, x0, x1)
+        statistics = []
+        for row in rows:
+            for column in columns:
+                statistics.append(self.getTileStatistics(row, column))
+        return _mergeStatistics(statistics)
+
+    def startBuilding(self):
+        """
+        Compute the tile statistics and the levels in a worker thread.
+        """
+        if self._thread is not None:
+            return
+        self._abort = False
+        self._thread = threading.Thread(target=self._build)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stopBuilding(self):
+        """
+        Ask the worker thread to stop and wait for it.
+        """
+        if self._thread is None:
+            return
+        self._abort = True
+        self._thread.join()
+        self._thread = None
+
+    def isBuilt(self):
+        return (len(self._levels) == len(self._shapes)) and \
+               (self._thread is None or not self._thread.is_alive())
+
+    def wait(self, timeout=None):
+        """
+        Wait for the worker thread to finish.
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _build(self):
+        rows, columns = self._getTileRange(self.data.shape[0:2],
+                                           None, None, None, None)
+        for row in rows:
+            for column in columns:
+                if self._abort:
+                    return
+                self.getTileStatistics(row, column)
+        for level in range(1, len(self._shapes)):
+            if self._abort:
+                return
+            self.getLevel(level)
+        if DEBUG:
+            print("ImagePyramid built with %d levels" % len(self._levels))
+
+_PYRAMIDS = weakref.WeakValueDictionary()
+_PYRAMIDS_LOCK = threading.Lock()
+
+def getPyramid(data, build=False):
+    """
+    Return the ImagePyramid associated to the data array creating it if
+    needed. Pyramids are shared as long as somebody keeps a reference to
+    them, so data are not expected to be modified in place meanwhile
+    unless invalidate is called.
+
+    :param data: 2D array or 3D array of RGB(A) pixels
+    :type data: numpy.ndarray
+    :param build: If True, start building the levels in a worker thread.
+    """
+    with _PYRAMIDS_LOCK:
+        pyramid = _PYRAMIDS.get(id(data), None)
+        if (pyramid is None) or (pyramid.data is not data):
+            pyramid = ImagePyramid(data)
+            _PYRAMIDS[id(data)] = pyramid
+    if build:
+        pyramid.startBuilding()
+    return pyramid
+
+def invalidate(data):
+    """
+    Forget the ImagePyramid associated to the data array, if any. To be
+    called when the data array may have been modified in place, so the next
+    call to getPyramid does not return outdated levels and statistics.
+
+    :param data: 2D array or 3D array of RGB(A) pixels
+    :type data: numpy.ndarray
+    """
+    with _PYRAMIDS_LOCK:
+        pyramid = _PYRAMIDS.get(id(data), None)
+        if pyramid is not None:
+            del _PYRAMIDS[id(data)]
+    if pyramid is not None:
+        pyramid.stopBuilding()
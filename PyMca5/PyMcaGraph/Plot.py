@@ -44,6 +44,7 @@
 from . import PlotBase
 from . import PlotBackend
 from . import Colors
+from . import CurveLOD
 
 DEBUG = 0
 if DEBUG:
@@ -118,8 +119,22 @@ class Plot(PlotBase.PlotBase):
     colorList = _COLORLIST
     colorDict = _COLORDICT
 
+    # curves with at least this number of points are sent to the backends
+    # as a min/max envelope of the visible range (level of detail)
+    curveLODThreshold = 100000
+    # default number of columns of the envelope
+    curveLODResolution = 2048
+
     def __init__(self, parent=None, backend=None, callback=None):
         self._parent = parent
+        # level of detail handling of huge curves
+        self._curveLOD = {}
+        self._curveLODEnabled = True
+        self._curveLODUpdating = False
+        # data limits of the curves and extra backend keywords
+        self._curveLimits = {}
+        self._curveKw = {}
+        self._curveDataReplotRequested = False
         if backend is None:
             backend = self.defaultBackend
             self._default = True
@@ -224,9 +239,31 @@ def getWidgetHandle(self):
 
     def setCallback(self, callbackFunction):
         if callbackFunction is None:
-            self._plot.setCallback(self.graphCallback)
+            self._callbackFunction = self.graphCallback
         else:
-            self._plot.setCallback(callbackFunction)
+            self._callbackFunction = callbackFunction
+        self._plot.setCallback(self._backendCallback)
+
+    def _backendCallback(self, ddict):
+        if ddict.get('event', None) == "limitsChanged":
+            self._updateCurveLOD(ddict['xdata'])
+        return self._callbackFunction(ddict)
+
+    def setCurveLODEnabled(self, flag=True):
+        """
+        Enable or disable the level of detail handling of the curves with
+        at least curveLODThreshold points. When enabled, only the min/max
+        envelope of those curves at screen resolution is sent to the backend.
+        """
+        flag = bool(flag)
+        if flag == self._curveLODEnabled:
+            return
+        self._curveLODEnabled = flag
+        self._curveLOD = {}
+        self._update()
+
+    def isCurveLODEnabled(self):
+        return self._curveLODEnabled
 
     def graphCallback(self, ddict=None):
         """
@@ -415,6 +452,9 @@ def addCurve(self, x, y, legend=None, info=None, replace=False, replot=True,
         if replace:
             self._curveList = []
             self._curveDict = {}
+            self._curveLOD = {}
+            self._curveLimits = {}
+            self._curveKw = {}
             self._colorIndex = 0
             self._styleIndex = 0
             self._plot.clearCurves()
@@ -485,7 +525,27 @@ def addCurve(self, x, y, legend=None, info=None, replace=False, replot=True,
 
         info["plot_color"] = color
         info["plot_linestyle"] = linestyle
-        if self.isXAxisLogarithmic() or self.isYAxisLogarithmic():
+        lod = None
+        if self._curveLODEnabled and \
+           (x.size >= self.curveLODThreshold) and \
+           (x.ndim == 1) and (x.shape == y.shape) and \
+           (info["plot_symbol"] in [None, "", " ", "None"]) and \
+           (xerror is None) and (yerror is None) and \
+           (not hasattr(color, "size")):
+            lod = self._getCurveLOD(key, x, y)
+        else:
+            self._curveLOD.pop(key, None)
+        if lod is not None:
+            if replot:
+                # the zoom is going to be reset
+                xmin, xmax = x[0], x[-1]
+            else:
+                xmin, xmax = self._getCurveLODLimits(x[0], x[-1])
+            resolution = self._getCurveLODResolution()
+            lodKey = lod.getKey(xmin, xmax, resolution)
+            xplot, yplot = lod.getData(xmin, xmax, resolution)
+            colorplot = color
+        elif self.isXAxisLogarithmic() or self.isYAxisLogarithmic():
             if hasattr(color, "size"):
                 xplot, yplot, colorplot = self.logFilterData(x, y, color=color)
             else:
@@ -520,7 +580,21 @@ def addCurve(self, x, y, legend=None, info=None, replace=False, replot=True,
             info['plot_handle'] = curveHandle
         else:
             info['plot_handle'] = key
+        if lod is not None:
+            # keep what is needed to send a new envelope to the backend
+            self._curveLOD[key]["key"] = lodKey
+            self._curveLOD[key]["kw"] = dict(kw,
+                                             color=colorplot,
+                                             symbol=info["plot_symbol"],
+                                             linestyle=info["plot_linestyle"],
+                                             xlabel=info["xlabel"],
+                                             ylabel=info["ylabel"],
+                                             yaxis=yaxis,
+                                             z=info["plot_z"],
+                                             selectable=info["plot_selectable"])
         self._curveDict[key] = [x, y, key, info]
+        self._curveLimits.pop(key, None)
+        self._curveKw[key] = kw
 
         if len(self._curveList) == 1:
             if self.isActiveCurveHandlingEnabled():
@@ -538,6 +612,187 @@ def addCurve(self, x, y, legend=None, info=None, replace=False, replot=True,
             #self.replot()
         return key
 
+    def updateCurveData(self, legend, x, y, info=None, replot=True):
+        """
+        Replace the data of an existing curve keeping its attributes.
+
+        Only the data of the curve are sent to the backend. If the
+        backend cannot update the data of a plotted curve, the curve is
+        replaced in the backend without going through addCurve. A curve not
+        present yet or requiring a treatment of its data (level of detail,
+        logarithmic axes, error bars, fill, color array) is set via addCurve.
+
+        Several calls with replot set to True made before the plot gets
+        updated (for instance while waiting for the Qt event loop) give a
+        single zoom reset and redraw.
+
+        :param legend: The legend associated to the curve
+        :type legend: string
+        :param x: The new x values
+        :param y: The new y values
+        :param info: Dictionary replacing the one of the curve (or None).
+                     Its plot attributes are taken from the current one.
+        :type info: dict or None
+        :param replot: Flag to indicate plot is to be updated
+        :type replot: boolean default True
+        :returns: The legend of the curve
+        """
+        x = numpy.asarray(x)
+        y = numpy.asarray(y)
+        return self._setCurveData(str(legend), x, y, None, info, replot)
+
+    def appendCurveData(self, legend, x, y, info=None, replot=True):
+        """
+        Append points to an existing curve keeping its attributes.
+
+        The data limits of the curve are updated from the limits of the
+        new points only. See updateCurveData for the other parameters.
+        """
+        key = str(legend)
+        x = numpy.asarray(x)
+        y = numpy.asarray(y)
+        if key not in self._curveDict:
+            return self._setCurveData(key, x, y, None, info, replot)
+        oldX, oldY = self._curveDict[key][0:2]
+        limits = self._curveLimits.get(key, None)
+        if (limits is not None) and x.size and (x.shape == y.shape):
+            limits = (min(limits[0], x.min()), min(limits[1], y.min()),
+                      max(limits[2], x.max()), max(limits[3], y.max()))
+        elif x.size:
+            limits = None
+        x = numpy.concatenate((numpy.ravel(oldX), numpy.ravel(x)))
+        y = numpy.concatenate((numpy.ravel(oldY), numpy.ravel(y)))
+        return self._setCurveData(key, x, y, limits, info, replot)
+
+    def _canUpdateCurveData(self, key, x, y):
+        """
+        Return True if the data of the curve can be sent to the backend
+        as they are.
+        """
+        if (key not in self._curveDict) or self.isCurveHidden(key):
+            return False
+        if (x.ndim != 1) or (x.shape != y.shape) or (not x.size):
+            return False
+        if self.isXAxisLogarithmic() or self.isYAxisLogarithmic():
+            return False
+        if (key in self._curveLOD) or \
+           (self._curveLODEnabled and (x.size >= self.curveLODThreshold)):
+            return False
+        info = self._curveDict[key][3]
+        if (info.get('sigmax', None) is not None) or \
+           (info.get('sigmay', None) is not None) or \
+           info.get('plot_fill', False) or \
+           hasattr(info.get('plot_color', None), "size"):
+            return False
+        return info.get('plot_handle', None) is not None
+
+    def _isCurveDataUpdate(self, legend, x, y, info=None, replace=False,
+                           color=None, symbol=None, linestyle=None,
+                           xlabel=None, ylabel=None, yaxis=None,
+                           xerror=None, yerror=None, **kw):
+        """
+        Return True if a call to addCurve with the given arguments would
+        only change the data of the curve. In that case updateCurveData
+        can be used instead.
+        """
+        key = str(legend)
+        x = numpy.asarray(x)
+        y = numpy.asarray(y)
+        if replace or kw or (xerror is not None) or (yerror is not None):
+            return False
+        if not self._canUpdateCurveData(key, x, y):
+            return False
+        oldInfo = self._curveDict[key][3]
+        if info is None:
+            # addCurve keeps the attributes of the curve
+            info = oldInfo
+        if (info.get("sigmax", None) is not None) or \
+           (info.get("sigmay", None) is not None):
+            return False
+        if xlabel is None:
+            xlabel = info.get("xlabel", "X")
+        if ylabel is None:
+            ylabel = info.get("ylabel", "Y")
+        if color is None:
+            color = info.get("plot_color", None)
+        if symbol is None:
+            symbol = info.get("plot_symbol", None)
+            if self._plotPoints and (symbol in [None, "", " "]):
+                symbol = 'o'
+        receivedLinestyle = linestyle
+        if linestyle is None:
+            linestyle = info.get("plot_linestyle", None)
+        if self._plotLines and (receivedLinestyle is None):
+            if linestyle in [None, " ", ""]:
+                linestyle = '-'
+        elif receivedLinestyle is None:
+            linestyle = ' '
+        if yaxis is None:
+            yaxis = info.get("plot_yaxis", "left")
+        if (color is None) or hasattr(color, "size"):
+            return False
+        return (str(xlabel) == oldInfo["xlabel"]) and \
+               (str(ylabel) == oldInfo["ylabel"]) and \
+               (color == oldInfo["plot_color"]) and \
+               (symbol == oldInfo["plot_symbol"]) and \
+               (linestyle == oldInfo["plot_linestyle"]) and \
+               (yaxis == oldInfo["plot_yaxis"]) and \
+               (info.get("plot_fill", False) == oldInfo["plot_fill"]) and \
+               (info.get("plot_z", 1) == oldInfo["plot_z"]) and \
+               (info.get("plot_selectable", True) == \
+                                        oldInfo["plot_selectable"])
+
+    def _setCurveData(self, key, x, y, limits=None, info=None, replot=True):
+        if key in self._curveDict:
+            oldInfo = self._curveDict[key][3]
+            if info is None:
+                info = oldInfo
+            elif info is not oldInfo:
+                # keep the attributes of the curve
+                for infoKey in oldInfo:
+                    if infoKey.startswith("plot_") or \
+                       infoKey in ["xlabel", "ylabel", "sigmax", "sigmay"]:
+                        info[infoKey] = oldInfo[infoKey]
+        if not self._canUpdateCurveData(key, x, y):
+            # not the addCurve method of derived classes that may call
+            # this method
+            return Plot.addCurve(self, x, y, legend=key, info=info,
+                                 replot=replot)
+        handle = info['plot_handle']
+        if not self._plot.updateCurveData(handle, x, y, replot=False):
+            self._plot.removeCurve(handle, replot=False)
+            info['plot_handle'] = self._plot.addCurve(x, y, key, info,
+                                        replot=False, replace=False,
+                                        color=info["plot_color"],
+                                        symbol=info["plot_symbol"],
+                                        linestyle=info["plot_linestyle"],
+                                        xlabel=info["xlabel"],
+                                        ylabel=info["ylabel"],
+                                        yaxis=info["plot_yaxis"],
+                                        z=info["plot_z"],
+                                        selectable=info["plot_selectable"],
+                                        **self._curveKw.get(key, {}))
+        self._curveDict[key] = [x, y, key, info]
+        if limits is None:
+            self._curveLimits.pop(key, None)
+        else:
+            self._curveLimits[key] = limits
+        if replot:
+            self._requestCurveDataReplot()
+        return key
+
+    def _requestCurveDataReplot(self):
+        if self._curveDataReplotRequested:
+            return
+        self._curveDataReplotRequested = True
+        self._plot.requestReplot(self._curveDataReplot)
+
+    def _curveDataReplot(self):
+        if not self._curveDataReplotRequested:
+            return
+        self._curveDataReplotRequested = False
+        self.resetZoom()
+
     def addImage(self, data, legend=None, info=None,
                  replace=True, replot=True,
                  xScale=None, yScale=None, z=None,
@@ -645,6 +900,9 @@ def removeCurve(self, legend, replot=True):
         if legend in self._curveDict:
             handle = self._curveDict[legend][3].get('plot_handle', None)
             del self._curveDict[legend]
+            self._curveLOD.pop(legend, None)
+            self._curveLimits.pop(legend, None)
+            self._curveKw.pop(legend, None)
             if handle is not None:
                 self._plot.removeCurve(handle, replot=replot)
         if not len(self._curveList):
@@ -816,24 +1074,19 @@ def _getAllLimits(self):
         xmax = None
         ymax = None
         for key in keys:
-            x = self._curveDict[key][0]
-            y = self._curveDict[key][1]
+            limits = self._curveLimits.get(key, None)
+            if limits is None:
+                x = self._curveDict[key][0]
+                y = self._curveDict[key][1]
+                limits = (x.min(), y.min(), x.max(), y.max())
+                self._curveLimits[key] = limits
             if xmin is None:
-                xmin = x.min()
-            else:
-                xmin = min(xmin, x.min())
-            if xmax is None:
-                xmax = x.max()
+                xmin, ymin, xmax, ymax = limits
             else:
-                xmax = max(xmax, x.max())
-            if ymin is None:
-                ymin = y.min()
-            else:
-                ymin = min(ymin, y.min())
-            if ymax is None:
-                ymax = y.max()
-            else:
-                ymax = max(ymax, y.max())
+                xmin = min(xmin, limits[0])
+                ymin = min(ymin, limits[1])
+                xmax = max(xmax, limits[2])
+                ymax = max(ymax, limits[3])
         return xmin, ymin, xmax, ymax
 
     def saveGraph(self, filename, fileFormat='svg', dpi=None, **kw):
@@ -1008,6 +1261,85 @@ def logFilterData(self, x, y, xLog=None, yLog=None, color=None):
             colors = color
         return x, y, colors
 
+    def _getCurveLOD(self, key, x, y):
+        """
+        Return the CurveLOD instance associated to the curve or None if the
+        curve cannot be decimated. The min/max pyramid is only rebuilt when
+        the data or the logarithmic filtering change.
+        """
+        logX = self.isXAxisLogarithmic()
+        logY = self.isYAxisLogarithmic()
+        ddict = self._curveLOD.get(key, None)
+        if (ddict is None) or (ddict["x"] is not x) or (ddict["y"] is not y):
+            ddict = {"x": x, "y": y, "lod": {}}
+        cacheKey = (logX, logY)
+        if cacheKey not in ddict["lod"]:
+            if logX or logY:
+                xplot, yplot, dummy = self.logFilterData(x, y)
+            else:
+                xplot, yplot = x, y
+            if xplot.size and CurveLOD.isSorted(xplot):
+                ddict["lod"][cacheKey] = CurveLOD.CurveLOD(xplot, yplot)
+            else:
+                ddict["lod"][cacheKey] = None
+        self._curveLOD[key] = ddict
+        return ddict["lod"][cacheKey]
+
+    def _getCurveLODLimits(self, xmin, xmax):
+        try:
+            xmin, xmax = self._plot.getGraphXLimits()
+        except:
+            if DEBUG:
+                print("Cannot get graph X limits, using data limits")
+        return xmin, xmax
+
+    def _getCurveLODResolution(self):
+        widget = self.getWidgetHandle()
+        if hasattr(widget, "width"):
+            try:
+                return max(int(widget.width()), 512)
+            except:
+                pass
+        return self.curveLODResolution
+
+    def _updateCurveLOD(self, xRange):
+        """
+        Send to the backend the envelope of the decimated curves matching
+        the visible x range.
+        """
+        if self._curveLODUpdating or (not len(self._curveLOD)):
+            return
+        xmin, xmax = xRange
+        resolution = self._getCurveLODResolution()
+        logX = self.isXAxisLogarithmic()
+        logY = self.isYAxisLogarithmic()
+        modified = False
+        self._curveLODUpdating = True
+        try:
+            for key in list(self._curveLOD.keys()):
+                ddict = self._curveLOD[key]
+                lod = ddict["lod"].get((logX, logY), None)
+                if (lod is None) or ("kw" not in ddict) or \
+                   (key not in self._curveDict) or self.isCurveHidden(key):
+                    continue
+                lodKey = lod.getKey(xmin, xmax, resolution)
+                if lodKey == ddict["key"]:
+                    continue
+                xplot, yplot = lod.getData(xmin, xmax, resolution)
+                info = self._curveDict[key][3]
+                self._plot.removeCurve(info.get('plot_handle', key),
+                                       replot=False)
+                info['plot_handle'] = self._plot.addCurve(xplot, yplot, key,
+                                                          info, replot=False,
+                                                          replace=False,
+                                                          **ddict["kw"])
+                ddict["key"] = lodKey
+                modified = True
+            if modified:
+                self.replot()
+        finally:
+            self._curveLODUpdating = False
+
     def _update(self):
         if DEBUG:
             print("_update called")
@@ -1038,6 +1370,9 @@ def replot(self):
     def clear(self):
         self._curveList = []
         self._curveDict = {}
+        self._curveLOD = {}
+        self._curveLimits = {}
+        self._curveKw = {}
         self._colorIndex = 0
         self._styleIndex = 0
         self._markerDict = {}
@@ -1050,6 +1385,9 @@ def clear(self):
     def clearCurves(self):
         self._curveList = []
         self._curveDict = {}
+        self._curveLOD = {}
+        self._curveLimits = {}
+        self._curveKw = {}
         self._colorIndex = 0
         self._styleIndex = 0
         self._plot.clearCurves()
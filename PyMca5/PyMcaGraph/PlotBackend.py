@@ -660,6 +660,22 @@ def removeCurve(self, legend, replot=True):
         print("PlotBackend removeCurve not implemented")
         return
 
+    def updateCurveData(self, legend, x, y, replot=True):
+        """
+        Replace the data of an already plotted curve keeping all its
+        attributes.
+
+        :param legend: The legend/handle associated to the curve
+        :type legend: string or handle
+        :param x: The new x values
+        :param y: The new y values
+        :param replot: Flag to indicate plot is to be immediately updated
+        :type replot: boolean default True
+        :returns: False if the backend cannot update the data in place and
+                  the curve has to be added again, True otherwise.
+        """
+        return False
+
     def removeImage(self, legend, replot=True):
         """
         Remove the image associated to the supplied legend from the graph.
@@ -689,6 +705,20 @@ def removeMarker(self, label, replot=True):
         """
         print("PlotBackend removeMarker not implemented")
 
+    def requestReplot(self, callback):
+        """
+        Request an update of the plot performed by calling callback.
+
+        Backends able to delay the update (for instance until control
+        returns to the event loop) can do it, so that the data changes
+        made in the meantime give a single redraw. The callback is in
+        charge of the redraw and it is not called twice for the same
+        request. This default implementation calls it immediately.
+
+        :param callback: Function without arguments updating the plot
+        """
+        callback()
+
     def resetZoom(self, dataMargins=None):
         """
         Autoscale any axis that is in autoscale mode.
@@ -45,9 +45,9 @@
 from .GLTexture import Image
 
 try:
-    from ....ctools import minMax
+    from ... import ImagePyramid
 except ImportError:
-    from PyMca5.PyMcaGraph.ctools import minMax
+    from PyMca5.PyMcaGraph import ImagePyramid
 
 
 # colormap ####################################################################
@@ -308,6 +308,8 @@ def __init__(self, data, origin, scale,
         super(GLPlotColormap, self).__init__(data, origin, scale)
         self.colormap = colormap
         self.cmapIsLog = cmapIsLog
+        ImagePyramid.invalidate(data)
+        self._dataStatistics = None  # Data (min, minPos, max)
         self._cmapRange = None  # User-provided range info
         self._cmapRangeCache = None  # Store extra data for range
         self.cmapRange = cmapRange  # Update _cmapRange
@@ -323,12 +325,19 @@ def discard(self):
             del self._texture
         self._textureIsDirty = False
 
+    def _getDataStatistics(self):
+        # Kept until the data changes, not on colormap changes
+        if self._dataStatistics is None:
+            pyramid = ImagePyramid.getPyramid(self.data)
+            self._dataStatistics = pyramid.getStatistics()
+        return self._dataStatistics
+
     @property
     def cmapRange(self):
         if self._cmapRange is None:  # Auto-scale mode
             if self._cmapRangeCache is None:
                 # Build data , positive ranges
-                min_, minPos, max_ = minMax(self.data, minPositive=True)
+                min_, minPos, max_ = self._getDataStatistics()
                 maxPos = max_ if max_ > 0. else 1.
                 if minPos is None:
                     minPos = maxPos
@@ -347,8 +356,7 @@ def cmapRange(self):
                     if min_ > 0. and max_ > 0.:
                         minPos, maxPos = min_, max_
                     else:
-                        dataMin, minPos, dataMax = minMax(self.data,
-                                                          minPositive=True)
+                        dataMin, minPos, dataMax = self._getDataStatistics()
                         if max_ > 0.:
                             maxPos = max_
                         elif dataMax > 0.:
@@ -375,6 +383,9 @@ def updateData(self, data):
         oldData = self.data
         self.data = data
 
+        # the same array may have been modified in place
+        ImagePyramid.invalidate(data)
+        self._dataStatistics = None
         self._cmapRangeCache = None
 
         if hasattr(self, '_texture'):
@@ -71,6 +71,7 @@ def nanmin(x):
     print("matplotlib.widgets Cursor not available")
 # This should be independent of Qt
 TK = False
+QT = False
 if ("tk" in sys.argv) or ("Tkinter" in sys.modules) or ("tkinter" in sys.modules):
     TK = True
 if TK and ("PyQt4" not in sys.modules) and ("PyQt5" not in sys.modules) and\
@@ -129,6 +130,10 @@ def nanmin(x):
     from . import _utils
 except ImportError:
     from PyMca5.PyMcaGraph.backends import _utils
+try:
+    from .. import ImagePyramid
+except ImportError:
+    from PyMca5.PyMcaGraph import ImagePyramid
 
 DEBUG = 0
 
@@ -155,6 +160,8 @@ class ModestImage(AxesImage):
 """
     def __init__(self, *args, **kwargs):
         self._full_res = None
+        self._pyramid = None
+        self._level = None
         self._sx, self._sy = None, None
         self._bounds = (None, None, None, None)
         self._origExtent = None
@@ -203,7 +210,10 @@ def set_data(self, A):
         self._rgbacache = None
         self._oldxslice = None
         self._oldyslice = None
+        self._level = None
         self._sx, self._sy = None, None
+        # downsampled levels are built in a worker thread
+        self._pyramid = ImagePyramid.getPyramid(A, build=True)
 
     def get_array(self):
         """Override to return the full-resolution array"""
@@ -254,15 +264,30 @@ def _scale_to_res(self):
         sy = int(max(1, min((y1 - y0) / 5., numpy.ceil(dy / ext[1]))))
         sx = int(max(1, min((x1 - x0) / 5., numpy.ceil(dx / ext[0]))))
 
+        # use the pyramid level matching the resolution if already built
+        level = self._pyramid.getLevelForFactor(min(sx, sy))
+        level = self._pyramid.getAvailableLevel(level)
+
         # have we already calculated what we need?
         if (self._sx is not None) and (self._sy is not None):
             if sx >= self._sx and sy >= self._sy and \
+                level == self._level and \
                 x0 >= self._bounds[0] and x1 <= self._bounds[1] and \
                 y0 >= self._bounds[2] and y1 <= self._bounds[3]:
                 return
 
-        self._A = self._full_res[y0:y1:sy, x0:x1:sx]
+        factor = 2 ** level
+        data = self._pyramid.getLevel(level)
+        sy = max(1, sy // factor)
+        sx = max(1, sx // factor)
+        y0, x0 = y0 // factor, x0 // factor
+        y1, x1 = -(-y1 // factor), -(-x1 // factor)
+        self._A = data[y0:y1:sy, x0:x1:sx]
         self._A = cbook.safe_masked_invalid(self._A)
+        x0 *= factor
+        y0 *= factor
+        sx *= factor
+        sy *= factor
         x1 = x0 + self._A.shape[1] * sx
         y1 = y0 + self._A.shape[0] * sy
 
@@ -272,6 +297,7 @@ def _scale_to_res(self):
             self.set_extent([x0, x1, y0, y1])
         self._sx = sx
         self._sy = sy
+        self._level = level
         self._bounds = (x0, x1, y0, y1)
         self.changed()
 
@@ -2234,6 +2260,49 @@ def removeCurve(self, handle, replot=True):
         if replot:
             self.replot()
 
+    def updateCurveData(self, handle, x, y, replot=True):
+        line = None
+        if isinstance(handle, Line2D):
+            line = handle
+        else:
+            # we have received a legend!
+            for axes in [self.ax, self.ax2]:
+                for line2d in axes.lines:
+                    if line2d.get_label() == handle:
+                        line = line2d
+                        break
+                if line is not None:
+                    break
+            for axes in [self.ax, self.ax2]:
+                for item in axes.collections:
+                    if item.get_label() == handle:
+                        # scatter plot or fill
+                        return False
+        if (line is None) or (not hasattr(line, "_plot_info")):
+            return False
+        if line._plot_info.get('fill', False):
+            return False
+        line.set_data(x, y)
+        if hasattr(x, "min") and hasattr(y, "min"):
+            line._plot_info['xmin'] = nanmin(x)
+            line._plot_info['xmax'] = nanmax(x)
+            line._plot_info['ymin'] = nanmin(y)
+            line._plot_info['ymax'] = nanmax(y)
+        else:
+            for key in ['xmin', 'xmax', 'ymin', 'ymax']:
+                line._plot_info.pop(key, None)
+        if replot:
+            self.replot()
+        return True
+
+    def requestReplot(self, callback):
+        if QT:
+            # give a single redraw for the requests made before returning
+            # to the event loop
+            QtCore.QTimer.singleShot(0, callback)
+        else:
+            callback()
+
     def removeImage(self, handle, replot=True):
         if hasattr(handle, "remove"):
             if (handle in self.ax.images) or (handle in self.ax.artists):
@@ -2560,6 +2629,8 @@ def addImage(self, data, legend=None, info=None,
         else:
             picker = None
         shape = data.shape
+        # the same array may have been modified in place
+        ImagePyramid.invalidate(data)
         if 0:
             # this supports non regularly spaced coordenates!!!!
             x = xmin + numpy.arange(w) * xScale[1]
@@ -2615,6 +2686,8 @@ def addImage(self, data, legend=None, info=None,
                 if colormap is None:
                     colormap = self.getDefaultColormap()
                 cmap = self.__getColormap(colormap['name'])
+                # statistics are cached per tile by the shared pyramid
+                pyramid = ImagePyramid.getPyramid(data)
                 if colormap['normalization'].startswith('log'):
                     vmin, vmax = None, None
                     if not colormap['autoscale']:
@@ -2633,12 +2706,14 @@ def addImage(self, data, legend=None, info=None,
 
                     # Set unset/negative bounds to positive bounds
                     if vmin is None or vmax is None:
-                        posData = data[data > 0]
+                        dataMin, dataMinPos, dataMax = \
+                                                pyramid.getStatistics()
                         if vmax is None:
                             # 1. as an ultimate fallback
-                            vmax = posData.max() if posData.size > 0 else 1.
+                            vmax = dataMax if dataMinPos is not None else 1.
                         if vmin is None:
-                            vmin = posData.min() if posData.size > 0 else vmax
+                            vmin = dataMinPos if dataMinPos is not None \
+                                   else vmax
                         if vmin > vmax:
                             vmin = vmax
 
@@ -2646,8 +2721,7 @@ def addImage(self, data, legend=None, info=None,
 
                 else:  # Linear normalization
                     if colormap['autoscale']:
-                        vmin = data.min()
-                        vmax = data.max()
+                        vmin, dummy, vmax = pyramid.getStatistics()
                     else:
                         vmin = colormap['vmin']
                         vmax = colormap['vmax']
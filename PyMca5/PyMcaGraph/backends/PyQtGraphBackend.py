@@ -44,6 +44,7 @@
     import pyqtgraph as pg
 from pyqtgraph.Qt import QtCore, QtGui
 from .. import PlotBackend
+from .. import ImagePyramid
 _USE_ORIGINAL = False
 DEBUG = 0
 
@@ -481,7 +482,16 @@ def addImage(self, data, legend=None, info=None,
         :returns: The legend/handle used by the backend to univocally access it.
         """
         self.removeImage(legend, replot=False)
-        item = pg.ImageItem(image=data.T)
+        if len(data.shape) == 2:
+            # use the statistics cached by the shared pyramid as levels
+            # and let pyqtgraph downsample the image to the screen size
+            ImagePyramid.invalidate(data)
+            dataMin, dataMinPos, dataMax = \
+                            ImagePyramid.getPyramid(data).getStatistics()
+            item = pg.ImageItem(image=data.T, levels=(dataMin, dataMax),
+                                autoDownsample=True)
+        else:
+            item = pg.ImageItem(image=data.T)
         item.setZValue(z)
         #self._imageItem.setCompositionMode(QtGui.QPainter.CompositionMode_Multiply)
         if xScale is None:
@@ -29,6 +29,7 @@
 cimport cython
 cimport numpy as np
 import numpy as np
+import threading
 
 
 from Colormap cimport colormapFillPixmap, initFastLog10
@@ -56,15 +57,111 @@ _NUMPY_TO_TYPE_DESC = {
     'u8': 0b0111,
 }
 
+# Number of threads used to apply a colormap to large data
+try:
+    from multiprocessing import cpu_count as _cpu_count
+    COLORMAP_N_THREADS = max(1, min(_cpu_count(), 8))
+except:
+    COLORMAP_N_THREADS = 1
+
+# Data with less elements are processed by the calling thread only
+_THREADS_MIN_SIZE = 1048576
+
+
+def _splitRows(data, nThreads):
+    """Split the indices of data in ranges of whole rows, one per thread."""
+    cdef unsigned long size = data.size
+    if nThreads is None:
+        nThreads = COLORMAP_N_THREADS
+    if nThreads <= 1 or size < _THREADS_MIN_SIZE:
+        return [(0, size)]
+    rowSize = data.shape[-1] if data.ndim > 1 else 1
+    nRows = size // rowSize
+    nThreads = min(int(nThreads), nRows)
+    return [((nRows * i // nThreads) * rowSize,
+             (nRows * (i + 1) // nThreads) * rowSize)
+            for i in range(nThreads)]
+
+
+def _runInThreads(function, ranges, args):
+    """Call function(first, last, *args) for each range, in parallel.
+
+    The function is expected to release the GIL.
+    """
+    results = [None] * len(ranges)
+
+    def run(index):
+        results[index] = function(ranges[index][0], ranges[index][1], *args)
+
+    threads = [threading.Thread(target=run, args=(index,))
+               for index in range(1, len(ranges))]
+    for thread in threads:
+        thread.start()
+    run(0)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _minMaxRange(unsigned long first, unsigned long last,
+                 np.ndarray data, unsigned int dataType, bint minPositive):
+    cdef unsigned long c_itemSize = data.itemsize
+    cdef char * c_dataPtr = data.data + first * c_itemSize
+    cdef unsigned long c_length = last - first
+    cdef double c_min, c_minPos = 0., c_max
+    if minPositive:
+        with nogil:
+            getMinMax(c_dataPtr, dataType, c_length,
+                      &c_min, &c_minPos, &c_max)
+    else:
+        with nogil:
+            getMinMax(c_dataPtr, dataType, c_length, &c_min, NULL, &c_max)
+    return c_min, c_minPos, c_max
+
+
+def _fillPixmapRange(unsigned long first, unsigned long last,
+                     np.ndarray data, unsigned int dataType,
+                     double startValue, double endValue,
+                     bint isLog10Mapping,
+                     np.ndarray colormap, np.ndarray nanColor,
+                     np.ndarray pixmap):
+    cdef unsigned long c_itemSize = data.itemsize
+    cdef char * c_dataPtr = data.data + first * c_itemSize
+    cdef unsigned char * c_pixmapPtr = <unsigned char *> pixmap.data
+    c_pixmapPtr += 4 * first
+    cdef unsigned long c_length = last - first
+    cdef unsigned char * c_colormapPtr = <unsigned char *> colormap.data
+    cdef unsigned int c_colormapLength = len(colormap)
+    cdef unsigned char * c_nanColorPtr = NULL
+    if nanColor is not None:
+        c_nanColorPtr = <unsigned char *> nanColor.data
+    with nogil:
+        colormapFillPixmap(c_dataPtr,
+                           dataType,
+                           c_length,
+                           startValue,
+                           endValue,
+                           isLog10Mapping,
+                           c_colormapPtr,
+                           c_colormapLength,
+                           c_nanColorPtr,
+                           c_pixmapPtr)
+
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
 def dataToRGBAColormap(data,
                        np.ndarray[np.uint8_t, ndim=2, mode="c"] colormap,
                        startValue=None, endValue=None,
                        bint isLog10Mapping=False,
-                       nanColor=None):
+                       nanColor=None,
+                       output=None,
+                       nThreads=None):
     """Compute a pixmap by applying a colormap to data.
 
+    The GIL is released and large data are split in ranges of rows
+    processed by different threads.
+
     :param numpy.ndarray data: Array of data value to convert to pixmap.
     :param numpy.ndarray colormap: palette to use as colormap as an array of
                                    RGBA color.
@@ -75,6 +172,11 @@ def dataToRGBAColormap(data,
                      If None, the first color of the colormap.
     :type nanColor: None (the default) or a container that can be converted
                     to a numpy.ndarray containing 4 elements in [0, 255].
+    :param output: C-contiguous uint8 array with the shape of data plus a
+                   dimension of 4 where to write the pixmap, or None (the
+                   default) to allocate a new one.
+    :param nThreads: Number of threads to use or None (the default) to use
+                     COLORMAP_N_THREADS.
     :returns: The corresponding pixmap of RGBA pixels as an array of 4 uint8
               with same dimensions as data and used min and max.
     :rtype: A tuple : (pixmap , (usedMin, usedMax)).
@@ -84,36 +186,43 @@ def dataToRGBAColormap(data,
         data = np.asarray(data, dtype=np.float32)
 
     cdef np.ndarray c_data = np.ascontiguousarray(data)
-    cdef void * c_dataPtr = c_data.data  # &c_data[0] needs dim
-    cdef unsigned long c_dataSize = c_data.size
-    cdef unsigned int c_dataItemSize = c_data.itemsize
+    cdef unsigned int c_type = _NUMPY_TO_TYPE_DESC[c_data.dtype.str[1:]]
 
-    cdef unsigned char[:, :] c_colormap = colormap
-    cdef unsigned int c_colormapLength = len(colormap)
-
-    cdef unsigned char * c_nanColorPtr
-    cdef np.ndarray c_nanColor
-    if nanColor is None:
-        c_nanColorPtr = NULL
-    else:
+    cdef np.ndarray c_nanColor = None
+    if nanColor is not None:
         c_nanColor = np.asarray(nanColor, dtype=np.uint8, order='C')
-        c_nanColorPtr = <unsigned char *> c_nanColor.data
 
-    pixmap = np.empty((data.size, 4), dtype=np.uint8)
-    cdef unsigned char[:, :] c_pixmap = pixmap
+    pixmapShape = tuple(data.shape) + (4,)
+    if output is None:
+        pixmap = np.empty(pixmapShape, dtype=np.uint8)
+    else:
+        if (not isinstance(output, np.ndarray)) or \
+           output.dtype != np.uint8 or \
+           output.shape != pixmapShape or \
+           not output.flags['C_CONTIGUOUS']:
+            raise ValueError("output must be a C-contiguous uint8 array "
+                             "of shape %s" % str(pixmapShape))
+        pixmap = output
 
-    cdef unsigned int c_type = _NUMPY_TO_TYPE_DESC[data.dtype.str[1:]]
+    ranges = _splitRows(data, nThreads)
 
-    cdef double c_start, c_startExtra, c_end
+    cdef double c_start, c_end
     if startValue is None or endValue is None:
-        if isLog10Mapping:
-            with nogil:
-                getMinMax(c_dataPtr, c_type, c_dataSize,
-                          &c_startExtra, &c_start, &c_end)
+        if c_data.size == 0:
+            results = [_minMaxRange(0, 0, c_data, c_type, isLog10Mapping)]
         else:
-            with nogil:
-                getMinMax(c_dataPtr, c_type, c_dataSize,
-                          &c_start, NULL, &c_end)
+            results = _runInThreads(_minMaxRange, ranges,
+                                    (c_data, c_type, isLog10Mapping))
+        # Merge min/max ignoring NaNs, a min positive of 0 means none
+        c_start = results[0][1] if isLog10Mapping else results[0][0]
+        c_end = results[0][2]
+        for result in results[1:]:
+            if isLog10Mapping:
+                if result[1] != 0. and (c_start == 0. or result[1] < c_start):
+                    c_start = result[1]
+            else:
+                c_start = np.fmin(c_start, result[0])
+            c_end = np.fmax(c_end, result[2])
 
         if startValue is not None:
             c_start = startValue
@@ -123,19 +232,11 @@ def dataToRGBAColormap(data,
         c_start = startValue
         c_end = endValue
 
-    with nogil:
-        colormapFillPixmap(c_dataPtr,
-                           c_type,
-                           c_dataSize,
-                           c_start,
-                           c_end,
-                           isLog10Mapping,
-                           &c_colormap[0, 0],
-                           c_colormapLength,
-                           c_nanColorPtr,
-                           &c_pixmap[0, 0])
+    if c_data.size:
+        _runInThreads(_fillPixmapRange, ranges,
+                      (c_data, c_type, c_start, c_end, isLog10Mapping,
+                       colormap, c_nanColor, pixmap))
 
-    pixmap.shape = data.shape + (4,)
     return pixmap, (c_start, c_end)
 
 def fastLog10(double value):
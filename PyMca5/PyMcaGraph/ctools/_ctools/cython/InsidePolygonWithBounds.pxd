@@ -5,4 +5,6 @@ cdef extern from "InsidePolygonWithBounds.h":
                          float *, int , int , unsigned char *) nogil
     void PointsInsidePolygonInt(double *, int , \
                          int *, int , int , unsigned char *) nogil
-
+    int PolygonFillMask(double *, int , double , double , int , \
+                        double , double , int , int , \
+                        int , unsigned char *) nogil
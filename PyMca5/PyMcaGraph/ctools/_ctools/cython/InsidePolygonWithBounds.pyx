@@ -2,7 +2,7 @@
 #
 # The PyMca X-Ray Fluorescence Toolkit
 #
-# Copyright (c) 2004-2015 European Synchrotron Radiation Facility
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
 #
 # This file is part of the PyMca X-ray Fluorescence Toolkit developed at
 # the ESRF by the Software group.
@@ -30,11 +30,35 @@ cimport cython
 from InsidePolygonWithBounds cimport PointsInsidePolygon as _pnpoly
 from InsidePolygonWithBounds cimport PointsInsidePolygonF as _pnpolyf
 from InsidePolygonWithBounds cimport PointsInsidePolygonInt as _pnpolyInt32
+from InsidePolygonWithBounds cimport PolygonFillMask as _polygonFillMask
 cimport numpy
 import numpy
 
+# Polygon selections are split in threads above that number of points.
+# COLORMAP_N_THREADS and _runInThreads are defined in Colormap.pyx
+_POLYGON_THREADS_MIN_SIZE = 262144
+
+def _splitRange(size, nThreads):
+    """Split range(size) in contiguous ranges, one per thread."""
+    if nThreads is None:
+        nThreads = COLORMAP_N_THREADS
+    if nThreads <= 1 or size < _POLYGON_THREADS_MIN_SIZE:
+        return [(0, size)]
+    nThreads = min(int(nThreads), size)
+    return [(size * i // nThreads, size * (i + 1) // nThreads)
+            for i in range(nThreads)]
+
+def _getVertices(vertices):
+    c_vertices = numpy.ascontiguousarray(vertices, dtype=numpy.float64)
+    if (c_vertices.ndim != 2) or (c_vertices.shape[1] != 2):
+        raise ValueError("Vertices must be an array Nx2")
+    if not c_vertices.shape[0]:
+        # keep a valid pointer
+        c_vertices = numpy.zeros((1, 2), dtype=numpy.float64)[:0]
+    return c_vertices
+
 @cython.boundscheck(False)
-def pnpoly(vertices, points, bint border=True):
+def pnpoly(vertices, points, bint border=True, nThreads=None):
     """
     :param vertices: Array Nx2 with the coordenates of the polygon vertices
     :type vertices: ndarray
@@ -42,65 +66,106 @@ def pnpoly(vertices, points, bint border=True):
     :type points: ndarray Nx2 or list of [x, y] pairs
     :param border: Flag to indicate if a pointon a vertex is to be in or out
     :type border: boolean (default True)
-    """
-    if isinstance(points, numpy.ndarray):
-        if points.dtype == numpy.float32:
-            return _pnpolyFloat(vertices, points, border)
-        elif points.dtype in [numpy.int32, numpy.int8, numpy.int16,
-                              numpy.uint32, numpy.uint8, numpy.uint16]:
-            return _pnpolyInt(vertices, points, border)
-    return _pnpolyd(vertices, points, border)
+    :param nThreads: Number of threads to use for large sets of points.
+                     Default is COLORMAP_N_THREADS.
+    :return: uint8 array with 1 for the points inside the polygon
 
-@cython.boundscheck(False)
-def _pnpolyd(vertices, points, bint border=True):
-    cdef double[:,:] c_vertices = numpy.ascontiguousarray(vertices,
-                                                          dtype=numpy.float64)
-    cdef int n_vertices = c_vertices.shape[0]
-    assert c_vertices.shape[1] == 2
-    cdef double[:,:] c_points = numpy.ascontiguousarray(points,
-                                                        dtype=numpy.float64)
-    cdef int n_points = c_points.shape[0]
+    Points outside the bounding box of the polygon are discarded without
+    further testing. The GIL is released during the calculation.
+    """
+    if isinstance(points, numpy.ndarray) and \
+       (points.dtype == numpy.float32):
+        dtype = numpy.float32
+    elif isinstance(points, numpy.ndarray) and \
+         (points.dtype in [numpy.int32, numpy.int8, numpy.int16,
+                           numpy.uint32, numpy.uint8, numpy.uint16]):
+        dtype = numpy.int32
+    else:
+        dtype = numpy.float64
+    c_vertices = _getVertices(vertices)
+    c_points = numpy.ascontiguousarray(points, dtype=dtype)
+    if c_points.size == 0:
+        return numpy.zeros((0, ), dtype=numpy.uint8)
     assert c_points.shape[1] == 2
-
-    cdef numpy.ndarray[numpy.uint8_t, ndim=1] mask = \
-         numpy.zeros((n_points, ), dtype=numpy.uint8)
-    with nogil:
-        _pnpoly(&c_vertices[0,0], n_vertices, &c_points[0,0], n_points,
-                 border, &mask[0])
+    mask = numpy.zeros((c_points.shape[0], ), dtype=numpy.uint8)
+    _runInThreads(_pnpolyRange, _splitRange(c_points.shape[0], nThreads),
+                  (c_vertices, c_points, border, mask))
     return mask
 
 @cython.boundscheck(False)
-def _pnpolyFloat(vertices, points, bint border=True):
-    cdef double[:,:] c_vertices = numpy.ascontiguousarray(vertices,
-                                                          dtype=numpy.float64)
-    cdef int n_vertices = c_vertices.shape[0]
-    assert c_vertices.shape[1] == 2
-    cdef float[:,:] c_points = numpy.ascontiguousarray(points,
-                                                        dtype=numpy.float32)
-    cdef int n_points = c_points.shape[0]
-    assert c_points.shape[1] == 2
+def _pnpolyRange(int first, int last,
+                 numpy.ndarray vertices, numpy.ndarray points,
+                 bint border, numpy.ndarray mask):
+    cdef double * c_vertices = <double *> vertices.data
+    cdef int n_vertices = vertices.shape[0]
+    cdef int n_points = last - first
+    cdef unsigned char * c_mask = (<unsigned char *> mask.data) + first
+    cdef int c_itemSize = points.itemsize
+    cdef char * c_points = points.data + 2 * first * c_itemSize
+    if points.dtype == numpy.float32:
+        with nogil:
+            _pnpolyf(c_vertices, n_vertices, <float *> c_points, n_points,
+                     border, c_mask)
+    elif points.dtype == numpy.int32:
+        with nogil:
+            _pnpolyInt32(c_vertices, n_vertices, <int *> c_points, n_points,
+                         border, c_mask)
+    else:
+        with nogil:
+            _pnpoly(c_vertices, n_vertices, <double *> c_points, n_points,
+                    border, c_mask)
 
-    cdef numpy.ndarray[numpy.uint8_t, ndim=1] mask = \
-         numpy.zeros((n_points, ), dtype=numpy.uint8)
-    with nogil:
-        _pnpolyf(&c_vertices[0,0], n_vertices, &c_points[0,0], n_points,
-                 border, &mask[0])
+@cython.boundscheck(False)
+def polygonFillMask(vertices, shape, origin=(0., 0.), scale=(1., 1.),
+                    bint border=True, nThreads=None):
+    """
+    Scanline fill of a polygon on a regular grid of points.
+
+    The result is the same as the one of pnpoly applied to the points
+    (origin[0] + scale[0] * column, origin[1] + scale[1] * row) but
+    the spans of points inside the polygon are filled row by row
+    instead of testing the points one by one.
+
+    :param vertices: Array Nx2 with the x, y coordenates of the polygon vertices
+    :param shape: (number of rows, number of columns) of the mask
+    :param origin: x, y coordenates of the point of the first row and column
+    :param scale: x, y distance between consecutive points
+    :param border: Flag to indicate if a point on a vertex is to be in or out
+    :param nThreads: Number of threads to use for large masks.
+                     Default is COLORMAP_N_THREADS.
+    :return: uint8 array of the given shape with 1 inside the polygon
+    """
+    c_vertices = _getVertices(vertices)
+    nRows, nColumns = int(shape[0]), int(shape[1])
+    mask = numpy.zeros((nRows, nColumns), dtype=numpy.uint8)
+    if mask.size == 0:
+        return mask
+    ranges = _splitRange(nRows * nColumns, nThreads)
+    ranges = [(first // nColumns, last // nColumns) for first, last in ranges]
+    results = _runInThreads(_polygonFillRows, ranges,
+                            (c_vertices,
+                             float(origin[0]), float(scale[0]),
+                             float(origin[1]), float(scale[1]),
+                             border, mask))
+    if min(results) < 0:
+        raise MemoryError("Cannot allocate memory for polygon filling")
     return mask
 
 @cython.boundscheck(False)
-def _pnpolyInt(vertices, points, bint border=True):
-    cdef double[:,:] c_vertices = numpy.ascontiguousarray(vertices,
-                                                          dtype=numpy.float64)
-    cdef int n_vertices = c_vertices.shape[0]
-    assert c_vertices.shape[1] == 2
-    cdef int[:,:] c_points = numpy.ascontiguousarray(points,
-                                                        dtype=numpy.int32)
-    cdef int n_points = c_points.shape[0]
-    assert c_points.shape[1] == 2
-
-    cdef numpy.ndarray[numpy.uint8_t, ndim=1] mask = \
-         numpy.zeros((n_points, ), dtype=numpy.uint8)
+def _polygonFillRows(int first, int last, numpy.ndarray vertices,
+                     double x0, double xStep, double y0, double yStep,
+                     bint border, numpy.ndarray mask):
+    cdef double * c_vertices = <double *> vertices.data
+    cdef int n_vertices = vertices.shape[0]
+    cdef int n_columns = mask.shape[1]
+    cdef unsigned char * c_mask = (<unsigned char *> mask.data) + \
+                                  first * n_columns
+    cdef int result
+    if last <= first:
+        return 0
     with nogil:
-        _pnpolyInt32(&c_vertices[0,0], n_vertices, &c_points[0,0], n_points,
-                 border, &mask[0])
-    return mask
+        result = _polygonFillMask(c_vertices, n_vertices,
+                                  x0, xStep, n_columns,
+                                  y0, yStep, first, last,
+                                  border, c_mask)
+    return result
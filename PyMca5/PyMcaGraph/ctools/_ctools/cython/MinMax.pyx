@@ -94,3 +94,52 @@ def minMax(np.ndarray data, bint minPositive=False):
             getMinMax(c_dataPtr, c_type, c_dataSize,
                       &c_dataMin, NULL, &c_dataMax)
         return c_dataMin, c_dataMax
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def minMaxBlocks(np.ndarray data, unsigned long blockSize):
+    """Get min and max of consecutive blocks of data.
+
+    data is split in blocks of blockSize elements (the last one can be
+    shorter) and the min and max of each block are computed with the same
+    C function as :func:`minMax`, so NaNs are ignored. If a block only
+    contains NaNs, its min and max are NaNs.
+
+    :param np.ndarray data: Array of data, it is used as a 1D array.
+    :param int blockSize: Number of elements of each block.
+    :returns: (min, max) arrays of float64 with one value per block
+    :rtype: tuple of np.ndarray
+    :raises: ValueError if data is empty or blockSize is zero
+    """
+    #Convert float16 to float32
+    if data.dtype.str[1:] == 'f2':
+        data = np.asarray(data, dtype=np.float32)
+
+    cdef np.ndarray c_data = np.ascontiguousarray(data).reshape(-1)
+    cdef char * c_dataPtr = c_data.data
+    cdef unsigned long c_dataSize = c_data.size
+
+    if c_dataSize == 0:
+        raise ValueError("zero-size array")
+    if blockSize == 0:
+        raise ValueError("blockSize must be strictly positive")
+
+    cdef unsigned int c_type = _NUMPY_TO_TYPE_DESC[data.dtype.str[1:]]
+    cdef unsigned long c_itemSize = c_data.itemsize
+    cdef unsigned long c_nBlocks = (c_dataSize + blockSize - 1) // blockSize
+    cdef np.ndarray c_min = np.empty((c_nBlocks,), dtype=np.float64)
+    cdef np.ndarray c_max = np.empty((c_nBlocks,), dtype=np.float64)
+    cdef double * c_minPtr = <double *> c_min.data
+    cdef double * c_maxPtr = <double *> c_max.data
+    cdef unsigned long index, start, length
+
+    with nogil:
+        for index in range(c_nBlocks):
+            start = index * blockSize
+            length = c_dataSize - start
+            if length > blockSize:
+                length = blockSize
+            getMinMax(<void *> (c_dataPtr + start * c_itemSize), c_type,
+                      length, &c_minPtr[index], NULL, &c_maxPtr[index])
+    return c_min, c_max
@@ -69,3 +69,8 @@ void PointsInsidePolygon(double *polygon_xy, int N_xy, \
                          double *points_xy, int N_points_xy,
                          int border_value, unsigned char *output);
 
+int PolygonFillMask(double *vertices, int N_vertices,
+                    double x0, double xStep, int nColumns,
+                    double y0, double yStep,
+                    int firstRow, int lastRow,
+                    int border_value, unsigned char *output);
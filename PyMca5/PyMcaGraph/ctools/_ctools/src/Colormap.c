@@ -27,6 +27,8 @@
 #
 #############################################################################*/
 #include <math.h>
+#include <stdlib.h>
+#include <string.h>
 
 #include "Colormap.h"
 #include "Types.h"
@@ -331,6 +333,130 @@ FILL_PIXMAP_WITH_LUT_DEFINITION(int16_t, INT16_MIN, 65536)
 FILL_PIXMAP_WITH_LUT_DEFINITION(uint16_t, 0, 65536)
 
 
+/* Fill pixmap with log10 LUT ***********************************************/
+
+/* Number of bits of the mantissa used to index the look-up table */
+#define LOG10_LUT_BITS 12
+
+/* Maximum number of entries of the look-up table (16 MB) */
+#define LOG10_LUT_MAX_SIZE (1 << 22)
+
+/** Macro defining typed function filling pixmap from floating point data
+ * with log10 mapping using a precomputed look-up table.
+ *
+ * The bits of the IEEE 754 representation of positive values increase with
+ * the value. The color is computed once for each combination of exponent
+ * and LOG10_LUT_BITS most significant bits of the mantissa found between
+ * the min and max values, so that no log10 is computed per pixel.
+ * Accuracy is the one of fastLog10 which uses the same number of bits.
+ *
+ * Returns 0 without filling the pixmap if the mapping range is not strictly
+ * positive or if the look-up table would not be smaller than the data.
+ *
+ * @param TYPE The floating point type of the input data of the function
+ * @param UINT_TYPE The unsigned integer type with the size of TYPE
+ * @param SHIFT The number of bits of the mantissa not used in the LUT
+ */
+#define FILL_PIXMAP_WITH_LOG10_LUT_DEFINITION(TYPE, UINT_TYPE, SHIFT)\
+static int \
+fillPixmapWithLog10LUT_ ## TYPE(TYPE * data,\
+    unsigned long length,\
+    double startValue,\
+    double endValue,\
+    uint32_t * colormap,\
+    unsigned int colormapLength,\
+    uint32_t nanColor,\
+    uint32_t * pixmapOut)\
+{\
+    unsigned long index, lutLength;\
+    double min, max, startLog, endLog, scale;\
+    unsigned int cmapMax = colormapLength - 1;\
+    UINT_TYPE keyMin, keyMax;\
+    uint32_t * colorLUT;\
+    TYPE bound;\
+\
+    if (startValue <= 0.0 || endValue <= 0.0 || startValue == endValue) {\
+        return 0;\
+    }\
+\
+    min = (startValue < endValue) ? startValue : endValue;\
+    max = (startValue < endValue) ? endValue : startValue;\
+\
+    /* Values strictly between min and max have keys in [keyMin, keyMax] */\
+    bound = (TYPE) min;\
+    memcpy(&keyMin, &bound, sizeof(TYPE));\
+    keyMin >>= SHIFT;\
+    bound = (TYPE) max;\
+    memcpy(&keyMax, &bound, sizeof(TYPE));\
+    keyMax >>= SHIFT;\
+\
+    lutLength = (unsigned long) (keyMax - keyMin + 1);\
+    if (lutLength > LOG10_LUT_MAX_SIZE || lutLength >= length) {\
+        return 0;\
+    }\
+    colorLUT = (uint32_t *) malloc(lutLength * sizeof(uint32_t));\
+    if (colorLUT == NULL) {\
+        return 0;\
+    }\
+\
+    startLog = fastLog10(startValue);\
+    endLog = fastLog10(endValue);\
+    scale = ((double) colormapLength) / (endLog - startLog);\
+\
+    /* Color of the middle of each range of values sharing a key */\
+    for (index=0; index<lutLength; index++) {\
+        unsigned int cmapIndex;\
+        UINT_TYPE bits = (((UINT_TYPE) (keyMin + index)) << SHIFT) |\
+                         (((UINT_TYPE) 1) << (SHIFT - 1));\
+        TYPE lutValue;\
+        double value;\
+\
+        memcpy(&lutValue, &bits, sizeof(TYPE));\
+        value = (double) lutValue;\
+        if (value >= max) {\
+            cmapIndex = cmapMax;\
+        }\
+        else if (value <= min) {\
+            cmapIndex = 0;\
+        }\
+        else {\
+            cmapIndex = (unsigned int) (scale * (fastLog10(value) - startLog));\
+            if (cmapIndex > cmapMax) {\
+                cmapIndex = cmapMax;\
+            }\
+        }\
+        colorLUT[index] = colormap[cmapIndex];\
+    }\
+\
+    PRAGMA_OMP("omp parallel for schedule(static) if (length > 1048576)")\
+    for (index=0; index<length; index++) {\
+        double value = (double) data[index];\
+\
+        if (isnan(value)) {\
+            pixmapOut[index] = nanColor;\
+        }\
+        else if (value >= max) {\
+            pixmapOut[index] = colormap[cmapMax];\
+        }\
+        else if (value <= min) {\
+            pixmapOut[index] = colormap[0];\
+        }\
+        else {\
+            UINT_TYPE bits;\
+\
+            memcpy(&bits, &data[index], sizeof(TYPE));\
+            pixmapOut[index] = colorLUT[(bits >> SHIFT) - keyMin];\
+        }\
+    }\
+\
+    free(colorLUT);\
+    return 1;\
+}
+
+FILL_PIXMAP_WITH_LOG10_LUT_DEFINITION(float, uint32_t, (23 - LOG10_LUT_BITS))
+FILL_PIXMAP_WITH_LOG10_LUT_DEFINITION(double, uint64_t, (52 - LOG10_LUT_BITS))
+
+
 /* Public API ****************************************************************/
 
 #define CALL_FILL_PIXMAP(TYPE)\
@@ -344,6 +470,16 @@ FILL_PIXMAP_WITH_LUT_DEFINITION(uint16_t, 0, 65536)
         nanColor, \
         pixmapOut)
 
+#define CALL_FILL_PIXMAP_WITH_LOG10_LUT(TYPE)\
+    fillPixmapWithLog10LUT_ ## TYPE((TYPE *) data,\
+        length,\
+        startValue,\
+        endValue,\
+        colormap,\
+        colormapLength,\
+        nanColor, \
+        pixmapOut)
+
 #define CALL_FILL_PIXMAP_WITH_LUT(TYPE)\
     fillPixmapWithLUT_ ## TYPE((TYPE *) data,\
         length,\
@@ -399,13 +535,19 @@ colormapFillPixmap(void * data,
                 /* If NaN color is NULL, use the first color of the colormap */
                 nanColor = (RGBANaNColor == 0) ? *((uint32_t *) RGBAColormap) :
                                                  *((uint32_t *) RGBANaNColor);
-                CALL_FILL_PIXMAP(float);
+                if (! (isLog10Mapping &&
+                       CALL_FILL_PIXMAP_WITH_LOG10_LUT(float))) {
+                    CALL_FILL_PIXMAP(float);
+                }
                 break;
             case (FLOATING | SIZE_64): /*double*/
                 /* If NaN color is NULL, use the first color of the colormap */
                 nanColor = (RGBANaNColor == 0) ? *((uint32_t *) RGBAColormap) :
                                                  *((uint32_t *) RGBANaNColor);
-                CALL_FILL_PIXMAP(double);
+                if (! (isLog10Mapping &&
+                       CALL_FILL_PIXMAP_WITH_LOG10_LUT(double))) {
+                    CALL_FILL_PIXMAP(double);
+                }
                 break;
 
             case (SIZE_8): /*int8_t*/
@@ -30,6 +30,8 @@
 
 /* SOLUTION #1 (2D) */
 
+#include <stdlib.h>
+#include <math.h>
 #include "../include/InsidePolygonWithBounds.h"
 
 #define _INSIDE_POLYGON(NAME, TYPE) \
@@ -71,77 +73,205 @@ _INSIDE_POLYGON(_InsidePolygon, Point)
 _INSIDE_POLYGON(_InsidePolygonF, PointF)
 _INSIDE_POLYGON(_InsidePolygonInt, PointInt)
 
-void PointsInsidePolygon(double *vertices, int N_vertices, \
-                         double *points_xy, int N_points_xy,
-                         int border_value, unsigned char *output)
+#define _POINTS_INSIDE_POLYGON(NAME, INSIDE_FUNCTION, TYPE, POINT_TYPE)                     \
+void NAME(double *vertices, int N_vertices,                                              \
+          TYPE *points_xy, int N_points_xy,                                              \
+          int border_value, unsigned char *output)                                       \
+{                                                                                        \
+    int i;                                                                               \
+    Point *polygon;                                                                      \
+    POINT_TYPE *point;                                                                   \
+    unsigned char *p;                                                                    \
+    unsigned char border;                                                                \
+    double xmin, xmax, ymin, ymax;                                                       \
+                                                                                         \
+    polygon = (Point *) vertices;                                                        \
+    point = (POINT_TYPE *) points_xy;                                                    \
+    border = (unsigned char) border_value;                                               \
+    p = output;                                                                          \
+    if (N_vertices < 1)                                                                  \
+    {                                                                                    \
+        for (i=0; i < N_points_xy; i++)                                                  \
+            p[i] = OUTSIDE;                                                              \
+        return;                                                                          \
+    }                                                                                    \
+                                                                                         \
+    /* points outside the bounding box of the polygon are outside */                    \
+    _PolygonBoundingBox(polygon, N_vertices, &xmin, &xmax, &ymin, &ymax);                \
+    for (i=0; i < N_points_xy; i++)                                                      \
+    {                                                                                    \
+        if ((point->x < xmin) || (point->x > xmax) ||                                    \
+            (point->y < ymin) || (point->y > ymax))                                      \
+            *p = OUTSIDE;                                                                \
+        else                                                                             \
+            *p = INSIDE_FUNCTION(polygon, N_vertices, *point, border);                   \
+        p++;                                                                             \
+        point++;                                                                         \
+    }                                                                                    \
+}
+
+static void _PolygonBoundingBox(Point *polygon, int N,
+                                double *xmin, double *xmax,
+                                double *ymin, double *ymax)
 {
     int i;
-    Point *polygon;
-    Point *point;
-    unsigned char *p;
-    unsigned char border;
 
-
-
-    polygon = (Point *) vertices;
-    point = (Point *) points_xy;
-    border = (unsigned char) border_value;
-
-    p = output;
-    for (i=0; i < N_points_xy; i++)
+    *xmin = *xmax = polygon[0].x;
+    *ymin = *ymax = polygon[0].y;
+    for (i=1; i < N; i++)
     {
-        *p = _InsidePolygon(polygon, N_vertices, *point, border);
-        p++;
-        point++;
+        *xmin = MIN(*xmin, polygon[i].x);
+        *xmax = MAX(*xmax, polygon[i].x);
+        *ymin = MIN(*ymin, polygon[i].y);
+        *ymax = MAX(*ymax, polygon[i].y);
     }
 }
 
-void PointsInsidePolygonF(double *vertices, int N_vertices, \
-                         float *points_xy, int N_points_xy,
-                         int border_value, unsigned char *output)
-{
-    int i;
-    Point *polygon;
-    PointF *point;
-    unsigned char *p;
-    unsigned char border;
+_POINTS_INSIDE_POLYGON(PointsInsidePolygon, _InsidePolygon, double, Point)
+_POINTS_INSIDE_POLYGON(PointsInsidePolygonF, _InsidePolygonF, float, PointF)
+_POINTS_INSIDE_POLYGON(PointsInsidePolygonInt, _InsidePolygonInt, int, PointInt)
 
+/* Scanline fill of a polygon on a regular grid.
 
+ The point of column j and row i of the grid is (x0 + xStep * j, y0 + yStep * i).
+ For each row the intersections of the polygon edges with the row are calculated
+ with the same expressions and rules as _InsidePolygon and sorted. A point is
+ inside if an odd number of intersections is at its right, so the points between
+ intersections 2k and 2k + 1 are filled in one go. Points exactly on a vertex
+ get border_value. The rows firstRow to lastRow - 1 are written at output.
 
-    polygon = (Point *) vertices;
-    point = (PointF *) points_xy;
-    border = (unsigned char) border_value;
+ Returns 0 on success and -1 if memory cannot be allocated.
+ */
+static void _SortDoubles(double *values, int n)
+{
+    int i, j;
+    double tmp;
 
-    p = output;
-    for (i=0; i < N_points_xy; i++)
+    /* insertion sort, the number of intersections per row is small */
+    for (i=1; i < n; i++)
     {
-        *p = _InsidePolygonF(polygon, N_vertices, *point, border);
-        p++;
-        point++;
+        tmp = values[i];
+        j = i - 1;
+        while ((j >= 0) && (values[j] > tmp))
+        {
+            values[j + 1] = values[j];
+            j--;
+        }
+        values[j + 1] = tmp;
     }
 }
 
-void PointsInsidePolygonInt(double *vertices, int N_vertices, \
-                         int *points_xy, int N_points_xy,
-                         int border_value, unsigned char *output)
+static void _FillSpan(unsigned char *row, int nColumns,
+                      double x0, double xStep,
+                      double xleft, double xright)
 {
-    int i;
-    Point *polygon;
-    PointInt *point;
-    unsigned char *p;
-    unsigned char border;
+    /* fill the columns j verifying xleft < x0 + xStep * j <= xright */
+    double first, last, x;
+    long j, jmin, jmax;
 
+    if (xStep == 0.0)
+    {
+        if ((xleft < x0) && (x0 <= xright))
+        {
+            for (j=0; j < nColumns; j++)
+                row[j] = INSIDE;
+        }
+        return;
+    }
+    first = (xleft - x0) / xStep;
+    last = (xright - x0) / xStep;
+    if (first > last)
+    {
+        x = first;
+        first = last;
+        last = x;
+    }
+    /* keep one column of margin for the rounding of the division */
+    if ((last < -1.0) || (first > nColumns))
+        return;
+    jmin = (first < 1.0) ? 0 : (long) first - 1;
+    jmax = (last > (nColumns - 2.0)) ? nColumns - 1 : (long) last + 1;
+    for (j=jmin; j <= jmax; j++)
+    {
+        x = x0 + xStep * j;
+        if ((xleft < x) && (x <= xright))
+            row[j] = INSIDE;
+    }
+}
 
+int PolygonFillMask(double *vertices, int N_vertices,
+                    double x0, double xStep, int nColumns,
+                    double y0, double yStep,
+                    int firstRow, int lastRow,
+                    int border_value, unsigned char *output)
+{
+    int i, j, k, n;
+    long r, c;
+    double y, x, *xinters;
+    Point *polygon;
+    Point p1, p2;
+    unsigned char *row;
 
     polygon = (Point *) vertices;
-    point = (PointInt *) points_xy;
-    border = (unsigned char) border_value;
+    for (k = 0; k < (lastRow - firstRow) * nColumns; k++)
+        output[k] = OUTSIDE;
+    if (N_vertices < 1)
+        return 0;
+    xinters = (double *) malloc(N_vertices * sizeof(double));
+    if (xinters == NULL)
+        return -1;
+
+    for (i=firstRow; i < lastRow; i++)
+    {
+        y = y0 + yStep * i;
+        n = 0;
+        p1 = polygon[0];
+        for (k=1; k <= N_vertices; k++)
+        {
+            p2 = polygon[k % N_vertices];
+            if ((y > MIN(p1.y, p2.y)) && (y <= MAX(p1.y, p2.y)) && (p1.y != p2.y))
+            {
+                x = (y - p1.y) * (p2.x - p1.x) / (p2.y - p1.y) + p1.x;
+                /* _InsidePolygon does not count it beyond the edge */
+                xinters[n] = MIN(x, MAX(p1.x, p2.x));
+                n++;
+            }
+            p1 = p2;
+        }
+        if (n < 2)
+            continue;
+        _SortDoubles(xinters, n);
+        row = output + (i - firstRow) * nColumns;
+        /* an odd number of intersections at the right of the point */
+        for (j=0; j + 1 < n; j += 2)
+        {
+            _FillSpan(row, nColumns, x0, xStep, xinters[j], xinters[j + 1]);
+        }
+    }
+    free(xinters);
 
-    p = output;
-    for (i=0; i < N_points_xy; i++)
+    /* points on a vertex */
+    for (k=0; k < N_vertices; k++)
     {
-        *p = _InsidePolygonInt(polygon, N_vertices, *point, border);
-        p++;
-        point++;
+        if ((yStep == 0.0) || (xStep == 0.0))
+            break;
+        r = (long) floor((polygon[k].y - y0) / yStep + 0.5);
+        c = (long) floor((polygon[k].x - x0) / xStep + 0.5);
+        for (i=(int) (r - 1); i <= r + 1; i++)
+        {
+            if ((i < firstRow) || (i >= lastRow))
+                continue;
+            if ((y0 + yStep * i) != polygon[k].y)
+                continue;
+            for (j=(int) (c - 1); j <= c + 1; j++)
+            {
+                if ((j < 0) || (j >= nColumns))
+                    continue;
+                x = x0 + xStep * j;
+                if (x == polygon[k].x)
+                    output[(i - firstRow) * nColumns + j] = (unsigned char) border_value;
+            }
+        }
     }
+    return 0;
 }
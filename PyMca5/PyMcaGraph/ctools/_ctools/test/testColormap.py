@@ -641,6 +641,40 @@ def testInf(self):
                       duration)
 
 
+# TestColormapThreads #########################################################
+
+class TestColormapThreads(_TestColormap):
+    """Test fill pixmap split in several threads and in a provided buffer."""
+
+    def testThreadsAndOutput(self):
+        """Test pixmap generation for large data with several threads."""
+        self._log("TestColormapThreads.testThreadsAndOutput")
+        colormap = self.COLORMAPS['red 256']
+        data = np.arange(1024 * 1030, dtype=np.float64) % 60000 + 1.
+        data.shape = 1030, 1024
+        for dtype in (np.float32, np.float64, np.uint16, np.int32):
+            typedData = np.asarray(data, dtype=dtype)
+            for isLog10 in (False, True):
+                reference, usedRange = ctools.dataToRGBAColormap(
+                    typedData, colormap, None, None, isLog10, None,
+                    nThreads=1)
+                output = np.empty(data.shape + (4,), dtype=np.uint8)
+                pixmap, threadsRange = ctools.dataToRGBAColormap(
+                    typedData, colormap, None, None, isLog10, None,
+                    output=output, nThreads=3)
+                self.assertTrue(pixmap is output)
+                self.assertEqual(usedRange, threadsRange)
+                self.assertTrue(np.all(np.equal(pixmap, reference)))
+
+                # Compare with control code
+                self._testColormap(typedData, colormap, None, None,
+                                   isLog10=isLog10)
+
+        self.assertRaises(ValueError, ctools.dataToRGBAColormap,
+                          data, colormap, output=np.empty((10, 4), np.uint8))
+
+
+
 # main ########################################################################
 
 if __name__ == '__main__':
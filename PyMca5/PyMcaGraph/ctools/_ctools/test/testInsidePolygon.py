@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+"""Tests for C pnpoly and polygonFillMask"""
+
+
+# import ######################################################################
+
+import numpy as np
+try:
+    import unittest
+except ImportError:
+    import unittest2 as unittest
+
+from PyMca5.PyMcaGraph import ctools
+
+
+# TestInsidePolygon ###########################################################
+
+class TestInsidePolygon(unittest.TestCase):
+    """Test the point in polygon routines in C."""
+
+    def _gridPoints(self, shape, origin, scale):
+        x = origin[0] + scale[0] * np.arange(shape[1])
+        y = origin[1] + scale[1] * np.arange(shape[0])
+        xx, yy = np.meshgrid(x, y)
+        points = np.zeros((xx.size, 2), dtype=np.float64)
+        points[:, 0] = xx.ravel()
+        points[:, 1] = yy.ravel()
+        return points
+
+    def testSquare(self):
+        vertices = np.array(((1.5, 1.5), (5.5, 1.5), (5.5, 3.5), (1.5, 3.5)))
+        expected = np.zeros((6, 8), dtype=np.uint8)
+        expected[2:4, 2:6] = 1
+        mask = ctools.polygonFillMask(vertices, expected.shape)
+        self.assertTrue(np.array_equal(mask, expected))
+        points = self._gridPoints(expected.shape, (0., 0.), (1., 1.))
+        mask = ctools.pnpoly(vertices, points)
+        self.assertTrue(np.array_equal(mask, expected.ravel()))
+
+    def testFillVsPnpoly(self):
+        """polygonFillMask gives the same result as pnpoly on the grid"""
+        rng = np.random.RandomState(0)
+        for trial in range(50):
+            shape = rng.randint(1, 60), rng.randint(1, 60)
+            nVertices = rng.randint(3, 20)
+            if trial % 2:
+                # vertices on grid points
+                vertices = rng.randint(-3, 63, (nVertices, 2)).astype(np.float64)
+                origin, scale = (0., 0.), (1., 1.)
+            else:
+                vertices = rng.uniform(-10., 70., (nVertices, 2))
+                origin = rng.uniform(-2., 2., 2)
+                scale = rng.uniform(0.5, 1.5, 2) * rng.choice((-1, 1), 2)
+            border = bool(trial % 3)
+            points = self._gridPoints(shape, origin, scale)
+            expected = ctools.pnpoly(vertices, points, border, nThreads=1)
+            for nThreads in (1, 3):
+                mask = ctools.polygonFillMask(vertices, shape, origin, scale,
+                                              border, nThreads=nThreads)
+                self.assertTrue(np.array_equal(mask.ravel(), expected))
+
+    def testThreads(self):
+        """pnpoly gives the same result with several threads"""
+        rng = np.random.RandomState(1)
+        vertices = rng.uniform(0., 100., (25, 2))
+        for dtype in (np.float64, np.float32, np.int32):
+            points = rng.uniform(-10., 110., (300000, 2)).astype(dtype)
+            expected = ctools.pnpoly(vertices, points, nThreads=1)
+            mask = ctools.pnpoly(vertices, points, nThreads=4)
+            self.assertTrue(np.array_equal(mask, expected))
+
+
+# main ########################################################################
+
+if __name__ == '__main__':
+    import sys
+
+    unittest.main(argv=sys.argv[:])
@@ -30,7 +30,7 @@
 import sys
 import os
 import numpy
-from PyMca5.PyMcaGraph.ctools import pnpoly
+from PyMca5.PyMcaGraph.ctools import polygonFillMask
 from . import RGBCorrelatorGraph
 from . import ColormapDialog
 qt = RGBCorrelatorGraph.qt
@@ -1799,18 +1799,12 @@ def _handlePolygonMask(self, ddict):
         else:
             print("Cannot handle polygon mask")
             return
-        x = self._xScale[0] + self._xScale[1] * numpy.arange(imageShape[1])
-        y = self._yScale[0] + self._yScale[1] * numpy.arange(imageShape[0])
-        X, Y = numpy.meshgrid(x, y)
-        X.shape = -1
-        Y.shape = -1
-        Z = numpy.zeros((imageShape[1]*imageShape[0], 2))
-        Z[:, 0] = X
-        Z[:, 1] = Y
-        X = None
-        Y = None
-        mask = pnpoly(ddict['points'][:-1], Z, 1)
-        mask.shape = imageShape
+        # scanline fill of the polygon on the grid of pixel coordinates
+        mask = polygonFillMask(ddict['points'][:-1],
+                               imageShape[0:2],
+                               origin=(self._xScale[0], self._yScale[0]),
+                               scale=(self._xScale[1], self._yScale[1]),
+                               border=True)
         if self.__selectionMask is None:
             self.__selectionMask = mask
         else:
@@ -41,6 +41,7 @@
 import os
 import numpy
 from PyMca5.PyMcaGraph.ctools import pnpoly
+from PyMca5.PyMcaCore import RGBCorrelatorCore
 DEBUG = 0
 
 from . import PlotWindow
@@ -188,10 +189,7 @@ def getDensityData(self, bins=None):
             bins = self._bins
         x0 = x.min()
         y0 = y.min()
-        image = numpy.histogram2d(y, x,
-                                  bins=bins,
-                                  #range=(binsY, binsX),
-                                  normed=False)
+        image = RGBCorrelatorCore.histogram2d(y, x, bins=bins)
         self._binsX = image[2]
         self._binsY = image[1]
         self._bins = bins
@@ -1593,6 +1593,13 @@ def addCurve(self, x, y, legend=None, info=None, replace=False, replot=True,
            own = self._ownSignal
         if own and (legend in self.dataObjectsDict):
             # The curve is already registered
+            if self._isCurveDataUpdate(legend, x, y, info=info,
+                                replace=replace, color=color, symbol=symbol,
+                                linestyle=linestyle, xlabel=xlabel, ylabel=ylabel, yaxis=yaxis,
+                                xerror=xerror, yerror=yerror, **kw):
+                # live update of the data only
+                self.updateCurveData(legend, x, y, info=info, replot=replot)
+                return
             super(McaWindow, self).addCurve(x, y, legend=legend, info=info,
                                 replace=replace, replot=replot, color=color, symbol=symbol,
                                 linestyle=linestyle, xlabel=xlabel, ylabel=ylabel, yaxis=yaxis,
@@ -32,6 +32,7 @@
 import os
 import time
 import subprocess
+import multiprocessing
 
 from PyMca5.PyMcaGui import PyMcaQt as qt
 
@@ -46,7 +47,7 @@
     HDF5SUPPORT = False
 from PyMca5.PyMcaIO import ConfigDict
 from PyMca5.PyMcaPhysics.xrf import McaAdvancedFitBatch
-from PyMca5.PyMcaGui.physics.xrf import QtMcaAdvancedFitReport
+from PyMca5.PyMcaPhysics.xrf import McaAdvancedFitReport
 from PyMca5.PyMcaCore import EdfFileLayer
 from PyMca5.PyMcaCore import SpecFileLayer
 from PyMca5.PyMcaGui import IconDict
@@ -1405,6 +1406,7 @@ def __init__(self,parent=None, name="BatchWindow", fl=0, actions = 0, outputdir=
         self.table = table
         self.__ended         = False
         self.__writingReport = False
+        self._reportWriter   = None
 
         if actions: self.addButtons()
         self.show()
@@ -1463,7 +1465,7 @@ def onNewFile(self, file, filelist, filestep, filebeginoffset =0, fileendoffset
         index  = indexlist.index(filelist.index(file)) - filebeginoffset
         #print index + filebeginoffset
         if index == 0:
-            self.report= None
+            self._closeReportWriter()
             if self.html:
                 self.htmlindex = os.path.join(self.outputdir, 'HTML')
                 htmlindex = os.path.join(os.path.basename(file)+"_HTMLDIR",
@@ -1597,7 +1599,7 @@ def __htmlReport(self, filename, key, outputdir, useExistingFiles, info=None, fi
         if not os.path.exists(fitfile):
             print("fit file %s does not exists!" % fitfile)
             return
-        if self.report is None:
+        if self._reportWriter is None:
             #first file
             self.forcereport = 0
             self._concentrationsFile = os.path.join(outputdir,
@@ -1615,25 +1617,38 @@ def __htmlReport(self, filename, key, outputdir, useExistingFiles, info=None, fi
                 #this is to generate the concentrations file
                 #from an already existing set of fitfiles
                 self.forcereport = 1
+            #the reports are written by a worker process and the
+            #index entries are appended as soon as they are ready.
+            #A chunk is already one of several batch processes, it
+            #writes its reports itself. So does a frozen binary, that
+            #cannot reliably start a new interpreter.
+            if (self.chunk is None) and \
+               (not getattr(sys, "frozen", False)):
+                nProcesses = 1
+            else:
+                nProcesses = 0
+            #html set to 2 gives summary reports without plot
+            self._reportWriter = McaAdvancedFitReport.McaAdvancedFitReportWriter(\
+                        os.path.join(outputdir, "HTML"), table = self.table,
+                        summary = (self.html == 2),
+                        nProcesses = nProcesses,
+                        index = self.chunk is None)
         if self.forcereport or (not useExistingResult):
-            self.report = QtMcaAdvancedFitReport.QtMcaAdvancedFitReport(fitfile = fitfile,
-                        outfile = outfile, table = self.table)
+            self._reportWriter.addFitFile(fitfile, outfile)
+        else:
+            self._reportWriter.addExistingReport(outfile)
+
+    def _closeReportWriter(self):
+        """
+        Wait for the pending reports. Their index entries are then complete.
+        """
+        if self._reportWriter is not None:
             self.__writingReport = True
-            a=self.report.writeReport()
-            """
-            #The code below has been moved to McaAdvancedFitBatch.py
-            if len(self.report._concentrationsTextASCII) > 1:
-                text  = ""
-                text += "SOURCE: "+ filename +"\n"
-                text += "KEY: "+key+"\n"
-                text += self.report._concentrationsTextASCII + "\n"
-                f=open(self._concentrationsFile,"a")
-                f.write(text)
-                f.close()
-            """
+            self._reportWriter.close()
             self.__writingReport = False
-            #qt.QApplication.postEvent(self, McaCustomEvent.McaCustomEvent({'event':'reportWritten'}))
-            self.onReportWritten()
+            self._reportWriter = None
+            return True
+        return False
 
     def onEnd(self,dict):
         self.__ended = True
@@ -1656,7 +1671,7 @@ def onEnd(self,dict):
             if 'savedimages' in dict:
                 self.plotImages(dict['savedimages'])
         if self.html:
-            if not self.__writingReport:
+            if (not self._closeReportWriter()) or (self.chunk is not None):
                 directory = os.path.join(self.outputdir,"HTML")
                 a = HtmlIndex.HtmlIndex(directory)
                 a.buildRecursiveIndex()
@@ -1722,6 +1737,8 @@ def plotImages(self,imagelist):
             os.system(cmd)
 
 def main():
+    # processes spawned by a frozen binary must not start a new batch
+    multiprocessing.freeze_support()
     sys.excepthook = qt.exceptionHandler
     import getopt
     options     = 'f'
@@ -1771,6 +1788,7 @@ def main():
         elif opt in ('--mcastep'):
             mcastep  = int(arg)
         elif opt in ('--html'):
+            #1 for full reports, 2 for summary reports
             html  = int(arg)
         elif opt in ('--htmlindex'):
             htmlindex  = arg
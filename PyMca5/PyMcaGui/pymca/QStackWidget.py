@@ -1006,6 +1006,7 @@ def sendMcaSelection(self, mcaObject, key = None, legend = None, action = None):
 
     def setSelectionMask(self, mask, instance_id=None):
         self._selectionMask = mask
+        self._selectionMaskUpdated()
         if instance_id == id(self):
             return
 
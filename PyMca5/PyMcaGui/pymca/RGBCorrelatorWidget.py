@@ -39,6 +39,7 @@
 from PyMca5.PyMcaIO import ArraySave
 from PyMca5 import PyMcaDirs
 from PyMca5.PyMcaCore import EdfFileDataSource
+from PyMca5.PyMcaCore import RGBCorrelatorCore
 from PyMca5.PyMcaGui.pymca import ExternalImagesWindow
 from PyMca5.PyMcaIO import TiffIO
 from PyMca5.PyMcaGui.io import PyMcaFileDialogs
@@ -180,6 +181,8 @@ def __init__(self, parent = None, bgrx = False, replace = False):
             self.bgrx = "RGBX"
         self._imageList = []
         self._imageDict = {}
+        # cached image statistics
+        self._core = RGBCorrelatorCore.RGBCorrelatorCore()
         self.__imageLength = None
         self.__redLabel = None
         self.__greenLabel = None
@@ -487,9 +490,10 @@ def addImage(self, image0, label = None):
             self._imageList.append(label)
         self._imageDict[label] = {}
         self._imageDict[label]['image'] = image
-        tmp = numpy.ravel(image)
-        self._imageDict[label]['min'] = min(tmp)
-        self._imageDict[label]['max'] = max(tmp)
+        self._core.addImage(image, label)
+        statistics = self._core.getStatistics(label)
+        self._imageDict[label]['min'] = statistics['min']
+        self._imageDict[label]['max'] = statistics['max']
 
         self.tableWidget.build(self._imageList)
         i = 0
@@ -542,6 +546,7 @@ def removeImage(self, label):
         self._imageDict[label] = {}
         del self._imageDict[label]
         del self._imageList[self._imageList.index(label)]
+        self._core.removeImage(label)
         if self.__redLabel == label:   self.__redLabel = None
         if self.__greenLabel == label: self.__greenLabel = None
         if self.__blueLabel == label:self.__blueLabel = None
@@ -594,6 +599,7 @@ def setImageShape(self, shape):
         self._updateSizeLabel()
         for key in self._imageDict.keys():
             self._imageDict[key]['image'].shape = shape
+            self._core.addImage(self._imageDict[key]['image'], key)
         self.tableWidget._update()
 
     def transposeImages(self):
@@ -610,6 +616,7 @@ def transposeImages(self):
         self._updateSizeLabel()
         for key in self._imageDict.keys():
             self._imageDict[key]['image'] = self._imageDict[key]['image'].T
+            self._core.addImage(self._imageDict[key]['image'], key)
         self.tableWidget._update()
 
     def _updateSizeLabel(self):
@@ -632,6 +639,7 @@ def reset(self):
         self._tableSlot({'r':[],'g':[],'b':[]})
         self._imageList = []
         self._imageDict = {}
+        self._core.reset()
         self.__imageLength = None
         self.__imageShape = None
         self.__redLabel    = None
@@ -33,6 +33,7 @@
 from PyMca5.PyMcaGui import ColormapDialog
 from PyMca5 import spslut
 from PyMca5.PyMcaGui import QPyMcaMatplotlibSave
+from PyMca5.PyMcaCore import RGBCorrelatorCore
 MATPLOTLIB = True
 
 convertToRowAndColumn = MaskImageWidget.convertToRowAndColumn
@@ -62,6 +63,7 @@ def __init__(self, parent = None, math = True, replace = False,
         self.imageList   = None
         self.imageDict   = None
         self._imageData = None
+        self._expressionDict = {}
         self._xScale = None
         self._yScale = None
         self.__imagePixmap   = None
@@ -201,7 +203,7 @@ def _calculateClicked(self):
             name = name.replace(item, tmpLabel)
             i = i + 1
         try:
-            self._imageData = 1 * eval(expression)
+            self._imageData = self._evaluate(text, expression)
         except:
             error = sys.exc_info()
             text = "Failed to evaluate expression:\n"
@@ -212,6 +214,25 @@ def _calculateClicked(self):
         self.plotImage()
         self.setName("(%s)" % name)
 
+    def _evaluate(self, text, expression):
+        """
+        Evaluate the text blockwise if it only contains element wise
+        operations. Otherwise evaluate the expression as it is.
+        """
+        if text not in self._expressionDict:
+            try:
+                self._expressionDict[text] = \
+                                RGBCorrelatorCore.ImageExpression(text)
+            except RGBCorrelatorCore.ExpressionError:
+                if DEBUG:
+                    print("Expression cannot be evaluated blockwise")
+                self._expressionDict[text] = None
+        compiled = self._expressionDict[text]
+        if compiled is None:
+            return 1 * eval(expression)
+        images = [self.imageDict[label]['image'] for label in self.imageList]
+        return 1 * compiled.evaluate(images)
+
     def setName(self, name):
         self.name.setText(name)
         self.graphWidget.graph.setGraphTitle("%s" % name)
@@ -1295,6 +1295,13 @@ def addCurve(self, x, y, legend=None, info=None, replace=False, replot=True,
                 yaxis =  info.get("plot_yaxis", None)
         if legend in self.dataObjectsDict:
             # the info is changing
+            if self._isCurveDataUpdate(legend, x, y, info=info,
+                                replace=replace, color=color, symbol=symbol,
+                                linestyle=linestyle, xlabel=xlabel, ylabel=ylabel, yaxis=yaxis,
+                                xerror=xerror, yerror=yerror, **kw):
+                # live update of the data only
+                self.updateCurveData(legend, x, y, info=info, replot=replot)
+                return
             super(ScanWindow, self).addCurve(x, y, legend=legend, info=info,
                                 replace=replace, replot=replot, color=color, symbol=symbol,
                                 linestyle=linestyle, xlabel=xlabel, ylabel=ylabel, yaxis=yaxis,
@@ -0,0 +1,364 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V.A. Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+__doc__ = """
+Headless FFT based alignment of stacks of images.
+
+The images are Fourier transformed in blocks (real FFTs of stacked frames)
+by a pool of threads, the spectrum of the reference image is calculated only
+once and the shifted images are written block by block into the output
+(a numpy array or an HDF5 dataset) without keeping a copy of the full stack.
+
+Usage:
+
+.. code-block:: python
+
+    alignment = FFTAlignment(reference, offsets=[10, 10], widths=[200, 200])
+    shifts = alignment.calculateShifts(stack, mcaIndex=0)
+    alignment.shiftStack(stack, shifts, mcaIndex=0, output=h5Dataset)
+"""
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import numpy
+from numpy.fft import rfft2, irfft2, fftshift
+from . import ImageRegistration
+
+DEBUG = 0
+
+def getNumberOfThreads():
+    try:
+        return max(1, multiprocessing.cpu_count())
+    except NotImplementedError:
+        return 1
+
+def getRectangularWindow(shape, apodization=(10, 10), dtype=numpy.float32):
+    """
+    Window used to supress the borders of the images prior to the FFT.
+
+    :param shape: Shape of the images
+    :param apodization: Number of pixels to be ignored at each border
+    :return: 2D array of ones with the borders set to zero
+    """
+    window = numpy.zeros(shape, dtype=dtype)
+    window[apodization[0]:shape[0] - apodization[0],
+           apodization[1]:shape[1] - apodization[1]] = 1
+    return window
+
+def getFrame(data, index, mcaIndex=0):
+    """
+    Return the image at the given index of a stack of images
+
+    :param data: 3D array (or HDF5 dataset) with the stack
+    :param index: Image index
+    :param mcaIndex: Stack index of the images. One of 0, 2 or -1
+    """
+    if mcaIndex == 0:
+        return data[index]
+    elif mcaIndex in [2, -1]:
+        return data[:, :, index]
+    raise IndexError("Only stacks of images or spectra supported. " + \
+                     "1D index should be 0 or 2")
+
+def hermitianSpectrum(halfSpectrum, shape):
+    """
+    Rebuild the full 2D spectrum of a real image from its real FFT.
+
+    :param halfSpectrum: Output of numpy.fft.rfft2 (last axis halved)
+    :param shape: Shape of the original image
+    :return: The output numpy.fft.fft2 would give on the same image
+    """
+    n0, n1 = shape[-2:]
+    full = numpy.zeros(halfSpectrum.shape[:-1] + (n1,),
+                       dtype=halfSpectrum.dtype)
+    nHalf = halfSpectrum.shape[-1]
+    full[..., :nHalf] = halfSpectrum
+    if n1 > nHalf:
+        k0 = (-numpy.arange(n0)) % n0
+        k1 = n1 - numpy.arange(nHalf, n1)
+        full[..., nHalf:] = \
+                halfSpectrum[..., k0, :][..., k1].conjugate()
+    return full
+
+def upsampledCorrelationPeak(crossPower, coarsePeak, upsampling,
+                             region=1.5):
+    """
+    Locate with subpixel accuracy the maximum of the inverse FFT of the
+    normalized cross-power spectrum by evaluating its matrix DFT on a fine
+    grid around the coarse peak (Guizar-Sicairos, Thurman and Fienup,
+    Opt. Lett. 33, 156-158 (2008)).
+
+    :param crossPower: Full 2D normalized cross-power spectrum
+    :param coarsePeak: Integer position (wrapped to [-N/2, N/2)) of the peak
+    :param upsampling: Upsampling factor (1/upsampling pixel accuracy)
+    :param region: Size in pixels of the refined region around the peak
+    :return: Subpixel position of the peak
+    """
+    n0, n1 = crossPower.shape
+    npoints = int(numpy.ceil(region * upsampling))
+    if npoints % 2 == 0:
+        npoints += 1
+    delta = (numpy.arange(npoints) - npoints // 2) / float(upsampling)
+    positions0 = coarsePeak[0] + delta
+    positions1 = coarsePeak[1] + delta
+    k0 = numpy.fft.fftfreq(n0) * n0
+    k1 = numpy.fft.fftfreq(n1) * n1
+    kernel0 = numpy.exp((2j * numpy.pi / n0) * numpy.outer(positions0, k0))
+    kernel1 = numpy.exp((2j * numpy.pi / n1) * numpy.outer(k1, positions1))
+    correlation = abs(numpy.dot(numpy.dot(kernel0, crossPower), kernel1))
+    i0, i1 = numpy.unravel_index(numpy.argmax(correlation), correlation.shape)
+    return positions0[i0], positions1[i1]
+
+class FFTAlignment(object):
+    def __init__(self, reference, offsets=None, widths=None,
+                 apodization=(10, 10), upsampling=1, nthreads=None,
+                 blocksize=16, dtype=numpy.float32):
+        """
+        :param reference: Reference image
+        :param offsets: Origin of the region of interest used to align
+        :param widths: Size of the region of interest used to align
+        :param apodization: Border pixels of the region to be ignored
+        :param upsampling: If larger than one, the correlation peak is refined
+                           to 1/upsampling of a pixel with an upsampled DFT.
+                           Otherwise a centroid around the peak is used.
+        :param nthreads: Number of worker threads. Default is one per CPU.
+        :param blocksize: Number of images transformed in one go
+        """
+        self._dtype = dtype
+        self.upsampling = upsampling
+        self.blocksize = max(1, int(blocksize))
+        if nthreads is None:
+            nthreads = getNumberOfThreads()
+        self.nthreads = max(1, int(nthreads))
+        self._apodization = apodization
+        self._referenceFFT = None
+        self.setReference(reference, offsets=offsets, widths=widths)
+
+    def setReference(self, reference, offsets=None, widths=None):
+        """
+        Set the reference image and calculate (only once) its spectrum.
+        """
+        if offsets is None:
+            offsets = [0, 0]
+        if widths is None:
+            widths = [reference.shape[0] - offsets[0],
+                      reference.shape[1] - offsets[1]]
+        self._offsets = [int(offsets[0]), int(offsets[1])]
+        self._widths = [int(widths[0]), int(widths[1])]
+        self._window = getRectangularWindow(self._widths,
+                                            self._apodization,
+                                            dtype=self._dtype)
+        image = self._windowed(reference)
+        self._referenceFFT = rfft2(image)
+        self._referenceAbs = abs(self._referenceFFT)
+        self._referenceAbs[self._referenceAbs < 1.0e-20] = 1.0
+
+    def getReferenceFFT(self):
+        return self._referenceFFT
+
+    def _windowed(self, image):
+        o0, o1 = self._offsets
+        w0, w1 = self._widths
+        return self._window * numpy.asarray(image[o0:o0 + w0, o1:o1 + w1],
+                                            dtype=self._dtype)
+
+    def _readBlock(self, data, indices, mcaIndex):
+        block = numpy.zeros((len(indices),) + tuple(self._widths),
+                            dtype=self._dtype)
+        o0, o1 = self._offsets
+        w0, w1 = self._widths
+        if mcaIndex == 0:
+            block[:] = data[indices[0]:indices[-1] + 1, o0:o0 + w0, o1:o1 + w1]
+        else:
+            block[:] = numpy.rollaxis(numpy.asarray(\
+                           data[o0:o0 + w0, o1:o1 + w1,
+                                indices[0]:indices[-1] + 1]), 2)
+        block *= self._window
+        return block
+
+    def _blockShifts(self, data, indices, mcaIndex):
+        block = self._readBlock(data, indices, mcaIndex)
+        shape = block.shape[1:]
+        spectra = rfft2(block)
+        absSpectra = abs(spectra)
+        absSpectra[absSpectra < 1.0e-20] = 1.0
+        crossPower = (self._referenceFFT * spectra.conjugate()) / \
+                     (self._referenceAbs * absSpectra)
+        correlation = abs(fftshift(irfft2(crossPower, s=shape), axes=(-2, -1)))
+        if self.upsampling > 1:
+            fullCrossPower = hermitianSpectrum(crossPower, shape)
+        shifts = numpy.zeros((len(indices), 2), numpy.float64)
+        w = 3
+        for i in range(len(indices)):
+            res = correlation[i]
+            a0, a1 = numpy.unravel_index(numpy.argmax(res), shape)
+            if self.upsampling > 1:
+                peak = upsampledCorrelationPeak(fullCrossPower[i],
+                                                (a0 - shape[0] // 2,
+                                                 a1 - shape[1] // 2),
+                                                self.upsampling)
+                shifts[i] = -peak[0], -peak[1]
+                continue
+            # centroid around the peak as ImageRegistration does
+            a00 = int(max(a0 - w, 0))
+            a01 = int(min(a0 + w + 1, shape[0]))
+            a10 = int(max(a1 - w, 0))
+            a11 = int(min(a1 + w + 1, shape[1]))
+            region = res[a00:a01, a10:a11]
+            region = region * (region > 0.1 * res[a0, a1])
+            total = region.sum()
+            x0 = (region.sum(axis=1) * numpy.arange(a00, a01)).sum() / total
+            x1 = (region.sum(axis=0) * numpy.arange(a10, a11)).sum() / total
+            shifts[i] = shape[0] // 2 - x0, shape[1] // 2 - x1
+        return shifts
+
+    def _blocks(self, nImages):
+        return [list(range(i, min(i + self.blocksize, nImages))) \
+                for i in range(0, nImages, self.blocksize)]
+
+    def calculateShifts(self, data, mcaIndex=0, progressCallback=None):
+        """
+        Calculate the shifts of all the images of the stack respect to the
+        reference.
+
+        :param data: 3D array or HDF5 dataset
+        :param mcaIndex: Stack index of the images. One of 0, 2 or -1
+        :param progressCallback: Optional callable receiving the percentage
+        :return: Array of shape (nImages, 2) to be used with shiftStack
+        """
+        if mcaIndex not in [0, 2, -1]:
+            raise IndexError("Only stacks of images or spectra supported. " + \
+                             "1D index should be 0 or 2")
+        nImages = data.shape[mcaIndex]
+        shifts = numpy.zeros((nImages, 2), numpy.float64)
+        blocks = self._blocks(nImages)
+        function = lambda indices: self._blockShifts(data, indices, mcaIndex)
+        if self.nthreads > 1 and len(blocks) > 1:
+            pool = ThreadPool(self.nthreads)
+            results = pool.imap(function, blocks)
+        else:
+            pool = None
+            results = (function(indices) for indices in blocks)
+        try:
+            for indices, blockShifts in zip(blocks, results):
+                shifts[indices[0]:indices[-1] + 1] = blockShifts
+                if DEBUG:
+                    for i in indices:
+                        print("Index = %d shift = %.4f, %.4f" % \
+                              (i, shifts[i][0], shifts[i][1]))
+                if progressCallback is not None:
+                    progressCallback((100. * (indices[-1] + 1)) / nImages)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        return shifts
+
+    def shiftStack(self, data, shifts, mcaIndex=0, output=None,
+                   crop=True, progressCallback=None):
+        """
+        Apply the shifts to the images of the stack.
+
+        :param data: 3D array or HDF5 dataset with the input images
+        :param shifts: Shifts as returned by calculateShifts
+        :param mcaIndex: Stack index of the images. One of 0, 2 or -1
+        :param output: Array or HDF5 dataset of shape (nImages, d0, d1).
+                       If None, data are replaced in place.
+        :param crop: If True, the region not covered by all the shifted
+                     images is set to zero
+        :param progressCallback: Optional callable receiving the percentage
+        """
+        return shiftStack(data, shifts, mcaIndex=mcaIndex, output=output,
+                          crop=crop, nthreads=self.nthreads,
+                          blocksize=self.blocksize,
+                          progressCallback=progressCallback)
+
+def shiftStack(data, shifts, mcaIndex=0, output=None, crop=True,
+               nthreads=None, blocksize=16, progressCallback=None):
+    """
+    Shift the images of a stack block by block, writing each block into
+    the output as soon as it is ready. See FFTAlignment.shiftStack
+    """
+    if mcaIndex not in [0, 2, -1]:
+        raise IndexError("Only stacks of images or spectra supported. " + \
+                         "1D index should be 0 or 2")
+    shifts = numpy.asarray(shifts)
+    nImages = data.shape[mcaIndex]
+    if mcaIndex == 0:
+        shape = data.shape[1], data.shape[2]
+    else:
+        shape = data.shape[0], data.shape[1]
+    window = numpy.ones(shape, numpy.float32)
+    if crop:
+        d0_start, d0_end, d1_start, d1_end = \
+                ImageRegistration.get_crop_indices(shape,
+                                                   shifts[:, 0],
+                                                   shifts[:, 1])
+        window[:] = 0.0
+        window[int(d0_start):int(d0_end), int(d1_start):int(d1_end)] = 1.0
+    if nthreads is None:
+        nthreads = getNumberOfThreads()
+    blocksize = max(1, int(blocksize))
+    blocks = [list(range(i, min(i + blocksize, nImages))) \
+              for i in range(0, nImages, blocksize)]
+
+    def function(indices):
+        block = numpy.zeros((len(indices),) + shape, numpy.float32)
+        for j, i in enumerate(indices):
+            block[j] = ImageRegistration.shiftImage(\
+                            getFrame(data, i, mcaIndex), shifts[i]) * window
+        return block
+
+    if nthreads > 1 and len(blocks) > 1:
+        pool = ThreadPool(nthreads)
+        results = pool.imap(function, blocks)
+    else:
+        pool = None
+        results = (function(indices) for indices in blocks)
+    try:
+        for indices, block in zip(blocks, results):
+            i0 = indices[0]
+            i1 = indices[-1] + 1
+            if output is not None:
+                output[i0:i1] = block
+            elif mcaIndex == 0:
+                data[i0:i1] = block
+            else:
+                data[:, :, i0:i1] = numpy.rollaxis(block, 0, 3)
+            if DEBUG:
+                print("Images %d to %d shifted" % (i0, i1 - 1))
+            if progressCallback is not None:
+                progressCallback((100. * i1) / nImages)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return output
@@ -33,4 +33,4 @@
 try:
     from median import *
 except ImportError:
-    from .median import medfilt2d, medfilt1d
+    from .median import medfilt2d, medfilt1d, medfilt1d_stack, medfilt2d_stack
@@ -35,8 +35,32 @@
 except ImportError:
     from PyMca5.PyMcaSciPy.signal import mediantools
 
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import numpy
 from numpy import asarray
 
+def _getNumberOfThreads(nthreads=None):
+    if nthreads is None:
+        try:
+            nthreads = multiprocessing.cpu_count()
+        except NotImplementedError:
+            nthreads = 1
+    return max(1, int(nthreads))
+
+def _runBlocks(function, blocks, nthreads):
+    # the C routines release the GIL, therefore threads run concurrently
+    if (nthreads > 1) and (len(blocks) > 1):
+        pool = ThreadPool(min(nthreads, len(blocks)))
+        try:
+            pool.map(function, blocks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for block in blocks:
+            function(block)
+
 def medfilt2d(input_data, kernel_size=None, conditional=0):
     """Median filter for 2-dimensional arrays.
 
@@ -111,7 +135,169 @@ def medfilt1d(input_data, kernel_size=None, conditional=0):
         if (size % 2) != 1:
             image.shape = oldShape
             raise ValueError("Kernel_size should be odd.")
-    output = mediantools._medfilt2d(image, kernel_size, conditional)
+    if image.dtype in [numpy.float32, numpy.float64] and \
+       image.flags['C_CONTIGUOUS']:
+        image.shape = 1, -1
+        output = numpy.empty(image.shape, dtype=image.dtype)
+        mediantools._medfilt1d_rows(image, output, int(kernel_size[0]),
+                                    conditional)
+    else:
+        output = mediantools._medfilt2d(image, kernel_size, conditional)
     output.shape = oldShape
     image.shape = oldShape
     return output
+
+def medfilt1d_stack(input_data, kernel_size=3, conditional=0, axis=-1,
+                    output=None, nthreads=None, blocksize=None):
+    """Median filter of all the 1-dimensional arrays along one axis.
+
+  Description:
+
+    Apply medfilt1d to all the 1D arrays (for instance all the spectra of
+    a stack) along the given axis. The work is split in blocks of arrays
+    filtered concurrently by several threads.
+
+  Inputs:
+
+    in -- A N-dimensional input array.
+    kernel_size -- An odd integer with the size of the median window.
+    conditional -- If different from 0 implements a conditional median filter.
+    axis -- Axis along which to filter. Default is the last one.
+    output -- Optional array of the same shape as the input to receive the
+              result. It can be the input array itself.
+    nthreads -- Number of threads to be used. Default is one per CPU.
+    blocksize -- Number of arrays handled in one go. Only blocks of arrays
+                 not contiguous in memory are copied, so the memory used
+                 beyond the output is limited by this value.
+
+  Outputs: (out,)
+
+    out -- An array the same size as input containing the median filtered
+           result.
+
+    """
+    data = asarray(input_data)
+    kernel_size = int(asarray(kernel_size).ravel()[0])
+    if (kernel_size % 2) != 1:
+        raise ValueError("Kernel_size should be odd.")
+    if output is None:
+        output = numpy.empty(data.shape, dtype=data.dtype)
+    elif output.shape != data.shape:
+        raise ValueError("Output shape does not match input shape")
+    if data.ndim == 0 or data.size == 0:
+        return output
+    if data.dtype == numpy.float32:
+        dtype = numpy.float32
+    else:
+        dtype = numpy.float64
+    nthreads = _getNumberOfThreads(nthreads)
+    # put the filtered axis last
+    axis = axis % data.ndim
+    dataView = numpy.rollaxis(data, axis, data.ndim)
+    outputView = numpy.rollaxis(output, axis, output.ndim)
+    if dataView.ndim == 1:
+        dataView = dataView.reshape(1, -1)
+        outputView = outputView.reshape(1, -1)
+    nChannels = dataView.shape[-1]
+    nArrays = dataView.size // nChannels
+    if blocksize is None:
+        blocksize = max(1, min(nArrays // nthreads + 1, 4096))
+
+    if dataView.dtype == dtype and outputView.dtype == dtype and \
+       dataView.flags['C_CONTIGUOUS'] and outputView.flags['C_CONTIGUOUS']:
+        # work directly on views of the arrays
+        data2D = dataView.reshape(-1, nChannels)
+        output2D = outputView.reshape(-1, nChannels)
+        def function(block):
+            mediantools._medfilt1d_rows(data2D[block[0]:block[1]],
+                                        output2D[block[0]:block[1]],
+                                        kernel_size, conditional)
+        blocks = [(i, min(i + blocksize, nArrays)) \
+                  for i in range(0, nArrays, blocksize)]
+    else:
+        # work on contiguous copies of slices along the first axis
+        arraysPerSlice = max(1, nArrays // dataView.shape[0])
+        step = max(1, blocksize // arraysPerSlice)
+        def function(block):
+            tmp = numpy.array(dataView[block[0]:block[1]], dtype=dtype,
+                              order="C")
+            shape = tmp.shape
+            tmp.shape = -1, nChannels
+            mediantools._medfilt1d_rows(tmp, tmp, kernel_size, conditional)
+            tmp.shape = shape
+            outputView[block[0]:block[1]] = tmp
+        blocks = [(i, min(i + step, dataView.shape[0])) \
+                  for i in range(0, dataView.shape[0], step)]
+    _runBlocks(function, blocks, nthreads)
+    return output
+
+def medfilt2d_stack(input_data, kernel_size=None, conditional=0, axis=0,
+                    output=None, nthreads=None):
+    """Median filter of all the images of a stack.
+
+  Description:
+
+    Apply medfilt2d to every image of a 3-dimensional array. The images
+    are distributed among several threads.
+
+  Inputs:
+
+    in -- A 3 dimensional input array.
+    kernel_size -- A scalar or an length-2 list giving the size of the
+                   median filter window in each dimension. Elements of
+                   kernel_size should be odd.
+    conditional -- If different from 0 implements a conditional median filter.
+    axis -- Index of the images in the stack (0 or 2, -1).
+    output -- Optional array of the same shape as the input to receive the
+              result. It can be the input array itself.
+    nthreads -- Number of threads to be used. Default is one per CPU.
+
+  Outputs: (out,)
+
+    out -- An array the same size as input containing the median filtered
+           result.
+
+    """
+    data = asarray(input_data)
+    if data.ndim != 3:
+        raise ValueError("Input must be a 3-dimensional array")
+    if kernel_size is None:
+        kernel_size = [3] * 2
+    kernel_size = asarray(kernel_size)
+    if len(kernel_size.shape) == 0:
+        kernel_size = [kernel_size.item()] * 2
+    kernel_size = (int(kernel_size[0]), int(kernel_size[1]))
+    for size in kernel_size:
+        if (size % 2) != 1:
+            raise ValueError("Each element of kernel_size should be odd.")
+    if output is None:
+        output = numpy.empty(data.shape, dtype=data.dtype)
+    elif output.shape != data.shape:
+        raise ValueError("Output shape does not match input shape")
+    if data.dtype == numpy.float32:
+        dtype = numpy.float32
+    else:
+        dtype = numpy.float64
+    nthreads = _getNumberOfThreads(nthreads)
+    axis = axis % 3
+    if axis not in [0, 2]:
+        raise ValueError("Images must be indexed by the first or last axis")
+    nImages = data.shape[axis]
+    if axis == 0:
+        dataView = data
+        outputView = output
+    else:
+        dataView = numpy.rollaxis(data, 2)
+        outputView = numpy.rollaxis(output, 2)
+    step = max(1, nImages // (4 * nthreads))
+
+    def function(block):
+        tmp = numpy.ascontiguousarray(dataView[block[0]:block[1]],
+                                      dtype=dtype)
+        result = numpy.empty(tmp.shape, dtype=dtype)
+        mediantools._medfilt2d_stack(tmp, result, kernel_size, conditional)
+        outputView[block[0]:block[1]] = result
+
+    blocks = [(i, min(i + step, nImages)) for i in range(0, nImages, step)]
+    _runBlocks(function, blocks, nthreads)
+    return output
@@ -62,6 +62,8 @@ void int_medfilt2(int*, int*,int*,int*,int);
 void uint_medfilt2(unsigned int*,unsigned int*,int*,int*,int);
 void long_medfilt2(long*, long*,int*,int*,int);
 void ulong_medfilt2(unsigned long*,unsigned long*,int*,int*,int);
+void f_medfilt2_work(float*,float*,int*,int*,int,float*);
+void d_medfilt2_work(double*,double*,int*,int*,int,double*);
 
 /* The QUICK_SELECT routine is based on Hoare's Quickselect algorithm,
  * with unrolled recursion.
@@ -102,7 +104,7 @@ TYPE NAME(TYPE arr[], int n)                                            \
         /* Nibble from each end towards middle, swapping misordered items */ \
         piv = arr[lo];                                                  \
         for (ll = lo+1, hh = hi;; ll++, hh--) {                         \
-        while (arr[ll] < piv) ll++;                                     \
+        while ((ll <= hi) && (arr[ll] < piv)) ll++;                     \
         while (arr[hh] > piv) hh--;                                     \
         if (hh < ll) break;                                             \
         ELEM_SWAP(TYPE, arr, ll, hh);                                   \
@@ -120,18 +122,19 @@ TYPE NAME(TYPE arr[], int n)                                            \
 }
 
 /* 2-D median filter with zero-padding on edges. */
+/* The _work version receives a work buffer of Nwin[0] * Nwin[1] elements
+ * and does not allocate memory, so it can be called without the GIL. */
 #define MEDIAN_FILTER_2D(NAME, TYPE, SELECT)                            \
-void NAME(TYPE* in, TYPE* out, int* Nwin, int* Ns, int flag)            \
+void NAME##_work(TYPE* in, TYPE* out, int* Nwin, int* Ns, int flag,     \
+                 TYPE* myvals)                                          \
 {                                                                       \
     /* if flag is not 0, implements a conditional filter */             \
     int nx, ny, hN[2];                                                  \
     int pre_x, pre_y, pos_x, pos_y;                                     \
     int subx, suby, k, totN;                                            \
-    TYPE *myvals, *fptr1, *fptr2, *ptr1, *ptr2, minval=0, maxval=0;     \
+    TYPE *fptr1, *fptr2, *ptr1, *ptr2, minval=0, maxval=0;              \
                                                                         \
     totN = Nwin[0] * Nwin[1];                                           \
-    myvals = (TYPE *) check_malloc( totN * sizeof(TYPE));               \
-                                                                        \
     hN[0] = Nwin[0] >> 1;                                               \
     hN[1] = Nwin[1] >> 1;                                               \
     ptr1 = in;                                                          \
@@ -183,6 +186,14 @@ void NAME(TYPE* in, TYPE* out, int* Nwin, int* Ns, int flag)            \
                 *fptr1++ = *ptr1++;                                     \
             }                                                           \
         }                                                               \
+}                                                                       \
+                                                                        \
+void NAME(TYPE* in, TYPE* out, int* Nwin, int* Ns, int flag)            \
+{                                                                       \
+    TYPE *myvals;                                                       \
+                                                                        \
+    myvals = (TYPE *) check_malloc(Nwin[0] * Nwin[1] * sizeof(TYPE));   \
+    NAME##_work(in, out, Nwin, Ns, flag, myvals);                       \
     free(myvals);                                                       \
 }
 
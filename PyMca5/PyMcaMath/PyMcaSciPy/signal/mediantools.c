@@ -133,7 +133,7 @@ static PyObject *mediantools_median2d(PyObject *self, PyObject *args)
         PYERR("Size must be a length two sequence");
     lhelp = (long *) PyArray_DATA(a_size);
     Nwin[0] = (int) (*lhelp);
-    Nwin[1] = (int) (*(lhelp++));
+    Nwin[1] = (int) (*(lhelp + 1));
     Idims[0] = (int) (PyArray_DIMS(a_image)[0]);
     Idims[1] = (int) (PyArray_DIMS(a_image)[1]);
     }
@@ -200,8 +200,170 @@ static PyObject *mediantools_median2d(PyObject *self, PyObject *args)
 
 }
 
+/* defined in slidingmedian.c */
+extern int f_medfilt1_rows(float*, float*, long, long, int, int);
+extern int d_medfilt1_rows(double*, double*, long, long, int, int);
+/* defined in medianfilter.c */
+extern void f_medfilt2_work(float*, float*, int*, int*, int, float*);
+extern void d_medfilt2_work(double*, double*, int*, int*, int, double*);
+
+/* Check the input and the output arrays of the batched filters. Both must
+ * be C contiguous arrays of the same shape and type (float32 or float64)
+ * with the given number of dimensions and the output must be writable. */
+static int check_batch_arrays(PyObject *self, PyObject *input, PyObject *output,
+                              int nd)
+{
+    PyArrayObject *a_in, *a_out;
+    int i;
+
+    if (!PyArray_Check(input) || !PyArray_Check(output)) {
+        PyErr_SetString(GETSTATE(self)->error, "Input and output must be arrays");
+        return -1;
+    }
+    a_in = (PyArrayObject *) input;
+    a_out = (PyArrayObject *) output;
+    if ((PyArray_NDIM(a_in) != nd) || (PyArray_NDIM(a_out) != nd)) {
+        PyErr_SetString(GETSTATE(self)->error, "Wrong number of dimensions");
+        return -1;
+    }
+    for (i = 0; i < nd; i++) {
+        if (PyArray_DIMS(a_in)[i] != PyArray_DIMS(a_out)[i]) {
+            PyErr_SetString(GETSTATE(self)->error,
+                            "Input and output must have the same shape");
+            return -1;
+        }
+    }
+    if ((PyArray_TYPE(a_in) != PyArray_TYPE(a_out)) ||
+        ((PyArray_TYPE(a_in) != NPY_FLOAT) && (PyArray_TYPE(a_in) != NPY_DOUBLE))) {
+        PyErr_SetString(GETSTATE(self)->error,
+                        "Input and output must be both float32 or float64");
+        return -1;
+    }
+    if (!PyArray_ISCARRAY_RO(a_in) || !PyArray_ISCARRAY(a_out)) {
+        PyErr_SetString(GETSTATE(self)->error,
+                        "Arrays must be C contiguous and output writable");
+        return -1;
+    }
+    return 0;
+}
+
+static char doc_medfilt1d_rows[] = \
+"_medfilt1d_rows(data, output, kernel_size, conditional=0)\n\n"
+"Median filter of each row of the 2D float32 or float64 contiguous array\n"
+"data written into output (that can be data itself). The GIL is released\n"
+"during the calculation.";
+
+static PyObject *mediantools_medfilt1d_rows(PyObject *self, PyObject *args)
+{
+    PyObject *input=NULL, *output=NULL;
+    PyArrayObject *a_in, *a_out;
+    int kernel=3, conditional_flag=0, status=0;
+    long nrows, ncols;
+
+    if (!PyArg_ParseTuple(args, "OOi|i", &input, &output, &kernel,
+                          &conditional_flag))
+        return NULL;
+    if (check_batch_arrays(self, input, output, 2))
+        return NULL;
+    if ((kernel < 1) || ((kernel % 2) != 1)) {
+        PyErr_SetString(GETSTATE(self)->error, "Kernel size should be odd");
+        return NULL;
+    }
+    a_in = (PyArrayObject *) input;
+    a_out = (PyArrayObject *) output;
+    nrows = (long) PyArray_DIMS(a_in)[0];
+    ncols = (long) PyArray_DIMS(a_in)[1];
+
+    Py_BEGIN_ALLOW_THREADS
+    if (PyArray_TYPE(a_in) == NPY_FLOAT)
+        status = f_medfilt1_rows((float *) PyArray_DATA(a_in),
+                                 (float *) PyArray_DATA(a_out),
+                                 nrows, ncols, kernel, conditional_flag);
+    else
+        status = d_medfilt1_rows((double *) PyArray_DATA(a_in),
+                                 (double *) PyArray_DATA(a_out),
+                                 nrows, ncols, kernel, conditional_flag);
+    Py_END_ALLOW_THREADS
+
+    if (status) {
+        PyErr_SetString(GETSTATE(self)->error, "Memory allocation error.");
+        return NULL;
+    }
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static char doc_medfilt2d_stack[] = \
+"_medfilt2d_stack(data, output, kernel_size, conditional=0)\n\n"
+"Median filter of each image of the 3D float32 or float64 contiguous array\n"
+"data written into output. kernel_size is a length two sequence. The GIL is\n"
+"released during the calculation.";
+
+static PyObject *mediantools_medfilt2d_stack(PyObject *self, PyObject *args)
+{
+    PyObject *input=NULL, *output=NULL;
+    PyArrayObject *a_in, *a_out;
+    int conditional_flag=0;
+    int Nwin[2] = {3, 3};
+    int Idims[2] = {0, 0};
+    long i, n, nImage;
+    void *work;
+    char *pin, *pout;
+    int elsize;
+
+    if (!PyArg_ParseTuple(args, "OO(ii)|i", &input, &output, &Nwin[0], &Nwin[1],
+                          &conditional_flag))
+        return NULL;
+    if (check_batch_arrays(self, input, output, 3))
+        return NULL;
+    if ((Nwin[0] < 1) || (Nwin[1] < 1) || ((Nwin[0] % 2) != 1) ||
+        ((Nwin[1] % 2) != 1)) {
+        PyErr_SetString(GETSTATE(self)->error,
+                        "Each element of kernel_size should be odd");
+        return NULL;
+    }
+    a_in = (PyArrayObject *) input;
+    a_out = (PyArrayObject *) output;
+    n = (long) PyArray_DIMS(a_in)[0];
+    Idims[0] = (int) PyArray_DIMS(a_in)[1];
+    Idims[1] = (int) PyArray_DIMS(a_in)[2];
+    nImage = ((long) Idims[0]) * Idims[1];
+    elsize = (int) PyArray_ITEMSIZE(a_in);
+    if ((PyArray_DATA(a_in) == PyArray_DATA(a_out)) && (n > 0)) {
+        PyErr_SetString(GETSTATE(self)->error,
+                        "The 2D filter cannot work in place");
+        return NULL;
+    }
+    work = malloc(Nwin[0] * Nwin[1] * elsize);
+    if (work == NULL) {
+        PyErr_SetString(GETSTATE(self)->error, "Memory allocation error.");
+        return NULL;
+    }
+    pin = (char *) PyArray_DATA(a_in);
+    pout = (char *) PyArray_DATA(a_out);
+
+    Py_BEGIN_ALLOW_THREADS
+    for (i = 0; i < n; i++) {
+        if (PyArray_TYPE(a_in) == NPY_FLOAT)
+            f_medfilt2_work((float *) (pin + i * nImage * elsize),
+                            (float *) (pout + i * nImage * elsize),
+                            Nwin, Idims, conditional_flag, (float *) work);
+        else
+            d_medfilt2_work((double *) (pin + i * nImage * elsize),
+                            (double *) (pout + i * nImage * elsize),
+                            Nwin, Idims, conditional_flag, (double *) work);
+    }
+    Py_END_ALLOW_THREADS
+
+    free(work);
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
 static struct PyMethodDef mediantools_methods[] = {
     {"_medfilt2d", mediantools_median2d, METH_VARARGS, doc_median2d},
+    {"_medfilt1d_rows", mediantools_medfilt1d_rows, METH_VARARGS, doc_medfilt1d_rows},
+    {"_medfilt2d_stack", mediantools_medfilt2d_stack, METH_VARARGS, doc_medfilt2d_stack},
     {NULL,        NULL, 0}        /* sentinel */
 };
 
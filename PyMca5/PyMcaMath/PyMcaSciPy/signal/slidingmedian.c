@@ -0,0 +1,287 @@
+/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+/*
+ * 1-D median filter of the rows of a 2-D array.
+ *
+ * The behaviour is the one of the 2-D median filter applied to a single
+ * column: the window shrinks at the edges and, for even number of points,
+ * the lower of the two middle values is taken.
+ *
+ * Small kernels use Hoare's selection on a copy of each window. Large
+ * kernels keep the window in a double heap (max heap of the lower half,
+ * min heap of the upper half, median at the root of both) so that each
+ * new sample is inserted in O(log(kernel)) replacing the oldest one.
+ * The minimum and maximum needed by the conditional filter are tracked
+ * with monotonic queues.
+ *
+ * The functions do not touch any Python object and do not allocate memory
+ * other than with malloc, so they can be called with the GIL released.
+ */
+#include <stdlib.h>
+#include <string.h>
+
+/* kernels at least this wide use the double heap */
+#define SLIDING_MEDIAN_MIN_KERNEL 9
+
+/* defined in medianfilter.c */
+float f_quick_select(float arr[], int n);
+double d_quick_select(double arr[], int n);
+
+/* defined below */
+int f_medfilt1_rows(float*, float*, long, long, int, int);
+int d_medfilt1_rows(double*, double*, long, long, int, int);
+
+#define SLIDING_MEDIAN_1D(NAME, TYPE, SELECT)                               \
+typedef struct {                                                            \
+    TYPE *data;  /* circular buffer with the window values */               \
+    int *pos;    /* position in the heap of each value */                   \
+    int *heap;   /* points to the middle of the heap storage (median) */    \
+    int n;       /* window size */                                          \
+    int idx;     /* oldest value in the circular buffer */                  \
+    int ct;      /* number of inserted values */                            \
+} NAME##_heap;                                                              \
+                                                                            \
+static int NAME##_less(NAME##_heap* m, int i, int j)                        \
+{                                                                           \
+    return m->data[m->heap[i]] < m->data[m->heap[j]];                       \
+}                                                                           \
+                                                                            \
+static int NAME##_exchange(NAME##_heap* m, int i, int j)                    \
+{                                                                           \
+    int t = m->heap[i];                                                     \
+    m->heap[i] = m->heap[j];                                                \
+    m->heap[j] = t;                                                         \
+    m->pos[m->heap[i]] = i;                                                 \
+    m->pos[m->heap[j]] = j;                                                 \
+    return 1;                                                               \
+}                                                                           \
+                                                                            \
+static int NAME##_cmpexch(NAME##_heap* m, int i, int j)                     \
+{                                                                           \
+    return (NAME##_less(m, i, j) && NAME##_exchange(m, i, j));              \
+}                                                                           \
+                                                                            \
+/* min heap (positive indices) and max heap (negative indices) sizes */     \
+static int NAME##_minct(NAME##_heap* m) { return (m->ct - 1) / 2; }         \
+static int NAME##_maxct(NAME##_heap* m) { return m->ct / 2; }               \
+                                                                            \
+/* keep the heap properties of the items below i / 2 */                    \
+static void NAME##_minsortdown(NAME##_heap* m, int i)                       \
+{                                                                           \
+    for (; i <= NAME##_minct(m); i *= 2) {                                  \
+        if ((i > 1) && (i < NAME##_minct(m)) && NAME##_less(m, i + 1, i))   \
+            ++i;                                                            \
+        if (!NAME##_cmpexch(m, i, i / 2))                                   \
+            break;                                                          \
+    }                                                                       \
+}                                                                           \
+                                                                            \
+static void NAME##_maxsortdown(NAME##_heap* m, int i)                       \
+{                                                                           \
+    for (; i >= -NAME##_maxct(m); i *= 2) {                                 \
+        if ((i < -1) && (i > -NAME##_maxct(m)) && NAME##_less(m, i, i - 1)) \
+            --i;                                                            \
+        if (!NAME##_cmpexch(m, i / 2, i))                                   \
+            break;                                                          \
+    }                                                                       \
+}                                                                           \
+                                                                            \
+/* return 1 if the median changed */                                        \
+static int NAME##_minsortup(NAME##_heap* m, int i)                          \
+{                                                                           \
+    while ((i > 0) && NAME##_cmpexch(m, i, i / 2))                          \
+        i /= 2;                                                             \
+    return (i == 0);                                                        \
+}                                                                           \
+                                                                            \
+static int NAME##_maxsortup(NAME##_heap* m, int i)                          \
+{                                                                           \
+    while ((i < 0) && NAME##_cmpexch(m, i / 2, i))                          \
+        i /= 2;                                                             \
+    return (i == 0);                                                        \
+}                                                                           \
+                                                                            \
+static void NAME##_reset(NAME##_heap* m)                                    \
+{                                                                           \
+    int i;                                                                  \
+    m->ct = m->idx = 0;                                                     \
+    /* initial fill pattern: median, max, min, max, min ... */              \
+    for (i = m->n - 1; i >= 0; i--) {                                       \
+        m->pos[i] = ((i + 1) / 2) * ((i & 1) ? -1 : 1);                     \
+        m->heap[m->pos[i]] = i;                                             \
+    }                                                                       \
+}                                                                           \
+                                                                            \
+static void NAME##_insert(NAME##_heap* m, TYPE v)                           \
+{                                                                           \
+    int isnew = (m->ct < m->n);                                             \
+    int p = m->pos[m->idx];                                                 \
+    TYPE old = m->data[m->idx];                                             \
+    m->data[m->idx] = v;                                                    \
+    m->idx = (m->idx + 1) % m->n;                                           \
+    m->ct += isnew;                                                         \
+    if (p > 0) {                                                            \
+        if (!isnew && (old < v))                                            \
+            NAME##_minsortdown(m, p * 2);                                   \
+        else if (NAME##_minsortup(m, p))                                    \
+            NAME##_maxsortdown(m, -1);                                      \
+    } else if (p < 0) {                                                     \
+        if (!isnew && (v < old))                                            \
+            NAME##_maxsortdown(m, p * 2);                                   \
+        else if (NAME##_maxsortup(m, p))                                    \
+            NAME##_minsortdown(m, 1);                                       \
+    } else {                                                                \
+        if (NAME##_maxct(m))                                                \
+            NAME##_maxsortdown(m, -1);                                      \
+        if (NAME##_minct(m))                                                \
+            NAME##_minsortdown(m, 1);                                       \
+    }                                                                       \
+}                                                                           \
+                                                                            \
+/* median of the window [first, last] using selection on a copy */         \
+static TYPE NAME##_window(TYPE* row, long first, long last, TYPE* work,     \
+                          TYPE* minval, TYPE* maxval)                       \
+{                                                                           \
+    long i;                                                                 \
+    int k = 0;                                                              \
+    *minval = *maxval = row[first];                                         \
+    for (i = first; i <= last; i++) {                                       \
+        *minval = (row[i] < *minval) ? row[i] : *minval;                    \
+        *maxval = (row[i] > *maxval) ? row[i] : *maxval;                    \
+        work[k++] = row[i];                                                 \
+    }                                                                       \
+    return SELECT(work, k);                                                 \
+}                                                                           \
+                                                                            \
+static void NAME##_row(TYPE* row, TYPE* out, long n, int kernel, int flag,  \
+                       TYPE* work, NAME##_heap* m, long* qmin, long* qmax)  \
+{                                                                           \
+    long i, first, last;                                                    \
+    long hN = kernel / 2;                                                   \
+    long minhead = 0, mintail = 0, maxhead = 0, maxtail = 0;                \
+    TYPE median, minval = 0, maxval = 0;                                    \
+    int sliding;                                                            \
+                                                                            \
+    sliding = (m != NULL) && (n >= kernel);                                 \
+    if (sliding) {                                                          \
+        NAME##_reset(m);                                                    \
+        for (i = 0; i < kernel - 1; i++) {                                  \
+            NAME##_insert(m, row[i]);                                       \
+            if (flag) {                                                     \
+                while ((mintail > minhead) &&                               \
+                       (row[qmin[(mintail - 1) % kernel]] >= row[i]))       \
+                    mintail--;                                              \
+                qmin[(mintail++) % kernel] = i;                             \
+                while ((maxtail > maxhead) &&                               \
+                       (row[qmax[(maxtail - 1) % kernel]] <= row[i]))       \
+                    maxtail--;                                              \
+                qmax[(maxtail++) % kernel] = i;                             \
+            }                                                               \
+        }                                                                   \
+    }                                                                       \
+    for (i = 0; i < n; i++) {                                               \
+        first = (i < hN) ? 0 : i - hN;                                      \
+        last = (i + hN > n - 1) ? n - 1 : i + hN;                           \
+        if (sliding && (first == i - hN) && (last == i + hN)) {             \
+            NAME##_insert(m, row[last]);                                    \
+            median = m->data[m->heap[0]];                                   \
+            if (flag) {                                                     \
+                /* drop the value leaving the window before adding */       \
+                if ((mintail > minhead) && (qmin[minhead % kernel] < first))\
+                    minhead++;                                              \
+                if ((maxtail > maxhead) && (qmax[maxhead % kernel] < first))\
+                    maxhead++;                                              \
+                while ((mintail > minhead) &&                               \
+                       (row[qmin[(mintail - 1) % kernel]] >= row[last]))    \
+                    mintail--;                                              \
+                qmin[(mintail++) % kernel] = last;                          \
+                while ((maxtail > maxhead) &&                               \
+                       (row[qmax[(maxtail - 1) % kernel]] <= row[last]))    \
+                    maxtail--;                                              \
+                qmax[(maxtail++) % kernel] = last;                          \
+                minval = row[qmin[minhead % kernel]];                       \
+                maxval = row[qmax[maxhead % kernel]];                       \
+            }                                                               \
+        } else {                                                            \
+            median = NAME##_window(row, first, last, work, &minval, &maxval);\
+        }                                                                   \
+        if ((flag == 0) || (row[i] == minval) || (row[i] == maxval))        \
+            out[i] = median;                                                \
+        else                                                                \
+            out[i] = row[i];                                                \
+    }                                                                       \
+}                                                                           \
+                                                                            \
+/* filter the rows of a (nrows, ncols) C contiguous array. in and out can  \
+ * be the same array. Returns 0 on success and -1 on allocation error */    \
+int NAME(TYPE* in, TYPE* out, long nrows, long ncols, int kernel, int flag)\
+{                                                                           \
+    long r;                                                                 \
+    TYPE *row, *work;                                                       \
+    int *heapstorage;                                                       \
+    long *queues;                                                           \
+    NAME##_heap heap, *m = NULL;                                            \
+                                                                            \
+    if (kernel < 1)                                                         \
+        kernel = 1;                                                         \
+    row = (TYPE *) malloc(ncols * sizeof(TYPE));                            \
+    work = (TYPE *) malloc(kernel * sizeof(TYPE));                          \
+    heapstorage = (int *) malloc(2 * kernel * sizeof(int));                 \
+    queues = (long *) malloc(2 * kernel * sizeof(long));                    \
+    heap.data = (TYPE *) malloc(kernel * sizeof(TYPE));                     \
+    if ((row == NULL) || (work == NULL) || (heapstorage == NULL) ||         \
+        (queues == NULL) || (heap.data == NULL)) {                          \
+        free(row);                                                          \
+        free(work);                                                         \
+        free(heapstorage);                                                  \
+        free(queues);                                                       \
+        free(heap.data);                                                    \
+        return -1;                                                          \
+    }                                                                       \
+    if (kernel >= SLIDING_MEDIAN_MIN_KERNEL) {                              \
+        heap.n = kernel;                                                    \
+        heap.pos = heapstorage;                                             \
+        heap.heap = heapstorage + kernel + (kernel / 2);                    \
+        m = &heap;                                                          \
+    }                                                                       \
+    for (r = 0; r < nrows; r++) {                                           \
+        memcpy(row, in + r * ncols, ncols * sizeof(TYPE));                  \
+        NAME##_row(row, out + r * ncols, ncols, kernel, flag,               \
+                   work, m, queues, queues + kernel);                       \
+    }                                                                       \
+    free(row);                                                              \
+    free(work);                                                             \
+    free(heapstorage);                                                      \
+    free(queues);                                                           \
+    free(heap.data);                                                        \
+    return 0;                                                               \
+}
+
+SLIDING_MEDIAN_1D(f_medfilt1_rows, float, f_quick_select)
+SLIDING_MEDIAN_1D(d_medfilt1_rows, double, d_quick_select)
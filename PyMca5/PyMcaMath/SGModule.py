@@ -37,7 +37,11 @@
 from numpy.linalg import solve
 
 ODD_SIGN = 1.0
-__LAST_COEFF = None
+# filter coefficients already calculated, keyed by (num_points, pol_degree,
+# diff_order)
+_COEFF_CACHE = {}
+# maximum number of array elements filtered at once by the stack routines
+BLOCK_SIZE = 64 * 1024
 
 def calc_coeff(num_points, pol_degree, diff_order=0):
 
@@ -56,20 +60,9 @@ def calc_coeff(num_points, pol_degree, diff_order=0):
                      and so on ...
 
     """
-    global __LAST_COEFF
-    global __LAST_NUM_POINTS
-    global __LAST_POL_DEGREE
-    global __LAST_DIFF_ORDER
-    if __LAST_COEFF is not None:
-        if num_points == __LAST_NUM_POINTS:
-            if pol_degree == __LAST_POL_DEGREE:
-                if diff_order == __LAST_DIFF_ORDER:
-                    return __LAST_COEFF
-    else:
-        __LAST_NUM_POINTS = num_points
-        __LAST_POL_DEGREE = pol_degree
-        __LAST_DIFF_ORDER = diff_order
-
+    key = (int(num_points), int(pol_degree), int(diff_order))
+    if key in _COEFF_CACHE:
+        return _COEFF_CACHE[key].copy()
 
     # setup interpolation matrix
     # ... you might use other interpolation points
@@ -94,8 +87,8 @@ def calc_coeff(num_points, pol_degree, diff_order=0):
     if (ODD_SIGN < 0) and (diff_order %2):
         coeff *= ODD_SIGN
 
-    __LAST_COEFF = coeff
-    return coeff
+    _COEFF_CACHE[key] = coeff
+    return coeff.copy()
 
 def smooth(signal, coeff):
 
@@ -105,20 +98,134 @@ def smooth(signal, coeff):
     res = numpy.convolve(signal, coeff)
     return res[N:-N]
 
+def _applyCoefficients(data, coeff, axis=-1, blocksize=None):
+    """
+    Convolve in place all the 1D vectors of data along the given axis with
+    the filter coefficients. Only the points where the filter fully overlaps
+    the data are replaced, the first and last N points are left untouched.
+
+    The vectors are processed in blocks of at most blocksize elements
+    (default BLOCK_SIZE) using one multiply-add per coefficient on the whole
+    block instead of one numpy.convolve call per vector.
+    """
+    N = numpy.size(coeff - 1) // 2
+    ndim = len(data.shape)
+    if axis < 0:
+        axis = axis + ndim
+    if (axis < 0) or (axis >= ndim):
+        raise ValueError("Invalid axis %d" % axis)
+    nChannels = data.shape[axis]
+    if nChannels < (2 * N + 1):
+        raise ValueError("Not enough points for a %d points filter" % \
+                         (2 * N + 1))
+    nValid = nChannels - 2 * N
+    if data.dtype in [numpy.float32, numpy.float64]:
+        dtype = data.dtype
+    else:
+        dtype = numpy.float64
+    if blocksize is None:
+        blocksize = BLOCK_SIZE
+
+    # work on a 2D view (vectors, channels) or (channels, vectors) if possible
+    work = data
+    if ndim > 1:
+        if axis == 0:
+            work = data.reshape(nChannels, -1)
+        elif axis == ndim - 1:
+            work = data.reshape(-1, nChannels)
+        if (work is data) or (not numpy.may_share_memory(work, data)):
+            # middle axis or non contiguous data, keep the original shape
+            work = data
+        elif axis > 0:
+            axis = 1
+    ndim = len(work.shape)
+
+    if (ndim == 1) or ((ndim == 2) and (dtype == numpy.float64) and \
+                       (nValid > 511)):
+        # long double precision vectors: numpy.convolve does all the
+        # coefficients in a single pass and it is faster than the block
+        # approach
+        if ndim == 1:
+            work[N:N + nValid] = numpy.convolve(work, coeff, mode='valid')
+        elif axis == 0:
+            for i in range(work.shape[1]):
+                work[N:N + nValid, i] = numpy.convolve(work[:, i], coeff,
+                                                       mode='valid')
+        else:
+            for i in range(work.shape[0]):
+                work[i, N:N + nValid] = numpy.convolve(work[i], coeff,
+                                                       mode='valid')
+        return data
+
+    # numpy.convolve flips the filter
+    coeff = numpy.array(coeff[::-1], dtype=numpy.float64)
+
+    # split the work along one of the other axes
+    if axis == 0:
+        blockAxis = 1
+    else:
+        blockAxis = 0
+    nVectors = work.shape[blockAxis]
+    step = max(1, int(blocksize // max(1, work.size // nVectors)))
+
+    channelSlice = [slice(None)] * ndim
+    for start in range(0, nVectors, step):
+        blockSlice = [slice(None)] * ndim
+        blockSlice[blockAxis] = slice(start, min(start + step, nVectors))
+        block = work[tuple(blockSlice)]
+        shape = list(block.shape)
+        shape[axis] = nValid
+        result = numpy.empty(shape, dtype=dtype)
+        buffer = numpy.empty(shape, dtype=dtype)
+        for i in range(2 * N + 1):
+            channelSlice[axis] = slice(i, i + nValid)
+            if i == 0:
+                numpy.multiply(block[tuple(channelSlice)], coeff[i],
+                               out=result, casting="unsafe")
+            else:
+                numpy.multiply(block[tuple(channelSlice)], coeff[i],
+                               out=buffer, casting="unsafe")
+                result += buffer
+        channelSlice[axis] = slice(N, N + nValid)
+        block[tuple(channelSlice)] = result
+    return data
+
 def getSavitzkyGolay(spectrum, npoints=3, degree=1, order=0):
     coeff = calc_coeff(npoints, degree, order)
     N = numpy.size(coeff - 1) // 2
-    if order < 1:
-        result = 1.0 * spectrum
-    else:
-        result = 0.0 * spectrum
-    result[N:-N] = numpy.convolve(spectrum, coeff, mode='valid')
+    result = 1.0 * spectrum
+    _applyCoefficients(result, coeff, axis=-1)
+    if (order > 0) and (N > 0):
+        result[..., :N] = 0.0
+        result[..., -N:] = 0.0
     return result
 
-def replaceStackWithSavitzkyGolay(stack, npoints=3, degree=1, order=0):
+def smoothStack(data, npoints=3, degree=1, order=0, axis=-1, blocksize=None):
+    """
+    Apply in place a Savitzky-Golay filter along the given axis of a numpy
+    array. When calculating derivatives (order > 0) the points at each edge
+    take the closest calculated value, otherwise they are left untouched.
+    """
+    if not isinstance(data, numpy.ndarray):
+        raise TypeError("Only numpy arrays are supported")
     coeff = calc_coeff(npoints, degree, order)
-    N = numpy.size(coeff-1) // 2
-    convolve = numpy.convolve
+    N = numpy.size(coeff - 1) // 2
+    ndim = len(data.shape)
+    if axis < 0:
+        axis = axis + ndim
+    _applyCoefficients(data, coeff, axis=axis, blocksize=blocksize)
+    if (order > 0) and (N > 0):
+        target = [slice(None)] * ndim
+        source = [slice(None)] * ndim
+        target[axis] = slice(0, N)
+        source[axis] = slice(N, N + 1)
+        data[tuple(target)] = data[tuple(source)]
+        target[axis] = slice(-N, None)
+        source[axis] = slice(-(N + 1), -N)
+        data[tuple(target)] = data[tuple(source)]
+    return data
+
+def replaceStackWithSavitzkyGolay(stack, npoints=3, degree=1, order=0):
     mcaIndex = -1
     if hasattr(stack, "info") and hasattr(stack, "data"):
         actualData = stack.data
@@ -127,32 +234,17 @@ def replaceStackWithSavitzkyGolay(stack, npoints=3, degree=1, order=0):
         actualData = stack
     if not isinstance(actualData, numpy.ndarray):
         raise TypeError("This Plugin only supports numpy arrays")
-    # take a view
-    data = actualData[:]
-    oldShape = data.shape
-    if mcaIndex in [-1, len(data.shape)-1]:
-        data.shape = -1, oldShape[-1]
-        for i in range(data.shape[0]):
-            data[i,N:-N] = convolve(data[i,:],coeff, mode='valid')
-            if order > 0:
-                data[i, :N]  = data[i, N]
-                data[i, -N:] = data[i,-(N+1)]
-        data.shape = oldShape
+    if mcaIndex in [-1, len(actualData.shape)-1]:
+        smoothStack(actualData, npoints, degree, order, axis=-1)
     elif mcaIndex == 0:
-        data.shape = oldShape[0], -1
-        for i in range(data.shape[-1]):
-            data[N:-N, i] = convolve(data[:, i],coeff, mode='valid')
-            if order > 0:
-                data[:N, i] = data[N, i]
-                data[-N:, i] = data[-(N+1), i]
-        data.shape = oldShape
+        smoothStack(actualData, npoints, degree, order, axis=0)
     else:
         raise ValueError("Invalid 1D index %d" % mcaIndex)
     return
 
 if getSavitzkyGolay(10*numpy.arange(10.), npoints=3, degree=1,order=1)[5] < 0:
     ODD_SIGN = -1
-    __LAST_COEFF= None
+    _COEFF_CACHE.clear()
 
 if __name__ == "__main__":
     x=numpy.arange(100.)
@@ -31,10 +31,34 @@
 __license__ = "MIT"
 __copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
 import numpy
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 from PyMca5 import SpecfitFuns
 
 snip1d = SpecfitFuns.snip1d
 snip2d = SpecfitFuns.snip2d
+snip3d = SpecfitFuns.snip3d
+
+def _getNumberOfThreads(nthreads=None):
+    if nthreads is None:
+        try:
+            nthreads = multiprocessing.cpu_count()
+        except NotImplementedError:
+            nthreads = 1
+    return max(1, int(nthreads))
+
+def _runBlocks(function, blocks, nthreads):
+    # the SpecfitFuns SNIP routines release the GIL
+    if (nthreads > 1) and (len(blocks) > 1):
+        pool = ThreadPool(min(nthreads, len(blocks)))
+        try:
+            pool.map(function, blocks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for block in blocks:
+            function(block)
 
 
 def getSpectrumBackground(spectrum, width, roi_min=None, roi_max=None, smoothing=1):
@@ -49,10 +73,6 @@ def getSpectrumBackground(spectrum, width, roi_min=None, roi_max=None, smoothing
 getSnip1DBackground = getSpectrumBackground
 
 def subtractSnip1DBackgroundFromStack(stack, width, roi_min=None, roi_max=None,  smoothing=1):
-    if roi_min is None:
-        roi_min = 0
-    if roi_max is None:
-        roi_max = len(spectrum)
     mcaIndex = -1
     if hasattr(stack, "info") and hasattr(stack, "data"):
         data = stack.data
@@ -61,6 +81,10 @@ def subtractSnip1DBackgroundFromStack(stack, width, roi_min=None, roi_max=None,
         data = stack
     if not isinstance(data, numpy.ndarray):
         raise TypeError("This Plugin only supports numpy arrays")
+    if roi_min is None:
+        roi_min = 0
+    if roi_max is None:
+        roi_max = data.shape[mcaIndex]
     oldShape = data.shape
     if mcaIndex in [-1, len(data.shape)-1]:
         data.shape = -1, oldShape[-1]
@@ -84,10 +108,6 @@ def subtractSnip1DBackgroundFromStack(stack, width, roi_min=None, roi_max=None,
     return
 
 def replaceStackWithSnip1DBackground(stack, width, roi_min=None, roi_max=None,  smoothing=1):
-    if roi_min is None:
-        roi_min = 0
-    if roi_max is None:
-        roi_max = len(spectrum)
     mcaIndex = -1
     if hasattr(stack, "info") and hasattr(stack, "data"):
         data = stack.data
@@ -96,6 +116,10 @@ def replaceStackWithSnip1DBackground(stack, width, roi_min=None, roi_max=None,
         data = stack
     if not isinstance(data, numpy.ndarray):
         raise TypeError("This Plugin only supports numpy arrays")
+    if roi_min is None:
+        roi_min = 0
+    if roi_max is None:
+        roi_max = data.shape[mcaIndex]
     oldShape = data.shape
     if mcaIndex in [-1, len(data.shape)-1]:
         data.shape = -1, oldShape[-1]
@@ -133,14 +157,13 @@ def getImageBackground(image, width, roi_min=None, roi_max=None, smoothing=1):
 
 getSnip2DBackground = getImageBackground
 
-def subtractSnip2DBackgroundFromStack(stack, width, roi_min=None, roi_max=None,  smoothing=1, index=None):
+def subtractSnip2DBackgroundFromStack(stack, width, roi_min=None, roi_max=None,  smoothing=1, index=None,
+                                      output=None, nthreads=None):
     """
     index is the dimension used to index the images
+
+    The data outside the region of interest are left untouched.
     """
-    if roi_min is None:
-        roi_min = (0, 0)
-    if roi_max is None:
-        roi_max = image.shape
     if hasattr(stack, "info") and hasattr(stack, "data"):
         data = stack.data
         if index is None:
@@ -151,49 +174,167 @@ def subtractSnip2DBackgroundFromStack(stack, width, roi_min=None, roi_max=None,
         index = 2
     if not isinstance(data, numpy.ndarray):
         raise TypeError("This Plugin only supports numpy arrays")
+    snip2DStack(data, width, roi_min=roi_min, roi_max=roi_max,
+                smoothing=smoothing, index=index, output=output,
+                subtract=True, nthreads=nthreads)
+    return
+
+def snip2DStack(data, width, roi_min=None, roi_max=None, smoothing=1,
+                index=0, output=None, subtract=False, nthreads=None):
+    """
+    Calculate the 2D SNIP background of all the images of a stack.
+
+    The images are read, processed and written one at a time by a pool of
+    threads, therefore the input and the output can be HDF5 datasets and the
+    stack does not need to fit in memory.
+
+    :param data: 3D array or HDF5 dataset
+    :param width: SNIP width
+    :param roi_min: First (row, column) of the images to be considered
+    :param roi_max: Last (row, column) + 1 of the images to be considered
+    :param smoothing: Number of smoothing iterations prior to the SNIP
+    :param index: Dimension used to index the images
+    :param output: Array or dataset receiving the result. Default is the
+                   input data itself.
+    :param subtract: If True, the result is the data minus the background
+    :param nthreads: Number of threads. Default is the number of CPUs.
+    :return: The output
+
+    Outside the region of interest the output receives the input data.
+    """
     shape = data.shape
-    if index == 0:
-        if (roi_min[0] > 0) or (roi_min[1] > 0):
-            data[:, 0:roi_min[0], 0:roi_min[1]] = 0
-        if roi_max[0] < (shape[1]-1):
-            if roi_max[1] < (shape[2]-1):
-                data[:, roi_max[0]:, roi_max[1]:] = 0
-            else:
-                data[:, roi_max[0]:, :] = 0
+    if len(shape) != 3:
+        raise ValueError("Only 3D stacks are supported")
+    if index < 0:
+        index += 3
+    imageShape = [shape[i] for i in range(3) if i != index]
+    if roi_min is None:
+        roi_min = (0, 0)
+    if roi_max is None:
+        roi_max = imageShape
+    roi_max = [min(roi_max[i], imageShape[i]) for i in range(2)]
+    if output is None:
+        output = data
+    elif tuple(output.shape) != tuple(shape):
+        raise ValueError("Output shape does not match input shape")
+    inPlace = output is data
+    roi = (slice(roi_min[0], roi_max[0]), slice(roi_min[1], roi_max[1]))
+
+    def _processImage(i):
+        key = list(roi)
+        key.insert(index, i)
+        if inPlace:
+            image = numpy.array(data[tuple(key)], dtype=numpy.float64)
+            target = image
         else:
-            if roi_max[1] < (shape[2]-1):
-                data[:, :, roi_max[1]:] = 0
-        for i in range(shape[index]):
-            data[i,roi_min[0]:roi_max[0],roi_min[1]:roi_max[1]] -=\
-                snip2d(data[i,roi_min[0]:roi_max[0],roi_min[1]:roi_max[1]], width, smoothing)
-        return
-    if index == 1:
-        if (roi_min[0] > 0) or (roi_min[1] > 0):
-            data[0:roi_min[0], :, 0:roi_min[1]] = 0
-        if roi_max[0] < (shape[0]-1):
-            if roi_max[1] < (shape[2]-1):
-                data[roi_max[0]:, :, roi_max[1]:] = 0
-            else:
-                data[roi_max[0]:, :, :] = 0
+            fullKey = [slice(None), slice(None)]
+            fullKey.insert(index, i)
+            image = numpy.array(data[tuple(fullKey)], dtype=numpy.float64)
+            target = image[roi]
+        background = snip2d(target, width, smoothing)
+        if subtract:
+            target -= background
         else:
-            if roi_max[1] < (shape[2]-1):
-                data[:, :, roi_max[1]:] = 0
-        for i in range(shape[index]):
-            data[roi_min[0]:roi_max[0], i, roi_min[1]:roi_max[1]] -=\
-                snip2d(data[roi_min[0]:roi_max[0], i, roi_min[1]:roi_max[1]], width, smoothing)
-        return
-    if index == 2:
-        if (roi_min[0] > 0) or (roi_min[1] > 0):
-            data[0:roi_min[0], 0:roi_min[1],:] = 0
-        if roi_max[0] < (shape[0]-1):
-            if roi_max[1] < (shape[1]-1):
-                data[roi_max[0]:, roi_max[1]:, :] = 0
-            else:
-                data[roi_max[0]:, :, :] = 0
+            target[:] = background
+        if inPlace:
+            output[tuple(key)] = image
         else:
-            if roi_max[1] < (shape[2]-1):
-                data[:, roi_max[1]:, :] = 0
-        for i in range(shape[index]):
-            data[roi_min[0]:roi_max[0],roi_min[1]:roi_max[1], i] -=\
-                snip2d(data[roi_min[0]:roi_max[0],roi_min[1]:roi_max[1], i], width, smoothing)
-        return
+            output[tuple(fullKey)] = image
+
+    _runBlocks(_processImage, list(range(shape[index])),
+               _getNumberOfThreads(nthreads))
+    return output
+
+def subtractSnip3DBackgroundFromStack(stack, width, roi_min=None, roi_max=None,  smoothing=1,
+                                      output=None, nthreads=None):
+    """
+    The data outside the region of interest are left untouched.
+    """
+    if hasattr(stack, "info") and hasattr(stack, "data"):
+        data = stack.data
+    else:
+        data = stack
+    if not isinstance(data, numpy.ndarray):
+        raise TypeError("This Plugin only supports numpy arrays")
+    snip3DStack(data, width, roi_min=roi_min, roi_max=roi_max,
+                smoothing=smoothing, output=output, subtract=True,
+                nthreads=nthreads)
+    return
+
+def snip3DStack(data, width, roi_min=None, roi_max=None, smoothing=1,
+                output=None, subtract=False, nthreads=None, tilesize=None):
+    """
+    Calculate the 3D SNIP background of a volume.
+
+    The volume is split along its first dimension in slabs of tilesize
+    planes processed concurrently. Each slab is read with enough neighbouring
+    planes (width * (width + 1) / 2 + smoothing at each side) to give the
+    same result as processing the whole volume at once. When working in
+    place, the slabs are only written back once all of them are calculated.
+
+    :param data: 3D array or HDF5 dataset
+    :param width: SNIP width
+    :param roi_min: First index of each dimension to be considered
+    :param roi_max: Last index + 1 of each dimension to be considered
+    :param smoothing: Number of smoothing iterations prior to the SNIP
+    :param output: Array or dataset receiving the result. Default is the
+                   input data itself.
+    :param subtract: If True, the result is the data minus the background
+    :param nthreads: Number of threads. Default is the number of CPUs.
+    :param tilesize: Number of planes of each slab. Default is to give one
+                     slab to each thread.
+    :return: The output
+
+    Outside the region of interest the output receives the input data.
+    """
+    shape = data.shape
+    if len(shape) != 3:
+        raise ValueError("Only 3D stacks are supported")
+    if roi_min is None:
+        roi_min = (0, 0, 0)
+    if roi_max is None:
+        roi_max = shape
+    roi_max = [min(roi_max[i], shape[i]) for i in range(3)]
+    if output is None:
+        output = data
+    elif tuple(output.shape) != tuple(shape):
+        raise ValueError("Output shape does not match input shape")
+    inPlace = output is data
+    nthreads = _getNumberOfThreads(nthreads)
+    first, last = roi_min[0], roi_max[0]
+    if tilesize is None:
+        tilesize = (last - first + nthreads - 1) // nthreads
+    tilesize = max(1, int(tilesize))
+    halo = (int(width) * (int(width) + 1)) // 2 + int(smoothing)
+    roi = (slice(roi_min[1], roi_max[1]), slice(roi_min[2], roi_max[2]))
+    # when working in place the slabs cannot be written back before all
+    # their neighbours have been read
+    results = {}
+
+    def _processSlab(start):
+        end = min(start + tilesize, last)
+        lo = max(first, start - halo)
+        hi = min(last, end + halo)
+        volume = numpy.array(data[lo:hi, roi[0], roi[1]], dtype=numpy.float64)
+        background = snip3d(volume, width, smoothing)[start - lo:end - lo]
+        if subtract:
+            result = volume[start - lo:end - lo] - background
+        else:
+            result = background
+        if inPlace:
+            results[start] = result
+        else:
+            slab = numpy.array(data[start:end])
+            slab[:, roi[0], roi[1]] = result
+            output[start:end] = slab
+
+    _runBlocks(_processSlab, list(range(first, last, tilesize)), nthreads)
+    if inPlace:
+        for start in sorted(results.keys()):
+            result = results.pop(start)
+            output[start:start + result.shape[0], roi[0], roi[1]] = result
+    else:
+        # planes outside the region of interest
+        for i in list(range(0, first)) + list(range(last, shape[0])):
+            output[i] = data[i]
+    return output
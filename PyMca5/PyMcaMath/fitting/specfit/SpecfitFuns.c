@@ -113,6 +113,7 @@ SpecfitFuns_snip1d(PyObject *self, PyObject *args)
 
     width = (int )width0;
 
+    Py_BEGIN_ALLOW_THREADS
     for (n = 0; n < n_spectra; n++)
     {
         for (i=0; i<smooth_iterations; i++)
@@ -138,6 +139,7 @@ SpecfitFuns_snip1d(PyObject *self, PyObject *args)
             lls_inv(&(doublePointer[n*n_channels]), n_channels);
         }
     }
+    Py_END_ALLOW_THREADS
 
     return PyArray_Return(ret);
 }
@@ -173,6 +175,7 @@ SpecfitFuns_snip2d(PyObject *self, PyObject *args)
 
     width = (int )width0;
 
+    Py_BEGIN_ALLOW_THREADS
     for (i=0; i<smooth_iterations; i++)
     {
         smooth2d((double *) PyArray_DATA(ret), nrows, ncolumns);
@@ -189,6 +192,7 @@ SpecfitFuns_snip2d(PyObject *self, PyObject *args)
     {
         lls_inv((double *) PyArray_DATA(ret), size);
     }
+    Py_END_ALLOW_THREADS
 
     return PyArray_Return(ret);
 }
@@ -225,6 +229,7 @@ SpecfitFuns_snip3d(PyObject *self, PyObject *args)
 
     width = (int )width0;
 
+    Py_BEGIN_ALLOW_THREADS
     for (i=0; i<smooth_iterations; i++)
     {
         smooth3d((double *) PyArray_DATA(ret), nx, ny, nz);
@@ -241,6 +246,7 @@ SpecfitFuns_snip3d(PyObject *self, PyObject *args)
     {
         lls_inv((double *) PyArray_DATA(ret), size);
     }
+    Py_END_ALLOW_THREADS
 
     return PyArray_Return(ret);
 }
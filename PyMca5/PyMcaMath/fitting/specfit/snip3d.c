@@ -84,10 +84,10 @@ void snip3d(double *data, int nx, int ny, int nz, int width)
 					P8 = data[iplus + jmin  + k+p];  /* P8 = data[i+p][j-p][k+p] */
 
 					S1 = data[iplus   + joffset + k-p]; /* S1  = data[i+p][j][k-p] */
-					S2 = data[ioffset + jmin    + k-p]; /* S2  = data[i][j+p][k-p] */
+					S2 = data[ioffset + jplus   + k-p]; /* S2  = data[i][j+p][k-p] */
 					S3 = data[imin    + joffset + k-p]; /* S3  = data[i-p][j][k-p] */
 					S4 = data[ioffset + jmin    + k-p]; /* S4  = data[i][j-p][k-p] */
-					S5 = data[imin    + joffset + k+p]; /* S5  = data[i-p][j][k+p] */
+					S5 = data[iplus   + joffset + k+p]; /* S5  = data[i+p][j][k+p] */
 					S6 = data[ioffset + jplus   + k+p]; /* S6  = data[i][j+p][k+p] */
 					S7 = data[imin    + joffset + k+p]; /* S7  = data[i-p][j][k+p] */
 					S8 = data[ioffset + jmin    + k+p]; /* S8  = data[i][j-p][k+p] */
@@ -175,7 +175,7 @@ void snip3d(double *data, int nx, int ny, int nz, int width)
 			for (j=p; j<(ny-p); j++)
 			{
 				joffset = j * nz;
-				for (k=p; k<(nz-p); j++)
+				for (k=p; k<(nz-p); k++)
 				{
 					data[ioffset + joffset + k] = w[ioffset + joffset + k];
 				}
@@ -359,6 +359,118 @@ def polspl(x,y,w,npts,xl,xh,nr,nc):
         c[ni]=t/a[ni,ni]
     return c
 
+# cache of the linear operators mapping the ordinates into the spline
+# coefficients for a given set of abscissas, weights, ranges and degrees
+_POLSPL_OPERATORS = {}
+_POLSPL_OPERATORS_MAX = 16
+
+def polspl_operator(x, w, xl, xh, nr, nc):
+    r"""
+        polspl_operator(x, w, xl, xh, nr, nc): for internal use of postedge
+
+     PURPOSE:
+        build the matrix M such that the coefficients returned by polspl
+        are obtained as M * y for any set of ordinates y.
+
+     INPUTS:
+        x, w: abscissas and weights (zero-based arrays of npts elements)
+        xl, xh, nr, nc: same meaning and one-based layout as in polspl
+
+     OUTPUTS:
+        array of shape (sum(nc), npts)
+
+     PROCEDURE:
+        The normal equations of every range and the knot constraints
+        (continuity of the function and of its first derivative) are
+        assembled as a single bordered system that is solved at once
+        for all the columns of the right hand side. The system does not
+        depend on the ordinates, therefore the operator is cached and
+        reused while the abscissas, weights, ranges and degrees do not
+        change.
+    """
+    nr = int(nr)
+    xl = numpy.array(xl, dtype=numpy.float64, copy=True)
+    xh = numpy.array(xh, dtype=numpy.float64, copy=True)
+    nc = numpy.array(nc[1:nr + 1], dtype=numpy.int32)
+    x = numpy.asarray(x, dtype=numpy.float64)
+    w = numpy.asarray(w, dtype=numpy.float64)
+    for i in range(1, nr + 1):
+        if xl[i] > xh[i]:
+            xl[i], xh[i] = xh[i], xl[i]
+
+    key = (x.tobytes(), w.tobytes(),
+           tuple(xl[1:nr + 1]), tuple(xh[1:nr + 1]), tuple(nc))
+    operator = _POLSPL_OPERATORS.get(key, None)
+    if operator is not None:
+        return operator
+
+    ncoef = nc.sum()
+    nconstraints = 2 * (nr - 1)
+    n = ncoef + nconstraints
+    npts = x.size
+    start = numpy.zeros(nr + 1, dtype=numpy.int32)
+    start[1:] = numpy.cumsum(nc)
+
+    # normal equations of each range and its contribution to the rhs
+    a = numpy.zeros((n, n), dtype=numpy.float64)
+    b = numpy.zeros((n, npts), dtype=numpy.float64)
+    for ibl in range(nr):
+        idx = numpy.nonzero((x >= xl[ibl + 1]) & (x <= xh[ibl + 1]))[0]
+        v = numpy.vander(x[idx], nc[ibl], increasing=True)
+        vw = v.T * w[idx]
+        ns = start[ibl]
+        ne = start[ibl + 1]
+        a[ns:ne, ns:ne] = numpy.dot(vw, v)
+        b[ns:ne, idx] = vw
+
+    # knot constraints (Lagrange multipliers)
+    ncol = ncoef
+    for ik in range(1, nr):
+        xk = 0.5 * (xh[ik] + xl[ik + 1])
+        if xl[ik] > xl[ik + 1]:
+            xk = 0.5 * (xl[ik] + xh[ik + 1])
+        for ibl, sign in [(ik - 1, -1.0), (ik, 1.0)]:
+            powers = numpy.arange(nc[ibl])
+            ns = start[ibl]
+            ne = start[ibl + 1]
+            a[ns:ne, ncol] = sign * pow(xk, powers)
+            a[ns + 1:ne, ncol + 1] = sign * powers[1:] * \
+                                     pow(xk, powers[1:] - 1)
+        ncol += 2
+    a[ncoef:, :ncoef] = a[:ncoef, ncoef:].T
+
+    operator = numpy.linalg.solve(a, b)[:ncoef]
+    if len(_POLSPL_OPERATORS) >= _POLSPL_OPERATORS_MAX:
+        _POLSPL_OPERATORS.clear()
+    _POLSPL_OPERATORS[key] = operator
+    return operator
+
+def polspl_matrix(x, y, w, xl, xh, nr, nc):
+    r"""
+        polspl_matrix(x, y, w, xl, xh, nr, nc): for internal use of postedge
+
+     PURPOSE:
+        polynomial spline least squares fit equivalent to polspl but
+        solving the constrained system with numpy.
+
+     INPUTS:
+        x, y, w: abscissas, ordinates and weights (zero-based arrays).
+        y can be two dimensional (npts, nspectra) to fit several
+        spectra sharing the same abscissas at once.
+        xl, xh, nr, nc: same meaning and one-based layout as in polspl
+
+     OUTPUTS:
+        array with the coefficients in the same one-based layout as
+        the one returned by polspl (one column per spectrum if y is
+        two dimensional).
+    """
+    operator = polspl_operator(x, w, xl, xh, nr, nc)
+    y = numpy.asarray(y, dtype=numpy.float64)
+    shape = (max(36, operator.shape[0] + 1),) + y.shape[1:]
+    c = numpy.zeros(shape, dtype=numpy.float64)
+    c[1:operator.shape[0] + 1] = numpy.dot(operator, y)
+    return c
+
 def polspl_test():
     r"""
         polspl_test(): to test polspl ()
@@ -393,6 +505,46 @@ def polspl_test():
     #print("fit: ",fit)
     return
 
+def polspl_benchmark(npts=800, nspectra=200, polDegree=(3, 3, 3)):
+    r"""
+        polspl_benchmark(): compare the timing of the polspl implementations
+
+     Fits nspectra synthetic spectra sharing the same k grid and returns
+     a dictionary with the elapsed time per spectrum of each implementation.
+    """
+    k = numpy.linspace(2.0, 16.0, npts)
+    nr = len(polDegree)
+    xl = numpy.zeros(10)
+    xh = numpy.zeros(10)
+    nc = numpy.zeros(10, numpy.int32)
+    xl[1:nr + 1] = numpy.linspace(2.0, 16.0, nr + 1)[:-1]
+    xh[1:nr + 1] = numpy.linspace(2.0, 16.0, nr + 1)[1:]
+    nc[1:nr + 1] = numpy.array(polDegree) + 1
+    xx = numpy.zeros(npts + 1)
+    xx[1:] = k
+    w = numpy.ones(npts + 1)
+    spectra = numpy.zeros((nspectra, npts + 1))
+    for i in range(nspectra):
+        spectra[i, 1:] = 1.0 + 0.01 * k + 0.2 * numpy.exp(-0.05 * k * k) * \
+                         numpy.sin(2 * k + 0.01 * i)
+    functions = [("python", polspl)]
+    if _XAS:
+        functions.append(("C", _xas.polspl))
+    result = {}
+    for label, function in functions:
+        t0 = time.time()
+        for i in range(nspectra):
+            function(xx, spectra[i], w, npts, xl * 1, xh * 1, nr, nc)
+        result[label] = (time.time() - t0) / nspectra
+    _POLSPL_OPERATORS.clear()
+    t0 = time.time()
+    for i in range(nspectra):
+        polspl_matrix(k, spectra[i, 1:], w[1:], xl, xh, nr, nc)
+    result["matrix"] = (time.time() - t0) / nspectra
+    t0 = time.time()
+    polspl_matrix(k, spectra[:, 1:].T, w[1:], xl, xh, nr, nc)
+    result["matrix (all spectra at once)"] = (time.time() - t0) / nspectra
+    return result
 
 def postEdge(set2,kmin=None,kmax=None,polDegree=[3,3,3],knots=None, full=False):
     r"""
@@ -504,15 +656,17 @@ def postEdge(set2,kmin=None,kmax=None,polDegree=[3,3,3],knots=None, full=False):
     yy[1:] = set22[:,1]
 
     #t0 = time.time()
-    if _XAS:
-        c = _xas.polspl(xx,yy,w,npts,xl,xh,nr,nc)
-        if DEBUG:
-            t0 = time.time()
+    c = polspl_matrix(xx[1:], yy[1:], w[1:], xl, xh, nr, nc)
+    if DEBUG:
+        t0 = time.time()
+        if _XAS:
+            c2 = _xas.polspl(xx,yy,w,npts,xl,xh,nr,nc)
+        else:
             c2 = polspl(xx,yy,w,npts,xl,xh,nr,nc)
-            print("polspl elapsed = ", time.time() - t0)
-            print("OK?", numpy.allclose(c, c2))
-    else:
-        c = polspl(xx,yy,w,npts,xl,xh,nr,nc)
+        print("polspl elapsed = ", time.time() - t0)
+        # polspl also returns the Lagrange multipliers after the coefficients
+        ncoef = int(numpy.sum(nc)) + 1
+        print("OK?", numpy.allclose(c[:ncoef], c2[:ncoef]))
 
     #TODO: polspl_evaluate receives and returns arrays like IDL (2,npoints)
     #t0 = time.time()
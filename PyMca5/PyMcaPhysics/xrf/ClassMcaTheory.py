@@ -478,10 +478,11 @@ def __configure(self):
                         PEAKS0ESCAPE[-1].append(_esc_)
                         _nescape_ += len(_esc_)
                 else:
-                    for i in range(len(newpeaks)):
-                        _esc_ = Elements.getEscape([detele,1.0,1.0], newpeaks[i][1],
-                                            ethreshold=ethreshold, ithreshold=ithreshold,
-                                            nthreshold=nthreshold)
+                    _escList_ = Elements.getEscapeList([detele,1.0,1.0],
+                                        [newpeaks[i][1] for i in range(len(newpeaks))],
+                                        ethreshold=ethreshold, ithreshold=ithreshold,
+                                        nthreshold=nthreshold)
+                    for _esc_ in _escList_:
                         PEAKS0ESCAPE[-1].append(_esc_)
                         _nescape_ += len(_esc_)
             PEAKS0.append(numpy.array(newpeaks))
@@ -791,10 +792,11 @@ def __configure(self):
                                 PEAKS0ESCAPE[-1].append(_esc_)
                                 _nescape_ += len(_esc_)
                         else:
-                            for i in range(len(newpeaks)):
-                                _esc_ = Elements.getEscape([detele,1.0,1.0], newpeaks[i][1],
-                                                    ethreshold=ethreshold, ithreshold=ithreshold,
-                                                    nthreshold=nthreshold)
+                            _escList_ = Elements.getEscapeList([detele,1.0,1.0],
+                                                [newpeaks[i][1] for i in range(len(newpeaks))],
+                                                ethreshold=ethreshold, ithreshold=ithreshold,
+                                                nthreshold=nthreshold)
+                            for _esc_ in _escList_:
                                 PEAKS0ESCAPE[-1].append(_esc_)
                                 _nescape_ += len(_esc_)
                     PEAKS0.append(numpy.array(newpeaks))
@@ -958,6 +960,23 @@ def __configure(self):
 
         self.PEAKS0     = PEAKS0
         self.PEAKS0ESCAPE = PEAKS0ESCAPE
+        # dense version of PEAKS0ESCAPE: for each group the index of the
+        # parent line, the rate and the energy of each escape peak
+        self.ESCAPEINDEX  = []
+        self.ESCAPERATE   = []
+        self.ESCAPEENERGY = []
+        for escape_groups in PEAKS0ESCAPE:
+            index  = []
+            rate   = []
+            energy = []
+            for ii, esc_group in enumerate(escape_groups):
+                for esc_line in esc_group:
+                    index.append(ii)
+                    energy.append(esc_line[0] * 1.0)
+                    rate.append(esc_line[1])
+            self.ESCAPEINDEX.append(numpy.array(index, dtype=numpy.int64))
+            self.ESCAPERATE.append(numpy.array(rate, dtype=numpy.float64))
+            self.ESCAPEENERGY.append(numpy.array(energy, dtype=numpy.float64))
         #for i in range(len(PEAKS0)):
         #    print self.PEAKS0[i]
         #    print self.PEAKS0ESCAPE[i]
@@ -968,6 +987,7 @@ def __configure(self):
         self.NGLOBAL    = NGLOBAL
         self.PARAMETERS = PARAMETERS
         self.ESCAPE     = self.config['fit']['escapeflag']
+        self.__buildPeakTable()
         self.__SUM        = self.config['fit']['sumflag']
         self.__CONTINUUM     = CONTINUUM
         self.MAXITER    = self.config['fit']['maxiter']
@@ -1286,6 +1306,113 @@ def __getselfzz(self):
         self.laststripanchorsflag     = self.config['fit']['stripanchorsflag']
         self.laststripanchorslist     = self.config['fit']['stripanchorslist']
 
+    def __buildPeakTable(self):
+        """
+        Store the peaks of all the groups in a single preallocated table.
+
+        The rows of PEAKTABLE are those of numpy.concatenate(PEAKSW) and
+        PEAKSW[i] is replaced by a view on the rows of group i. For each row
+        the group index, the line rate, the escape factor and the energy
+        are kept in flat arrays, and the indices of the peak shape
+        parameters are resolved, so the whole table can be updated with a
+        few array operations at each evaluation of the model.
+        """
+        PEAKS0 = self.PEAKS0
+        group  = []
+        rate   = []
+        factor = []
+        energy = []
+        widthEnergy = []
+        escape = []
+        for i in range(len(self.PEAKSW)):
+            (r, c) = PEAKS0[i].shape
+            n_escape_lines = self.PEAKSW[i].shape[0] - r
+            group.append(numpy.zeros((r + n_escape_lines,), numpy.int64) + i)
+            rate.append(PEAKS0[i][:,0])
+            factor.append(numpy.ones((r,), numpy.float64))
+            energy.append(PEAKS0[i][:,1] * 1.0)
+            widthEnergy.append(PEAKS0[i][:,1] * 1.0)
+            escape.append(numpy.zeros((r,), numpy.bool_))
+            if n_escape_lines:
+                if OLDESCAPE:
+                    rate.append(PEAKS0[i][:,0])
+                    factor.append(PEAKS0[i][:,3] * 1.0)
+                    esc_ene = PEAKS0[i][:,1] - self.config['detector']['detene']
+                else:
+                    rate.append(PEAKS0[i][self.ESCAPEINDEX[i],0])
+                    factor.append(self.ESCAPERATE[i])
+                    esc_ene = self.ESCAPEENERGY[i]
+                energy.append(esc_ene)
+                widthEnergy.append((esc_ene > 0) * esc_ene)
+                escape.append(numpy.ones((n_escape_lines,), numpy.bool_))
+        if self.__HYPERMET:
+            ncolumns = 3 + 5
+        else:
+            ncolumns = 3 + 1
+        if len(group):
+            self.PEAKTABLE = numpy.ones((sum([len(x) for x in group]),
+                                         ncolumns), numpy.float64)
+            self.PEAKTABLEGROUP  = numpy.concatenate(group)
+            self.PEAKTABLERATE   = numpy.concatenate(rate).astype(numpy.float64)
+            self.PEAKTABLEFACTOR = numpy.concatenate(factor).astype(numpy.float64)
+            self.PEAKTABLEENERGY = numpy.concatenate(energy).astype(numpy.float64)
+            self.PEAKTABLEWIDTHENERGY = \
+                        numpy.concatenate(widthEnergy).astype(numpy.float64)
+            self.PEAKTABLEESCAPE = numpy.nonzero(numpy.concatenate(escape))[0]
+        else:
+            self.PEAKTABLE = numpy.ones((0, ncolumns), numpy.float64)
+            self.PEAKTABLEGROUP  = numpy.zeros((0,), numpy.int64)
+            self.PEAKTABLERATE   = numpy.zeros((0,), numpy.float64)
+            self.PEAKTABLEFACTOR = numpy.zeros((0,), numpy.float64)
+            self.PEAKTABLEENERGY = numpy.zeros((0,), numpy.float64)
+            self.PEAKTABLEWIDTHENERGY = numpy.zeros((0,), numpy.float64)
+            self.PEAKTABLEESCAPE = numpy.zeros((0,), numpy.int64)
+        start = 0
+        for i in range(len(self.PEAKSW)):
+            end = start + self.PEAKSW[i].shape[0]
+            self.PEAKSW[i] = self.PEAKTABLE[start:end]
+            start = end
+        # the first occurrence of a name is the one returned by list.index
+        self.__parameterIndex = {}
+        for i in range(len(self.PARAMETERS) - 1, -1, -1):
+            self.__parameterIndex[self.PARAMETERS[i]] = i
+
+    def __getParameterIndex(self, name):
+        if name not in self.__parameterIndex:
+            raise ValueError("%s is not a fit parameter" % name)
+        return self.__parameterIndex[name]
+
+    def __updatePeakTable(self, param, hypermet, eta=True):
+        """
+        Fill PEAKTABLE (and therefore PEAKSW) for the given parameters.
+        The eta factor column is not set if eta is False.
+        """
+        param = numpy.asarray(param)
+        gain = param[1]
+        noise= param[2] * param[2]
+        fano = param[3] * 2.3548*2.3548*0.00385
+        table = self.PEAKTABLE
+        if not table.shape[0]:
+            return table
+        area = param[self.NGLOBAL + self.PEAKTABLEGROUP]
+        table[:,0] = self.PEAKTABLERATE * area * gain * self.PEAKTABLEFACTOR
+        table[:,1] = self.PEAKTABLEENERGY
+        table[:,2] = numpy.sqrt(noise + self.PEAKTABLEWIDTHENERGY * fano)
+        if hypermet:
+            table[:,3] = param[self.__getParameterIndex('ST AreaR')]
+            table[:,4] = param[self.__getParameterIndex('ST SlopeR')]
+            table[:,5] = param[self.__getParameterIndex('LT AreaR')]
+            table[:,6] = param[self.__getParameterIndex('LT SlopeR')]
+            table[:,7] = param[self.__getParameterIndex('STEP HeightR')]
+            #neglect tails in escape peaks
+            escape = self.PEAKTABLEESCAPE
+            table[escape,3] = 0.0
+            table[escape,5] = 0.0
+            table[escape,7] = 0.0
+        elif eta:
+            table[:,3] = param[self.__getParameterIndex('Eta Factor')]
+        return table
+
     def getPeakMatrixContribution(self,param0,t0=None,hypermet=None,
                                   continuum=None,summing=None):
         """
@@ -1312,7 +1439,6 @@ def getPeakMatrixContribution(self,param0,t0=None,hypermet=None,
         fano = param[3] * 2.3548*2.3548*0.00385
         #t=time.time()
         PEAKS0 = self.PEAKS0
-        PEAKS0ESCAPE = self.PEAKS0ESCAPE
         PEAKSW = self.PEAKSW
         PARAMETERS = self.PARAMETERS
         FASTER = 0
@@ -1331,16 +1457,8 @@ def getPeakMatrixContribution(self,param0,t0=None,hypermet=None,
                     PEAKSW[i][r:,2] = numpy.sqrt(noise + \
                                         (PEAKSW[i][r:,1]>0) * PEAKSW[i][r:,1] * fano)
                 else:
-                    ii=0
-                    j=0
-                    for esc_group in PEAKS0ESCAPE[i]:
-                        for esc_line in esc_group:
-                            esc_ene  = esc_line[0] * 1.0
-                            esc_rate = esc_line[1]
-                            PEAKSW[i][j+r,0] =  PEAKSW[i][ii,0] * esc_rate
-                            PEAKSW[i][j+r,1] =  esc_ene
-                            j = j + 1
-                        ii = ii + 1
+                    PEAKSW[i][r:,0] = PEAKSW[i][self.ESCAPEINDEX[i],0] * self.ESCAPERATE[i]
+                    PEAKSW[i][r:,1] = self.ESCAPEENERGY[i]
                     PEAKSW[i][r:, 2] = numpy.sqrt(noise + \
                                     (PEAKSW[i][r:,1]>0) * PEAKSW[i][r:,1] * fano)
                 (rw,cw) = (PEAKSW[i]).shape
@@ -1445,121 +1563,29 @@ def mcatheory(self,param0,t0,hypermet=None,continuum=None,summing=None):
         gain = param[1]
         energy=zero + gain * x
         #print energy
-        noise= param[2] * param[2]
-        fano = param[3] * 2.3548*2.3548*0.00385
         #t=time.time()
-        PEAKS0 = self.PEAKS0
-        PEAKS0ESCAPE = self.PEAKS0ESCAPE
         PEAKSW = self.PEAKSW
-        PARAMETERS = self.PARAMETERS
         FASTER = self.FASTER
-        for i in range(len(param[self.NGLOBAL:])):
-            if self.ESCAPE:
-                #area = param[NGLOBAL+i]
-                (r,c) = (PEAKS0[i]).shape
-                PEAKSW[i][0:r,0] = PEAKS0[i][:,0] * param[self.NGLOBAL+i] * gain
-                PEAKSW[i][0:r,1] = PEAKS0[i][:,1] * 1.0
-                PEAKSW[i][0:r,2] = numpy.sqrt(noise + PEAKS0[i][:,1] * fano)
-                #escape
-                if OLDESCAPE:
-                    PEAKSW[i][r:,0] = PEAKSW[i][0:r,0] * PEAKS0[i][:,3]
-                    PEAKSW[i][r:,1] = PEAKS0[i][:,1] - self.config['detector']['detene']
-                    PEAKSW[i][r:,2] = numpy.sqrt(noise + \
-                                        (PEAKSW[i][r:,1]>0) * PEAKSW[i][r:,1] * fano)
-                else:
-                    ii=0
-                    j=0
-                    for esc_group in PEAKS0ESCAPE[i]:
-                        for esc_line in esc_group:
-                            esc_ene  = esc_line[0] * 1.0
-                            esc_rate = esc_line[1]
-                            PEAKSW[i][j+r,0] =  PEAKSW[i][ii,0] * esc_rate
-                            PEAKSW[i][j+r,1] =  esc_ene
-                            j = j + 1
-                        ii = ii + 1
-                    PEAKSW[i][r:, 2] = numpy.sqrt(noise + \
-                                    (PEAKSW[i][r:,1]>0) * PEAKSW[i][r:,1] * fano)
-                (rw,cw) = (PEAKSW[i]).shape
-                if 0 and self.PARAMETERS[self.NGLOBAL+i] =='Fe K':
-                  for ii in range(rw):
-                    if ii < r:
-                        print(self.PARAMETERS[self.NGLOBAL+i],"PEAK ",ii,PEAKSW[i][ii])
-                    else:
-                        print(self.PARAMETERS[self.NGLOBAL+i],"PEAKesc ",ii,PEAKSW[i][ii])
-                #print PARAMETERS[self.NGLOBAL+i]
-                #print PEAKSW[i][:,1]
-                #print PEAKS0ESCAPE[i]
-                #for j in range(PEAKSW[i].shape[0]):
-                #    print "H = ", PEAKSW[i][j*r,0],"E = ",PEAKSW[i][j*r,1]
-
-                #if HYPERMET:
-                if hypermet:
-                    PEAKSW[i] [0:r,3] = param[PARAMETERS.index('ST AreaR')]
-                    PEAKSW[i] [:,4] = param[PARAMETERS.index('ST SlopeR')]
-                    PEAKSW[i] [0:r,5] = param[PARAMETERS.index('LT AreaR')]
-                    PEAKSW[i] [:,6] = param[PARAMETERS.index('LT SlopeR')]
-                    PEAKSW[i] [0:r,7] = param[PARAMETERS.index('STEP HeightR')]
-                    #neglect tails in escape peaks
-                    PEAKSW[i] [r:,3] = 0.0
-                    PEAKSW[i] [r:,5] = 0.0
-                    PEAKSW[i] [r:,7] = 0.0
-                else:
-                    PEAKSW[i] [:,3] = param[PARAMETERS.index('Eta Factor')]
-                if not FASTER:
-                    print("not FASTER")
-                    #if HYPERMET:
-                    if hypermet:
-                        if i == 0:
-                            result = SpecfitFuns.ahypermet(PEAKSW[i],energy,hypermet)
-                        else:
-                            result += SpecfitFuns.ahypermet(PEAKSW[i],energy,hypermet)
-                    else:
-                        if i == 0:
-                            result = SpecfitFuns.apvoigt(PEAKSW[i],energy)
-                        else:
-                            result += SpecfitFuns.apvoigt(PEAKSW[i],energy)
-            else:
-                PEAKSW[i][:,0] = PEAKS0[i][:,0] * param[self.NGLOBAL+i] * gain
-                PEAKSW[i][:,1] = PEAKS0[i][:,1] * 1.0
-                PEAKSW[i][:,2] = numpy.sqrt(noise + PEAKS0[i][:,1] * fano)
-                if hypermet:
-                    PEAKSW[i] [:,3] = param[PARAMETERS.index('ST AreaR')]
-                    PEAKSW[i] [:,4] = param[PARAMETERS.index('ST SlopeR')]
-                    PEAKSW[i] [:,5] = param[PARAMETERS.index('LT AreaR')]
-                    PEAKSW[i] [:,6] = param[PARAMETERS.index('LT SlopeR')]
-                    PEAKSW[i] [:,7] = param[PARAMETERS.index('STEP HeightR')]
-                else:
-                    PEAKSW[i] [:,3] = param[PARAMETERS.index('Eta Factor')]
-                if not FASTER:
-                    if hypermet:
-                        if i == 0:
-                            result = SpecfitFuns.ahypermet(PEAKSW[i],energy,hypermet)
-                        else:
-                            result += SpecfitFuns.ahypermet(PEAKSW[i],energy,hypermet)
-                    else:
-                        if i == 0:
-                            result = SpecfitFuns.apvoigt(PEAKSW[i],energy)
-                        else:
-                            result += SpecfitFuns.apvoigt(PEAKSW[i],energy)
-        #print PARAMETERS[self.NGLOBAL+4]
-        #print self.PEAKS0NAMES[4]
-        #print PEAKSW[4]
-        #print "loop takes ",time.time()-t
-        #loop takes 0.006 seconds
+        table = self.__updatePeakTable(param, hypermet)
+        #print "table update takes ",time.time()-t
         #t=time.time()
         if FASTER:
-            if len(PEAKSW[:]):
-                a=numpy.concatenate(PEAKSW[:])
-                #t=time.time()
-                #result = SpecfitFuns.agauss(a,energy)
-                #if HYPERMET:
+            if table.shape[0]:
+                #result = SpecfitFuns.agauss(table,energy)
                 if hypermet:
-                    result = SpecfitFuns.fastahypermet(a,energy,hypermet)
+                    result = SpecfitFuns.fastahypermet(table,energy,hypermet)
                 else:
-                    result = SpecfitFuns.apvoigt(a,energy)
+                    result = SpecfitFuns.apvoigt(table,energy)
             else:
                 result = 0.0 * x
             #print "eval = ",time.time()-t
+        else:
+            result = 0.0 * x
+            for i in range(len(PEAKSW)):
+                if hypermet:
+                    result += SpecfitFuns.ahypermet(PEAKSW[i],energy,hypermet)
+                else:
+                    result += SpecfitFuns.apvoigt(PEAKSW[i],energy)
         #evaluation takes 0.058 seconds
         #with less peaks 0.036
         #with tabulated function 0.018
@@ -1703,16 +1729,8 @@ def analyticalDerivative(self, param0, index, t0):
                 dummy[0:r,0] = PEAKS0[i][:,0] * gain
                 dummy[0:r,1] = PEAKS0[i][:,1] * 1.0
                 dummy[0:r,2] = numpy.sqrt(noise+ PEAKS0[i][:,1] * fano)
-                ii=0
-                j=0
-                for esc_group in self.PEAKS0ESCAPE[i]:
-                    for esc_line in esc_group:
-                        esc_ene  = esc_line[0] * 1.0
-                        esc_rate = esc_line[1]
-                        dummy[j+r, 0] =  dummy[ii,0] * esc_rate
-                        dummy[j+r, 1] =  esc_ene
-                        j = j + 1
-                    ii = ii + 1
+                dummy[r:,0] = dummy[self.ESCAPEINDEX[i],0] * self.ESCAPERATE[i]
+                dummy[r:,1] = self.ESCAPEENERGY[i]
                 dummy[r:, 2] = numpy.sqrt(noise + (dummy[r:,1]>0) * dummy[r:,1] * fano)
                 #for jj in range(r+n_escape_lines):
                 #    print index, dummy[jj, 1], dummy[jj, 0], dummy[jj, 2]
@@ -2034,16 +2052,8 @@ def specfitestimate(self,x,y,z,xscaling=1.0,yscaling=1.0):
                 #get the number of escape lines to get a proper buffer
                 n_escape_lines = self.PEAKSW[i].shape[0] - len(rates)
                 peak_buffer    = numpy.zeros((n_escape_lines, 3)).astype(numpy.float)
-                ii=0
-                jj=0
-                for esc_group in self.PEAKS0ESCAPE[i]:
-                    for esc_line in esc_group:
-                        esc_ene  = esc_line[0] * 1.0
-                        esc_rate = esc_line[1]
-                        peak_buffer[jj,0] =  self.PEAKS0[i][ii,0] * esc_rate
-                        peak_buffer[jj,1] =  esc_ene
-                        jj = jj + 1
-                    ii = ii + 1
+                peak_buffer[:,0] = self.PEAKS0[i][self.ESCAPEINDEX[i],0] * self.ESCAPERATE[i]
+                peak_buffer[:,1] = self.ESCAPEENERGY[i]
                 peak_buffer[:, 2] = numpy.sqrt(noise + \
                                     (peak_buffer[:,1]>0) * peak_buffer[:,1] * \
                                      fano)
@@ -2103,16 +2113,8 @@ def specfitestimate(self,x,y,z,xscaling=1.0,yscaling=1.0):
                     rates     =  self.PEAKS0[i][:,0]
                     n_escape_lines = self.PEAKSW[i].shape[0] - len(rates)
                     peak_buffer    = numpy.zeros((n_escape_lines, 3)).astype(numpy.float)
-                    ii=0
-                    jj=0
-                    for esc_group in self.PEAKS0ESCAPE[i]:
-                        for esc_line in esc_group:
-                            esc_ene  = esc_line[0] * 1.0
-                            esc_rate = esc_line[1]
-                            peak_buffer[jj,0] =  self.PEAKS0[i][ii,0] * esc_rate
-                            peak_buffer[jj,1] =  esc_ene
-                            jj = jj + 1
-                        ii = ii + 1
+                    peak_buffer[:,0] = self.PEAKS0[i][self.ESCAPEINDEX[i],0] * self.ESCAPERATE[i]
+                    peak_buffer[:,1] = self.ESCAPEENERGY[i]
                     peak_buffer[:, 2] = numpy.sqrt(noise + \
                                         (peak_buffer[:,1]>0) * peak_buffer[:,1] * \
                                          fano)
@@ -2569,64 +2571,8 @@ def getpeaksw(self,param,hypermet=None,continuum=None):
             continuum = self.__CONTINUUM
         if hypermet is None:
             hypermet = self.__HYPERMET
-        # zero = param[0]
-        gain = param[1]
-        #energy=zero + gain * x
-        #print energy
-        noise= param[2] * param[2]
-        fano = param[3] * 2.3548*2.3548*0.00385
-        #t=time.time()
-        PEAKS0 = self.PEAKS0
-        PEAKS0ESCAPE = self.PEAKS0ESCAPE
+        self.__updatePeakTable(param, hypermet, eta=False)
         PEAKSW = self.PEAKSW
-        PARAMETERS = self.PARAMETERS
-        for i in range(len(param[self.NGLOBAL:])):
-            if self.ESCAPE:
-                #area = param[NGLOBAL+i]
-                (r,c) = (PEAKS0[i]).shape
-                PEAKSW[i][0:r,0] = PEAKS0[i][:,0] * param[self.NGLOBAL+i] * gain
-                PEAKSW[i][0:r,1] = PEAKS0[i][:,1] * 1.0
-                PEAKSW[i][0:r,2] = numpy.sqrt(noise + PEAKS0[i][:,1] * fano)
-                #escape
-                if OLDESCAPE:
-                    PEAKSW[i][r:,0] = PEAKSW[i][0:r,0] * PEAKS0[i][:,3]
-                    PEAKSW[i][r:,1] = PEAKS0[i][:,1] - self.config['detector']['detene']
-                    PEAKSW[i][r:,2] = numpy.sqrt(noise + (PEAKSW[i][r:,1]>0) * PEAKSW[i][r:,1] * fano)
-                else:
-                    ii=0
-                    j=0
-                    for esc_group in PEAKS0ESCAPE[i]:
-                        for esc_line in esc_group:
-                            esc_ene  = esc_line[0] * 1.0
-                            esc_rate = esc_line[1]
-                            PEAKSW[i][j+r,0] =  PEAKSW[i][ii,0] * esc_rate
-                            PEAKSW[i][j+r,1] =  esc_ene
-                            j = j + 1
-                        ii = ii + 1
-                    PEAKSW[i][r:, 2] = numpy.sqrt(noise + \
-                                    (PEAKSW[i][r:,1]>0) * PEAKSW[i][r:,1] * fano)
-                #if HYPERMET:
-                if hypermet:
-                    PEAKSW[i] [0:r,3] = param[PARAMETERS.index('ST AreaR')]
-                    PEAKSW[i] [:,4] = param[PARAMETERS.index('ST SlopeR')]
-                    PEAKSW[i] [0:r,5] = param[PARAMETERS.index('LT AreaR')]
-                    PEAKSW[i] [:,6] = param[PARAMETERS.index('LT SlopeR')]
-                    PEAKSW[i] [0:r,7] = param[PARAMETERS.index('STEP HeightR')]
-                    #neglect tails in escape peaks
-                    PEAKSW[i] [r:,3] = 0.0
-                    PEAKSW[i] [r:,5] = 0.0
-                    PEAKSW[i] [r:,7] = 0.0
-            else:
-                # area = param[self.NGLOBAL + i]
-                PEAKSW[i][:,0] = PEAKS0[i][:,0] * param[self.NGLOBAL+i] * gain
-                PEAKSW[i][:,1] = PEAKS0[i][:,1] * 1.0
-                PEAKSW[i][:,2] = numpy.sqrt(noise + PEAKS0[i][:,1] * fano)
-                if hypermet:
-                    PEAKSW[i] [:,3] = param[PARAMETERS.index('ST AreaR')]
-                    PEAKSW[i] [:,4] = param[PARAMETERS.index('ST SlopeR')]
-                    PEAKSW[i] [:,5] = param[PARAMETERS.index('LT AreaR')]
-                    PEAKSW[i] [:,6] = param[PARAMETERS.index('LT SlopeR')]
-                    PEAKSW[i] [:,7] = param[PARAMETERS.index('STEP HeightR')]
         return PEAKSW
 
     # UTILITIES #
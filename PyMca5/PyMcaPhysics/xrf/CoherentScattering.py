@@ -33,6 +33,7 @@
 import os
 import numpy
 from PyMca5.PyMcaIO import ConfigDict
+from PyMca5.PyMcaPhysics.xrf import DataCache
 from PyMca5 import PyMcaDataDir
 
 dirmod = PyMcaDataDir.PYMCA_DATA_DIR
@@ -51,8 +52,7 @@
     if not os.path.exists(ffile):
         print("Cannot find file ", ffile)
         raise IOError("Cannot find file %s" % ffile)
-COEFFICIENTS = ConfigDict.ConfigDict()
-COEFFICIENTS.read(ffile)
+COEFFICIENTS = DataCache.loadConfigDict(ffile)
 KEVTOANG = 12.39852000
 R0 = 2.82E-13 #electron radius in cm
 
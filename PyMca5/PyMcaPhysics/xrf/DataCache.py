@@ -0,0 +1,203 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V.A. Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+__doc__ = """
+Binary cache of the text databases read when importing the fundamental
+parameters modules.
+
+The first time a database is read, its parsed contents are pickled into the
+cache directory (by default the "cache" subdirectory of the PyMca settings
+directory). Following reads load the pickle, that is about ten times faster
+than parsing the text file. Each cache file records the PyMca version, the
+Python version and the size and modification time of the original file, and
+it is regenerated if any of them changes. The cache file name includes a
+short hash of the path of the original file.
+
+Set the environment variable PYMCA_DATA_CACHE to a directory to use that
+directory instead, or to "0" to disable the cache.
+"""
+import os
+import sys
+import pickle
+import hashlib
+import subprocess
+import PyMca5
+from PyMca5.PyMcaIO import ConfigDict
+
+DEBUG = 0
+
+_CACHE_DIRECTORY = None
+
+def getCacheDirectory():
+    """
+    Return the directory where the cached databases are stored or None if
+    the cache is disabled or the directory cannot be created.
+    """
+    global _CACHE_DIRECTORY
+    directory = os.getenv("PYMCA_DATA_CACHE")
+    if directory is not None:
+        if directory in ["", "0"]:
+            return None
+    elif _CACHE_DIRECTORY is not None:
+        return _CACHE_DIRECTORY
+    else:
+        try:
+            settingsDir = os.path.dirname(PyMca5.getDefaultSettingsFile())
+            directory = os.path.join(settingsDir, "cache")
+        except:
+            if DEBUG:
+                print("Cannot get PyMca settings directory")
+            return None
+    try:
+        if not os.path.exists(directory):
+            os.mkdir(directory)
+    except:
+        if DEBUG:
+            print("Cannot create data cache directory %s" % directory)
+        return None
+    if os.getenv("PYMCA_DATA_CACHE") is None:
+        _CACHE_DIRECTORY = directory
+    return directory
+
+def getVersionKey(filename):
+    """
+    Key identifying the version of a data file
+    """
+    stat = os.stat(filename)
+    return "%s %d.%d %d %d" % (PyMca5.version(),
+                               sys.version_info[0], sys.version_info[1],
+                               stat.st_size, int(stat.st_mtime))
+
+def getCacheFileName(directory, filename):
+    """
+    Cache file of a data file. The name includes a short hash of the full
+    path, so files with the same name in different directories do not
+    overwrite each other's cache.
+    """
+    source = os.path.abspath(filename)
+    if not isinstance(source, bytes):
+        source = source.encode("utf-8", "replace")
+    return os.path.join(directory, "%s.%s.py%d.cache" % \
+                        (os.path.basename(filename),
+                         hashlib.md5(source).hexdigest()[:8],
+                         sys.version_info[0]))
+
+def load(filename, reader):
+    """
+    Return reader(filename) using the cached result if it is up to date.
+
+    :param filename: Data file
+    :param reader: Callable parsing the data file. The result must be
+                   picklable.
+    """
+    directory = getCacheDirectory()
+    if directory is None:
+        return reader(filename)
+    try:
+        versionKey = getVersionKey(filename)
+    except OSError:
+        return reader(filename)
+    cacheFile = getCacheFileName(directory, filename)
+    if os.path.exists(cacheFile):
+        try:
+            with open(cacheFile, "rb") as f:
+                key, source, data = pickle.load(f)
+            if (key == versionKey) and \
+               (source == os.path.abspath(filename)):
+                return data
+        except:
+            if DEBUG:
+                print("Invalid cache file %s" % cacheFile)
+    data = reader(filename)
+    try:
+        # write to a temporary file first to avoid concurrent readers
+        # getting a partially written cache
+        tmpFile = cacheFile + ".%d.tmp" % os.getpid()
+        with open(tmpFile, "wb") as f:
+            pickle.dump((versionKey, os.path.abspath(filename), data), f,
+                        protocol=2)
+        if os.path.exists(cacheFile):
+            os.remove(cacheFile)
+        os.rename(tmpFile, cacheFile)
+    except:
+        if DEBUG:
+            print("Cannot write cache file %s" % cacheFile)
+        try:
+            os.remove(tmpFile)
+        except:
+            pass
+    return data
+
+def _readConfigDict(filename):
+    cDict = ConfigDict.ConfigDict()
+    cDict.read(filename)
+    return cDict
+
+def loadConfigDict(filename):
+    """
+    Read a ConfigDict data file through the cache
+    """
+    return load(filename, _readConfigDict)
+
+def importBenchmark(module="PyMca5.PyMcaPhysics.xrf.Elements", repeat=5):
+    """
+    Measure the time needed to import a module in a fresh interpreter with
+    and without the data cache.
+
+    :return: Dictionary with the best times in seconds of the "cold" (no
+             cache) and the "cached" imports
+    """
+    code = "import time; t0 = time.time(); import %s; " % module + \
+           "print(time.time() - t0)"
+    result = {}
+    for label, value in [("cold", "0"), ("cached", None)]:
+        env = os.environ.copy()
+        if value is None:
+            env.pop("PYMCA_DATA_CACHE", None)
+        else:
+            env["PYMCA_DATA_CACHE"] = value
+        times = []
+        # the first cached import may have to generate the cache
+        for i in range(repeat + 1):
+            output = subprocess.check_output([sys.executable, "-c", code],
+                                             env=env)
+            times.append(float(output.decode().split()[-1]))
+        result[label] = min(times[1:])
+    return result
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        result = importBenchmark(sys.argv[1])
+    else:
+        result = importBenchmark()
+    print("Import without cache = %.4f s" % result["cold"])
+    print("Import with cache    = %.4f s" % result["cached"])
@@ -37,6 +37,8 @@
 import re
 import weakref
 import types
+import threading
+from collections import OrderedDict
 from PyMca5.PyMcaIO import ConfigDict
 from . import CoherentScattering
 from . import IncoherentScattering
@@ -454,15 +456,16 @@ def getPhotoWeight(ele,shelllist,energy, normalize = None, totals = None):
         raise ValueError("Incompatible combination")
     elif (energy < 1.0):
         #make sure the binding energies are correct
+        binding = None
         if PyMcaEPDL97.EPDL97_DICT[ele]['original']:
             #make sure the binding energies are those used by this module and not EADL ones
-            PyMcaEPDL97.setElementBindingEnergies(ele,
-                                                  Element[ele]['binding'])
+            binding = Element[ele]['binding']
         return PyMcaEPDL97.getPhotoelectricWeights(ele,
                                                    shelllist,
                                                    energy,
                                                    normalize=normalize,
-                                                   totals=False)
+                                                   totals=False,
+                                                   binding=binding)
     elif totals:
         totalPhoto = []
     logf = numpy.log
@@ -744,115 +747,151 @@ def getEscape(matrix, energy, ethreshold=None, ithreshold=None, nthreshold = Non
                                        [energyn, intensityn, labeln]]
     with the escape energies, intensities and labels
     """
+    return getEscapeList(matrix, [energy], ethreshold=ethreshold,
+                         ithreshold=ithreshold, nthreshold=nthreshold,
+                         alphain=alphain, cascade=cascade,
+                         fluorescencemode=fluorescencemode)[0]
+
+def getEscapeList(matrix, energyList, ethreshold=None, ithreshold=None,
+                  nthreshold=None, alphain=None, cascade=None,
+                  fluorescencemode=None):
+    """
+    Same as getEscape but for a list of incident energies. It gives back a
+    list with the output of getEscape at each of the energies.
+
+    The energy independent part of the calculation is taken from the
+    escape table of the detector material (see _getEscapeTable) and the
+    attenuation terms are evaluated at all the energies at once.
+    """
     if alphain  is None: alphain  = 90.0
     if fluorescencemode is None:fluorescencemode = False
+    if cascade is None:cascade=False
+    energy = numpy.array(energyList, dtype=numpy.float64).reshape(-1)
+    table = _getEscapeTable(matrix[0])
+    if table is None:
+        return [{} for x in energy]
     sinAlphaIn   = numpy.sin(alphain * (numpy.pi)/180.)
     sinAlphaOut  = 1.0
-    elementsList = None
-    if cascade is None:cascade=False
-    if elementsList is None:
-        #get material elements and concentrations
-        eleDict = getMaterialMassFractions([matrix[0]], [1.0])
-        if eleDict == {}: return {}
-        #sort the elements according to atomic number (not needed because the output will be a dictionnary)
-        keys = eleDict.keys()
-        elementsList = [[getz(x),x] for x in keys]
-        elementsList.sort()
-        #do the job
+    thickness = matrix[1] * matrix[2]
+    nEnergies = energy.size
+    mutotal = numpy.array(getMaterialMassAttenuationCoefficients(matrix[0],
+                                        1.0, energy.tolist())['total'],
+                          dtype=numpy.float64).reshape(-1)
+    rates = numpy.zeros((nEnergies, len(table['labels'])), numpy.float64)
+    for ele, massFraction, lines in table['elements']:
+        if not len(lines):
+            continue
+        fluoWeights = numpy.array([_getFluorescenceWeights(ele, x,
+                                                normalize=False,
+                                                cascade=cascade)
+                                   for x in energy], dtype=numpy.float64)
+        muphoto = numpy.array(getMaterialMassAttenuationCoefficients(ele,
+                                        1.0, energy.tolist())['photo'],
+                              dtype=numpy.float64).reshape(-1)
+        # correct respect to Reed and Ware
+        # because there can be more than one element and
+        # I also weight the mass fraction
+        notalone = (muphoto/mutotal) * 0.5 * massFraction
+        trans = (table['mutotal'][lines][None, :] / sinAlphaOut) / \
+                (mutotal[:, None] / sinAlphaIn)
+        trans = notalone[:, None] * (1.0 - trans * numpy.log(1.0 + 1.0/trans))
+        if thickness > 0.0:
+            #extremely thin case
+            trans0 = notalone * thickness * mutotal / sinAlphaIn
+            trans = numpy.minimum(trans0[:, None], trans)
+        rates[:, lines] = fluoWeights[:, table['shell'][lines]] * \
+                          table['rate'][lines][None, :] * trans
 
-    outputDict = {}
+    output = []
+    labels = table['labels']
+    lineEnergies = table['energy']
+    for i in range(nEnergies):
+        if fluorescencemode:
+            peakEnergies = lineEnergies
+        else:
+            peakEnergies = energy[i] - lineEnergies
+        peaklist = [[peakEnergies[j], rates[i, j], labels[j]] \
+                    for j in range(len(labels))]
+        output.append(_filterPeaks(peaklist, ethreshold = ethreshold,
+                                   ithreshold = ithreshold,
+                                   nthreshold = nthreshold,
+                                   absoluteithreshold = True,
+                                   keeptotalrate = False))
+    return output
+
+# escape tables: detector material composition -> table
+_ESCAPE_TABLES = {}
+_ESCAPE_TABLES_KEYS = []
+_ESCAPE_TABLES_SIZE = 32
+
+def _getEscapeTable(material):
+    """
+    Energy independent part of the escape peak calculation of a detector
+    material.
+
+    The table is a dictionary with the emission lines of all the elements of
+    the material: their "labels", "energy", "rate" (branching ratio), "shell"
+    (index of the shell in the fluorescence weights) and the material
+    attenuation coefficient at the line energy ("mutotal"). The "elements"
+    key contains the list of (element, mass fraction, line indices) in order
+    of increasing atomic number. The tables are cached using the material
+    composition as key. None is returned if the material is unknown.
+    """
+    eleDict = getMaterialMassFractions([material], [1.0])
+    if eleDict == {}:
+        return None
+    key = tuple(sorted((x, float(eleDict[x])) for x in eleDict))
+    with _ELEMENT_LOCK:
+        if key in _ESCAPE_TABLES:
+            if _ESCAPE_TABLES_KEYS[-1] != key:
+                _ESCAPE_TABLES_KEYS.remove(key)
+                _ESCAPE_TABLES_KEYS.append(key)
+            return _ESCAPE_TABLES[key]
+    #sort the elements according to atomic number
+    elementsList = [[getz(x),x] for x in eleDict.keys()]
+    elementsList.sort()
     shelllist = ['K', 'L1', 'L2', 'L3','M1', 'M2', 'M3', 'M4', 'M5']
-    for z,ele in elementsList:
+    labels = []
+    energies = []
+    rates = []
+    shells = []
+    elements = []
+    for z, ele in elementsList:
         #use own unfiltered dictionnary
-        elementDict = _getUnfilteredElementDict(ele, energy)
-        outputDict[ele] ={}
-        outputDict[ele]['mass fraction'] = eleDict[ele]
-        outputDict[ele]['rates'] = {}
-        #get the fluorescence term for all shells
-        fluoWeights = _getFluorescenceWeights(ele, energy, normalize = False,
-                                                cascade=cascade)
-        outputDict[ele]['rays'] = elementDict['rays'] * 1
-        for rays in elementDict['rays']:
-            outputDict[ele][rays] = []
-            rates    = []
-            energies = []
-            transitions = elementDict[rays]
-            for transition in transitions:
-                outputDict[ele][rays] += [transition]
-                outputDict[ele][transition]={}
-                outputDict[ele][transition]['rate'] = 0.0
+        #(with photoweights set to False it does not depend on energy)
+        elementDict = _getUnfilteredElementDict(ele, None)
+        lines = []
+        for rays in ['M xrays', 'L xrays', 'K xrays']:
+            if rays not in elementDict['rays']:
+                continue
+            for transition in elementDict[rays]:
                 if transition[0] == "K":
-                    """
-                    if transition[-1] == 'a':
-
-                    elif transition[-1] == 'b':
-
-                    else:
-                    """
-                    rates.append(fluoWeights[0] *  elementDict[transition]['rate'])
+                    shells.append(0)
                 else:
-                    rates.append(fluoWeights[shelllist.index(transition[0:2])] * elementDict[transition]['rate'])
-                ene = elementDict[transition]['energy']
-                energies += [ene]
-                outputDict[ele][transition]['energy'] = ene
-                if ene < 0.0:
-                    print("element = ", ele, "transition = ", transition, "exc. energy = ", energy)
-
-            #matrix term
-            formula   = matrix[0]
-            thickness = matrix[1] * matrix[2]
-            energies += [energy]
-            allcoeffs   =  getMaterialMassAttenuationCoefficients(formula,1.0,energies)
-            mutotal  = allcoeffs['total']
-            #muphoto  = allcoeffs['photo']
-            muphoto  = getMaterialMassAttenuationCoefficients(ele,1.0,energy)['photo']
-            # correct respect to Reed and Ware
-            # because there can be more than one element and
-            # I also weight the mass fraction
-            notalone = (muphoto[-1]/mutotal[-1]) *\
-                        0.5 * outputDict[ele]['mass fraction']
-            del energies[-1]
-            i = 0
-            for transition in transitions:
-                trans = (mutotal[i]/sinAlphaOut)/(mutotal[-1]/sinAlphaIn)
-                trans = notalone * \
-                        (1.0 - trans * numpy.log(1.0 + 1.0/trans))
-                if thickness > 0.0:
-                    #extremely thin case
-                    trans0 = notalone * thickness * mutotal[-1]/sinAlphaIn
-                    trans = min(trans0, trans)
-                rates[i] *=  trans
-                outputDict[ele][transition]['rate'] = rates[i]
-                i += 1
-            outputDict[ele]['rates'][rays] = sum(rates)
-            #outputDict[ele][rays]= Element[ele]['rays'] * 1
-    peaklist = []
-    for key in outputDict:
-        rays = []
-        if 'M xrays' in outputDict[key]:
-            rays += outputDict[key]['M xrays']
-        if 'L xrays' in outputDict[key]:
-            rays += outputDict[key]['L xrays']
-        if 'K xrays' in outputDict[key]:
-            rays += outputDict[key]['K xrays']
-        for label in rays:
-            if fluorescencemode:
-                peaklist.append([outputDict[key][label]['energy'],
-                                 outputDict[key][label]['rate'],
-                                 key+' '+label.replace('*','')])
-            else:
-                peaklist.append([energy - outputDict[key][label]['energy'],
-                             outputDict[key][label]['rate'],
-                             key+' '+label.replace('*','')])
-
-    return _filterPeaks(peaklist, ethreshold = ethreshold,
-                                  ithreshold = ithreshold,
-                                  nthreshold = nthreshold,
-                                  absoluteithreshold = True,
-                                  keeptotalrate = False)
-
-
-    #return outputDict
+                    shells.append(shelllist.index(transition[0:2]))
+                lines.append(len(labels))
+                labels.append(ele + ' ' + transition.replace('*', ''))
+                energies.append(elementDict[transition]['energy'])
+                rates.append(elementDict[transition]['rate'])
+        elements.append((ele, eleDict[ele], numpy.array(lines, numpy.int64)))
+    table = {}
+    table['labels'] = labels
+    table['energy'] = numpy.array(energies, numpy.float64)
+    table['rate'] = numpy.array(rates, numpy.float64)
+    table['shell'] = numpy.array(shells, numpy.int64)
+    if len(energies):
+        table['mutotal'] = numpy.array(getMaterialMassAttenuationCoefficients( \
+                                    material, 1.0, energies)['total'],
+                                    numpy.float64).reshape(-1)
+    else:
+        table['mutotal'] = numpy.zeros((0,), numpy.float64)
+    table['elements'] = elements
+    with _ELEMENT_LOCK:
+        _ESCAPE_TABLES[key] = table
+        _ESCAPE_TABLES_KEYS.append(key)
+        if len(_ESCAPE_TABLES_KEYS) > _ESCAPE_TABLES_SIZE:
+            del _ESCAPE_TABLES[_ESCAPE_TABLES_KEYS.pop(0)]
+    return table
 
 
 def _filterPeaks(peaklist, ethreshold = None, ithreshold = None,
@@ -893,6 +932,9 @@ def _filterPeaks(peaklist, ethreshold = None, ithreshold = None,
             #         " rate = ",newpeaks[i][0], \
             #         "name = ",newpeaksnames[i]
             for j in range(i,len(newpeaks)):
+                # the peaks are sorted by energy
+                if (newpeaks[j][1] - newpeaks[i][1]) >= deltaonepeak:
+                    break
                 if i != j:
                     if abs(newpeaks[i][1]-newpeaks[j][1]) < deltaonepeak:
                         if len(tojoint):
@@ -1155,6 +1197,25 @@ def getMultilayerFluorescence(multilayer0,
                 if len(elementsList[0]) == 3:
                     optimized = 1
 
+    if optimized and (not secondary):
+        # primary fluorescence of element groups is calculated with array
+        # operations once the composition independent terms are known
+        from .MultilayerModel import MultilayerModel
+        model = MultilayerModel(multilayer, energyList,
+                                weightList=weightList,
+                                flagList=flagList,
+                                elementsList=elementsList,
+                                beamfilters=beamfilters,
+                                attenuators=attenuators,
+                                alphain=alphain,
+                                alphaout=alphaout,
+                                cascade=cascade,
+                                detector=detector,
+                                funnyfilters=funnyfilters,
+                                forcepresent=forcepresent,
+                                layerList=layerList)
+        return model.getMultilayerFluorescence(fulloutput=fulloutput)
+
     if attenuators is None:attenuators = []
     if beamfilters is None:beamfilters = []
     if alphain  is None: alphain =  45.0
@@ -2167,6 +2228,134 @@ def getMaterialKey(compound):
         return matkeys[index]
     return None
 
+# parsed formulae: compound -> (elements, numbers of atoms, element weights)
+_FORMULA_CACHE = OrderedDict()
+_FORMULA_CACHE_SIZE = 4096
+_FORMULA_CACHE_LOCK = threading.Lock()
+
+def _parseFormula(compound):
+    """
+    Split a chemical formula as 'C22H10N2O5' into the tuples of elements
+    and numbers of atoms, the element weights (mass * number of atoms) are
+    also returned. The results are memoized.
+    """
+    with _FORMULA_CACHE_LOCK:
+        if compound in _FORMULA_CACHE:
+            return _FORMULA_CACHE[compound]
+    elts = tuple([ w for w in re.split('[0-9]', compound) if w != '' ])
+    nbs = tuple([ int(w) for w in re.split('[a-zA-Z]', compound) if w != '' ])
+    weights = None
+    if (len(elts) == len(nbs)) and len(elts):
+        for elt in elts:
+            if elt not in Element:
+                break
+        else:
+            weights = tuple([Element[elt]['mass'] * nb \
+                             for (elt, nb) in zip(elts, nbs)])
+    result = (elts, nbs, weights)
+    with _FORMULA_CACHE_LOCK:
+        _FORMULA_CACHE[compound] = result
+        if len(_FORMULA_CACHE) > _FORMULA_CACHE_SIZE:
+            _FORMULA_CACHE.popitem(last=False)
+    return result
+
+# interpolated element cross sections: (element, LOGLOG, energies) -> arrays
+_XCOM_CACHE = OrderedDict()
+_XCOM_CACHE_LOCK = threading.Lock()
+_XCOM_CACHE_SIZE = 512
+_XCOM_CACHE_MAX_ENERGIES = 4096
+
+def _getElementCrossSections(ele, energy):
+    """
+    Photon cross sections of an element in cm2/g at the energies (keV) given
+    by a 1D numpy array.
+
+    Below 1 keV they are taken from EPDL97, above that energy they are
+    log-log interpolated from the XCOM tables. The brackets of all the
+    energies are found at once with numpy.searchsorted and the results for
+    the most recently used (element, energies) pairs are kept in a least
+    recently used cache. The returned arrays are read-only.
+    """
+    key = None
+    if energy.size <= _XCOM_CACHE_MAX_ENERGIES:
+        key = (ele, LOGLOG, energy.tobytes())
+        with _XCOM_CACHE_LOCK:
+            if key in _XCOM_CACHE:
+                # most recently used at the end
+                result = _XCOM_CACHE.pop(key)
+                _XCOM_CACHE[key] = result
+                return result
+
+    if 'xcom' in Element[ele]:
+        xcom_data = Element[ele]['xcom']
+    else:
+        xcom_data = getelementmassattcoef(ele, None)
+    cohe = numpy.zeros(energy.shape, numpy.float64)
+    comp = numpy.zeros(energy.shape, numpy.float64)
+    photo = numpy.zeros(energy.shape, numpy.float64)
+    pair = numpy.zeros(energy.shape, numpy.float64)
+
+    low = energy < 1.0
+    if low.any():
+        binding = None
+        if PyMcaEPDL97.EPDL97_DICT[ele]['original']:
+            #make sure the binding energies are those used by this module and not EADL ones
+            binding = Element[ele]['binding']
+        tmpDict = PyMcaEPDL97.getElementCrossSections(ele, energy[low],
+                                                      binding=binding)
+        cohe[low] = tmpDict['coherent']
+        comp[low] = tmpDict['compton']
+        photo[low] = tmpDict['photo']
+
+    high = ~low
+    if high.any():
+        ene = energy[high]
+        xene = xcom_data['energy']
+        # last tabulated point <= ene and first tabulated point >= ene
+        i0 = numpy.searchsorted(xene, ene, side='right') - 1
+        i1 = numpy.searchsorted(xene, ene, side='left')
+        if (i0.min() < 0) or (i1.max() >= len(xene)):
+            raise ValueError("Energy outside %s cross section tables" % ele)
+        exact = i1 <= i0
+        if LOGLOG:
+            A = xcom_data['energylog10'][i0]
+            B = xcom_data['energylog10'][i1]
+            x = numpy.log10(ene)
+        else:
+            A = xene[i0]
+            B = xene[i1]
+            x = ene
+        delta = B - A
+        delta[exact] = 1.0
+        c2 = (x - A) / delta
+        c1 = (B - x) / delta
+        values = []
+        for label in ['coherent', 'compton', 'photo']:
+            tmp = pow(10.0, c2 * xcom_data[label + 'log10'][i1] + \
+                            c1 * xcom_data[label + 'log10'][i0])
+            tmp[exact] = xcom_data[label][i1[exact]]
+            values.append(tmp)
+        cohe[high], comp[high], photo[high] = values
+        pair1 = xcom_data['pair'][i1]
+        pair0 = xcom_data['pair'][i0]
+        valid = (pair1 > 0.0) & (pair0 > 0.0)
+        tmp = numpy.zeros(ene.shape, numpy.float64)
+        if valid.any():
+            tmp[valid] = pow(10.0, c1[valid] * numpy.log10(pair0[valid]) + \
+                                   c2[valid] * numpy.log10(pair1[valid]))
+        tmp[exact] = pair1[exact]
+        pair[high] = tmp
+
+    result = (cohe, comp, photo, pair)
+    if key is not None:
+        for array in result:
+            array.flags.writeable = False
+        with _XCOM_CACHE_LOCK:
+            _XCOM_CACHE[key] = result
+            while len(_XCOM_CACHE) > _XCOM_CACHE_SIZE:
+                _XCOM_CACHE.popitem(last=False)
+    return result
+
 def getmassattcoef(compound, energy=None):
     """
     Usage: getmassattcoef(element symbol/composite, energy in kev)
@@ -2194,8 +2383,7 @@ def getmassattcoef(compound, energy=None):
     #single element case
     if compound in Element.keys():
         return getelementmassattcoef(compound,energy)
-    elts= [ w for w in re.split('[0-9]', compound) if w != '' ]
-    nbs= [ int(w) for w in re.split('[a-zA-Z]', compound) if w != '' ]
+    elts, nbs, weights = _parseFormula(compound)
     if len(elts)==1 and len(nbs)==0:
         if elts in Element.keys():
             return getelementmassattcoef(compound,energy)
@@ -2204,94 +2392,39 @@ def getmassattcoef(compound, energy=None):
     if (len(elts)==0 and len(nbs)==0) or (len(elts) != len(nbs)):
         return {}
 
-    fraction = [Element[elt]['mass'] *nb for (elt, nb) in zip(elts, nbs) ]
-    div      = sum(fraction)
-    fraction = [x/div for x in fraction]
+    if weights is None:
+        weights = [Element[elt]['mass'] *nb for (elt, nb) in zip(elts, nbs) ]
+    div      = sum(weights)
+    fraction = [x/div for x in weights]
     #print "fraction = ",fraction
-    ddict={}
-    ddict['energy']   = []
-    ddict['coherent'] = []
-    ddict['compton']  = []
-    ddict['photo']    = []
-    ddict['pair']     = []
-    ddict['total']    = []
-    eltindex = 0
     if energy is None:
-        energy=[]
-        for ele in elts:
-            xcom_data = getelementmassattcoef(ele,None)['energy']
-            for ene in xcom_data:
-                if ene not in energy:
-                    energy.append(ene)
-        energy.sort()
-
-    for ele in elts:
-        xcom_data = getelementmassattcoef(ele,None)
-        #now I have to interpolate at the different energies
-        if not hasattr(energy, "__len__"):
-            energy =[energy]
-        eneindex = 0
-        for ene in energy:
-            if ene < 1.0:
-                if PyMcaEPDL97.EPDL97_DICT[ele]['original']:
-                    #make sure the binding energies are those used by this module and not EADL ones
-                    PyMcaEPDL97.setElementBindingEnergies(ele,
-                                                          Element[ele]['binding'])
-                tmpDict = PyMcaEPDL97.getElementCrossSections(ele, ene)
-                cohe  = tmpDict['coherent'][0]
-                comp  = tmpDict['compton'][0]
-                photo = tmpDict['photo'][0]
-                pair  = 0.0
-            else:
-                i0=max(numpy.nonzero(xcom_data['energy'] <= ene)[0])
-                i1=min(numpy.nonzero(xcom_data['energy'] >= ene)[0])
-                if (i1 == i0) or (i0>i1):
-                    cohe=xcom_data['coherent'][i1]
-                    comp=xcom_data['compton'][i1]
-                    photo=xcom_data['photo'][i1]
-                    pair=xcom_data['pair'][i1]
-                else:
-                    if LOGLOG:
-                        A=xcom_data['energylog10'][i0]
-                        B=xcom_data['energylog10'][i1]
-                        logene = numpy.log10(ene)
-                        c2=(logene-A)/(B-A)
-                        c1=(B-logene)/(B-A)
-                    else:
-                        A=xcom_data['energy'][i0]
-                        B=xcom_data['energy'][i1]
-                        c2=(ene-A)/(B-A)
-                        c1=(B-ene)/(B-A)
-                    cohe= pow(10.0,c2*xcom_data['coherentlog10'][i1]+\
-                                   c1*xcom_data['coherentlog10'][i0])
-                    comp= pow(10.0,c2*xcom_data['comptonlog10'][i1]+\
-                                   c1*xcom_data['comptonlog10'][i0])
-                    photo=pow(10.0,c2*xcom_data['photolog10'][i1]+\
-                                   c1*xcom_data['photolog10'][i0])
-                    if xcom_data['pair'][i1] > 0.0:
-                        c2 = c2*numpy.log10(xcom_data['pair'][i1])
-                        if xcom_data['pair'][i0] > 0.0:
-                            c1 = c1*numpy.log10(xcom_data['pair'][i0])
-                            pair = pow(10.0,c1+c2)
-                        else:
-                            pair =0.0
-                    else:
-                        pair =0.0
-            if eltindex == 0:
-                ddict['energy'].append(ene)
-                ddict['coherent'].append(cohe *fraction[eltindex])
-                ddict['compton'].append(comp *fraction[eltindex])
-                ddict['photo'].append(photo *fraction[eltindex])
-                ddict['pair'].append(pair*fraction[eltindex])
-                ddict['total'].append((cohe+comp+photo+pair)*fraction[eltindex])
-            else:
-                ddict['coherent'][eneindex] += cohe  *fraction[eltindex]
-                ddict['compton'] [eneindex] += comp  *fraction[eltindex]
-                ddict['photo']   [eneindex] += photo *fraction[eltindex]
-                ddict['pair']    [eneindex] += pair  *fraction[eltindex]
-                ddict['total']   [eneindex] += (cohe+comp+photo+pair) * fraction[eltindex]
-            eneindex += 1
-        eltindex += 1
+        energy = numpy.unique(numpy.concatenate(\
+            [getelementmassattcoef(ele,None)['energy'] for ele in elts])).tolist()
+    elif not hasattr(energy, "__len__"):
+        energy =[energy]
+    energyArray = numpy.array(energy, numpy.float64).reshape(-1)
+
+    for eltindex, ele in enumerate(elts):
+        cohe, comp, photo, pair = _getElementCrossSections(ele, energyArray)
+        if eltindex == 0:
+            coherent = cohe * fraction[eltindex]
+            compton = comp * fraction[eltindex]
+            photoelectric = photo * fraction[eltindex]
+            pairproduction = pair * fraction[eltindex]
+            total = (cohe+comp+photo+pair) * fraction[eltindex]
+        else:
+            coherent += cohe * fraction[eltindex]
+            compton += comp * fraction[eltindex]
+            photoelectric += photo * fraction[eltindex]
+            pairproduction += pair * fraction[eltindex]
+            total += (cohe+comp+photo+pair) * fraction[eltindex]
+    ddict={}
+    ddict['energy']   = list(energy)
+    ddict['coherent'] = coherent.tolist()
+    ddict['compton']  = compton.tolist()
+    ddict['photo']    = photoelectric.tolist()
+    ddict['pair']     = pairproduction.tolist()
+    ddict['total']    = total.tolist()
     return ddict
 
 def __materialInCompoundList(lst):
@@ -2417,9 +2550,8 @@ def getMaterialMassAttenuationCoefficients(compoundList0, fractionList0, energy0
             elts=[compound]
             nbs =[1]
         else:
-            elts= [ w for w in re.split('[0-9]', compound) if w != '' ]
             try:
-                nbs= [ int(w) for w in re.split('[a-zA-Z]', compound) if w != '' ]
+                elts, nbs, weights = _parseFormula(compound)
             except:
                 raise ValueError("Compound '%s' not understood" % compound)
             if len(elts)==1 and len(nbs)==0:
@@ -2453,114 +2585,142 @@ def getMaterialMassAttenuationCoefficients(compoundList0, fractionList0, energy0
 
     #I have the energy grid, the elements and their fractions
     dict={}
-    dict['energy']   = []
-    dict['coherent'] = []
-    dict['compton']  = []
-    dict['photo']    = []
-    dict['pair']     = []
-    dict['total']    = []
+    if not len(materialElements):
+        for key in ['energy', 'coherent', 'compton', 'photo', 'pair', 'total']:
+            dict[key] = []
+        return dict
+    if (type(energy) != type([])):
+        energy =[energy]
+    energyArray = numpy.array(energy, numpy.float64).reshape(-1)
     eltindex = 0
     for ele in materialElements.keys():
-        if 'xcom' in Element[ele]:
-            xcom_data = Element[ele]['xcom']
+        cohe, comp, photo, pair = _getElementCrossSections(ele, energyArray)
+        if eltindex == 0:
+            coherent = cohe * materialElements[ele]
+            compton = comp * materialElements[ele]
+            photoelectric = photo * materialElements[ele]
+            pairproduction = pair * materialElements[ele]
+            total = (cohe+comp+photo+pair) * materialElements[ele]
         else:
-            xcom_data = getelementmassattcoef(ele,None)
-        #now I have to interpolate at the different energies
-        if (type(energy) != type([])):
-            energy =[energy]
-        eneindex = 0
-        for ene in energy:
-            if ene < 1.0:
-                if PyMcaEPDL97.EPDL97_DICT[ele]['original']:
-                    #make sure the binding energies are those used by this module and not EADL ones
-                    PyMcaEPDL97.setElementBindingEnergies(ele,
-                                                          Element[ele]['binding'])
-                tmpDict = PyMcaEPDL97.getElementCrossSections(ele, ene)
-                cohe  = tmpDict['coherent'][0]
-                comp  = tmpDict['compton'][0]
-                photo = tmpDict['photo'][0]
-                pair  = 0.0
-            else:
-                i0=max(numpy.nonzero(xcom_data['energy'] <= ene)[0])
-                i1=min(numpy.nonzero(xcom_data['energy'] >= ene)[0])
-                if (i1 == i0) or (i0>i1):
-                    cohe=xcom_data['coherent'][i1]
-                    comp=xcom_data['compton'][i1]
-                    photo=xcom_data['photo'][i1]
-                    pair=xcom_data['pair'][i1]
-                else:
-                    if LOGLOG:
-                        A=xcom_data['energylog10'][i0]
-                        B=xcom_data['energylog10'][i1]
-                        logene = numpy.log10(ene)
-                        c2=(logene-A)/(B-A)
-                        c1=(B-logene)/(B-A)
-                    else:
-                        A=xcom_data['energy'][i0]
-                        B=xcom_data['energy'][i1]
-                        c2=(ene-A)/(B-A)
-                        c1=(B-ene)/(B-A)
-                    cohe= pow(10.0,c2*xcom_data['coherentlog10'][i1]+\
-                                   c1*xcom_data['coherentlog10'][i0])
-                    comp= pow(10.0,c2*xcom_data['comptonlog10'][i1]+\
-                                   c1*xcom_data['comptonlog10'][i0])
-                    photo=pow(10.0,c2*xcom_data['photolog10'][i1]+\
-                                   c1*xcom_data['photolog10'][i0])
-                    if xcom_data['pair'][i1] > 0.0:
-                        c2 = c2*numpy.log10(xcom_data['pair'][i1])
-                        if xcom_data['pair'][i0] > 0.0:
-                            c1 = c1*numpy.log10(xcom_data['pair'][i0])
-                            pair = pow(10.0,c1+c2)
-                        else:
-                            pair =0.0
-                    else:
-                        pair =0.0
-            if eltindex == 0:
-                dict['energy'].append(ene)
-                dict['coherent'].append(cohe * materialElements[ele])
-                dict['compton'].append(comp * materialElements[ele])
-                dict['photo'].append(photo * materialElements[ele])
-                dict['pair'].append(pair* materialElements[ele])
-                dict['total'].append((cohe+comp+photo+pair)* materialElements[ele])
-            else:
-                dict['coherent'][eneindex] += cohe  * materialElements[ele]
-                dict['compton'] [eneindex] += comp  * materialElements[ele]
-                dict['photo']   [eneindex] += photo * materialElements[ele]
-                dict['pair']    [eneindex] += pair  * materialElements[ele]
-                dict['total']   [eneindex] += (cohe+comp+photo+pair) *  materialElements[ele]
-            eneindex += 1
+            coherent += cohe * materialElements[ele]
+            compton += comp * materialElements[ele]
+            photoelectric += photo * materialElements[ele]
+            pairproduction += pair * materialElements[ele]
+            total += (cohe+comp+photo+pair) * materialElements[ele]
         eltindex += 1
+    dict['energy']   = list(energy)
+    dict['coherent'] = coherent.tolist()
+    dict['compton']  = compton.tolist()
+    dict['photo']    = photoelectric.tolist()
+    dict['pair']     = pairproduction.tolist()
+    dict['total']    = total.tolist()
     return dict
 
 
+_LINE_INDEX = {}
+
+def _getLineIndex():
+    """
+    Return the emission lines of all the elements sorted by energy.
+
+    The index is a dictionary of arrays with the keys "energy", "element"
+    (index in ElementList), "rays" (index in ElementXrays), "order" (position
+    of the transition in the rays list of the element) and "transition"
+    (transition names). It is built from the current contents of Element and
+    rebuilt after each call to updateDict.
+    """
+    with _ELEMENT_LOCK:
+        if "energy" in _LINE_INDEX:
+            return _LINE_INDEX
+        energyList = []
+        elementList = []
+        raysList = []
+        orderList = []
+        transitionList = []
+        for i, ele in enumerate(ElementList):
+            if 'rays' not in Element[ele]:
+                continue
+            for j, rays in enumerate(ElementXrays):
+                for k, transition in enumerate(Element[ele][rays]):
+                    energyList.append(Element[ele][transition]['energy'])
+                    elementList.append(i)
+                    raysList.append(j)
+                    orderList.append(k)
+                    transitionList.append(transition)
+        energy = numpy.array(energyList, dtype=numpy.float64)
+        idx = numpy.argsort(energy, kind="mergesort")
+        ddict = {}
+        ddict["energy"] = energy[idx]
+        ddict["element"] = numpy.array(elementList, dtype=numpy.int32)[idx]
+        ddict["rays"] = numpy.array(raysList, dtype=numpy.int32)[idx]
+        ddict["order"] = numpy.array(orderList, dtype=numpy.int32)[idx]
+        ddict["transition"] = [transitionList[i] for i in idx]
+        _LINE_INDEX.update(ddict)
+        return _LINE_INDEX
+
+def _resetLineIndex():
+    with _ELEMENT_LOCK:
+        _LINE_INDEX.clear()
+
 def getcandidates(energy,threshold=None,targetrays=None):
+    """
+    Find the emission lines within threshold keV of the given energies.
+
+    :param energy: Energy or sequence of energies in keV
+    :param threshold: Maximum distance in keV. Default is 0.010
+    :param targetrays: Ray families to consider. Default is
+                       ['K', 'L1', 'L2', 'L3', 'M']
+    :return: Dictionary keyed by the energy index. Each entry contains the
+             'energy', the list of 'elements' with candidate lines and, for
+             each of those elements, the list of [transition, energy, rate]
+    """
     if threshold  is None:
         threshold = 0.010
     if targetrays is None:
         targetrays=['K', 'L1', 'L2', 'L3', 'M']
-    if type(energy) != type([]):
+    if isinstance(energy, numpy.ndarray):
+        energy = list(energy.ravel())
+    elif type(energy) == type(()):
+        energy = list(energy)
+    elif type(energy) != type([]):
         energy = [energy]
     if type(targetrays) != type([]):
         targetrays = [targetrays]
-    #K lines
+    raysIndex = [ElementXrays.index(ray + " xrays") for ray in targetrays]
+    index = _getLineIndex()
+    lineEnergy = index["energy"]
+    # widen the search window and apply the exact condition afterwards
+    margin = 1.0e-9 * (1.0 + numpy.abs(numpy.array(energy)))
+    first = numpy.searchsorted(lineEnergy,
+                               numpy.array(energy) - threshold - margin,
+                               side="left")
+    last = numpy.searchsorted(lineEnergy,
+                              numpy.array(energy) + threshold + margin,
+                              side="right")
     lines ={}
-    index = 0
-    for ene in energy:
-        lines[index] = {'energy':ene,
-                        'elements':[]}
-        for ele in ElementList:
-            for ray in targetrays:
-                rays = ray + " xrays"
-                if 'rays' in Element[ele]:
-                    for transition in Element[ele][rays]:
-                        e = Element[ele][transition]['energy']
-                        r = Element[ele][transition]['rate']
-                        if abs(ene-e) < threshold:
-                            if ele not in lines[index]['elements']:
-                                lines[index]['elements'].append(ele)
-                                lines[index][ele]=[]
-                            lines[index][ele].append([transition, e, r])
-        index += 1
+    for n, ene in enumerate(energy):
+        lines[n] = {'energy':ene,
+                    'elements':[]}
+        candidates = []
+        for i in range(first[n], last[n]):
+            e = lineEnergy[i]
+            if abs(ene-e) < threshold:
+                rays = index["rays"][i]
+                for position, j in enumerate(raysIndex):
+                    if j == rays:
+                        candidates.append((index["element"][i], position,
+                                           index["order"][i], i))
+        # same ordering as a loop over elements, target rays and transitions
+        candidates.sort()
+        for elementIndex, position, order, i in candidates:
+            ele = ElementList[elementIndex]
+            if ele not in lines[n]['elements']:
+                lines[n]['elements'].append(ele)
+                lines[n][ele]=[]
+            transition = index["transition"][i]
+            lines[n][ele].append([transition,
+                                  Element[ele][transition]['energy'],
+                                  Element[ele][transition]['rate']])
     return lines
 
 
@@ -2736,68 +2896,17 @@ def getelementmassattcoef(ele,energy=None):
 
     if energy is None:
         return  Element[ele]['xcom']
-    ddict={}
-    ddict['energy']   = []
-    ddict['coherent'] = []
-    ddict['compton']  = []
-    ddict['photo']    = []
-    ddict['pair']     = []
-    ddict['total']    = []
     if not hasattr(energy, "__len__"):
         energy =[energy]
-    for ene in energy:
-        if ene < 1.0:
-            if PyMcaEPDL97.EPDL97_DICT[ele]['original']:
-                #make sure the binding energies are those used by this module and not EADL ones
-                PyMcaEPDL97.setElementBindingEnergies(ele,
-                                                      Element[ele]['binding'])
-            tmpDict = PyMcaEPDL97.getElementCrossSections(ele, ene)
-            cohe  = tmpDict['coherent'][0]
-            comp  = tmpDict['compton'][0]
-            photo = tmpDict['photo'][0]
-            pair  = 0.0
-        else:
-            i0=max(numpy.nonzero(Element[ele]['xcom']['energy'] <= ene)[0])
-            i1=min(numpy.nonzero(Element[ele]['xcom']['energy'] >= ene)[0])
-            if i1 <= i0:
-                cohe=Element[ele]['xcom']['coherent'][i1]
-                comp=Element[ele]['xcom']['compton'][i1]
-                photo=Element[ele]['xcom']['photo'][i1]
-                pair=Element[ele]['xcom']['pair'][i1]
-            else:
-                if LOGLOG:
-                    A=Element[ele]['xcom']['energylog10'][i0]
-                    B=Element[ele]['xcom']['energylog10'][i1]
-                    logene = numpy.log10(ene)
-                    c2=(logene-A)/(B-A)
-                    c1=(B-logene)/(B-A)
-                else:
-                    A=Element[ele]['xcom']['energy'][i0]
-                    B=Element[ele]['xcom']['energy'][i1]
-                    c2=(ene-A)/(B-A)
-                    c1=(B-ene)/(B-A)
-
-                cohe= pow(10.0,c2*Element[ele]['xcom']['coherentlog10'][i1]+\
-                               c1*Element[ele]['xcom']['coherentlog10'][i0])
-                comp= pow(10.0,c2*Element[ele]['xcom']['comptonlog10'][i1]+\
-                               c1*Element[ele]['xcom']['comptonlog10'][i0])
-                photo=pow(10.0,c2*Element[ele]['xcom']['photolog10'][i1]+\
-                               c1*Element[ele]['xcom']['photolog10'][i0])
-                if Element[ele]['xcom']['pair'][i1] > 0.0:
-                    c2 = c2*numpy.log10(Element[ele]['xcom']['pair'][i1])
-                    if Element[ele]['xcom']['pair'][i0] > 0.0:
-                        c1 = c1*numpy.log10(Element[ele]['xcom']['pair'][i0])
-                        pair = pow(10.0,c1+c2)
-                    else:
-                        pair =0.0
-                else:
-                    pair =0.0
-        ddict['energy'].append(ene)
-        ddict['coherent'].append(cohe)
-        ddict['compton'].append(comp)
-        ddict['photo'].append(photo)
-        ddict['pair'].append(pair)
-        ddict['total'].append(cohe+comp+photo+pair)
+    cohe, comp, photo, pair = _getElementCrossSections(ele,
+                                numpy.array(energy, numpy.float64).reshape(-1))
+    ddict={}
+    ddict['energy']   = list(energy)
+    ddict['coherent'] = cohe.tolist()
+    ddict['compton']  = comp.tolist()
+    ddict['photo']    = photo.tolist()
+    ddict['pair']     = pair.tolist()
+    ddict['total']    = (cohe+comp+photo+pair).tolist()
     return ddict
 
 def getElementLShellRates(symbol,energy=None,photoweights = None):
@@ -2985,9 +3094,75 @@ def _updateElementDict(symbol, dict, energy=None, minenergy=MINENERGY, minrate=0
     dict['buildparameters']['minenergy'] = minenergy
     dict['buildparameters']['minrate']   = minrate
 
+_ELEMENT_LOCK = threading.RLock()
+
+class _ElementDict(dict):
+    """
+    Dictionary of element properties keyed by element symbol.
+
+    The emission lines of an element depend on the excitation energy and are
+    only (re)calculated the first time the element is accessed after a call
+    to updateDict. Building them for the whole periodic table at import time
+    or at each change of the excitation energy is a waste because only a few
+    elements are used at any time.
+    """
+    def __init__(self, *var, **kw):
+        dict.__init__(self, *var, **kw)
+        self._pending = set()
+        self._building = set()
+        self._parameters = {}
+
+    def _setPending(self, parameters):
+        with _ELEMENT_LOCK:
+            self._parameters = parameters
+            self._pending = set(dict.keys(self))
+
+    def _update(self, key):
+        if (key in self._pending) or (key in self._building):
+            # other threads wait until the element is built, the building
+            # thread itself can access the element properties
+            with _ELEMENT_LOCK:
+                if key in self._pending:
+                    self._pending.discard(key)
+                    self._building.add(key)
+                    try:
+                        _updateElementDict(key, dict.__getitem__(self, key),
+                                           **self._parameters)
+                    finally:
+                        self._building.discard(key)
+
+    def __getitem__(self, key):
+        self._update(key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def values(self):
+        return [self[key] for key in dict.keys(self)]
+
+    def items(self):
+        return [(key, self[key]) for key in dict.keys(self)]
+
+    def itervalues(self):
+        for key in dict.keys(self):
+            yield self[key]
+
+    def iteritems(self):
+        for key in dict.keys(self):
+            yield key, self[key]
+
+    def __reduce__(self):
+        return (dict, (self.items(),))
+
 def updateDict(energy=None, minenergy=MINENERGY, minrate=0.0010, cb=True):
-    for ele in ElementList:
-        _updateElementDict(ele, Element[ele], energy=energy, minenergy=minenergy, minrate=minrate)
+    # the elements are updated when accessed
+    Element._setPending({"energy": energy,
+                         "minenergy": minenergy,
+                         "minrate": minrate})
+    _resetLineIndex()
     if cb:
         _updateCallback()
     return
@@ -3068,7 +3243,7 @@ def _updateCallback():
             method()
 
 
-Element={}
+Element = _ElementDict()
 for ele in ElementList:
     z = getz(ele)
     Element[ele]={}
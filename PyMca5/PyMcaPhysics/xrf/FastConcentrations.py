@@ -0,0 +1,631 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V.A. Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+__doc__ = """
+Concentration maps with a matrix correction calculated pixel by pixel.
+
+Given the fitted areas of the element groups for every pixel of a map, the
+FastConcentrations class calculates the mass fractions following the same
+procedure as the SingleLayerStrategy matrix iteration, but for all the
+pixels at once: the concentrations of the elements selected in the strategy
+are incorporated into the composition of the refined layer, the expected
+fluorescence rates are recalculated with that composition and the
+concentrations updated until they do not change anymore. Pixels that have
+converged are not processed in the following iterations.
+
+The pixels are processed in blocks, in parallel threads. Optionally, the
+compositions can be rounded to a grid and the fluorescence rates of each grid
+node are then calculated only once and cached.
+
+When the reference element is set to Auto, it is chosen as in
+ConcentrationsTool, but using the areas summed over the whole map, so the
+same reference is used for all the pixels.
+
+Secondary excitation is not considered.
+"""
+import copy
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import numpy
+from . import Elements
+from .MultilayerModel import MultilayerModel
+
+DEBUG = 0
+
+def _getNumberOfThreads(nthreads=None):
+    if nthreads is None:
+        try:
+            nthreads = multiprocessing.cpu_count()
+        except NotImplementedError:
+            nthreads = 1
+    return max(1, int(nthreads))
+
+def _runBlocks(function, blocks, nthreads):
+    # most of the time is spent in numpy operations releasing the GIL
+    if (nthreads > 1) and (len(blocks) > 1):
+        pool = ThreadPool(min(nthreads, len(blocks)))
+        try:
+            pool.map(function, blocks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for block in blocks:
+            function(block)
+
+
+class FastConcentrations(object):
+    def __init__(self, config=None, groups=None):
+        """
+        :param config: PyMca fit configuration
+        :param groups: Fitted element groups as ["Fe K", "Pb L", ...].
+                       Default is to take them from the peaks of the
+                       configuration.
+        """
+        self._model = None
+        self._cache = {}
+        self._cacheLock = threading.Lock()
+        if config is not None:
+            self.setFitConfiguration(config, groups=groups)
+
+    def setFitConfiguration(self, config, groups=None):
+        config = copy.deepcopy(config)
+        for material in config.get('materials', {}).keys():
+            Elements.Material[material] = copy.deepcopy(\
+                                            config['materials'][material])
+        concentrationsConfig = {"usematrix": 0,
+                                "useattenuators": 1,
+                                "flux": 1.0E10,
+                                "time": 1.0,
+                                "area": 30.0,
+                                "distance": 10.0,
+                                "reference": "Auto"}
+        concentrationsConfig.update(config.get('concentrations', {}))
+
+        # sample description
+        attenuators = []
+        beamfilters = []
+        funnyfilters = []
+        matrix = None
+        detector = None
+        alphain = None
+        alphaout = None
+        for attenuator in config['attenuators'].keys():
+            if not config['attenuators'][attenuator][0]:
+                continue
+            values = config['attenuators'][attenuator]
+            if attenuator.upper() == "MATRIX":
+                matrix = values[1:4]
+                alphain = values[4]
+                alphaout = values[5]
+            elif attenuator.upper()[:-1] == "BEAMFILTER":
+                beamfilters.append(values[1:])
+            elif attenuator.upper() == "DETECTOR":
+                detector = values[1:]
+            elif (len(values) > 4) and (abs(values[4] - 1.0) > 1.0e-10):
+                funnyfilters.append(values[1:])
+            else:
+                attenuators.append(values[1:])
+        if matrix is None:
+            raise ValueError("Invalid or undefined sample matrix")
+        if matrix[0].upper() == "MULTILAYER":
+            layerNames = []
+            multilayer = []
+            layerKeys = list(config['multilayer'].keys())
+            layerKeys.sort()
+            for layer in layerKeys:
+                if config['multilayer'][layer][0]:
+                    layerNames.append(layer)
+                    multilayer.append(config['multilayer'][layer][1:])
+            if not len(multilayer):
+                raise ValueError("Empty multilayer sample")
+        else:
+            layerNames = ["Layer0"]
+            multilayer = [matrix]
+        for layer in multilayer:
+            if not Elements.isValidMaterial(layer[0]):
+                raise ValueError("Material %s is not defined" % layer[0])
+        if not concentrationsConfig['useattenuators']:
+            attenuators = None
+            funnyfilters = None
+
+        # excitation beam
+        energyList = config['fit']['energy']
+        if energyList is None:
+            raise ValueError("Invalid energy")
+        if type(energyList) != type([]):
+            energyList = [energyList]
+            flagList = [1]
+            weightList = [1.0]
+        else:
+            flagList = config['fit']['energyflag']
+            weightList = config['fit']['energyweight']
+        finalEnergy = []
+        finalWeight = []
+        for idx in range(len(energyList)):
+            if flagList[idx] and (energyList[idx] is not None):
+                finalEnergy.append(energyList[idx])
+                finalWeight.append(weightList[idx])
+
+        # element groups
+        if groups is None:
+            groups = []
+            for element in config['peaks'].keys():
+                peaks = config['peaks'][element]
+                if type(peaks) != type([]):
+                    peaks = [peaks]
+                for peak in peaks:
+                    groups.append("%s %s" % (element, peak))
+        elementsList = []
+        for group in groups:
+            ele, family = group.split()[0:2]
+            elementsList.append([Elements.getz(ele), ele, family])
+        elementsList.sort()
+        self._groups = ["%s %s" % (item[1], item[2]) for item in elementsList]
+
+        self._model = MultilayerModel(multilayer, finalEnergy,
+                                      weightList=finalWeight,
+                                      elementsList=elementsList,
+                                      beamfilters=beamfilters,
+                                      attenuators=attenuators,
+                                      alphain=alphain,
+                                      alphaout=alphaout,
+                                      cascade=True,
+                                      detector=detector,
+                                      funnyfilters=funnyfilters,
+                                      forcepresent=1)
+        self._multilayer = multilayer
+        self._layerNames = layerNames
+        self._layerComposition = [Elements.getMaterialMassFractions(\
+                                                [layer[0]], [1.0]) \
+                                  for layer in multilayer]
+
+        # flux and solid angle
+        self._reference = None
+        if concentrationsConfig['usematrix']:
+            self._reference = self._getReference(\
+                                concentrationsConfig['reference'])
+        else:
+            distance = concentrationsConfig['distance']
+            radius2 = concentrationsConfig['area'] / numpy.pi
+            solidangle = 0.5 * (1.0 - (distance / \
+                                       numpy.sqrt(pow(distance, 2) + radius2)))
+            self._fluxFactor = concentrationsConfig['flux'] * \
+                               concentrationsConfig['time'] * solidangle
+
+        # matrix iteration
+        self._strategy = None
+        if config['fit'].get('strategyflag', False):
+            strategy = config['fit'].get('strategy', "SingleLayerStrategy")
+            if strategy != "SingleLayerStrategy":
+                raise ValueError("Unsupported strategy %s" % strategy)
+            self._strategy = self._getStrategy(config[strategy])
+        with self._cacheLock:
+            self._cache = {}
+
+    def getGroups(self):
+        """
+        Return the list of element groups in the order used by the
+        processAreas method.
+        """
+        return self._groups * 1
+
+    def getLayerNames(self):
+        return self._layerNames * 1
+
+    def _getReference(self, referenceElement):
+        # layers containing the fitted elements
+        present = {}
+        for ilayer, composition in enumerate(self._layerComposition):
+            for group in self._groups:
+                ele = group.split()[0]
+                if ele in composition:
+                    if ele not in present:
+                        present[ele] = []
+                    if ilayer not in present[ele]:
+                        present[ele].append(ilayer)
+        if not len(present):
+            text = "Matrix must contain at least one fitted element\n"
+            text += "in order to estimate flux and efficiency from it."
+            raise ValueError(text)
+        referenceElement = referenceElement.replace(' ', "")
+        if len(referenceElement) and (referenceElement.upper() != 'AUTO'):
+            if len(referenceElement) == 2:
+                referenceElement = referenceElement.upper()[0] +\
+                                   referenceElement.lower()[1]
+            elif len(referenceElement) == 1:
+                referenceElement = referenceElement.upper()[0]
+            if referenceElement not in present:
+                text = "Element %s not among matrix elements" % \
+                       referenceElement
+                raise ValueError(text)
+        else:
+            # chosen from the areas when processing
+            referenceElement = None
+        ddict = {}
+        ddict["element"] = referenceElement
+        ddict["present"] = present
+        return ddict
+
+    def _getReferenceGroup(self, element):
+        referenceGroup = None
+        for group in self._groups:
+            ele, family = group.split()
+            if ele != element:
+                continue
+            if referenceGroup is None:
+                referenceGroup = group
+            elif (referenceGroup.split()[1][0] == family[0]) and \
+                 (family[0] == 'L'):
+                # same choice as ConcentrationsTool: L3 better than L1
+                referenceGroup = group
+        return referenceGroup
+
+    def _figureOfMerit(self, element, areas, layers):
+        # weight of ConcentrationsTool with the rates of the initial matrix
+        weight = 0.0
+        z = Elements.getz(element)
+        for groupIndex, group in enumerate(self._groups):
+            ele, family = group.split()
+            if ele != element:
+                continue
+            if (family[0] == "K") and (z > 18):
+                factor = 2.0
+            elif (family[0] == "L") and (z > 54):
+                factor = 1.5
+            else:
+                factor = 1.0
+            rate = 0.0
+            for ilayer in self._reference["present"][element]:
+                rate += self._layerComposition[ilayer][element] * \
+                        layers[ilayer, groupIndex, 0]
+            if rate > 0.0:
+                weightHelp = areas[groupIndex] * rate * factor
+                if weightHelp > weight:
+                    weight = weightHelp
+        return weight
+
+    def _getStrategy(self, strategyConfiguration):
+        strategy = {}
+        strategy["iterations"] = strategyConfiguration.get("iterations", 3)
+        # refined layer
+        layer = strategyConfiguration.get("layer", "Auto")
+        elements = []
+        for group in strategyConfiguration["peaks"]:
+            if "-" in group:
+                continue
+            elements.append(group.split()[0])
+        if layer.upper() == "AUTO":
+            layerIndex = 0
+            for ilayer, composition in enumerate(self._layerComposition):
+                if len([ele for ele in elements if ele in composition]):
+                    layerIndex = ilayer
+                    break
+        elif layer in self._layerNames:
+            layerIndex = self._layerNames.index(layer)
+        else:
+            raise ValueError("Layer %s not among sample layers" % layer)
+        strategy["layer"] = layerIndex
+        # how each element is incorporated into the layer
+        compounds = []
+        for i, group in enumerate(strategyConfiguration["peaks"]):
+            if "-" in group:
+                continue
+            ele = group.split()[0]
+            groupName = None
+            for name in self._groups:
+                if name.split()[0] == ele:
+                    groupName = name
+                    break
+            if groupName is None:
+                raise ValueError("Element %s is not fitted" % ele)
+            material = strategyConfiguration["materials"][i]
+            if material in ["-", ele, ele + "1"]:
+                composition = {ele: 1.0}
+            else:
+                composition = Elements.getMaterialMassFractions(\
+                                                    [material], [1.0])
+                if ele not in composition:
+                    raise ValueError("Element %s not present in %s" % \
+                                     (ele, material))
+            compounds.append((self._groups.index(groupName), ele, composition))
+        strategy["compounds"] = compounds
+        completer = strategyConfiguration.get("completer", "-")
+        if completer in ["-", None, ""]:
+            strategy["completer"] = None
+        else:
+            strategy["completer"] = Elements.getMaterialMassFractions(\
+                                                    [completer], [1.0])
+        # all the elements the refined layer can contain
+        elements = []
+        for composition in [item[2] for item in compounds] + \
+                           [strategy["completer"] or {}]:
+            for ele in composition:
+                if ele not in elements:
+                    elements.append(ele)
+        strategy["elements"] = elements
+        return strategy
+
+    def _getComposition(self, concentrations):
+        """
+        Composition of the refined layer for the given concentrations
+        following the SingleLayerStrategy rules.
+        """
+        strategy = self._strategy
+        fractions = []
+        total = 0.0
+        for groupIndex, ele, composition in strategy["compounds"]:
+            # fraction of the compound needed to supply the element
+            fraction = numpy.clip(concentrations[groupIndex], 0.0, None) / \
+                       composition[ele]
+            fractions.append(fraction)
+            total = total + fraction
+        if strategy["completer"] is None:
+            normalization = 1.0 / numpy.where(total > 0.0, total, 1.0)
+            completerFraction = None
+        else:
+            normalization = 1.0 / numpy.where(total > 1.0, total, 1.0)
+            completerFraction = numpy.where(total < 1.0, 1.0 - total, 0.0)
+        layerComposition = {}
+        compositions = [item[2] for item in strategy["compounds"]]
+        for fraction, composition in zip(fractions, compositions):
+            for key in composition:
+                value = fraction * normalization * composition[key]
+                if key in layerComposition:
+                    layerComposition[key] = layerComposition[key] + value
+                else:
+                    layerComposition[key] = value
+        if completerFraction is not None:
+            for key in strategy["completer"]:
+                value = completerFraction * strategy["completer"][key]
+                if key in layerComposition:
+                    layerComposition[key] = layerComposition[key] + value
+                else:
+                    layerComposition[key] = value
+        # nothing to incorporate: keep the original layer
+        empty = total <= 0.0
+        if strategy["completer"] is None and numpy.any(empty):
+            original = self._layerComposition[strategy["layer"]]
+            for key in original:
+                if key not in layerComposition:
+                    layerComposition[key] = numpy.zeros(total.shape)
+            for key in layerComposition:
+                layerComposition[key] = numpy.where(empty,
+                                                    original.get(key, 0.0),
+                                                    layerComposition[key])
+        return layerComposition
+
+    def _getRates(self, layerComposition=None, gridstep=None):
+        """
+        Return the total rates and the rates of each layer as arrays of
+        shape (ngroups, npixels) and (nlayers, ngroups, npixels)
+        """
+        if layerComposition is None:
+            ddict = self._model.getRates()
+            total = numpy.array([ddict["total"][group] \
+                                 for group in self._groups])
+            layers = numpy.array([[layer[group] for group in self._groups] \
+                                  for layer in ddict["layers"]])
+            return total[:, None], layers[:, :, None]
+        keys = list(layerComposition.keys())
+        keys.sort()
+        nPixels = numpy.asarray(layerComposition[keys[0]]).size
+        if gridstep:
+            # calculate only once per grid node
+            values = numpy.array([numpy.asarray(layerComposition[key]) * \
+                                  numpy.ones(nPixels) for key in keys])
+            nodes = numpy.round(values / gridstep).astype(numpy.int64)
+            nodes, inverse = numpy.unique(nodes, axis=1,
+                                          return_inverse=True)
+            inverse = inverse.ravel()
+            nGroups = len(self._groups)
+            nLayers = len(self._multilayer)
+            rates = numpy.zeros((nodes.shape[1], (nLayers + 1) * nGroups),
+                                numpy.float64)
+            missing = []
+            with self._cacheLock:
+                for i in range(nodes.shape[1]):
+                    key = (tuple(keys), tuple(nodes[:, i]))
+                    if key in self._cache:
+                        rates[i] = self._cache[key]
+                    else:
+                        missing.append(i)
+            if len(missing):
+                composition = {}
+                for j, key in enumerate(keys):
+                    composition[key] = nodes[j, missing] * gridstep
+                total, layers = self._getRates(composition)
+                values = numpy.concatenate([total] + list(layers), axis=0).T
+                rates[missing] = values
+                with self._cacheLock:
+                    for i, value in zip(missing, values):
+                        self._cache[(tuple(keys), tuple(nodes[:, i]))] = \
+                                                                    value
+            rates = rates[inverse].T
+            return rates[:nGroups], \
+                   rates[nGroups:].reshape(nLayers, nGroups, nPixels)
+        massFractions = {self._strategy["layer"]: layerComposition}
+        ddict = self._model.getRates(massFractions=massFractions)
+        total = numpy.array([ddict["total"][group] * numpy.ones(nPixels) \
+                             for group in self._groups])
+        layers = numpy.array([[layer[group] * numpy.ones(nPixels) \
+                               for group in self._groups] \
+                              for layer in ddict["layers"]])
+        return total, layers
+
+    def _getConcentrations(self, areas, total, layers, reference):
+        """
+        Mass fractions from the areas and the rates for mass fraction one
+        """
+        if reference is None:
+            factor = self._fluxFactor
+        else:
+            element, group, layerList = reference
+            groupIndex = self._groups.index(group)
+            theoretical = 0.0
+            for ilayer in layerList:
+                theoretical = theoretical + \
+                    self._layerComposition[ilayer][element] * \
+                    layers[ilayer, groupIndex]
+            factor = areas[groupIndex] / numpy.where(theoretical > 0.0,
+                                                     theoretical, 1.0)
+            factor = numpy.where(theoretical > 0.0, factor, 0.0)
+        expected = factor * total
+        good = expected > 0.0
+        concentrations = numpy.where(good,
+                                     areas / numpy.where(good, expected, 1.0),
+                                     0.0)
+        expected = factor * layers
+        good = expected > 0.0
+        layerConcentrations = numpy.where(good,
+                                          areas / numpy.where(good,
+                                                              expected, 1.0),
+                                          0.0)
+        return concentrations, layerConcentrations
+
+    def processAreas(self, areas, iterations=None, tolerance=None,
+                     gridstep=None, nthreads=None, blocksize=None):
+        """
+        Calculate the concentrations of all the pixels of a map.
+
+        :param areas: Array of shape (ngroups, ...) with the fitted areas in
+                      the order returned by getGroups
+        :param iterations: Maximum number of matrix iterations. Default is
+                           the number of iterations of the strategy.
+        :param tolerance: Relative change of the concentrations below which
+                          a pixel is considered converged. Default 1.0e-4
+        :param gridstep: If given, the compositions are rounded to multiples
+                         of gridstep and the rates are cached
+        :param nthreads: Number of threads. Default is the number of CPUs.
+        :param blocksize: Number of pixels processed at once
+        :return: Dictionary with the keys "groups", "mass fraction" (array
+                 with the same shape as areas), "layers" (list of layer
+                 names), "layer mass fraction" (array of shape
+                 (nlayers,) + areas.shape), "iterations" and "converged"
+                 (arrays with the shape of a map)
+        """
+        if self._model is None:
+            raise ValueError("Fit configuration not set")
+        areas = numpy.asarray(areas, dtype=numpy.float64)
+        nGroups = len(self._groups)
+        if areas.shape[0] != nGroups:
+            raise ValueError("Expected areas of %d groups" % nGroups)
+        mapShape = areas.shape[1:]
+        areas = areas.reshape(nGroups, -1)
+        nPixels = areas.shape[1]
+        nLayers = len(self._multilayer)
+        if tolerance is None:
+            tolerance = 1.0e-4
+        if self._strategy is None:
+            iterations = 0
+        elif iterations is None:
+            iterations = self._strategy["iterations"]
+
+        total0, layers0 = self._getRates()
+
+        # reference element for the flux
+        reference = None
+        if self._reference is not None:
+            element = self._reference["element"]
+            if element is None:
+                # same choice as ConcentrationsTool, for the whole map
+                areaSums = areas.sum(axis=1)
+                fom = None
+                for group in self._groups:
+                    ele = group.split()[0]
+                    if ele not in self._reference["present"]:
+                        continue
+                    newfom = self._figureOfMerit(ele, areaSums, layers0)
+                    if (fom is None) or (newfom > fom):
+                        fom = newfom
+                        element = ele
+            reference = (element,
+                         self._getReferenceGroup(element),
+                         self._reference["present"][element])
+
+        concentrations = numpy.zeros((nGroups, nPixels), numpy.float64)
+        layerConcentrations = numpy.zeros((nLayers, nGroups, nPixels),
+                                          numpy.float64)
+        nIterations = numpy.zeros(nPixels, numpy.int32)
+        converged = numpy.zeros(nPixels, dtype=bool)
+        if iterations:
+            # the threads share the attenuation coefficients cache of the
+            # model, fill it before with the compounds and completer elements
+            self._model.loadElementCoefficients(self._strategy["elements"])
+
+        def function(block):
+            blockAreas = areas[:, block[0]:block[1]]
+            c, lc = self._getConcentrations(blockAreas, total0, layers0,
+                                            reference)
+            active = numpy.ones(c.shape[1], dtype=bool)
+            counter = numpy.zeros(c.shape[1], numpy.int32)
+            for iteration in range(iterations):
+                index = numpy.nonzero(active)[0]
+                if not len(index):
+                    break
+                composition = self._getComposition(c[:, index])
+                total, layers = self._getRates(composition, gridstep=gridstep)
+                newC, newLC = self._getConcentrations(blockAreas[:, index],
+                                                      total, layers,
+                                                      reference)
+                delta = numpy.abs(newC - c[:, index])
+                scale = numpy.abs(newC)
+                done = numpy.all(delta <= tolerance * \
+                                 numpy.where(scale > 0.0, scale, 1.0), axis=0)
+                c[:, index] = newC
+                lc[:, :, index] = newLC
+                counter[index] += 1
+                active[index[done]] = False
+            concentrations[:, block[0]:block[1]] = c
+            layerConcentrations[:, :, block[0]:block[1]] = lc
+            nIterations[block[0]:block[1]] = counter
+            converged[block[0]:block[1]] = (~active) | (iterations == 0)
+
+        nthreads = _getNumberOfThreads(nthreads)
+        if blocksize is None:
+            blocksize = max(1, min(nPixels // nthreads + 1, 4096))
+        blocks = [(i, min(i + blocksize, nPixels)) \
+                  for i in range(0, nPixels, blocksize)]
+        _runBlocks(function, blocks, nthreads)
+
+        ddict = {}
+        ddict["groups"] = self._groups * 1
+        ddict["mass fraction"] = concentrations.reshape((nGroups,) + mapShape)
+        ddict["layers"] = self._layerNames * 1
+        ddict["layer mass fraction"] = layerConcentrations.reshape(\
+                                        (nLayers, nGroups) + mapShape)
+        ddict["iterations"] = nIterations.reshape(mapShape)
+        ddict["converged"] = converged.reshape(mapShape)
+        if reference is not None:
+            ddict["reference"] = reference[1]
+        return ddict
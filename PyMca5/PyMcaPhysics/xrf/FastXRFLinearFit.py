@@ -39,6 +39,7 @@
 from . import ClassMcaTheory
 from PyMca5.PyMcaMath.fitting import Gefit
 from . import ConcentrationsTool
+from . import FastConcentrations
 from PyMca5.PyMcaMath.fitting import SpecfitFuns
 from PyMca5.PyMcaIO import ConfigDict
 import time
@@ -547,7 +548,35 @@ def fitMultipleSpectra(self, x=None, y=None, xmin=None, xmax=None,
             referenceTransitions = addInfo['ReferenceTransitions']
             if DEBUG:
                 print("Reference <%s>  transition <%s>" % (referenceElement, referenceTransitions))
-            if referenceElement in ["", None, "None"]:
+            if config['fit'].get('strategyflag', False):
+                # matrix iteration pixel by pixel instead of using the
+                # correction of the reference spectrum for all of them
+                groupsList = [group for group in fitresult['result']['groups'] \
+                              if not group.lower().startswith("scatter")]
+                engine = FastConcentrations.FastConcentrations(config,
+                                                        groups=groupsList)
+                engineGroups = engine.getGroups()
+                areas = numpy.zeros((len(engineGroups), nRows, nColumns),
+                                    numpy.float64)
+                for i, group in enumerate(fitresult['result']['groups']):
+                    if group in engineGroups:
+                        areas[engineGroups.index(group)] = \
+                                    results[nFreeBackgroundParameters+i]
+                engineResult = engine.processAreas(areas)
+                counter = 0
+                for group in groupsList:
+                    idx = engineGroups.index(group)
+                    outputDict['names'].append("C(%s)" % group)
+                    massFractions[counter] = engineResult['mass fraction'][idx]
+                    counter += 1
+                    if len(concentrationsResult['layerlist']) > 1:
+                        for layer in concentrationsResult['layerlist']:
+                            outputDict['names'].append("C(%s)-%s" % (group, layer))
+                            layerIdx = engineResult['layers'].index(layer)
+                            massFractions[counter] = \
+                                engineResult['layer mass fraction'][layerIdx, idx]
+                            counter += 1
+            elif referenceElement in ["", None, "None"]:
                 if DEBUG:
                     print("No reference")
                 counter = 0
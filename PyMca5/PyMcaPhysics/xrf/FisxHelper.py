@@ -33,6 +33,10 @@
 import os
 import sys
 import time
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
 from fisx import DataDir
 from fisx import Elements as FisxElements
 from fisx import Material
@@ -41,7 +45,27 @@
 xcom = None
 DEBUG = 0
 
-def getElementsInstance(dataDir=None, bindingEnergies=None, xcomFile=None):
+# process wide caches of fisx Elements instances and of the results obtained
+# from fit configurations
+_CACHE_LOCK = threading.RLock()
+_ELEMENTS_INSTANCES = {}
+_RESULTS_CACHE = OrderedDict()
+_RESULTS_CACHE_MAX_SIZE = 32
+_CACHE_COUNTERS = {"hits": 0,
+                   "misses": 0,
+                   "elements_hits": 0,
+                   "elements_misses": 0}
+
+def getElementsInstance(dataDir=None, bindingEnergies=None, xcomFile=None,
+                        cache=True):
+    """
+    Return a fisx Elements instance using PyMca shell constants, binding
+    energies and XCOM data.
+
+    Reading the data files takes a significant time, therefore instances
+    are shared by default among all the callers asking for the same files.
+    Use cache=False to get a new instance that can be freely modified.
+    """
     if dataDir is None:
         dataDir = DataDir.FISX_DATA_DIR
     try:
@@ -60,6 +84,19 @@ def getElementsInstance(dataDir=None, bindingEnergies=None, xcomFile=None):
             xcomFile = os.path.join(dataDir, "XCOM_CrossSections.dat")
         else:
             xcomFile = getDataFile("XCOM_CrossSections.dat")
+    if cache:
+        key = (dataDir, bindingEnergies, xcomFile)
+        with _CACHE_LOCK:
+            if key in _ELEMENTS_INSTANCES:
+                _CACHE_COUNTERS["elements_hits"] += 1
+                return _ELEMENTS_INSTANCES[key]
+            _CACHE_COUNTERS["elements_misses"] += 1
+            instance = getElementsInstance(dataDir,
+                                           bindingEnergies,
+                                           xcomFile,
+                                           cache=False)
+            _ELEMENTS_INSTANCES[key] = instance
+            return instance
     if DEBUG:
         t0 = time.time()
     instance = FisxElements(dataDir, bindingEnergies, xcomFile)
@@ -614,6 +651,77 @@ def getFisxCorrectionFactorsFromFitConfiguration(fitConfiguration,
                                         secondaryCalculationLimit= \
                                            secondaryCalculationLimit)
 
+def _canonical(item):
+    """
+    Convert nested dictionaries and sequences into a representation
+    independent of the dictionary ordering and of the sequence type.
+    """
+    if hasattr(item, "keys"):
+        return tuple([(str(key), _canonical(item[key])) \
+                      for key in sorted(item.keys(), key=str)])
+    if hasattr(item, "tolist"):
+        item = item.tolist()
+    if isinstance(item, (list, tuple)):
+        return tuple([_canonical(x) for x in item])
+    if hasattr(item, "decode") and not isinstance(item, str):
+        item = item.decode("latin-1")
+    return item
+
+def _getCacheKey(fitConfiguration, action, elementsFromMatrix,
+                 secondaryCalculationLimit):
+    """
+    Hash of the subset of the fit configuration used by the fisx calculation
+    """
+    fit = fitConfiguration.get("fit", {})
+    concentrations = fitConfiguration.get("concentrations", {})
+    detector = fitConfiguration.get("detector", {})
+    subset = {"action": action.upper(),
+              "elementsfrommatrix": int(elementsFromMatrix),
+              "secondarycalculationlimit": secondaryCalculationLimit,
+              "attenuators": fitConfiguration.get("attenuators", {}),
+              "multilayer": fitConfiguration.get("multilayer", {}),
+              "materials": fitConfiguration.get("materials", {}),
+              "peaks": fitConfiguration.get("peaks", {}),
+              "fit": dict([(key, fit.get(key, None)) for key in \
+                           ["energy", "energyflag", "energyweight",
+                            "energyscatter", "escapeflag"]]),
+              "concentrations": dict([(key, concentrations.get(key, None)) \
+                           for key in ["distance", "area",
+                                       "usemultilayersecondary"]]),
+              "detector": dict([(key, detector.get(key, None)) \
+                           for key in ["detele", "nthreshold"]])}
+    return hashlib.md5(repr(_canonical(subset)).encode("utf-8")).hexdigest()
+
+def getCacheInfo():
+    """
+    Return a dictionary with the hits and misses counters of the results
+    ("hits", "misses") and of the fisx Elements instances ("elements_hits",
+    "elements_misses") caches as well as the number of cached results
+    ("size") and instances ("elements_size").
+    """
+    with _CACHE_LOCK:
+        ddict = dict(_CACHE_COUNTERS)
+        ddict["size"] = len(_RESULTS_CACHE)
+        ddict["elements_size"] = len(_ELEMENTS_INSTANCES)
+    return ddict
+
+def clearCache(elements=False):
+    """
+    Forget the results calculated from fit configurations and reset the
+    counters.
+
+    :param elements: If True, the cached fisx Elements instances are also
+                     released and will be read again from the data files.
+    """
+    global xcom
+    with _CACHE_LOCK:
+        _RESULTS_CACHE.clear()
+        for key in _CACHE_COUNTERS:
+            _CACHE_COUNTERS[key] = 0
+        if elements:
+            _ELEMENTS_INSTANCES.clear()
+            xcom = None
+
 def _fisxFromFitConfigurationAction(fitConfiguration,
                                     action=None,
                                     elementsFromMatrix=False, \
@@ -623,6 +731,30 @@ def _fisxFromFitConfigurationAction(fitConfiguration,
     if secondaryCalculationLimit is None:
         secondaryCalculationLimit = \
             _getSecondaryCalculationLimitFromFitConfiguration(fitConfiguration)
+    key = _getCacheKey(fitConfiguration, action, elementsFromMatrix,
+                       secondaryCalculationLimit)
+    with _CACHE_LOCK:
+        if key in _RESULTS_CACHE:
+            _CACHE_COUNTERS["hits"] += 1
+            if DEBUG:
+                print("Using cached %s results" % action)
+            return copy.deepcopy(_RESULTS_CACHE[key])
+        _CACHE_COUNTERS["misses"] += 1
+    result = _fisxFromFitConfigurationCalculation(fitConfiguration,
+                                    action=action,
+                                    elementsFromMatrix=elementsFromMatrix,
+                                    secondaryCalculationLimit= \
+                                           secondaryCalculationLimit)
+    with _CACHE_LOCK:
+        _RESULTS_CACHE[key] = copy.deepcopy(result)
+        while len(_RESULTS_CACHE) > _RESULTS_CACHE_MAX_SIZE:
+            _RESULTS_CACHE.popitem(last=False)
+    return result
+
+def _fisxFromFitConfigurationCalculation(fitConfiguration,
+                                         action,
+                                         elementsFromMatrix,
+                                         secondaryCalculationLimit):
     # This is highly inefficient because one has to perform all the parsing
     # that has been already made when configuring the fit. However, this is
     # currently the simplest implementation that can work as standalone given
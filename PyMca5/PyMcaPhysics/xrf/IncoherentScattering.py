@@ -33,6 +33,7 @@
 import os
 import numpy
 from PyMca5.PyMcaIO import ConfigDict
+from PyMca5.PyMcaPhysics.xrf import DataCache
 from PyMca5 import PyMcaDataDir
 
 ElementList= ['H','He','Li','Be','B','C','N','O','F','Ne',
@@ -62,8 +63,7 @@
         print("Cannot find file ", ffile)
         raise IOError("Cannot find file %s" % ffile)
 
-COEFFICIENTS = ConfigDict.ConfigDict()
-COEFFICIENTS.read(ffile)
+COEFFICIENTS = DataCache.loadConfigDict(ffile)
 xvalues = COEFFICIENTS['ISCADT']['XSVAL']
 svalues = numpy.reshape(COEFFICIENTS['ISCADT']['SCATF'], (100, len(xvalues)))
 #svalues = COEFFICIENTS['ISCADT']['SCATF']
@@ -0,0 +1,1087 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+__doc__ = """
+HTML report of the results of a fit with the advanced fit (McaTheory).
+
+McaAdvancedFitReport does not need Qt. The plot of the fit is drawn into
+a matplotlib figure reused by all the reports of a process and it can
+be omitted.
+
+McaAdvancedFitReportWriter writes the reports of a batch of fit files
+from a queue in worker processes. The main process appends an entry to
+the index of each output directory as soon as a report is written.
+In summary mode the reports do not contain the plot and the index is a
+table with the main figures of merit of each fit.
+"""
+import os
+import sys
+import time
+import threading
+import multiprocessing
+MATPLOTLIB = True
+
+#this is installation dependent I guess
+from matplotlib import rcParams
+from matplotlib import __version__ as matplotlib_version
+#rcParams['numerix'] = "numeric"
+from matplotlib.font_manager import FontProperties
+from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+from matplotlib.figure import Figure
+MATPLOTLIB = True
+
+from PyMca5.PyMcaIO import ConfigDict
+from PyMca5.PyMcaCore import HtmlIndex
+from PyMca5.PyMcaPhysics.xrf import ConcentrationsTool
+ConcentrationsConversion = ConcentrationsTool.ConcentrationsConversion
+
+DEBUG = 0
+
+# figure reused by the reports written by the current process
+_FIGURE = None
+_FIGURE_LOCK = threading.Lock()
+
+def _getFigure():
+    global _FIGURE
+    if _FIGURE is None:
+        fig = Figure(figsize=(6,3)) # in inches
+        canvas = FigureCanvas(fig)
+        ax = fig.add_axes([.15, .15, .8, .8])
+        _FIGURE = fig, canvas, ax
+    fig, canvas, ax = _FIGURE
+    ax.cla()
+    ax.set_axisbelow(True)
+    return _FIGURE
+
+class McaAdvancedFitReport(object):
+    def __init__(self, fitfile = None, outfile = None, outdir = None,
+                    sourcename = None,
+                    selection = None,
+                    fitresult = None,htmltext=None,
+                    concentrations=None, table = None,
+                    plotdict=None, plot=True):
+
+        self.concentrations = concentrations
+        self.concentrationsConversion = ConcentrationsConversion()
+        if table is None: table = 2
+        self.tableFlag = table
+        self.plotFlag = plot
+        if fitfile is not None:
+            #generate output from fit result file
+            self.fitfile = fitfile
+            self.outfile = outfile
+            self.outdir  = outdir
+            self.generateReportFromFitFile()
+        else:
+            #generate output from fitresult INCLUDING fit file
+            self.fitfile = fitfile
+            self.outfile = outfile
+            self.outdir  = outdir
+            self.sourcename=sourcename
+            self.selection =selection
+            self.fitresult =fitresult
+            if self.outfile is None:
+                if selection is not None:
+                    self.outfile = selection
+            if (self.outfile is None) or (self.outfile == 'Unknown Origin'):
+                if sourcename is not None:
+                    self.outfile = os.path.basename(sourcename)
+        self.outfile = self.outfile.replace(" ","_")
+        self.outfile = self.outfile.replace("/","_over_")
+        self.graph = None
+        if htmltext is None:
+            htmltext={}
+        self.otherhtmltext=htmltext
+        if plotdict is None:
+            self.plotDict = {'logy':True,
+                             'xmin':None,
+                             'xmax':None,
+                             'ymin':None,
+                             'ymax':None}
+        else:
+            self.plotDict = plotdict
+
+    def writeReport(self,text=None):
+        if len(self.outfile) > 5:
+            if self.outfile[-5:] != ".html":
+                outfile = os.path.join(self.outdir, self.outfile+".html")
+            else:
+                outfile = os.path.join(self.outdir, self.outfile)
+        else:
+            outfile = os.path.join(self.outdir, self.outfile+".html")
+        try:
+            os.remove(outfile)
+        except:
+            pass
+        concentrationsfile = outfile[:-5]+"_concentrations.txt"
+        try:
+            os.remove(concentrationsfile)
+        except:
+            pass
+        if text is None:
+            text = self.getText()
+        f=open(outfile,"w")
+        f.write(text)
+        f.close()
+        if len(self._concentrationsTextASCII) > 1:
+             f=open(concentrationsfile, "w")
+             f.write(self._concentrationsTextASCII)
+             f.close()
+        return outfile
+
+    def generateReportFromFitFile(self):
+        d=ConfigDict.ConfigDict()
+        d.read(self.fitfile)
+        sourcename = "Unknown Source"
+        selection  = "Unknown Selection"
+        if 'info' in d:
+            if 'key' in d['info']:
+                selection=d['info']['key']
+            elif 'Key' in d['info']:
+                selection=d['info']['Key']
+            for key in d['info'].keys():
+                if key.upper() == 'SOURCENAME':
+                    sourcename = d['info'][key]
+                elif (key.upper() == 'SELECTION') or\
+                     (key.upper() == 'LEGEND'):
+                    selection = d['info'][key]
+        self.sourcename = sourcename
+        self.selection  = selection
+        if self.outfile is None:
+            if  self.outdir is None:
+                self.outdir = os.getcwd()
+            self.outfile= os.path.basename(self.fitfile)
+        else:
+            if self.outdir is None:
+                self.outdir = os.path.dirname(self.outfile)
+            self.outfile= os.path.basename(self.outfile)
+        if self.outdir == '':self.outdir = "."
+        self.fitresult=d
+        if 'concentrations' in d:
+            self.concentrations = d['concentrations']
+
+    def getText(self):
+        newlinks = []
+        for key in self.otherhtmltext.keys():
+            newlinks.append(["#%s" % (key),"%s" % key])
+        text =self.getHeader(newlinks)
+        text+=self.getInfo()
+        if self.plotFlag:
+            text+=self.getImage()
+        text+=self.getParam()
+        text+=self.getConcentrations()
+        self._concentrationsTextASCII = self.getConcentrationsASCII()
+        text+=self.getResult()
+        for key in self.otherhtmltext.keys():
+             text+="\n"
+             text+= "<H2><a NAME=""%s""></a><FONT color=#009999>" % key
+             text+= "%s:" % key
+             text+= "</FONT></H2>"
+             text+= self.otherhtmltext[key]
+             text+="<br>"
+        text+=self.getFooter()
+        return text
+
+    def getHeader(self,addlink=None):
+        link = [ ['http://pymca.sourceforge.net', 'PyMCA home'],
+                 ['http://www.esrf.fr', 'ESRF home'],
+                 ['http://www.esrf.fr/UsersAndScience/Experiments/TBS/BLISS', 'BLISS home']]
+        if self.concentrations is not None:
+            link.append(['#Concentrations', 'Concentrations'])
+        if self.tableFlag:link.append(['#Fit_Peak_Results', 'Fit Peak Results'])
+        if addlink is not None:
+            for item in addlink:
+                link.append(item)
+        text =""
+        text+= "<HTML>"
+        text+= "<HEAD>"
+        text+= "<TITLE>PyMCA : Advanced Fit Results</TITLE>"
+        text+= "</HEAD>"
+        text+= "<BODY TEXT=#000000 BGCOLOR=#FFFFFF ALINK=#ff6600 LINK=#0000cc VLINK=#0000cc marginwidth=10 marginheight=10  topmargin=10 leftmargin=10>"
+        text+= "<CENTER>"
+        text+= "<TABLE WIDTH=100%% border=0 Height=70>"
+        text+= "  <TR>"
+        text+= "    <TD><Font Size=5 Color=#0000cc>"
+        text+= "        <b>PyMCA : Advanced Fit Results</b></Font>"
+        text+= "    </td>"
+        text+= "    <td rowspan=2 ALIGN=RIGHT VALIGN=bottom>"
+        text+= "        <a HREF=""http://www.esrf.fr/"">"
+        logofile = self.outdir + "/" + "PyMcaLogo.png"
+        if not os.path.exists(logofile):
+            self._saveLogo(logofile)
+        text+= "        <img SRC=%s ALT=""ESRF home"" WIDTH=55 HEIGHT=68 BORDER=0></a>" % "PyMcaLogo.png"
+        text+= "    </td>"
+        text+= "  </tr>"
+        text+= "  <tr>"
+        text+= "     <td width=100%%  VALIGN=bottom>"
+        text+= "        <TABLE BORDER=0 CELLPADDING=0 CELLSPACING=0 WIDTH=100%%>"
+        text+= "          <TR>"
+        text+= "            <TD WIDTH=100%% BGCOLOR=#ee22aa HEIGHT=17  ALIGN=LEFT VALIGN=middle>"
+        text+= "            <FONT color=#000000>&nbsp;"
+        for name in link:
+            text+= "|&nbsp;&nbsp;<A STYLE=""color: #FFFFFF"" HREF=""%s"">%s</a>&nbsp;&nbsp;"%(tuple(name))
+        text+= "            </FONT>"
+        text+= "            </TD>"
+        text+= "          </TR>"
+        text+= "        </TABLE>"
+        text+= "     </td>"
+        text+= "  </tr>"
+        text+= "  <tr>"
+        text+= "     <td colspan=2 height=5><spacer type=block height=10 width=0>"
+        text+= "     </td>"
+        text+= "  </tr>"
+        text+= "</table>"
+        text+= "</center>"
+        return text
+
+    def _saveLogo(self, logofile):
+        HtmlIndex.saveLogo(logofile)
+
+    def getInfo(self):
+        text =""
+        text+= "<nobr><H2><FONT color=#0000cc>"
+        text+= "Computed File :&nbsp;"
+        text+= "</FONT>"
+        text+= "<FONT color=#000000>"
+        if self.fitfile is not None:
+            if os.path.basename(self.fitfile) == self.fitfile:
+                text+= "<b><I>%s</I></b>" % (os.getcwd()+"/"+self.fitfile)
+            else:
+                text+= "<b><I>%s</I></b>" % (self.fitfile)
+        else:
+            text+= "<b><I>%s</I></b>" % (self.outdir+"/"+self.outfile+".fit")
+            #and I have to generate it!!!!!!!!!!!!"
+            d=ConfigDict.ConfigDict(self.fitresult)
+            try:
+                os.remove(self.outdir+"/"+self.outfile+".fit")
+            except:
+                pass
+            if self.concentrations is not None:
+                d['concentrations'] = self.concentrations
+            d.write(self.outdir+"/"+self.outfile+".fit")
+        text+= "</FONT>"
+        text+= "</H2>"
+        text+= "</nobr>"
+        text+= "<LEFT>"
+        text+= "<TABLE border=0>"
+        text+= "<TR><TD><SPACER TYPE=BLOCK WIDTH=50></TD><TD>"
+        text+= "<TABLE border=0 cellpadding=1 cellspacing=2>"
+        text+= "  <TR><TH ALIGN=LEFT>Source : &nbsp;</TH><TD ALIGN=LEFT>%s</TD></TR>"    % (self.sourcename)
+        text+= "  <TR><TH ALIGN=LEFT>Selection : &nbsp;</TH><TD ALIGN=LEFT>%s</TD></TR>" % (self.selection)
+        text+= "  <TR><TH ALIGN=LEFT>Parameters : &nbsp;</TH><TD ALIGN=LEFT>"
+        d=ConfigDict.ConfigDict(self.fitresult['result']['config'])
+        try:
+            os.remove(self.outdir+"/"+self.outfile+".txt")
+        except:
+            pass
+        d.write(self.outdir+"/"+self.outfile+".txt")
+        text+= "<a HREF=""%s"">%s</a>"% (self.outfile+".txt",self.outfile+".txt")
+        text+="</TD></TR>"
+
+        """
+        text+= "  <TR><TH ALIGN=RIGHT>Source : </TH><TD ALIGN=LEFT>%s</TD>"%(self.sourcename)
+        text+= "  <TH ALIGN=RIGHT>Selection : </TH><TD ALIGN=LEFT>%s</TD></TR>"%(self.selection)
+        keys= [ key for key in info.keys() if key not in ['paramfile', 'peakfile'] ]
+        for idx in range(0, len(keys), 2):
+            text+= "  <TR><TH ALIGN=RIGHT>%s : </TH><TD ALIGN=LEFT>%s</TD>"%(keys[idx], info[keys[idx]])
+            if idx+1<len(keys):
+                text+= "  <TH ALIGN=RIGHT>%s : </TH><TD ALIGN=LEFT>%s</TD></TR>"%(keys[idx+1], info[keys[idx+1]])
+            else:
+                text+= "  <TD COLSPAN=2></TD></TR>"
+        """
+        text+= "</TABLE>"
+        text+= "</TD></TR></TABLE>"
+        text+= "</LEFT>"
+        return text
+
+
+    def getParam(self):
+        text=""
+        zero = self.fitresult['result']['fittedpar'][self.fitresult['result']['parameters'].index('Zero')]
+        gain = self.fitresult['result']['fittedpar'][self.fitresult['result']['parameters'].index('Gain')]
+        noise= self.fitresult['result']['fittedpar'][self.fitresult['result']['parameters'].index('Noise')]
+        fano = self.fitresult['result']['fittedpar'][self.fitresult['result']['parameters'].index('Fano')]
+        sum  = self.fitresult['result']['fittedpar'][self.fitresult['result']['parameters'].index('Sum')]
+        stdzero = self.fitresult['result']['sigmapar'][self.fitresult['result']['parameters'].index('Zero')]
+        stdgain = self.fitresult['result']['sigmapar'][self.fitresult['result']['parameters'].index('Gain')]
+        stdnoise= self.fitresult['result']['sigmapar'][self.fitresult['result']['parameters'].index('Noise')]
+        stdfano = self.fitresult['result']['sigmapar'][self.fitresult['result']['parameters'].index('Fano')]
+        stdsum  = self.fitresult['result']['sigmapar'][self.fitresult['result']['parameters'].index('Sum')]
+
+        hypermetflag = self.fitresult['result']['config']['fit']['hypermetflag']
+        if not ('fitfunction' in self.fitresult['result']['config']['fit']):
+            if hypermetflag:
+                self.fitresult['result']['config']['fit']['fitfunction'] = 0
+            else:
+                self.fitresult['result']['config']['fit']['fitfunction'] = 1
+        if self.fitresult['result']['config']['fit']['fitfunction'] or\
+           (hypermetflag != 1):
+            #the peaks are not pure gaussians
+            if self.fitresult['result']['config']['fit']['fitfunction']:
+                #peaks are pseudo-voigt functions
+                hypermetnames = ['Eta Factor']
+            else:
+                hypermetnames = ['ST AreaR', 'ST SlopeR',
+                                 'LT AreaR', 'LT SlopeR',
+                                 'STEP HeightR']
+            hypermetvalues=[]
+            hypermetstd   =[]
+            hypermetfinalnames = []
+            for name in hypermetnames:
+                if name in self.fitresult['result']['parameters']:
+                    hypermetvalues.append(self.fitresult['result']['fittedpar'] \
+                            [self.fitresult['result']['parameters'].index(name)])
+                    hypermetstd.append(self.fitresult['result']['sigmapar'] \
+                            [self.fitresult['result']['parameters'].index(name)])
+                    hypermetfinalnames.append(name)
+
+        # --- html table
+        text+="<H2><FONT color=#009999>"
+        text+="Fit Parameters :"
+        text+="</FONT></H2>"
+        text+="<CENTER>"
+        text+="<TABLE border=0 cellpadding=0 cellspacing=2 width=80%>"
+        text+="<TR>"
+        text+="    <TD><TABLE border=1 cellpadding=1 cellspacing=0 width=100%>"
+        text+="        <TR align=center>"
+        text+="            <TH colspan=2>FIT parameters</TH>"
+        text+="        </TR>"
+        text+="        <TR align=left>"
+        text+="            <TD><I>&nbsp;Region of Fit</I></TD>"
+        text+="            <TD>&nbsp;%d - %d</TD>" % (self.fitresult['result']['config']['fit']['xmin'],self.fitresult['result']['config']['fit']['xmax'])
+        text+="        </TR>"
+        text+="        <TR align=left>"
+        text+="            <TD><I>&nbsp;Number of iterations</I></TD>"
+        #text+="            <TD>&nbsp;%d</TD>" % (fitpar['fit_numiter'])
+        text+="            <TD>&nbsp;%d</TD>" % (self.fitresult['result']['niter'])
+        text+="        </TR>"
+        text+="        <TR align=left>"
+        text+="            <TD><I>&nbsp;Chi square</I></TD>"
+        #text+="            <TD>&nbsp;%.4f</TD>" % (fitpar['fit_chi'])
+        text+="            <TD>&nbsp;%.4f</TD>" % (self.fitresult['result']['chisq'])
+        text+="        </TR>"
+        text+="        <TR align=left>"
+        text+="            <TD><I>&nbsp;Last Chi square difference</I></TD>"
+        #text+="            <TD>&nbsp;%.4f %%</TD>" % (fitpar['fit_lastchi'])
+        text+="            <TD>&nbsp;%.4f %%</TD>" % (self.fitresult['result']['lastdeltachi']*100)
+        text+="        </TR>"
+        text+="        </TABLE>"
+        text+="    </TD>"
+        text+="</TR>"
+        text+="<TR>"
+        text+="    <TD><TABLE border=1 cellpadding=1 cellspacing=0 width=100%>"
+        text+="        <TR align=center>"
+        text+="            <TH colspan=2>Calibration parameters</TH>"
+        text+="        </TR>"
+        text+="        <TR align=left>"
+        text+="            <TD><I>&nbsp;Zero</I></TD>"
+        text+="            <TD>&nbsp;% .5E +/- % .5E</TD>" % (zero, stdzero)
+        text+="        </TR>"
+        text+="        <TR align=left>"
+        text+="            <TD><I>&nbsp;Gain</I></TD>"
+        text+="            <TD>&nbsp;% .5E +/- % .5E</TD>" % (gain, stdgain)
+        text+="        </TR>"
+        text+="        <TR align=left>"
+        text+="            <TD><I>&nbsp;Noise</I></TD>"
+        text+="            <TD>&nbsp;% .5E +/- % .5E</TD>" % (noise, stdnoise)
+        text+="        </TR>"
+        text+="        <TR align=left>"
+        text+="            <TD><I>&nbsp;Fano</I></TD>"
+        text+="            <TD>&nbsp;% .5E +/- % .5E</TD>" % (fano, stdfano)
+        text+="        </TR>"
+        text+="        <TR align=left>"
+        text+="            <TD><I>&nbsp;Sum</I></TD>"
+        text+="            <TD>&nbsp;% .5E +/- % .5E</TD>" % (sum, stdsum)
+        text+="        </TR>"
+        text+="        </TABLE>"
+        text+="    </TD>"
+        text+="</TR>"
+
+        # --- Peak shape parameters ---
+        if hypermetflag != 1:
+            text+="<TR>"
+            text+="    <TD><TABLE border=1 cellpadding=1 cellspacing=0 width=100%>"
+            text+="        <TR align=center>"
+            text+="            <TH colspan=2>Peak shape parameters</TH>"
+            text+="        </TR>"
+            for i in range(len(hypermetfinalnames)):
+                text+="        <TR align=left>"
+                text+="            <TD><I>&nbsp;%s</I></TD>" % hypermetnames[i]
+                text+="            <TD>&nbsp;% .5E +/- % .5E</TD>" % (hypermetvalues[i],
+                                                                      hypermetstd[i])
+                text+="        </TR>"
+            text+="        </TABLE>"
+            text+="    </TD>"
+            text+="</TR>"
+
+
+
+        # --- Continuum parameters ---
+        text+="<TR>"
+        text+="    <TD><TABLE border=1 cellpadding=1 cellspacing=0 width=100%>"
+        text+="        <TR align=center>"
+        text+="            <TH colspan=2>Continuum parameters</TH>"
+        text+="        </TR>"
+        # Stripping
+        if self.fitresult['result']['config']['fit']['stripflag']:
+             constant    = 1.0
+             iterations = 20000
+             stripwidth = 1
+             stripfilterwidth = 1
+             stripalgorithm = 0
+             snipwidth = 30
+             if 'stripalgorithm' in self.fitresult['result']['config']['fit']:
+                stripalgorithm=self.fitresult['result']['config']['fit']['stripalgorithm']
+             if 'snipwidth' in self.fitresult['result']['config']['fit']:
+                snipwidth=self.fitresult['result']['config']['fit']['snipwidth']
+             if 'stripconstant' in self.fitresult['result']['config']['fit']:
+                constant=self.fitresult['result']['config']['fit']['stripconstant']
+             if 'stripiterations' in self.fitresult['result']['config']['fit']:
+                iterations=self.fitresult['result']['config']['fit']['stripiterations']
+             if 'stripwidth' in self.fitresult['result']['config']['fit']:
+                stripwidth=self.fitresult['result']['config']['fit']['stripwidth']
+             if 'stripfilterwidth' in self.fitresult['result']['config']['fit']:
+                stripfilterwidth=self.fitresult['result']['config']['fit']['stripfilterwidth']
+             if stripalgorithm == 1:
+                 text+="        <TR align=left>"
+                 text+="            <TD><I>&nbsp;Type</I></TD>"
+                 text+="            <TD>&nbsp;%s</TD>" % "SNIP Background"
+                 text+="        </TR>"
+                 text+="        <TR align=left>"
+                 text+="            <TD><I>&nbsp;%s<I></TD>" % "SNIP width"
+                 text+="            <TD>&nbsp;%.5f</TD>" % snipwidth
+                 text+="        </TR>"
+             else:
+                 text+="        <TR align=left>"
+                 text+="            <TD><I>&nbsp;Type</I></TD>"
+                 text+="            <TD>&nbsp;%s</TD>" % "Strip Background"
+                 text+="        </TR>"
+                 text+="        <TR align=left>"
+                 text+="            <TD><I>&nbsp;%s<I></TD>" % "Strip Constant"
+                 text+="            <TD>&nbsp;%.5f</TD>" % constant
+                 text+="        </TR>"
+                 text+="        <TR align=left>"
+                 text+="            <TD><I>&nbsp;%s<I></TD>" % "Strip Iterations"
+                 text+="            <TD>&nbsp;%d</TD>" % iterations
+                 text+="        </TR>"
+                 text+="        <TR align=left>"
+                 text+="            <TD><I>&nbsp;%s<I></TD>" % "Strip Width"
+                 text+="            <TD>&nbsp;%d</TD>" % stripwidth
+                 text+="        </TR>"
+             text+="        <TR align=left>"
+             text+="            <TD><I>&nbsp;%s<I></TD>" % "Smoothing Filter Width"
+             text+="            <TD>&nbsp;%d</TD>" % stripfilterwidth
+             text+="        </TR>"
+             stripanchorslist = []
+             stripanchorsflag = self.fitresult['result']['config']['fit'].get('stripanchorsflag', 0)
+             if stripanchorsflag:
+                 stripanchorslist = self.fitresult['result']['config']['fit'].get('stripanchorslist', [])
+             i = 0
+             for anchor in stripanchorslist:
+                 if anchor != 0:
+                     text+="        <TR align=left>"
+                     text+="            <TD><I>&nbsp;%s%d<I></TD>" % ("Anchor",i)
+                     text+="            <TD>&nbsp;%d</TD>" % anchor
+                     text+="        </TR>"
+                     i += 1
+
+        # --- Background Function
+        if self.fitresult['result']['config']['fit']['continuum']:
+             text+="        <TR align=left>"
+             text+="            <TD><I>&nbsp;Type</I></TD>"
+             if 'continuum_name' in self.fitresult['result']['config']['fit']:
+                name = self.fitresult['result']['config']['fit']['continuum_name']
+                text+="            <TD>&nbsp;%s</TD>" % name
+             elif self.fitresult['result']['config']['fit']['continuum'] == 1:
+                text+="            <TD>&nbsp;%s</TD>" % "Constant Polymomial"
+             elif self.fitresult['result']['config']['fit']['continuum'] == 2:
+                text+="            <TD>&nbsp;%s</TD>" % "1st Order Polymomial"
+             elif self.fitresult['result']['config']['fit']['continuum'] == 3:
+                text+="            <TD>&nbsp;%s</TD>" % "2nd Order Polymomial"
+             else:
+                #compatibility with previous versions
+                text+="            <TD>&nbsp;%s</TD>" % "1st Order Polymomial"
+             text+="        </TR>"
+             isum = self.fitresult['result']['parameters'].index('Sum')
+             a=0
+             if hypermetflag:a=5
+             nglobal = len(self.fitresult['result']['parameters']) - len(self.fitresult['result']['groups'])
+             for i in range(isum+1,nglobal-a):
+                 text+="        <TR align=left>"
+                 text+="            <TD><I>&nbsp;%s<I></TD>" % self.fitresult['result']['parameters'][i]
+                 value    = self.fitresult['result']['fittedpar'][i]
+                 stdvalue = self.fitresult['result']['sigmapar'] [i]
+                 text+="            <TD>&nbsp;% .5E +/- % .5E</TD>" % (value, stdvalue)
+                 text+="        </TR>"
+             if 0:
+                 text+="        <TR align=left>"
+                 text+="            <TD><I>&nbsp;%s<I></TD>" % 'Constant'
+                 value    = self.fitresult['result']['fittedpar'][self.fitresult['result']['parameters'].index('Constant')]
+                 stdvalue = self.fitresult['result']['sigmapar'] [self.fitresult['result']['parameters'].index('Constant')]
+                 text+="            <TD>&nbsp;% .5E +/- % .5E</TD>" % (value, stdvalue)
+                 text+="        </TR>"
+                 if self.fitresult['result']['config']['fit']['continuum'] > 1:
+                      text+="        <TR align=left>"
+                      text+="            <TD><I>&nbsp;%s<I></TD>" % 'Slope'
+                      value    = self.fitresult['result']['fittedpar'][self.fitresult['result']['parameters'].index('Constant')+1]
+                      stdvalue = self.fitresult['result']['sigmapar'] [self.fitresult['result']['parameters'].index('Constant')+1]
+                      text+="            <TD>&nbsp;% .5E +/- % .5E</TD>" % (value, stdvalue)
+                      text+="        </TR>"
+             text+="</TR>"
+        text+="        </TABLE>"
+        text+="    </TD>"
+        text+="</TR>"
+        if 0:
+            #not yet implemented
+            text+="<TR>"
+            text+="    <TD align=center>"
+            text+="         <I>FIT END STATUS : </I>%s<BR>"% "STATUS"
+            text+="         <B>%s</B>" % "MESSAGE"
+            text+="    </TD>"
+            text+="</TR>"
+        text+="</TABLE>"
+        text+="</CENTER>"
+        return text
+
+    def getFooter(self):
+        now = time.time()
+        text =""
+        text+= "<center>"
+        text+= "<table width=100%% border=0 cellspacing=0 cellpadding=0>"
+        text+= "    <tr><td colspan=2 height=10><spacer type=block height=10 width=0></td></tr>"
+        text+= "    <tr><td colspan=2 bgcolor=#cc0066 height=5><spacer type=block height=5 width=0></td></tr>"
+        text+= "    <tr><td colspan=2 height=5><spacer type=block height=5 width=0></td></tr>"
+        text+= "    <TR>"
+        text+= "        <TD><FONT size=1 >created:  %s</font></TD>" % time.ctime(now)
+        #text+= "        <TD ALIGN=RIGHT><FONT size=1 >last modified: %s" % time.ctime(now)
+        text+= "        <TD ALIGN=RIGHT><FONT size=1 >last modified: %s by" % time.ctime(now)
+        #text+= "        <A STYLE=""color: #0000cc"" HREF=""mailto:papillon@esrf.fr"">papillon@esrf.fr</A></FONT></TD>"
+        if sys.platform == 'win32':
+            try:
+                user = os.getenv('USERNAME')
+                text+= "        <A STYLE=""color: #0000cc"">%s</A></FONT></TD>" % user
+            except:
+                text +="</FONT></TD>"
+        else:
+            try:
+                user = os.getenv("USER")
+                text+= "        <A STYLE=""color: #0000cc"">%s</A></FONT></TD>" % user
+            except:
+                text +="</FONT></TD>"
+        text+= "    </TR>"
+        text+= "</TABLE>"
+        text+= "</center>"
+        text+= "</BODY>"
+        text+= "</HTML>"
+        return text
+
+    def __getFitImage(self,imagefile=None):
+        if imagefile is None:imagefile=self.outdir+"/"+self.outfile+".png"
+        filelink = "%s" % imagefile
+        text = ""
+        text+= "<H2><FONT color=#009999>"
+        text+= "Spectrum, Continuum and Fitted values :"
+        text+= "</FONT></H2>"
+        text+= "<CENTER>"
+        text+= "<IMG SRC=%s ALT=""fit graph"" ALIGN=center>"%filelink
+        text+= "</CENTER>"
+        return text
+
+    def getImage(self):
+        _FIGURE_LOCK.acquire()
+        try:
+            return self._getImage()
+        finally:
+            _FIGURE_LOCK.release()
+
+    def _getImage(self):
+        ddict=self.fitresult
+        try:
+            fig, canvas, ax = _getFigure()
+            logplot = self.plotDict.get('logy', True)
+            if logplot:
+                axplot = ax.semilogy
+            else:
+                axplot = ax.plot
+            axplot(ddict['result']['energy'], ddict['result']['ydata'], 'k', lw=1.5)
+            axplot(ddict['result']['energy'], ddict['result']['continuum'], 'g', lw=1.5)
+            legendlist = ['spectrum', 'continuum', 'fit']
+            axplot(ddict['result']['energy'], ddict['result']['yfit'], 'r', lw=1.5)
+            fontproperties = FontProperties(size=8)
+            if ddict['result']['config']['fit']['sumflag']:
+                axplot(ddict['result']['energy'],
+                       ddict['result']['pileup'] + ddict['result']['continuum'], 'y', lw=1.5)
+                legendlist.append('pileup')
+            if matplotlib_version < '0.99.0':
+                legend = ax.legend(legendlist,0,
+                                   prop = fontproperties, labelsep=0.02)
+            elif matplotlib_version < '1.5':
+                legend = ax.legend(legendlist,0,
+                                   prop = fontproperties, labelspacing=0.02)
+            else:
+                legend = ax.legend(legendlist, loc=0,
+                                   prop = fontproperties, labelspacing=0.02)
+        except ValueError:
+            fig, canvas, ax = _getFigure()
+            ax.plot(ddict['result']['energy'], ddict['result']['ydata'], 'k', lw=1.5)
+            ax.plot(ddict['result']['energy'], ddict['result']['continuum'], 'g', lw=1.5)
+            legendlist = ['spectrum', 'continuum', 'fit']
+            ax.plot(ddict['result']['energy'], ddict['result']['yfit'], 'r', lw=1.5)
+            fontproperties = FontProperties(size=8)
+            if ddict['result']['config']['fit']['sumflag']:
+                ax.plot(ddict['result']['energy'],
+                            ddict['result']['pileup'] + ddict['result']['continuum'], 'y', lw=1.5)
+                legendlist.append('pileup')
+            if matplotlib_version < '0.99.0':
+                legend = ax.legend(legendlist,0,
+                               prop = fontproperties, labelsep=0.02)
+            elif matplotlib_version < '1.5':
+                legend = ax.legend(legendlist,0,
+                               prop = fontproperties, labelspacing=0.02)
+            else:
+                legend = ax.legend(legendlist, loc=0,
+                               prop = fontproperties, labelspacing=0.02)
+
+        ax.set_xlabel('Energy')
+        ax.set_ylabel('Counts')
+        legend.draw_frame(False)
+
+        outfile = self.outdir+"/"+self.outfile+".png"
+        try:
+            os.remove(outfile)
+        except:
+            pass
+
+        canvas.print_figure(outfile)
+        return self.__getFitImage(self.outfile+".png")
+
+    def getSummary(self):
+        """
+        Return a dictionary with the source, the selection, the reduced
+        chi square and the number of iterations of the fit.
+        """
+        result = self.fitresult['result']
+        return {'sourcename':self.sourcename,
+                'selection':self.selection,
+                'chisq':result.get('chisq', None),
+                'niter':result.get('niter', None)}
+
+    def getConcentrations(self):
+        return self.concentrationsConversion.getConcentrationsAsHtml(\
+                                                self.concentrations)
+
+    def getConcentrationsASCII(self):
+        return self.concentrationsConversion.getConcentrationsAsAscii(\
+                                                self.concentrations)
+
+    def getResult(self):
+        text = ""
+        if self.tableFlag == 0:
+            return text
+        text+="\n"
+        text+= "<H2><a NAME=""%s""></a><FONT color=#009999>" % 'Fit_Peak_Results'
+        text+= "%s:" % 'Fit Peak Results'
+        text+= "</FONT></H2>"
+        text+="<br>"
+        result = self.fitresult['result']
+        if self.tableFlag == 1:
+            labels=['Element','Group','Fit&nbsp; Area','Sigma']
+        else:
+            labels=['Element','Group','Fit&nbsp; Area','Sigma','Energy','Ratio','FWHM','Chi&nbsp; square']
+        lemmon = ("#%x%x%x" % (255,250,205)).upper()
+        hcolor = ("#%x%x%x" % (230,240,249)).upper()
+        text += "<CENTER>"
+        text += ("<nobr>")
+        text += '<table width="80%" border="0" cellspacing="1" cellpadding="1" >'
+        text += ( "<tr><b>")
+        for l in range(len(labels)):
+            if l < 2:
+                text += '<td align="left" bgcolor=%s><b>%s</b></td>' % (hcolor,labels[l])
+            elif (l > 3) or (self.tableFlag == 1):
+                text += '<td align="right" bgcolor=%s><b>%s</b></td>' % (hcolor,labels[l])
+            else:
+                text += '<td align="center" bgcolor=%s><b>%s</b></td>' % (hcolor,labels[l])
+        text+="</b></tr>\n"
+
+        for group in result['groups']:
+            text+=("<tr>")
+            ele,group0 = group.split()
+            text += '<td align="left"><b>%s</b></td>' % ele
+            text += '<td align="left"><b>%s</b></td>' % group0
+            fitarea    = "%.6e" % result[group]['fitarea']
+            sigmaarea  = "%.2e" % result[group]['sigmaarea']
+            text += '<td align="right"><b>%s</b></td>' % fitarea
+            text += '<td align="right"><b>%s</b></td>' % sigmaarea
+            text += '<td align="right"><b>&nbsp;</b></td>'
+            text += '<td align="right"><b>&nbsp;</b></td>'
+            text += '<td align="right"><b>&nbsp;</b></td>'
+            text += '<td align="right"><b>&nbsp;</b></td>'
+            text += '</tr>\n'
+            if type(result[group]['peaks']) != type([]):
+                iterator = [result[group]['peaks']]
+            else:
+                iterator = 1 * result[group]['peaks']
+            if self.tableFlag == 1:
+                iterator = []
+            for peak in iterator:
+                text += '<tr><td>&nbsp;</td>'
+                name  = peak
+                energy = ("%.3f" % (result[group][peak]['energy']))
+                ratio  = ("%.5f" % (result[group][peak]['ratio']))
+                area   = ("%.6e" % (result[group][peak]['fitarea']))
+                sigma  = ("%.2e" % (result[group][peak]['sigmaarea']))
+                fwhm   = ("%.3f" % (result[group][peak]['fwhm']))
+                chisq  = ("%.2f" % (result[group][peak]['chisq']))
+                fields = [name,area,sigma,energy,ratio,fwhm,chisq]
+                for field in fields:
+                    if field == name:
+                        text+=('<td align="left"  bgcolor=%s>%s</td>' % (lemmon,field))
+                    else:
+                        text+=('<td align="right" bgcolor=%s>%s</td>' % (lemmon,field))
+                text+="</tr>\n"
+            if type(result[group]['escapepeaks']) != type([]):
+                iterator = [result[group]['escapepeaks']]
+            else:
+                iterator = 1 * result[group]['escapepeaks']
+            if self.tableFlag == 1:
+                iterator = []
+            for peak0 in iterator:
+                name  = peak0+"esc"
+                peak  = peak0+"esc"
+                if result[group][name]['ratio'] > 0.0:
+                    text += '<tr><td></td>'
+                    energy = ("%.3f" % (result[group][peak]['energy']))
+                    ratio  = ("%.5f" % (result[group][peak]['ratio']))
+                    area   = ("%.6e" % (result[group][peak]['fitarea']))
+                    sigma  = ("%.2e" % (result[group][peak]['sigmaarea']))
+                    fwhm   = ("%.3f" % (result[group][peak]['fwhm']))
+                    chisq  = ("%.2f" % (result[group][peak]['chisq']))
+                    fields = [name,area,sigma,energy,ratio,fwhm,chisq]
+                    for field in fields:
+                        if field == name:
+                            text+=('<td align="left"  bgcolor=%s>%s</td>' % (lemmon,field))
+                        else:
+                            text+=('<td align="right" bgcolor=%s>%s</td>' % (lemmon,field))
+                    text+="</tr>\n"
+        text+=("</table>")
+        text+=("</nobr>")
+        text+="</CENTER>"
+        return text
+
+# index entries of the summary mode
+SUMMARY_PREFIX = "<TABLE border=0 cellpadding=1 cellspacing=2>" + \
+                 "<TR><TH ALIGN=LEFT>Source</TH><TH ALIGN=LEFT>Selection</TH>" + \
+                 "<TH ALIGN=RIGHT>Chi&nbsp; square</TH>" + \
+                 "<TH ALIGN=RIGHT>Iterations</TH></TR>\n"
+SUMMARY_ROW = "<TR><TD ALIGN=LEFT>%s</TD>" + \
+              "<TD ALIGN=LEFT><a href=""%s"">%s</a></TD>" + \
+              "<TD ALIGN=RIGHT>%s</TD><TD ALIGN=RIGHT>%s</TD></TR>\n"
+SUMMARY_SUFFIX = "</TABLE>"
+
+def _writeReport(fitfile, outfile, table, plot):
+    """
+    Write the report of fitfile into outfile and return the summary
+    of the fit.
+    """
+    report = McaAdvancedFitReport(fitfile=fitfile, outfile=outfile,
+                                  table=table, plot=plot)
+    report.writeReport()
+    return report.getSummary()
+
+def _reportWorker(jobQueue, resultQueue, table, plot):
+    while True:
+        job = jobQueue.get()
+        if job is None:
+            break
+        fitfile, outfile = job
+        try:
+            summary = _writeReport(fitfile, outfile, table, plot)
+            resultQueue.put((outfile, summary, None))
+        except:
+            resultQueue.put((outfile, None, "%s" % (sys.exc_info()[1],)))
+
+def _getContext():
+    # the calling process can be running Qt and other threads, the worker
+    # processes are started fresh instead of forking it
+    if hasattr(multiprocessing, "get_context"):
+        return multiprocessing.get_context("spawn")
+    return multiprocessing
+
+class McaAdvancedFitReportWriter(object):
+    def __init__(self, htmldir, table=2, summary=False, nProcesses=None,
+                 index=True):
+        """
+        :param htmldir: Directory containing the report directories. Its
+                        index links to the index of each of them.
+        :param table: Table flag of the reports
+        :param summary: If True the reports are written without plot and
+                        the index of each directory is a table with the
+                        chi square and the number of iterations of the fits.
+        :param nProcesses: Number of worker processes. Default is the number
+                           of CPUs. If 0 the reports are written in the
+                           calling thread.
+        :param index: If False the reports are written without updating
+                      the indices (for instance when several writers share
+                      the same directories).
+        """
+        if nProcesses is None:
+            nProcesses = multiprocessing.cpu_count()
+        self.htmldir = htmldir
+        self.table = table
+        self.summary = summary
+        self.nProcesses = max(0, int(nProcesses))
+        self.indexFlag = index
+        self._index = HtmlIndex.HtmlIndex(htmldir)
+        self._directories = []
+        self._workers = []
+        self._jobQueue = None
+        self._resultQueue = None
+        self._collector = None
+        self.nErrors = 0
+
+    def _start(self):
+        context = _getContext()
+        self._jobQueue = context.Queue()
+        self._resultQueue = context.Queue()
+        for i in range(self.nProcesses):
+            worker = context.Process(target=_reportWorker,
+                                    args=(self._jobQueue, self._resultQueue,
+                                          self.table, not self.summary))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+        self._collector = threading.Thread(target=self._collect)
+        self._collector.daemon = True
+        self._collector.start()
+
+    def _collect(self):
+        while True:
+            result = self._resultQueue.get()
+            if result is None:
+                break
+            self._appendEntry(*result)
+
+    def _addDirectory(self, directory):
+        """
+        Start a new index in directory and link it from the main index
+        """
+        if directory in self._directories:
+            return
+        self._directories.append(directory)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        logofile = os.path.join(directory, "PyMcaLogo.png")
+        if not os.path.exists(logofile):
+            # workers must not need Qt
+            self._saveLogo(logofile)
+        if not self.indexFlag:
+            return
+        index = os.path.join(directory, "index.html")
+        if os.path.exists(index):
+            os.remove(index)
+        if os.path.abspath(os.path.dirname(directory)) != \
+           os.path.abspath(self.htmldir):
+            return
+        name = os.path.basename(directory)
+        entry = self._index.getEntry("./" + name + "/index.html",
+                                     name.split('_HTMLDIR')[0])
+        mainIndex = os.path.join(self.htmldir, "index.html")
+        if os.path.exists(mainIndex):
+            f = open(mainIndex, 'rb')
+            text = f.read()
+            f.close()
+            if entry.encode('utf-8') in text:
+                return
+        self._index.appendEntry(entry)
+
+    def _saveLogo(self, logofile):
+        HtmlIndex.saveLogo(logofile)
+
+    def _appendEntry(self, outfile, summary=None, error=None):
+        if error is not None:
+            self.nErrors += 1
+            print("ERROR on REPORT %s: %s" % (outfile, error))
+            return
+        if not self.indexFlag:
+            return
+        directory = os.path.dirname(outfile)
+        link = os.path.basename(outfile)
+        if not self.summary:
+            self._index.appendEntry(self._index.getEntry(link), directory)
+            return
+        if summary is None:
+            summary = {}
+        values = []
+        for key in ['chisq', 'niter']:
+            value = summary.get(key, None)
+            if value is None:
+                values.append("&nbsp;")
+            elif key == 'chisq':
+                values.append("%.2f" % value)
+            else:
+                values.append("%d" % value)
+        row = SUMMARY_ROW % (summary.get('sourcename', "&nbsp;"),
+                             link,
+                             summary.get('selection', link.split(".html")[0]),
+                             values[0], values[1])
+        self._index.appendEntry(row, directory, prefix=SUMMARY_PREFIX,
+                                suffix=SUMMARY_SUFFIX)
+
+    def addFitFile(self, fitfile, outfile):
+        """
+        Queue the generation of the report of fitfile into outfile.
+        The directory of outfile is the directory of the index entry.
+        """
+        outfile = os.path.abspath(outfile)
+        self._addDirectory(os.path.dirname(outfile))
+        if not self.nProcesses:
+            try:
+                summary = _writeReport(fitfile, outfile,
+                                       self.table, not self.summary)
+                self._appendEntry(outfile, summary)
+            except:
+                self._appendEntry(outfile, None, "%s" % (sys.exc_info()[1],))
+            return
+        if self._collector is None:
+            self._start()
+        self._jobQueue.put((fitfile, outfile))
+
+    def addExistingReport(self, outfile):
+        """
+        Add to the index an already written report.
+        """
+        outfile = os.path.abspath(outfile)
+        self._addDirectory(os.path.dirname(outfile))
+        if self._collector is None:
+            self._appendEntry(outfile)
+        else:
+            self._resultQueue.put((outfile, None, None))
+
+    def close(self):
+        """
+        Wait for the queued reports to be written and their index entries
+        to be added.
+        """
+        if self._collector is None:
+            return
+        for worker in self._workers:
+            self._jobQueue.put(None)
+        for worker in self._workers:
+            worker.join()
+        # the results of the workers are already in the queue
+        self._resultQueue.put(None)
+        self._collector.join()
+        self._workers = []
+        self._collector = None
+        self._jobQueue = None
+        self._resultQueue = None
+
+def benchmark(nFiles=100, nProcesses=None, outputdir=None):
+    """
+    Compare the time needed to write the reports of nFiles fits one
+    after the other as PyMcaBatch did, with the writer and with the writer
+    in summary mode.
+
+    :return: Dictionary with the times in seconds ("sequential", "writer"
+             and "summary").
+    """
+    import tempfile
+    import shutil
+    import numpy
+    from PyMca5 import PyMcaDataDir
+    from PyMca5.PyMcaPhysics.xrf import ClassMcaTheory
+
+    cleanup = outputdir is None
+    if cleanup:
+        outputdir = tempfile.mkdtemp()
+    try:
+        config = ConfigDict.ConfigDict()
+        config.read(os.path.join(PyMcaDataDir.PYMCA_DATA_DIR, "McaTheory.cfg"))
+        config['peaks'] = {'Fe':'K', 'Cu':'K'}
+        config['detector']['zero'] = 0.0
+        config['detector']['gain'] = 0.02
+        config['fit']['xmin'] = 100
+        config['fit']['xmax'] = 600
+        mcaFit = ClassMcaTheory.McaTheory()
+        mcaFit.configure(config)
+        x = numpy.arange(1024.)
+        energy = 0.02 * x
+        fitfiles = []
+        for i in range(nFiles):
+            y = 10 + 1000. * numpy.exp(-0.5 * ((energy - 6.4) / 0.07) ** 2) +\
+                     500. * numpy.exp(-0.5 * ((energy - 8.04) / 0.08) ** 2)
+            y = numpy.random.poisson(y).astype(numpy.float64)
+            mcaFit.setData(x, y, xmin=100, xmax=600)
+            mcaFit.estimate()
+            mcaFit.startfit(digest=1)
+            fitfile = os.path.join(outputdir, "spectrum_%05d.fit" % i)
+            mcaFit.digestresult(outfile=fitfile,
+                                info={'SourceName':'benchmark',
+                                      'Key':'%d' % i})
+            fitfiles.append(fitfile)
+
+        def outfiles(name):
+            directory = os.path.join(outputdir, "HTML", name + "_HTMLDIR")
+            return [os.path.join(directory, os.path.basename(f)[:-4] + ".html")\
+                    for f in fitfiles]
+
+        result = {}
+        directory = os.path.dirname(outfiles("sequential")[0])
+        os.makedirs(directory)
+        t0 = time.time()
+        for fitfile, outfile in zip(fitfiles, outfiles("sequential")):
+            report = McaAdvancedFitReport(fitfile=fitfile, outfile=outfile)
+            report.writeReport()
+        HtmlIndex.HtmlIndex(directory).buildIndex()
+        result["sequential"] = time.time() - t0
+        for name, summary in [("writer", False), ("summary", True)]:
+            t0 = time.time()
+            writer = McaAdvancedFitReportWriter(os.path.join(outputdir, "HTML"),
+                                                summary=summary,
+                                                nProcesses=nProcesses)
+            for fitfile, outfile in zip(fitfiles, outfiles(name)):
+                writer.addFitFile(fitfile, outfile)
+            writer.close()
+            result[name] = time.time() - t0
+        return result
+    finally:
+        if cleanup:
+            shutil.rmtree(outputdir)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        result = benchmark(int(sys.argv[1]))
+    else:
+        result = benchmark()
+    print("Sequential reports     = %.4f s" % result["sequential"])
+    print("Report writer          = %.4f s" % result["writer"])
+    print("Summary report writer  = %.4f s" % result["summary"])
@@ -0,0 +1,597 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V.A. Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+__doc__ = """
+Primary fluorescence of a multilayer sample for a fixed geometry.
+
+The MultilayerModel class precomputes, for a given set of layers, beam
+filters, attenuators, detector and excitation energies, all the quantities
+that do not depend on the sample composition: line energies and rates,
+fluorescence weights, photoelectric cross sections and the mass attenuation
+coefficients of every element at the excitation and at the fluorescence
+energies.
+
+The fluorescence rates for mass fraction one of the requested element groups
+can then be evaluated for many layer compositions and many beam spectrum
+weights at once using array operations. The result of
+Elements.getMultilayerFluorescence for the nominal composition is available
+via the getMultilayerFluorescence method.
+
+Secondary fluorescence is not considered.
+"""
+import numpy
+from . import Elements
+
+DEBUG = 0
+
+SHELL_LIST = ['K', 'L1', 'L2', 'L3', 'M1', 'M2', 'M3', 'M4', 'M5']
+
+def _getShellIdent(family):
+    if family.upper()[0] == 'K':
+        shellIdent = 'K'
+    elif len(family) == 2:
+        shellIdent = family.upper()
+    elif family.upper() == 'L':
+        shellIdent = 'L3'
+    elif family.upper() == 'M':
+        shellIdent = 'M5'
+    else:
+        raise ValueError("Unknown Element shell %s" % family)
+    return shellIdent
+
+def _getAttenuation(attenuatorList, energies):
+    """
+    Sum of the mass attenuation coefficients multiplied by the mass
+    thickness of each attenuator.
+    """
+    coeffs = numpy.zeros(len(energies), numpy.float64)
+    if len(energies):
+        for attenuator in attenuatorList:
+            formula = attenuator[0]
+            thickness = attenuator[1] * attenuator[2]
+            coeffs += thickness * numpy.array(\
+                Elements.getMaterialMassAttenuationCoefficients(formula,
+                                            1.0, energies)['total'])
+    return coeffs
+
+
+class MultilayerModel(object):
+    def __init__(self, multilayer,
+                 energyList,
+                 weightList=None,
+                 flagList=None,
+                 elementsList=None,
+                 beamfilters=None,
+                 attenuators=None,
+                 alphain=None,
+                 alphaout=None,
+                 cascade=None,
+                 detector=None,
+                 funnyfilters=None,
+                 forcepresent=None,
+                 layerList=None):
+        """
+        The arguments have the same meaning as those of
+        Elements.getMultilayerFluorescence.
+
+        :param multilayer: Layer or list of layers [material, density,
+                           thickness]
+        :param energyList: Excitation energies in keV
+        :param weightList: Relative weights of the excitation energies
+        :param flagList: Energies with a flag equal to 0 are ignored
+        :param elementsList: List of element groups [Z, symbol, family]
+                             as [26, "Fe", "K"]
+        :param beamfilters: List of [material, density, thickness]
+        :param attenuators: List of [material, density, thickness]
+        :param alphain: Incoming beam angle with sample surface
+        :param alphaout: Outgoing beam angle with sample surface
+        :param cascade: Flag to consider vacancy propagation
+        :param detector: [material, density, thickness] of the detector
+        :param funnyfilters: List of [material, density, thickness,
+                             opening fraction]
+        :param forcepresent: If true, the groups of elements not present in
+                             any layer are considered in all layers
+        :param layerList: Indices of the layers to consider. Default is all.
+        """
+        if multilayer is None or not len(multilayer):
+            raise ValueError("Empty multilayer")
+        if type(multilayer[0]) != type([]):
+            multilayer = [multilayer]
+        self.multilayer = [list(layer) for layer in multilayer]
+        nLayers = len(self.multilayer)
+        if layerList is None:
+            layerList = list(range(nLayers))
+        elif type(layerList) != type([]):
+            layerList = [layerList]
+        self.layerList = layerList
+        if elementsList is None:
+            raise ValueError("A list of element groups must be supplied")
+        if type(elementsList) != type([]):
+            elementsList = [elementsList]
+        for group in elementsList:
+            if (type(group) not in [type([]), type(())]) or len(group) != 3:
+                raise ValueError(\
+                    "Element groups must be of the form [Z, symbol, family]")
+        self.elementsList = [list(group) for group in elementsList]
+        if cascade is None:
+            cascade = False
+        self.cascade = cascade
+        if forcepresent is None:
+            forcepresent = 0
+
+        # excitation energies
+        if (type(energyList) != type([])) and \
+           (type(energyList) != numpy.ndarray):
+            energyList = [energyList]
+        energyList = numpy.array(energyList, dtype=numpy.float64)
+        if flagList is None:
+            flagList = numpy.ones(len(energyList), numpy.float64)
+        else:
+            if (type(flagList) != type([])) and \
+               (type(flagList) != numpy.ndarray):
+                flagList = [flagList]
+            flagList = numpy.array(flagList)
+        i0 = numpy.nonzero(flagList > 0)[0]
+        self.energyList = numpy.take(energyList, i0).astype(numpy.float64)
+        if len(self.energyList) and \
+           (self.energyList.min() <= 0.10):
+            raise ValueError("Invalid Energy %.5g keV" % \
+                             self.energyList.min())
+        self._flagIndex = i0
+        self._nEnergies = len(energyList)
+        self._weightList = self._getNormalizedWeights(weightList)
+
+        # geometry
+        if alphain is None:
+            alphain = 45.0
+        if alphaout is None:
+            alphaout = 45.0
+        self.alphain = alphain
+        self.alphaout = alphaout
+        self._sinAlphaIn = numpy.sin(abs(alphain) * numpy.pi / 180.)
+        self._sinAlphaOut = numpy.sin(alphaout * numpy.pi / 180.)
+        if (alphain < 0.0) and (alphaout < 0.0):
+            self._fluoSinAlphaOut = numpy.sin(-alphaout * numpy.pi / 180.)
+        else:
+            self._fluoSinAlphaOut = self._sinAlphaOut
+        self._bottomExcitation = (alphain < 0.0) and (alphaout > 0.0)
+
+        # external beam filters
+        if beamfilters is None:
+            beamfilters = []
+        if len(beamfilters):
+            if type(beamfilters[0]) != type([]):
+                beamfilters = [beamfilters]
+        self._beamTransmission = numpy.exp(\
+            -_getAttenuation(beamfilters, self.energyList))
+
+        # layer compositions and element groups considered in each layer
+        forcedElementsList = []
+        if forcepresent:
+            keys = []
+            for layer in self.multilayer:
+                keys += list(Elements.getMaterialMassFractions([layer[0]],
+                                                                [1.0]).keys())
+            forcedElementsList = [group for group in self.elementsList \
+                                  if group[1] not in keys]
+        self._layerComposition = []
+        self._layerMassFraction = []
+        self._layerGroups = []
+        for layer in self.multilayer:
+            eleDict = Elements.getMaterialMassFractions([layer[0]], [1.0])
+            if eleDict == {}:
+                raise ValueError("Invalid layer material %s" % layer[0])
+            self._layerComposition.append(dict(eleDict))
+            groups = []
+            for ele in eleDict.keys():
+                for group in self.elementsList:
+                    if ele == group[1]:
+                        groups.append(group)
+            massFraction = dict(eleDict)
+            for group in forcedElementsList:
+                groups.append(group)
+                massFraction[group[1]] = 1.0
+            self._layerGroups.append(groups)
+            self._layerMassFraction.append(massFraction)
+
+        # emission lines
+        self._lineEnergies = []
+        self._groupData = {}
+        if len(self.energyList):
+            self._maxEnergy = self.energyList.max()
+        else:
+            self._maxEnergy = None
+        self._buildGroups(attenuators, detector, funnyfilters)
+        if len(self._lineEnergies):
+            self._lineEnergies = numpy.concatenate(self._lineEnergies)
+        else:
+            self._lineEnergies = numpy.zeros((0,), numpy.float64)
+
+        # attenuation coefficients of the elements
+        self._muCache = {}
+
+    def _getNormalizedWeights(self, weightList=None):
+        if weightList is None:
+            weightList = numpy.ones(self._nEnergies, numpy.float64)
+        else:
+            if (type(weightList) != type([])) and \
+               (type(weightList) != numpy.ndarray):
+                weightList = [weightList]
+            weightList = numpy.array(weightList, dtype=numpy.float64)
+            if len(weightList) != self._nEnergies:
+                raise ValueError(\
+                    "Number of weights does not match number of energies")
+        weightList = numpy.take(weightList, self._flagIndex)
+        total = weightList.sum()
+        if total <= 0.0:
+            raise ValueError("Sum of weights lower or equal to 0")
+        return weightList / total
+
+    def _buildGroups(self, attenuators, detector, funnyfilters):
+        if attenuators is None:
+            attenuators = []
+        if funnyfilters is None:
+            funnyfilters = []
+        funnyfactor = None
+        for attenuator in funnyfilters:
+            if funnyfactor is None:
+                funnyfactor = attenuator[3]
+            elif abs(attenuator[3] - funnyfactor) > 0.0001:
+                raise ValueError(\
+                    "All funny type filters must have same openning fraction")
+        unfilteredDict = {}
+        weightsDict = {}
+        offset = 0
+        usedGroups = []
+        for ilayer in range(len(self.multilayer)):
+            if ilayer in self.layerList:
+                usedGroups += self._layerGroups[ilayer]
+        for group in usedGroups:
+            ele = group[1]
+            key = (ele, group[2])
+            if key in self._groupData:
+                continue
+            shellIdent = _getShellIdent(group[2])
+            if ele not in unfilteredDict:
+                unfilteredDict[ele] = Elements._getUnfilteredElementDict(\
+                                                    ele, self._maxEnergy)
+            elementDict = unfilteredDict[ele]
+            rays = group[2] + " xrays"
+            ddict = {}
+            ddict["rays"] = rays
+            ddict["binding"] = Elements.Element[ele]['binding'][shellIdent]
+            if rays not in elementDict:
+                ddict["transitions"] = None
+                self._groupData[key] = ddict
+                continue
+            transitions = elementDict[rays] * 1
+            energies = [elementDict[t]['energy'] for t in transitions]
+            rates = numpy.array([elementDict[t]['rate'] for t in transitions],
+                                dtype=numpy.float64)
+            # attenuators, funny filters and detector
+            trans = numpy.exp(-_getAttenuation(attenuators, energies))
+            if funnyfactor is not None:
+                trans *= funnyfactor * \
+                         numpy.exp(-_getAttenuation(funnyfilters, energies)) + \
+                         (1.0 - funnyfactor)
+            if detector is not None:
+                trans *= 1.0 - numpy.exp(-_getAttenuation([detector],
+                                                          energies))
+            ddict["transitions"] = transitions
+            ddict["energies"] = energies
+            ddict["rates"] = rates * trans
+            ddict["slice"] = slice(offset, offset + len(transitions))
+            offset += len(transitions)
+            self._lineEnergies.append(numpy.array(energies,
+                                                  dtype=numpy.float64))
+
+            # fluorescence weights of the shell of each transition
+            shellIndex = []
+            for transition in transitions:
+                if transition[0] == "K":
+                    shellIndex.append(0)
+                else:
+                    shellIndex.append(SHELL_LIST.index(transition[0:2]))
+            if ele not in weightsDict:
+                weightsDict[ele] = numpy.array(\
+                    [Elements._getFluorescenceWeights(ele, energy,
+                                                      normalize=False,
+                                                      cascade=self.cascade)
+                     for energy in self.energyList], dtype=numpy.float64)
+            weights = weightsDict[ele]
+            if len(self.energyList):
+                ddict["weights"] = weights[:, shellIndex]
+            else:
+                ddict["weights"] = numpy.zeros((0, len(transitions)),
+                                               numpy.float64)
+
+            # excitation energies above the edge (at least one)
+            mask = self.energyList >= ddict["binding"]
+            if (not mask.any()) and len(mask):
+                mask[0] = True
+            ddict["mask"] = mask
+            if len(self.energyList):
+                ddict["photo"] = numpy.array(\
+                    Elements.getMaterialMassAttenuationCoefficients(ele,
+                                    1.0, self.energyList)['photo'],
+                    dtype=numpy.float64)
+            else:
+                ddict["photo"] = numpy.zeros((0,), numpy.float64)
+            self._groupData[key] = ddict
+
+    def _getElementCoefficients(self, ele):
+        """
+        Mass attenuation coefficients of an element at the excitation and at
+        the fluorescence energies
+        """
+        if ele not in self._muCache:
+            energies = list(self.energyList) + list(self._lineEnergies)
+            if len(energies):
+                mu = numpy.array(Elements.getMaterialMassAttenuationCoefficients(\
+                                ele, 1.0, energies)['total'],
+                                dtype=numpy.float64)
+            else:
+                mu = numpy.zeros((0,), numpy.float64)
+            self._muCache[ele] = mu
+        return self._muCache[ele]
+
+    def loadElementCoefficients(self, elementList):
+        """
+        Calculate in advance the mass attenuation coefficients of the given
+        elements. Call it before evaluating from several threads layer
+        compositions containing elements not present in the sample.
+        """
+        for ele in elementList:
+            self._getElementCoefficients(ele)
+
+    def _getLayerCoefficients(self, composition):
+        mu = None
+        for ele in composition:
+            fraction = numpy.asarray(composition[ele], dtype=numpy.float64)
+            term = fraction[..., None] * self._getElementCoefficients(ele)
+            if mu is None:
+                mu = term
+            else:
+                mu = mu + term
+        nEnergies = len(self.energyList)
+        return mu[..., :nEnergies], mu[..., nEnergies:]
+
+    def _getCompositions(self, massFractions=None):
+        compositions = [composition for composition in self._layerComposition]
+        if massFractions is None:
+            return compositions
+        if type(massFractions) == type({}):
+            items = massFractions.items()
+        else:
+            items = enumerate(massFractions)
+        for ilayer, composition in items:
+            if composition is None:
+                continue
+            if len(composition) == 0:
+                raise ValueError("Empty composition for layer %d" % ilayer)
+            for ele in composition:
+                if ele not in Elements.Element:
+                    raise ValueError("Invalid element %s" % ele)
+            compositions[ilayer] = composition
+        return compositions
+
+    def _evaluate(self, massFractions=None, weightList=None):
+        """
+        Return a list with, for each considered layer, the list of
+        (group, rates, weights) tuples. rates are the fluorescence rates of
+        each transition for each excitation energy and weights the weights
+        of the excitation energies at the layer.
+        """
+        if weightList is None:
+            weightList = self._weightList
+        else:
+            weightList = self._getNormalizedWeights(weightList)
+        compositions = self._getCompositions(massFractions)
+        nLayers = len(self.multilayer)
+        muBeam = []
+        muLines = []
+        for ilayer in range(nLayers):
+            mu0, mu1 = self._getLayerCoefficients(compositions[ilayer])
+            muBeam.append(mu0)
+            muLines.append(mu1)
+        sinAlphaIn = self._sinAlphaIn
+        sinAlphaOut = self._fluoSinAlphaOut
+        output = []
+        for ilayer in range(nLayers):
+            if ilayer not in self.layerList:
+                continue
+            layer = self.multilayer[ilayer]
+            thickness = layer[1] * layer[2]
+            # beam attenuation by the layers in front of this one
+            if self.alphain >= 0:
+                beamLayers = range(ilayer)
+            else:
+                beamLayers = range(ilayer + 1, nLayers)
+            beamCoeffs = 0.0
+            for jlayer in beamLayers:
+                beamCoeffs = beamCoeffs + muBeam[jlayer] * \
+                             (self.multilayer[jlayer][1] * \
+                              self.multilayer[jlayer][2] / sinAlphaIn)
+            beamWeights = weightList * self._beamTransmission * \
+                          numpy.exp(-beamCoeffs)
+            # fluorescence attenuation by the layers on top of this one
+            lineCoeffs = 0.0
+            for jlayer in range(ilayer):
+                lineCoeffs = lineCoeffs + muLines[jlayer] * \
+                             (self.multilayer[jlayer][1] * \
+                              self.multilayer[jlayer][2] / self._sinAlphaOut)
+            lineTransmission = numpy.exp(-lineCoeffs)
+            layerOutput = []
+            for group in self._layerGroups[ilayer]:
+                ddict = self._groupData[(group[1], group[2])]
+                if ddict["transitions"] is None:
+                    layerOutput.append((group, None, None))
+                    continue
+                sl = ddict["slice"]
+                if numpy.isscalar(lineTransmission):
+                    transmission = lineTransmission
+                else:
+                    transmission = lineTransmission[..., None, sl]
+                rates = ddict["weights"] * ddict["rates"] * transmission
+                muExcitation = muBeam[ilayer][..., :, None]
+                muFluorescence = muLines[ilayer][..., None, sl]
+                photo = ddict["photo"][:, None]
+                if self._bottomExcitation:
+                    if thickness <= 0.0:
+                        raise ValueError(\
+                            "Incorrect target density and/or thickness")
+                    denominator = muExcitation - muFluorescence * \
+                                  (sinAlphaIn / sinAlphaOut)
+                    zero = denominator == 0.0
+                    with numpy.errstate(divide="ignore", invalid="ignore"):
+                        trans = -photo / denominator
+                        trans = trans * \
+                            (numpy.exp(-(muExcitation / sinAlphaIn) * thickness) - \
+                             numpy.exp(-(muFluorescence / sinAlphaOut) * thickness))
+                    if zero.any():
+                        term = thickness / sinAlphaIn
+                        trans = numpy.where(zero,
+                                -photo * term * numpy.exp(-term * muExcitation),
+                                trans)
+                    if (trans < 0.0).any():
+                        print("trans lower than 0.0. Reset to 0.0")
+                        trans = numpy.where(trans < 0.0, 0.0, trans)
+                else:
+                    trans = photo / (muExcitation + muFluorescence * \
+                                     (sinAlphaIn / sinAlphaOut))
+                    if (thickness > 0.0) and (abs(sinAlphaIn) > 0.0):
+                        trans = trans * (1.0 - numpy.exp(\
+                            -((muExcitation / sinAlphaIn) + \
+                              (muFluorescence / sinAlphaOut)) * thickness))
+                rates = numpy.where(rates > 0.0, rates * trans, 0.0)
+                weights = beamWeights * ddict["mask"]
+                layerOutput.append((group, rates, weights))
+            output.append((ilayer, layerOutput))
+        return output
+
+    def getRates(self, massFractions=None, weightList=None):
+        """
+        Fluorescence rates of each element group for mass fraction one.
+
+        :param massFractions: Dictionary keyed by layer index or list with
+                              one entry per layer. Each entry is None, to
+                              keep the nominal composition of the layer, or
+                              a dictionary {element: mass fraction} with the
+                              new composition of the layer. Mass fractions
+                              can be numpy arrays of any (broadcastable)
+                              shape, for instance one value per pixel.
+        :param weightList: New relative weights of the excitation energies
+        :return: Dictionary with the keys "total", the sum over all layers,
+                 and "layers", a list with one entry per considered layer.
+                 Each of them is a dictionary keyed by group name ("Fe K")
+                 with the rates as values.
+        """
+        output = self._evaluate(massFractions=massFractions,
+                                weightList=weightList)
+        ddict = {}
+        ddict["total"] = {}
+        ddict["layers"] = []
+        for ilayer, layerOutput in output:
+            layerDict = {}
+            for group, rates, weights in layerOutput:
+                key = "%s %s" % (group[1], group[2])
+                if rates is None:
+                    value = 0.0
+                else:
+                    value = (rates.sum(axis=-1) * weights).sum(axis=-1)
+                layerDict[key] = value
+                if key in ddict["total"]:
+                    ddict["total"][key] = ddict["total"][key] + value
+                else:
+                    ddict["total"][key] = value
+            ddict["layers"].append(layerDict)
+        return ddict
+
+    def getMultilayerFluorescence(self, fulloutput=None):
+        """
+        Same output as Elements.getMultilayerFluorescence for the nominal
+        layer compositions.
+        """
+        if fulloutput is None:
+            fulloutput = 0
+        output = self._evaluate()
+        result = []
+        dictListList = []
+        for ilayer, layerOutput in output:
+            if not len(layerOutput):
+                if fulloutput:
+                    result.append({})
+                continue
+            # families of each element considered in this layer
+            raysDict = {}
+            for group, rates, weights in layerOutput:
+                ele = group[1]
+                if ele not in raysDict:
+                    raysDict[ele] = []
+                if rates is not None:
+                    raysDict[ele].append(group[2] + " xrays")
+            dictList = []
+            massFraction = self._layerMassFraction[ilayer]
+            for group, rates, weights in layerOutput:
+                ele = group[1]
+                eleDict = {}
+                eleDict['mass fraction'] = massFraction[ele] * 1.0
+                eleDict['rates'] = {}
+                eleDict['rays'] = raysDict[ele] * 1
+                if rates is not None:
+                    ddict = self._groupData[(ele, group[2])]
+                    rays = ddict["rays"]
+                    if weights.any():
+                        # weights are applied below
+                        eleDict['weight'] = 1.0
+                    else:
+                        eleDict['weight'] = 0.0
+                    lineRates = (rates * weights[:, None]).sum(axis=0)
+                    eleDict['rates'][rays] = lineRates.sum()
+                    eleDict[rays] = ddict["transitions"] * 1
+                    for i, transition in enumerate(ddict["transitions"]):
+                        eleDict[transition] = {}
+                        eleDict[transition]['rate'] = lineRates[i]
+                        eleDict[transition]['energy'] = ddict["energies"][i]
+                else:
+                    eleDict['weight'] = 0.0
+                dictList.append({ele: eleDict})
+            if fulloutput:
+                result.append(Elements._combineMatrixFluorescenceDict(\
+                                dictList, self._layerGroups[ilayer]))
+            dictListList += dictList
+        total = Elements._combineMatrixFluorescenceDict(dictListList,
+                                                        self.elementsList)
+        if fulloutput:
+            return [total] + result
+        else:
+            return total
@@ -33,8 +33,10 @@
 __doc__= "Interface to the PyMca EPDL97 description"
 import os
 import sys
+import threading
 from PyMca5.PyMcaIO import specfile
 from PyMca5 import getDataFile
+from PyMca5.PyMcaPhysics.xrf import DataCache
 import numpy
 log = numpy.log
 exp = numpy.exp
@@ -57,10 +59,6 @@
 EPDL97_FILE = getDataFile("EPDL97_CrossSections.dat")
 EADL97_FILE = getDataFile("EADL97_BindingEnergies.dat")
 
-EPDL97_DICT = {}
-for element in ElementList:
-    EPDL97_DICT[element] = {}
-
 #initialize the dictionnary, for the time being compatible with PyMca 4.3.0
 EPDL97_DICT = {}
 for element in ElementList:
@@ -93,233 +91,333 @@ def _initializeBindingEnergies():
 
 _initializeBindingEnergies()
 
+# the rows of the per element tables
+ATOMIC_SHELLS = ['M5', 'M4', 'M3', 'M2', 'M1', 'L3', 'L2', 'L1', 'K']
+_SCATTER_KEYS = ['coherent', 'compton', 'pair', 'all other']
+_KEYS = _SCATTER_KEYS + ATOMIC_SHELLS
+_ROWS = ['energy'] + _KEYS + ['photo', 'photoelectric', 'total']
+
+# per element contiguous tables, one row per item in _ROWS, and index of the
+# first non-zero value of each shell cross section (-1 if all are zero)
+_TABLES = {}
+_FIRST = {}
+_LOCK = threading.RLock()
+
 def setElementBindingEnergies(element, ddict):
     """
     Allows replacement of the element internal binding energies by a different
     set of energies. This is made to force this implementaticon of EPDL97 to
     respect other programs absorption edges. Data will be extrapolated when
     needed. WARNING: Coherent resonances are not replaced.
+
+    The tabulated cross sections are not modified, the binding energies are
+    only used to decide which shells can be excited. To use a different set
+    of binding energies for a single calculation, use the binding keyword of
+    getElementCrossSections instead.
     """
-    if len(EPDL97_DICT[element]['EPDL97'].keys()) < 2:
-        _initializeElement(element)
-    EPDL97_DICT[element]['original'] = False
-    EPDL97_DICT[element]['binding']={}
+    binding = {}
     if 'binding' in ddict:
-        EPDL97_DICT[element]['binding'].update(ddict['binding'])
+        binding.update(ddict['binding'])
     else:
-        EPDL97_DICT[element]['binding'].update(ddict)
+        binding.update(ddict)
+    EPDL97_DICT[element]['original'] = False
+    EPDL97_DICT[element]['binding'] = binding
 
-def _initializeElement(element):
+def _readCrossSections(filename):
     """
-    _initializeElement(element)
-    Supposed to be of internal use.
-    Reads the file and loads all the relevant element information contained
-    int the EPDL97 file into the internal dictionnary.
+    Parse all the scans of the EPDL97 file.
+
+    Returns a list of (labels, data) pairs, one per scan.
     """
-    #read the specfile data
-    sf = specfile.Specfile(EPDL97_FILE)
-    scan_index = ElementList.index(element)
-    if scan_index > 99:
-        #just to avoid a crash
-        #I do not expect any fluorescent analysis of these elements ...
-        scan_index = 99
-    scan = sf[scan_index]
-    labels = scan.alllabels()
-    data = scan.data()
-    scan = None
+    sf = specfile.Specfile(filename)
+    output = []
+    for i in range(len(sf)):
+        scan = sf[i]
+        output.append((scan.alllabels(), scan.data()))
+        scan = None
+    sf = None
+    return output
 
-    #fill the information into the dictionnary
+def _buildTable(labels, data, scan_index):
+    """
+    Translate the labels of one EPDL97 scan to the PyMca keys and return the
+    table of the element with one row per item in _ROWS.
+    """
+    ddict = {}
     i = -1
     for label0 in labels:
         i += 1
         label = label0.lower()
         #translate the label to the PyMca keys
         if ('coherent' in label) and ('incoherent' not in label):
-            EPDL97_DICT[element]['EPDL97']['coherent'] = data[i, :]
-            EPDL97_DICT[element]['EPDL97']['coherent'].shape = -1
+            ddict['coherent'] = data[i, :]
             continue
         if ('incoherent' in label) and ('plus' not in label):
-            EPDL97_DICT[element]['EPDL97']['compton'] = data[i, :]
-            EPDL97_DICT[element]['EPDL97']['compton'].shape = -1
+            ddict['compton'] = data[i, :]
             continue
         if 'allother' in label:
-            EPDL97_DICT[element]['EPDL97']['all other'] = data[i, :]
-            EPDL97_DICT[element]['EPDL97']['all other'].shape = -1
+            ddict['all other'] = data[i, :]
             continue
         label = label.replace(" ","").split("(")[0]
         if 'energy' in label:
-            EPDL97_DICT[element]['EPDL97']['energy'] = data[i, :]
-            EPDL97_DICT[element]['EPDL97']['energy'].shape = -1
+            ddict['energy'] = data[i, :]
             continue
         if 'photoelectric' in label:
-            EPDL97_DICT[element]['EPDL97']['photo'] = data[i, :]
-            EPDL97_DICT[element]['EPDL97']['photo'].shape = -1
-            #a reference should not be expensive ...
-            EPDL97_DICT[element]['EPDL97']['photoelectric'] =\
-                                EPDL97_DICT[element]['EPDL97']['photo']
+            ddict['photoelectric'] = data[i, :]
             continue
         if 'total' in label:
-            EPDL97_DICT[element]['EPDL97']['total'] = data[i, :]
-            EPDL97_DICT[element]['EPDL97']['total'].shape = -1
+            ddict['total'] = data[i, :]
             continue
         if label[0].upper() in ['K', 'L', 'M']:
             #for the time being I do not use the other shells in PyMca
-            EPDL97_DICT[element]['EPDL97'][label.upper()] = data[i, :]
-            EPDL97_DICT[element]['EPDL97'][label.upper()].shape = -1
+            ddict[label.upper()] = data[i, :]
             continue
-    EPDL97_DICT[element]['EPDL97']['pair'] = 0.0 *\
-                                             EPDL97_DICT[element]['EPDL97']['energy']
-    EPDL97_DICT[element]['EPDL97']['photo'] = \
-            EPDL97_DICT[element]['EPDL97']['total'] -\
-            EPDL97_DICT[element]['EPDL97']['compton']-\
-            EPDL97_DICT[element]['EPDL97']['coherent']-\
-            EPDL97_DICT[element]['EPDL97']['pair']
-
-    atomic_shells = ['M5', 'M4', 'M3', 'M2', 'M1', 'L3', 'L2', 'L1', 'K']
+    table = numpy.zeros((len(_ROWS), data.shape[1]), numpy.float64)
+    for key in ddict:
+        if key in _ROWS:
+            table[_ROWS.index(key)] = ddict[key]
+    energy, coherent, compton, pair, allOther, photo, total = \
+        [table[_ROWS.index(key)] for key in ['energy', 'coherent', 'compton',
+                                            'pair', 'all other', 'photo',
+                                            'total']]
+    photo[:] = total - compton - coherent - pair
 
     # with the new (short) version of the cross-sections file, "all other" contains all
     # shells above the M5. Nevertheless, we calculate it
     if scan_index > 17:
-        idx = EPDL97_DICT[element]['EPDL97']['all other'] > 0.0
+        idx = allOther > 0.0
         delta = 0.0
-        for key in atomic_shells:
-            delta += EPDL97_DICT[element]['EPDL97'][key]
-        EPDL97_DICT[element]['EPDL97']['all other'] =\
-                        (EPDL97_DICT[element]['EPDL97']['photo'] - delta) * idx
+        for key in ATOMIC_SHELLS:
+            delta += table[_ROWS.index(key)]
+        allOther[:] = (photo - delta) * idx
     else:
-        EPDL97_DICT[element]['EPDL97']['all other'] = 0.0 * \
-                        EPDL97_DICT[element]['EPDL97']['photo']
+        allOther[:] = 0.0
 
     #take care of rounding problems
-    idx = EPDL97_DICT[element]['EPDL97']['all other'] < 0.0
-    EPDL97_DICT[element]['EPDL97']['all other'][idx] = 0.0
+    allOther[allOther < 0.0] = 0.0
+    return table
+
+def _loadTables():
+    """
+    Read all the EPDL97 tables at once. The parsed file is kept in the binary
+    data cache and therefore this is only slow the first time.
+    """
+    with _LOCK:
+        if len(_TABLES):
+            return
+        scans = DataCache.load(EPDL97_FILE, _readCrossSections)
+        tables = {}
+        first = {}
+        for element in ElementList:
+            scan_index = ElementList.index(element)
+            if scan_index > 99:
+                #just to avoid a crash
+                #I do not expect any fluorescent analysis of these elements ...
+                scan_index = 99
+            labels, data = scans[scan_index]
+            table = _buildTable(labels, data, scan_index)
+            firstNonZero = numpy.zeros((len(ATOMIC_SHELLS),), numpy.int64)
+            for i, key in enumerate(ATOMIC_SHELLS):
+                l = numpy.nonzero(table[_ROWS.index(key)] > 0.0)[0]
+                if len(l):
+                    firstNonZero[i] = l[0]
+                else:
+                    firstNonZero[i] = -1
+            tables[element] = table
+            first[element] = firstNonZero
+        _FIRST.update(first)
+        _TABLES.update(tables)
+
+def _initializeElement(element):
+    """
+    _initializeElement(element)
+    Supposed to be of internal use.
+    Loads all the relevant element information contained in the EPDL97 file
+    into the internal dictionnary. The dictionnary entries are views of the
+    element table.
+    """
+    if not len(_TABLES):
+        _loadTables()
+    table = _TABLES[element]
+    ddict = {}
+    for i, key in enumerate(_ROWS):
+        ddict[key] = table[i]
+    EPDL97_DICT[element]['EPDL97'] = ddict
 
+def _getBindingArray(binding, shells=None):
+    if shells is None:
+        shells = ATOMIC_SHELLS
+    return numpy.array([binding[key] for key in shells], numpy.float64)
 
-def getElementCrossSections(element, energy=None, forced_shells=None):
+def getCrossSectionsArray(elements, energy, binding=None, forced_shells=None):
     """
-    getElementCrossSections(element, energy, forced_shells=None)
+    getCrossSectionsArray(elements, energy, binding=None, forced_shells=None)
+
+    Evaluate the cross sections of several elements at several energies in
+    a single call.
+
+    :param elements: List of chemical symbols
+    :param energy: Excitation energies in keV
+    :param binding: List of binding energy dictionaries, one per element.
+                    An item set to None uses the binding energies currently
+                    associated to the element.
+    :param forced_shells: List of shells whose excitation has to be forced
+                          via log-log extrapolation if needed.
+    :return: Array of shape (number of elements, len(_KEYS) + 2, number of
+             energies) with the coherent, compton, pair, "all other",
+             M5, M4, M3, M2, M1, L3, L2, L1, K, photo and total cross
+             sections in cm2/g.
+    """
+    if not len(_TABLES):
+        _loadTables()
+    if forced_shells is None:
+        forced_shells = []
+    energy = numpy.array(energy, dtype=numpy.float64, copy=False, ndmin=1)
+    nElements = len(elements)
+    nEnergies = energy.size
+    nShells = len(ATOMIC_SHELLS)
+    nKeys = len(_KEYS)
+    if binding is None:
+        binding = [None] * nElements
+
+    # gather the tabulated values around each energy for all the elements
+    X0 = numpy.zeros((nElements, 1, nEnergies), numpy.float64)
+    X1 = numpy.zeros((nElements, 1, nEnergies), numpy.float64)
+    Y0 = numpy.zeros((nElements, nKeys, nEnergies), numpy.float64)
+    Y1 = numpy.zeros((nElements, nKeys, nEnergies), numpy.float64)
+    B = numpy.zeros((nElements, nShells, 1), numpy.float64)
+    XF0 = numpy.ones((nElements, nShells, 1), numpy.float64)
+    XF1 = numpy.ones((nElements, nShells, 1), numpy.float64)
+    YF0 = numpy.zeros((nElements, nShells, 1), numpy.float64)
+    YF1 = numpy.zeros((nElements, nShells, 1), numpy.float64)
+    extrapolate = numpy.zeros((nElements, nShells, 1), dtype=bool)
+    for i, element in enumerate(elements):
+        if element not in ElementList:
+            raise ValueError("Invalid chemical symbol %s" % element)
+        table = _TABLES[element]
+        xdata = table[0]
+        n = xdata.size
+        #find interpolation point
+        j0 = numpy.searchsorted(xdata, energy, side='left') - 1
+        idx = energy <= xdata[0]
+        if idx.any():
+            #take first value or extrapolate?
+            print("Warning: Extrapolating data at the beginning")
+            j0[idx] = 0
+        idx = energy > xdata[-2]
+        if idx.any():
+            #take last value or extrapolate?
+            print("Warning: Extrapolating data at the end")
+            j0[idx] = n - 2
+        j1 = j0 + 1
+        # at absorption edges the energy is repeated, take the value above
+        idx = j1 < (n - 1)
+        idx[idx] = (energy[idx] == xdata[j1[idx]]) & \
+                   (xdata[j1[idx]] == xdata[j1[idx] + 1])
+        j0[idx] += 1
+        j1[idx] += 1
+        X0[i, 0] = xdata[j0]
+        X1[i, 0] = xdata[j1]
+        Y0[i] = table[1:nKeys + 1, j0]
+        Y1[i] = table[1:nKeys + 1, j1]
+        if binding[i] is None:
+            B[i, :, 0] = _getBindingArray(EPDL97_DICT[element]['binding'])
+        else:
+            B[i, :, 0] = _getBindingArray(binding[i])
+        first = _FIRST[element]
+        for k, key in enumerate(ATOMIC_SHELLS):
+            if first[k] < 0:
+                continue
+            extrapolate[i, k] = True
+            XF0[i, k] = xdata[first[k]]
+            XF1[i, k] = xdata[first[k] + 1]
+            YF0[i, k] = table[_ROWS.index(key), first[k]]
+            YF1[i, k] = table[_ROWS.index(key), first[k] + 1]
+
+    x = energy
+    result = numpy.zeros((nElements, nKeys + 2, nEnergies), numpy.float64)
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        close = ((X1 - X0) < 5.E-10) | ((X1 - x) < 5.E-10)
+        logX1 = numpy.log(X1 / x)
+        logX0 = numpy.log(x / X0)
+        logDelta = numpy.log(X1 / X0)
+        logY0 = log(Y0)
+        logY1 = log(Y1)
+        loglog = exp((logY0 * logX1 + logY1 * logX0) / logDelta)
+
+        #coherent and incoherent
+        nScatter = len(_SCATTER_KEYS)
+        y0 = Y0[:, :nScatter]
+        y1 = Y1[:, :nScatter]
+        onlyY1 = exp((logY1[:, :nScatter] * logX0) / logDelta)
+        values = numpy.where((y0 > 0) & (y1 > 0),
+                             loglog[:, :nScatter],
+                             numpy.where((y1 > 0) & ((x - X0) > 1.E-5),
+                                         onlyY1,
+                                         0.0))
+        result[:, :nScatter] = numpy.where(close, y1, values)
+
+        #partial cross sections
+        y0 = Y0[:, nScatter:]
+        y1 = Y1[:, nScatter:]
+        excited = x >= B
+        standard = (y0 > 0.0) & excited
+        forced = numpy.array([key in forced_shells for key in ATOMIC_SHELLS],
+                             dtype=bool).reshape(1, -1, 1)
+        forced = (~standard) & (forced | excited) & extrapolate
+        values = numpy.where(close, y1, loglog[:, nScatter:])
+        extrapolated = exp((log(YF0) * numpy.log(XF1 / x) + \
+                            log(YF1) * numpy.log(x / XF0)) / \
+                            numpy.log(XF1 / XF0))
+        result[:, nScatter:nKeys] = numpy.where(standard, values,
+                                        numpy.where(forced, extrapolated, 0.0))
+
+    photo = result[:, nKeys]
+    for key in ['all other'] + ATOMIC_SHELLS:
+        photo += result[:, _KEYS.index(key)]
+    total = result[:, nKeys + 1]
+    for key in ['coherent', 'compton']:
+        total += result[:, _KEYS.index(key)]
+    total += photo
+    return result
+
+def getElementCrossSections(element, energy=None, forced_shells=None,
+                            binding=None):
+    """
+    getElementCrossSections(element, energy, forced_shells=None, binding=None)
     Returns total and partial cross sections of element at the specified
     energies. If forced_shells are not specified, it uses the internal
     binding energies of EPDL97 for all shells. If forced_shells is specified,
     it enforces excitation of the relevant shells via log-log extrapolation
-    if needed.
+    if needed. If binding is specified, that dictionnary of binding energies
+    is used instead of the binding energies associated to the element.
     """
-    if forced_shells is None:
-        forced_shells = []
     if element not in ElementList:
         raise ValueError("Invalid chemical symbol %s" % element)
     if len(EPDL97_DICT[element]['EPDL97'].keys()) < 2:
         _initializeElement(element)
 
-    if energy is None and EPDL97_DICT[element]['original']:
+    if energy is None and EPDL97_DICT[element]['original'] and \
+       binding is None:
         return EPDL97_DICT[element]['EPDL97']
     elif energy is None:
         energy = EPDL97_DICT[element]['EPDL97']['energy']
 
-    try:
-        n = len(energy)
-    except TypeError:
-        energy = numpy.array([energy])
-    if type(energy) in [type(1), type(1.0)]:
-        energy = numpy.array([energy])
-    elif type(energy) in [type([]), type((1,))]:
-        energy = numpy.array(energy)
-
-    binding = EPDL97_DICT[element]['binding']
-    wdata = EPDL97_DICT[element]['EPDL97']
+    energy = numpy.array(energy, dtype=numpy.float64, ndmin=1)
+    values = getCrossSectionsArray([element], energy,
+                                   binding=[binding],
+                                   forced_shells=forced_shells)[0]
     ddict = {}
-    ddict['energy']     = energy
-    ddict['coherent']   = 0.0 * energy
-    ddict['compton']    = 0.0 * energy
-    ddict['photo']      = 0.0 * energy
-    ddict['pair']       = 0.0 * energy
-    ddict['all other']  = 0.0 * energy
-    ddict['total']      = 0.0 * energy
-    atomic_shells = ['M5', 'M4', 'M3', 'M2', 'M1', 'L3', 'L2', 'L1', 'K']
-    for key in atomic_shells:
-        ddict[key] = 0.0 * energy
-
-    #find interpolation point
-    len_energy = len(energy)
-    for i in range(len_energy):
-        x = energy[i]
-        if x > wdata['energy'][-2]:
-            #take last value or extrapolate?
-            print("Warning: Extrapolating data at the end")
-            j1 = len(wdata['energy']) - 1
-            j0 = j1 - 1
-        elif x <= wdata['energy'][0]:
-            #take first value or extrapolate?
-            print("Warning: Extrapolating data at the beginning")
-            j1 = 1
-            j0 = 0
-        else:
-            j0 = numpy.max(numpy.nonzero(wdata['energy'] < x), axis=1)
-            j1 = j0 + 1
-        x0 = wdata['energy'][j0]
-        x1 = wdata['energy'][j1]
-        if x == x1:
-            if (j1 + 1 ) < len(wdata['energy']):
-                if x1 == wdata['energy'][j1 + 1]:
-                    j0 = j1
-                    j1 += 1
-                    x0 = wdata['energy'][j0]
-                    x1 = wdata['energy'][j1]
-
-        #coherent and incoherent
-        for key in ['coherent', 'compton', 'pair', 'all other']:
-            if (j0 == j1) or ((x1 - x0) < 5.E-10) or ((x1 - x) < 5.E-10) :
-                ddict[key][i] =  wdata[key][j1]
-            else:
-                y0 = wdata[key][j0]
-                y1 = wdata[key][j1]
-                if (y0 > 0) and (y1 > 0):
-                    ddict[key][i] = exp((log(y0) * log(x1/x) +\
-                                     log(y1) * log(x/x0))/log(x1/x0))
-                elif (y1 > 0) and ((x-x0) > 1.E-5):
-                    ddict[key][i] = exp((log(y1) * log(x/x0))/log(x1/x0))
-
-
-        #partial cross sections
-        for key in atomic_shells:
-            y0 = wdata[key][j0]
-            if (y0 > 0.0) and (x >= binding[key]):
-                #standard way
-                y1 = wdata[key][j1]
-                if (((x1 - x0) < 5.E-10) or ((x1 - x) < 5.E-10)):
-                    # no interpolation needed
-                    ddict[key][i] = y1
-                else:
-                    ddict[key][i] = exp((log(y0) * log(x1/x) +\
-                                 log(y1) * log(x/x0))/log(x1/x0))
-            elif (forced_shells == []) and (x < binding[key]):
-                continue
-            elif (key in forced_shells) or (x >= binding[key]):
-                l = numpy.nonzero(wdata[key] > 0.0)
-                if not len(l[0]):
-                    continue
-                j00 = numpy.min(l)
-                j01 = j00 + 1
-                x00 = wdata['energy'][j00]
-                x01 = wdata['energy'][j01]
-                y0 = wdata[key][j00]
-                y1 = wdata[key][j01]
-                ddict[key][i] = exp((log(y0) * log(x01/x) +\
-                                 log(y1) * log(x/x00))/log(x01/x00))
-
-        for key in ['all other'] + atomic_shells:
-            ddict['photo'][i] += ddict[key][i]
-
-        for key in ['coherent', 'compton', 'photo']:
-            ddict['total'][i] += ddict[key][i]
-    for key in ddict.keys():
-        ddict[key] = ddict[key].tolist()
+    ddict['energy'] = energy.tolist()
+    for i, key in enumerate(_KEYS + ['photo', 'total']):
+        ddict[key] = values[i].tolist()
     return ddict
 
 
-def getPhotoelectricWeights(element, shelllist, energy, normalize = None, totals = None):
+def getPhotoelectricWeights(element, shelllist, energy, normalize = None, totals = None,
+                            binding = None):
     """
-    getPhotoelectricWeights(element,shelllist,energy,normalize=None,totals=None)
+    getPhotoelectricWeights(element,shelllist,energy,normalize=None,totals=None,binding=None)
     Given a certain list of shells and one excitation energy, gives back the ratio
     mu(shell, energy)/mu(energy) where mu refers to the photoelectric mass attenuation
     coefficient.
@@ -330,6 +428,8 @@ def getPhotoelectricWeights(element, shelllist, energy, normalize = None, totals
     If normalize is None or True, normalizes the output to the shells given in shelllist.
     If totals is True, gives back the a dictionnary with all the mass attenuation coefficients
     used in the calculations.
+    If binding is given, that dictionnary of binding energies is used instead of the ones
+    associated to the element.
     """
     if normalize is None:
         normalize = True
@@ -339,7 +439,8 @@ def getPhotoelectricWeights(element, shelllist, energy, normalize = None, totals
 
     #it is not necessary to force shells because the proper way to work is to force this
     #module to respect a given set of binding energies.
-    ddict = getElementCrossSections(element, energy=energy, forced_shells=None)
+    ddict = getElementCrossSections(element, energy=energy, forced_shells=None,
+                                    binding=binding)
 
     w = []
     d = ddict['photo'][0]
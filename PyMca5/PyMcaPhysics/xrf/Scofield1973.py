@@ -33,8 +33,8 @@
 import sys
 import os
 from PyMca5.PyMcaIO import ConfigDict
+from PyMca5.PyMcaPhysics.xrf import DataCache
 from PyMca5 import getDataFile
 
-dict = ConfigDict.ConfigDict()
 dictfile = getDataFile("Scofield1973.dict")
-dict.read(dictfile)
+dict = DataCache.loadConfigDict(dictfile)
@@ -32,51 +32,87 @@
 __copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
 from . import Elements
 import math
+import copy
+import threading
+from collections import OrderedDict
 import numpy
 
-def continuumEbel(target, e0, e=None, window=None,
-                  alphae=None, alphax=None,
-                  transmission=None, targetthickness=None,
-                  filterlist=None):
-    """
-    Calculation of X-ray Tube continuum emission spectrum
-
-    Parameters:
-    -----------
-     target : list [Symbol, density (g/cm2), thickness(cm)] or atomic ymbol
-        If set to atomic symbol, the program sets density and thickness of 0.1 cm
-     e0 : float
-        Tube Voltage in kV
-     e : float or array of floats
-        Energy of interest. If not given, the program will generate an array of energies
-        from 1 to the given tube voltage minus 1 kV in keV.
-     window : list
-        Tube window [Formula, density, thickness]
-     alphae : float
-        Angle, in degrees, between electron beam and tube target. Normal incidence is 90.
-     alphax : float
-        Angle, in degrees, of X-ray exit beam. Normal exit is 90.
-     transmission : Boolean, default is False
-        If True the X-ray come out of the tube target by the side opposite to the one
-        receiving the exciting electron beam.
-     targetthickness : Target thickness in cm
-        Only considered in transmission case. If not given, the program uses as target
-        thickness the maximal penetration depth of the incident electron beam.
-     filterlist : [list]
-        Additional filters [[Formula, density, thickness], ...]
+# memoized results of the public functions. The key describes the target,
+# the voltage, the energies, the window, the filters and the geometry.
+_CACHE_LOCK = threading.RLock()
+_CACHE = OrderedDict()
+_CACHE_MAX_SIZE = 128
+_CACHE_COUNTERS = {"hits": 0, "misses": 0}
 
-     Return:
-     -------
-     result : Array
-        Spectral flux density.
-        Flux of photons at the given energies in photons/sr/mA/keV/s
+def getCacheInfo():
+    """
+    Return a dictionary with the number of hits and misses of the cache of
+    calculated spectra and its current size.
+    """
+    with _CACHE_LOCK:
+        ddict = dict(_CACHE_COUNTERS)
+        ddict["size"] = len(_CACHE)
+    return ddict
 
-    Reference:
-        H. Ebel, X-Ray Spectrometry 28 (1999) 255-266
-        Tube voltage from 5 to 50 kV
-        Electron incident angle from 50 to 90 deg.
-        X-Ray take off angle from 90 to 5 deg.
+def clearCache():
     """
+    Forget all the calculated spectra. It has to be called if the definition
+    of a material used as window or filter is modified.
+    """
+    with _CACHE_LOCK:
+        _CACHE.clear()
+        for key in _CACHE_COUNTERS:
+            _CACHE_COUNTERS[key] = 0
+
+def _materialKey(name, depth=0):
+    # a material can be redefined by the user, its composition is part of
+    # the key
+    if (depth < 5) and (name in Elements.Material):
+        material = Elements.Material[name]
+        compoundList = material.get('CompoundList', [])
+        fractionList = material.get('CompoundFraction', [])
+        if type(compoundList) != type([]):
+            compoundList = [compoundList]
+        if type(fractionList) != type([]):
+            fractionList = [fractionList]
+        return (name,
+                tuple([_materialKey(x, depth + 1) for x in compoundList]),
+                tuple([float(x) for x in fractionList]))
+    return name
+
+def _layerKey(layer):
+    if layer is None:
+        return None
+    return (_materialKey(layer[0]),) + tuple([float(x) for x in layer[1:]])
+
+def _getCacheKey(name, target, e0, energy, window, alphae, alphax,
+                 transmission, targetthickness, filterlist):
+    if type(target) in [type([]), type(())]:
+        targetKey = _layerKey(target)
+    else:
+        targetKey = target
+    if energy is not None:
+        energy = numpy.array(energy, dtype=numpy.float64, ndmin=1).tobytes()
+    if filterlist is not None:
+        filterlist = tuple([_layerKey(x) for x in filterlist])
+    return (name, targetKey, repr(e0), energy, _layerKey(window),
+            alphae, alphax, transmission, targetthickness, filterlist)
+
+def _cached(function, args, key):
+    with _CACHE_LOCK:
+        if key in _CACHE:
+            _CACHE_COUNTERS["hits"] += 1
+            _CACHE[key] = _CACHE.pop(key)
+            return copy.deepcopy(_CACHE[key])
+        _CACHE_COUNTERS["misses"] += 1
+    result = function(*args)
+    with _CACHE_LOCK:
+        _CACHE[key] = copy.deepcopy(result)
+        while len(_CACHE) > _CACHE_MAX_SIZE:
+            _CACHE.popitem(last=False)
+    return result
+
+def _getTarget(target):
     if type(target) in [type([]), type(list())]:
         element = target[0]
         density = target[1]
@@ -85,137 +121,153 @@ def continuumEbel(target, e0, e=None, window=None,
         element   = target
         density   = Elements.Element[element]['density']
         thickness = 0.1
+    return element, density, thickness
+
+def _getEnergy(e0, e):
     if e is None:
         energy = numpy.arange(e0 * 1.0)[1:]
-    elif type(e) == type([]):
-        energy = numpy.array(e, dtype=numpy.float)
-    elif type(e) == numpy.ndarray:
-        energy = numpy.array(e, dtype=numpy.float)
+    elif type(e) in [type([]), numpy.ndarray]:
+        energy = numpy.array(e, dtype=numpy.float64)
     else:
-        energy = numpy.array([e], dtype=numpy.float)
+        energy = numpy.array([e], dtype=numpy.float64)
+    return energy
 
+def _getGeometry(alphae, alphax, transmission):
     if alphae is None:
         alphae = 75.0
     if alphax is None:
         alphax = 15.0
     if transmission is None:
         transmission = False
+    return alphae, alphax, transmission
 
-    sinalphae = math.sin(math.radians(alphae))
-    sinalphax = math.sin(math.radians(alphax))
-    sinfactor = sinalphae / sinalphax
-
-    z = Elements.getz(element)
-    const = 1.35e+09
-    x = 1.109 - 0.00435 * z + 0.00175 * e0
+def _getMassAttenuation(formula, energy):
+    return numpy.array(
+        Elements.getMaterialMassAttenuationCoefficients(formula, 1.0,
+                                energy)['total'], numpy.float64)
 
+def _getTransmission(layers, energy, thickness):
+    """
+    Transmission of the layers [[formula, density, thickness], ...] at the
+    given energies. thickness is an array with the thicknesses to be used,
+    with as many rows as layers and broadcastable to the shape of the
+    result. Layers with zero thickness are ignored.
+    """
+    w = None
+    for i, layer in enumerate(layers):
+        if not numpy.any(thickness[i] != 0):
+            continue
+        mu = _getMassAttenuation(layer[0], energy)
+        wi = numpy.exp(-(mu * layer[1] * thickness[i]))
+        if w is None:
+            w = wi
+        else:
+            w = w * wi
+    return w
 
+def _ebelParameters(z, mass, e0):
     # calculate intermediate constants from formulae (4) in Ebel's paper
     # eta in Ebel's paper
     m   = 0.1382 - 0.9211 / math.sqrt(z)
     logz = math.log(z)
     eta = 0.1904 - 0.2236 * logz + 0.1292 * pow(logz, 2) - \
           0.0149 * pow(logz, 3)
-    eta = eta * pow(e0, m)
+    eta = eta * numpy.power(e0, m)
 
     # dephmax? in Ebel's paper
-    p3 = 0.787e-05 * math.sqrt(0.0135 * z) * pow(e0, 1.5) + \
-         0.735e-06 * pow(e0, 2)
-    rhozmax = (Elements.Element[element]['mass'] / z) * p3
-    # print "max depth = ",2 * rhozmax
+    p3 = 0.787e-05 * math.sqrt(0.0135 * z) * numpy.power(e0, 1.5) + \
+         0.735e-06 * numpy.power(e0, 2)
+    rhozmax = (mass / z) * p3
+    return eta, rhozmax
 
-    # and finally we get rhoz
-    u0 = e0 / energy
-    logu0 = numpy.log(u0)
+def _rhoz(eta, rhozmax, logu0):
     p1 = logu0 * (0.49269 - 1.09870 * eta + 0.78557 * pow(eta, 2))
     p2 = 0.70256 - 1.09865 * eta + 1.00460 * pow(eta, 2) + logu0
-    rhoz = rhozmax * (p1 / p2)
+    return rhozmax * (p1 / p2)
 
+def _targetThickness(density, rhozmax, targetthickness):
+    if targetthickness is None:
+        ttarget = 2 * rhozmax
+        if numpy.isscalar(ttarget):
+            print("WARNING target thickness assumed equal to maximum depth of %f cm" % (ttarget/density))
+        else:
+            print("WARNING target thickness assumed equal to maximum depth of the electron beam")
+    else:
+        ttarget = targetthickness * density
+    return ttarget
+
+def _continuum(element, density, e0, energy, window, alphae, alphax,
+               transmission, targetthickness, filterlist,
+               windowthickness=None):
+    """
+    Vectorized continuum emission. e0 can be a scalar or an array of shape
+    (n, 1) to obtain n spectra at once. windowthickness, if given, has the
+    same shape as e0 and replaces the thickness of the window.
+    """
+    sinalphae = math.sin(math.radians(alphae))
+    sinalphax = math.sin(math.radians(alphax))
+    sinfactor = sinalphae / sinalphax
+
+    z = Elements.getz(element)
+    const = 1.35e+09
+    x = 1.109 - 0.00435 * z + 0.00175 * e0
+    eta, rhozmax = _ebelParameters(z, Elements.Element[element]['mass'], e0)
+
+    # and finally we get rhoz
+    u0 = e0 / energy
+    logu0 = numpy.log(u0)
+    rhoz = _rhoz(eta, rhozmax, logu0)
 
     # the term dealing with the photoelectric absorption of the Bremsstrahlung
     tau = numpy.array(
         Elements.getMaterialMassAttenuationCoefficients(element,
                                                         1.0,
                                                         energy)['photo'])
-
-    if not transmission:
-        rhelp = tau * 2.0 * rhoz * sinfactor
-        if len(numpy.nonzero(rhelp <= 0.0)[0]):
-            result = numpy.zeros(rhelp.shape, numpy.float)
-            for i in range(len(rhelp)):
-                if rhelp[i] > 0.0:
-                    result[i] = const * z * pow(u0[i] - 1.0, x) * \
-                         (1.0 - numpy.exp(-rhelp[i])) / rhelp[i]
+    rhelp = tau * 2.0 * rhoz * sinfactor
+    valid = rhelp > 0.0
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        if not transmission:
+            result = const * z * numpy.power(u0 - 1.0, x) * \
+                     (1.0 - numpy.exp(-rhelp)) / rhelp
         else:
-            result = const * z * pow(u0 - 1.0, x) * \
-                 (1.0 - numpy.exp(-rhelp)) / rhelp
+            ttarget = _targetThickness(density, rhozmax, targetthickness)
+            result = const * z * numpy.power(u0 - 1.0, x) * \
+                (numpy.exp(-tau * (ttarget - 2.0 * rhoz) / sinalphax) - \
+                 numpy.exp(-tau * ttarget / sinalphax)) / rhelp
+    result = numpy.where(valid, result, 0.0)
 
-        # the term dealing with absorption in tube's window
-        if window is not None:
-            if window[2] != 0:
-                w = Elements.getMaterialTransmission(window[0], 1.0, energy,
-                                                     density=window[1],
-                                                     thickness=window[2],
-                                                     listoutput=False)['transmission']
-                result *= w
-        if filterlist is not None:
-            w = 1
-            for fwindow in filterlist:
-                if fwindow[2] == 0:
-                    continue
-                w *= Elements.getMaterialTransmission(fwindow[0], 1.0, energy,
-                                                      density = fwindow[1],
-                                                      thickness = fwindow[2],
-                                                      listoutput=False)['transmission']
-            result *= w
-        return result
-    # transmission case
-    if targetthickness is None:
-        #d = Elements.Element[target]['density']
-        d = density
-        ttarget = 2 * rhozmax
-        print("WARNING target thickness assumed equal to maximum depth of %f cm" % (ttarget/d))
-    else:
-        #ttarget = targetthickness * Elements.Element[target]['density']
-        ttarget = targetthickness * density
-    # generationdepth = min(ttarget, 2 * rhozmax)
-    rhelp = tau * 2.0 * rhoz * sinfactor
-    if len(numpy.nonzero(rhelp <= 0.0)[0]):
-        result = numpy.zeros(rhelp.shape, numpy.float)
-        for i in range(len(rhelp)):
-            if rhelp[i] > 0.0:
-                result[i] = const * z * pow(u0[i] - 1.0, x) * \
-                     (numpy.exp(-tau[i] *(ttarget - 2.0 * rhoz[i]) / sinalphax) - \
-                      numpy.exp(-tau[i] * ttarget / sinalphax)) / rhelp[i]
-    else:
-        result = const * z * pow(u0 - 1.0, x) * \
-             (numpy.exp(-tau *(ttarget - 2.0 * rhoz) / sinalphax) - \
-              numpy.exp(-tau * ttarget / sinalphax)) / rhelp
     # the term dealing with absorption in tube's window
     if window is not None:
-        if window[2] != 0.0 :
-            w = Elements.getMaterialTransmission(window[0], 1.0, energy,
-                                                 density=window[1],
-                                                 thickness=window[2] / sinalphax,
-                                                 listoutput=False)['transmission']
-            result *= w
+        if windowthickness is None:
+            windowthickness = window[2]
+        if transmission:
+            windowthickness = windowthickness / sinalphax
+        w = _getTransmission([window], energy, [windowthickness])
+        if w is not None:
+            result = result * w
     if filterlist is not None:
-        for fwindow in filterlist:
-            if fwindow[2] == 0:
-                continue
-            w = Elements.getMaterialTransmission(fwindow[0], 1.0, energy,
-                                                 density=fwindow[1],
-                                                 thickness=fwindow[2],
-                                                 listoutput=False)['transmission']
-            result *= w
+        w = _getTransmission(filterlist, energy,
+                             [fwindow[2] for fwindow in filterlist])
+        if w is not None:
+            result = result * w
     return result
 
-def characteristicEbel(target, e0, window=None,
-                       alphae=None, alphax=None,
-                       transmission=None, targetthickness=None,
-                       filterlist=None):
+def _continuumEbel(target, e0, e, window, alphae, alphax, transmission,
+                   targetthickness, filterlist):
+    element, density, thickness = _getTarget(target)
+    energy = _getEnergy(e0, e)
+    alphae, alphax, transmission = _getGeometry(alphae, alphax, transmission)
+    result = _continuum(element, density, e0, energy, window,
+                        alphae, alphax, transmission, targetthickness,
+                        filterlist)
+    return numpy.array(result, dtype=numpy.float64, ndmin=1)
+
+def continuumEbel(target, e0, e=None, window=None,
+                  alphae=None, alphax=None,
+                  transmission=None, targetthickness=None,
+                  filterlist=None):
     """
-    Calculation of target characteritic lines and intensities
+    Calculation of X-ray Tube continuum emission spectrum
 
     Parameters:
     -----------
@@ -223,8 +275,9 @@ def characteristicEbel(target, e0, window=None,
         If set to atomic symbol, the program sets density and thickness of 0.1 cm
      e0 : float
         Tube Voltage in kV
-     e : float
-        Energy of interest
+     e : float or array of floats
+        Energy of interest. If not given, the program will generate an array of energies
+        from 1 to the given tube voltage minus 1 kV in keV.
      window : list
         Tube window [Formula, density, thickness]
      alphae : float
@@ -240,12 +293,71 @@ def characteristicEbel(target, e0, window=None,
      filterlist : [list]
         Additional filters [[Formula, density, thickness], ...]
 
-    Result: list
-        Characteristic lines and intensities in the form
-        [[energy0, intensity0, name0], [energy1, intensity1, name1], ...]
-        Energies in keV
-        Intensities in photons/sr/mA/keV/s
+     Return:
+     -------
+     result : Array
+        Spectral flux density.
+        Flux of photons at the given energies in photons/sr/mA/keV/s
+
+    Reference:
+        H. Ebel, X-Ray Spectrometry 28 (1999) 255-266
+        Tube voltage from 5 to 50 kV
+        Electron incident angle from 50 to 90 deg.
+        X-Ray take off angle from 90 to 5 deg.
+    """
+    args = (target, e0, e, window, alphae, alphax, transmission,
+            targetthickness, filterlist)
+    key = _getCacheKey("continuum", target, e0, _getEnergy(e0, e), window,
+                       alphae, alphax, transmission, targetthickness,
+                       filterlist)
+    return _cached(_continuumEbel, args, key)
+
+def continuumEbelBatch(target, e0, e, window=None,
+                       alphae=None, alphax=None,
+                       transmission=None, targetthickness=None,
+                       filterlist=None, windowthickness=None):
+    """
+    Calculation of a family of X-ray Tube continuum emission spectra sharing
+    the same energies, target, window material and geometry.
+
+    Parameters are those of continuumEbel except:
+
+     e0 : float or array of floats
+        Tube voltages in kV
+     e : array of floats
+        Energies of interest
+     windowthickness : float or array of floats
+        Tube window thicknesses in cm. If given, it replaces the thickness
+        of the window.
+
+    e0 and windowthickness are broadcasted against each other.
+
+     Return:
+     -------
+     result : Array
+        Spectral flux density with one row per combination of voltage and
+        window thickness and one column per energy.
     """
+    element, density, thickness = _getTarget(target)
+    energy = _getEnergy(None, e)
+    alphae, alphax, transmission = _getGeometry(alphae, alphax, transmission)
+    if windowthickness is None:
+        e0 = numpy.array(e0, dtype=numpy.float64, ndmin=1).reshape(-1, 1)
+    else:
+        e0, windowthickness = numpy.broadcast_arrays(
+                numpy.array(e0, dtype=numpy.float64, ndmin=1),
+                numpy.array(windowthickness, dtype=numpy.float64, ndmin=1))
+        e0 = e0.reshape(-1, 1)
+        windowthickness = windowthickness.reshape(-1, 1)
+        if window is None:
+            raise ValueError("Window thicknesses given without window")
+    result = _continuum(element, density, e0, energy, window,
+                        alphae, alphax, transmission, targetthickness,
+                        filterlist, windowthickness=windowthickness)
+    return result * numpy.ones((e0.shape[0], energy.size))
+
+def _characteristicEbel(target, e0, window, alphae, alphax, transmission,
+                        targetthickness, filterlist):
     if type(target) == type([]):
         element = target[0]
         density = target[1]
@@ -256,13 +368,7 @@ def characteristicEbel(target, e0, window=None,
         element   = target
         density   = Elements.Element[element]['density']
         thickness = 0.1
-
-    if alphae is None:
-        alphae = 75.0
-    if alphax is None:
-        alphax = 15.0
-    if transmission is None:
-        transmission = False
+    alphae, alphax, transmission = _getGeometry(alphae, alphax, transmission)
 
     sinalphae = math.sin(math.radians(alphae))
     sinalphax = math.sin(math.radians(alphax))
@@ -275,20 +381,6 @@ def characteristicEbel(target, e0, window=None,
     # get the energy of the characteristic lines
     lines = Elements._getUnfilteredElementDict(element, None, photoweights = True)
 
-    if 0:
-        # L shell lines will have to be entered directly by the user
-        # L shell
-        lpeaks = []
-        for label in lines['L xrays']:
-            lpeaks.append([lines[label]['energy'],
-                              lines[label]['rate'],
-                              element+' '+label])
-        lfluo = Elements._filterPeaks(lpeaks, ethreshold=0.020,
-                                      ithreshold=0.001,
-                                      nthreshold=6,
-                                      absoluteithreshold=False,
-                                      keeptotalrate=True)
-        lfluo.sort()
     peaklist = []
     rays = 'K xrays'
     if rays in lines.keys():
@@ -326,117 +418,58 @@ def characteristicEbel(target, e0, window=None,
         0.009583 * z * numpy.exp(-u0) + 0.001141 * e0
 
     # Absorption correction
-    # calculate intermediate constants from formulae (4) in Ebel's paper
-    # eta in Ebel's paper
-    m = 0.1382 - 0.9211 / numpy.sqrt(z)
-    logz = numpy.log(z)
-    eta = 0.1904 - 0.2236 * logz + 0.1292 * pow(logz, 2) - 0.0149 * pow(logz, 3)
-    eta = eta * pow(e0, m)
-
-    # depmax? in Ebel's paper
-    p3 = 0.787e-05 * numpy.sqrt(0.0135 * z) * pow(e0, 1.5) + \
-        0.735e-06 * pow(e0, 2)
-    rhozmax = (Elements.Element[element]['mass'] / z) * p3
-
-    # and finally we get rhoz
-    p1 = logu0 * (0.49269 - 1.09870 * eta + 0.78557 * pow(eta, 2))
-    p2 = 0.70256 - 1.09865 * eta + 1.00460 * pow(eta, 2) + logu0
-    rhoz = rhozmax * (p1 / p2)
+    eta, rhozmax = _ebelParameters(z, Elements.Element[element]['mass'], e0)
+    rhoz = _rhoz(eta, rhozmax, logu0)
 
     # the term dealing with the photoelectric absorption
-    energylist = []
-    for i in range(len(fl)):
-        energylist.append(fl[i][0])
+    energylist = [line[0] for line in fl]
     tau = numpy.array(
         Elements.getMaterialMassAttenuationCoefficients(element, 1.0,
                                                         energylist)['photo'])
+    rhelp = tau * 2.0 * rhoz * sinfactor
+    valid = rhelp > 0.0
     if not transmission:
-        rhelp = tau * 2.0 * rhoz * sinfactor
-        w = None
+        windowthickness = None
         if window is not None:
-            if window[2] != 0.0:
-                w = Elements.getMaterialTransmission(window[0], 1.0,
-                                                     energylist,
-                                                     density=window[1],
-                                                     thickness=window[2],
-                                                     listoutput=False)['transmission']
-        if filterlist is not None:
-            for fwindow in filterlist:
-                if fwindow[2] == 0:
-                    continue
-                if w is None:
-                    w = Elements.getMaterialTransmission(fwindow[0], 1.0,
-                                                         energylist,
-                                                         density=fwindow[1],
-                                                         thickness=fwindow[2],
-                                                         listoutput=False)['transmission']
-                else:
-                    w *= Elements.getMaterialTransmission(fwindow[0], 1.0,
-                                                          energylist,
-                                                          density=fwindow[1],
-                                                          thickness=fwindow[2],
-                                                          listoutput=False)['transmission']
-        for i in range(len(fl)):
-            if rhelp[i] > 0.0 :
-                rhelp[i] = (1.0 - numpy.exp(-rhelp[i])) / rhelp[i]
-            else:
-                rhelp[i] = 0.0
-            intensity = const * oneovers * r * Elements.getomegak(element) * rhelp[i]
-            #the term dealing with absorption in tube's window
-            if w is not None:
-                intensity = intensity * w[i]
-            fl[i][1] = intensity * fl[i][1]
-        return fl
-
-    #transmission case
-    if targetthickness is None:
-        d = density
-        ttarget = 2 * rhozmax
-        print("WARNING target thickness assumed equal to maximum depth of %f cm" % (ttarget/d))
+            windowthickness = window[2]
     else:
-        ttarget = targetthickness * density
-    #generationdepth = min(ttarget, 2 * rhozmax)
-    rhelp = tau * 2.0 * rhoz * sinfactor
-    w = None
-    if (window is not None) or (filterlist is not None):
+        if (window is None) and (filterlist is None):
+            return fl
+        ttarget = _targetThickness(density, rhozmax, targetthickness)
+        windowthickness = None
         if window is not None:
-            if window[2] != 0.0:
-                w = Elements.getMaterialTransmission(window[0], 1.0,
-                                                     energylist,
-                                                     density=window[1],
-                                                     thickness=window[2] / sinalphax,
-                                                     listoutput=False)['transmission']
-        if filterlist is not None:
-            for fwindow in filterlist:
-                if w is None:
-                    w = Elements.getMaterialTransmission(fwindow[0], 1.0,
-                                                         energylist,
-                                                         density=fwindow[1],
-                                                         thickness=fwindow[2],
-                                                         listoutput=False)['transmission']
-                else:
-                    w *= Elements.getMaterialTransmission(fwindow[0], 1.0,
-                                                          energylist,
-                                                          density=fwindow[1],
-                                                          thickness=fwindow[2],
-                                                          listoutput=False)['transmission']
-        for i in range(len(fl)):
-            if rhelp[i] > 0.0:
-                rhelp[i] = (numpy.exp(-tau[i] *( ttarget - 2.0 * rhoz) / sinalphax) - numpy.exp(-tau[i] * ttarget / sinalphax)) / rhelp[i]
-            else:
-                rhelp[i] = 0.0
-            intensity = const * oneovers * r * Elements.getomegak(element) * rhelp[i]
-            if w is not None:
-                intensity = intensity * w[i]
-            fl[i][1] = intensity * fl[i][1]
+            windowthickness = window[2] / sinalphax
+    layers = []
+    thicknesses = []
+    if windowthickness is not None:
+        layers.append(window)
+        thicknesses.append(windowthickness)
+    if filterlist is not None:
+        for fwindow in filterlist:
+            layers.append(fwindow)
+            thicknesses.append(fwindow[2])
+    w = _getTransmission(layers, energylist, thicknesses)
+    with numpy.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        if not transmission:
+            rhelp = (1.0 - numpy.exp(-rhelp)) / rhelp
+        else:
+            rhelp = (numpy.exp(-tau * (ttarget - 2.0 * rhoz) / sinalphax) - \
+                     numpy.exp(-tau * ttarget / sinalphax)) / rhelp
+    rhelp = numpy.where(valid, rhelp, 0.0)
+    intensity = const * oneovers * r * Elements.getomegak(element) * rhelp
+    #the term dealing with absorption in tube's window
+    if w is not None:
+        intensity = intensity * w
+    for i in range(len(fl)):
+        fl[i][1] = intensity[i] * fl[i][1]
     return fl
 
-def generateLists(target, e0, window=None,
-                  alphae=None, alphax=None,
-                  transmission=None, targetthickness=None,
-                  filterlist=None):
+def characteristicEbel(target, e0, window=None,
+                       alphae=None, alphax=None,
+                       transmission=None, targetthickness=None,
+                       filterlist=None):
     """
-    Generate a theoretical X-Ray Tube emission profile
+    Calculation of target characteritic lines and intensities
 
     Parameters:
     -----------
@@ -444,6 +477,8 @@ def generateLists(target, e0, window=None,
         If set to atomic symbol, the program sets density and thickness of 0.1 cm
      e0 : float
         Tube Voltage in kV
+     e : float
+        Energy of interest
      window : list
         Tube window [Formula, density, thickness]
      alphae : float
@@ -459,13 +494,21 @@ def generateLists(target, e0, window=None,
      filterlist : [list]
         Additional filters [[Formula, density, thickness], ...]
 
-     Return:
-     -------
-     result : Tuple
-        [Array of Energies, Array of relative intensities, Array of flags]
-        Flag set to 1 means it is a target characteristic energy
-        Flag set to 0 means it corresponds to a continuum energy
+    Result: list
+        Characteristic lines and intensities in the form
+        [[energy0, intensity0, name0], [energy1, intensity1, name1], ...]
+        Energies in keV
+        Intensities in photons/sr/mA/keV/s
     """
+    args = (target, e0, window, alphae, alphax, transmission,
+            targetthickness, filterlist)
+    key = _getCacheKey("characteristic", target, e0, None, window,
+                       alphae, alphax, transmission, targetthickness,
+                       filterlist)
+    return _cached(_characteristicEbel, args, key)
+
+def _generateLists(target, e0, window, alphae, alphax, transmission,
+                   targetthickness, filterlist):
     e0w = 1.0 * e0
     x1min = 1.4
     step1 = 0.2
@@ -496,8 +539,8 @@ def generateLists(target, e0, window=None,
     energyweight[0:len(x1)] *= step1
     energyweight[len(x1):(len(x1) + len(x2))] *= step2
     energyweight[len(x1)] *= (energy[len(x1)] - energy[len(x1) - 1]) / step2
-    finalenergy = numpy.zeros(len(fllines) + len(energyweight), numpy.float)
-    finalweight = numpy.zeros(len(fllines) + len(energyweight), numpy.float)
+    finalenergy = numpy.zeros(len(fllines) + len(energyweight), numpy.float64)
+    finalweight = numpy.zeros(len(fllines) + len(energyweight), numpy.float64)
     scatterflag = numpy.zeros(len(fllines) + len(energyweight))
     finalenergy[len(fllines):] = energy[0:]
     finalweight[len(fllines):] = energyweight[0:] / 1.0e7
@@ -507,6 +550,91 @@ def generateLists(target, e0, window=None,
         scatterflag[i] = 1
     return finalenergy, finalweight, scatterflag
 
+def generateLists(target, e0, window=None,
+                  alphae=None, alphax=None,
+                  transmission=None, targetthickness=None,
+                  filterlist=None):
+    """
+    Generate a theoretical X-Ray Tube emission profile
+
+    Parameters:
+    -----------
+     target : list [Symbol, density (g/cm2), thickness(cm)] or atomic ymbol
+        If set to atomic symbol, the program sets density and thickness of 0.1 cm
+     e0 : float
+        Tube Voltage in kV
+     window : list
+        Tube window [Formula, density, thickness]
+     alphae : float
+        Angle, in degrees, between electron beam and tube target. Normal incidence is 90.
+     alphax : float
+        Angle, in degrees, of X-ray exit beam. Normal exit is 90.
+     transmission : Boolean, default is False
+        If True the X-ray come out of the tube target by the side opposite to the one
+        receiving the exciting electron beam.
+     targetthickness : Target thickness in cm
+        Only considered in transmission case. If not given, the program uses as target
+        thickness the maximal penetration depth of the incident electron beam.
+     filterlist : [list]
+        Additional filters [[Formula, density, thickness], ...]
+
+     Return:
+     -------
+     result : Tuple
+        [Array of Energies, Array of relative intensities, Array of flags]
+        Flag set to 1 means it is a target characteristic energy
+        Flag set to 0 means it corresponds to a continuum energy
+    """
+    args = (target, e0, window, alphae, alphax, transmission,
+            targetthickness, filterlist)
+    key = _getCacheKey("lists", target, e0, None, window,
+                       alphae, alphax, transmission, targetthickness,
+                       filterlist)
+    return _cached(_generateLists, args, key)
+
+def generateListsBatch(target, e0, window=None,
+                       alphae=None, alphax=None,
+                       transmission=None, targetthickness=None,
+                       filterlist=None, windowthickness=None):
+    """
+    Generate a family of theoretical X-Ray Tube emission profiles.
+
+    Parameters are those of generateLists except:
+
+     e0 : float or list of floats
+        Tube voltages in kV
+     windowthickness : float or list of floats
+        Tube window thicknesses in cm. If given, it replaces the thickness
+        of the window.
+
+    e0 and windowthickness are broadcasted against each other.
+
+     Return:
+     -------
+     result : List
+        One (energies, relative intensities, flags) tuple per combination of
+        voltage and window thickness as returned by generateLists.
+    """
+    if windowthickness is None:
+        e0 = numpy.array(e0, dtype=numpy.float64, ndmin=1)
+        windowList = [window] * e0.size
+    else:
+        if window is None:
+            raise ValueError("Window thicknesses given without window")
+        e0, windowthickness = numpy.broadcast_arrays(
+                numpy.array(e0, dtype=numpy.float64, ndmin=1),
+                numpy.array(windowthickness, dtype=numpy.float64, ndmin=1))
+        windowList = [[window[0], window[1], float(t)] \
+                      for t in windowthickness.ravel()]
+    output = []
+    for voltage, tubeWindow in zip(e0.ravel(), windowList):
+        output.append(generateLists(target, float(voltage), tubeWindow,
+                                    alphae=alphae, alphax=alphax,
+                                    transmission=transmission,
+                                    targetthickness=targetthickness,
+                                    filterlist=filterlist))
+    return output
+
 
 if __name__ == "__main__":
     import sys
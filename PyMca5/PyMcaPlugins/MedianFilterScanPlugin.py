@@ -31,7 +31,7 @@
 
 from PyMca5 import Plugin1DBase
 from PyMca5.PyMcaMath.fitting import SpecfitFuns
-from PyMca5.PyMcaMath.PyMcaSciPy.signal.median import medfilt1d
+from PyMca5.PyMcaMath.PyMcaSciPy.signal.median import medfilt1d_stack
 
 class MedianFilterScanPlugin(Plugin1DBase.Plugin1DBase):
     def __init__(self, plotWindow, **kw):
@@ -184,9 +184,7 @@ def applyMedianFilter(self, width=3):
             i += 1
 
         # now perform the median filter
-        for i in range(nChannels):
-            medianSpectra[i, :] = medfilt1d(tmpArray[i,:],
-                                            kernel_size=width)
+        medfilt1d_stack(tmpArray, kernel_size=width, output=medianSpectra)
         tmpArray = None
         # now get the final spectrum
         y = medianSpectra.sum(axis=1) / nCurves
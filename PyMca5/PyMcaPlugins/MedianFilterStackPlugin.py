@@ -58,9 +58,12 @@
     selectionMaskUpdated
 """
 
+import numpy
 from PyMca5 import StackPluginBase
 from PyMca5.PyMcaGui.pymca import Median2DBrowser
 from PyMca5.PyMcaGui import PyMca_Icons
+from PyMca5.PyMcaMath.PyMcaSciPy.signal.median import medfilt1d_stack
+from PyMca5.PyMcaMath.PyMcaSciPy.signal.median import medfilt2d_stack
 
 DEBUG = 0
 
@@ -70,8 +73,20 @@ def __init__(self, stackWindow, **kw):
         StackPluginBase.StackPluginBase.__init__(self, stackWindow, **kw)
         self.methodDict = {'Show':[self._showWidget,
                                    "Image Browser with Median Filter",
-                                   PyMca_Icons.brushselect]}
-        self.__methodKeys = ['Show']
+                                   PyMca_Icons.brushselect],
+                           'Spectral Median Filter':[
+                                   self.replaceStackWithSpectralMedian,
+                                   "Replace current stack by one in which\n" +\
+                                   "each spectrum has been median filtered",
+                                   PyMca_Icons.smooth],
+                           'Image Median Filter':[
+                                   self.replaceStackWithImageMedian,
+                                   "Replace current stack by one in which\n" +\
+                                   "each image has been median filtered",
+                                   PyMca_Icons.smooth]}
+        self.__methodKeys = ['Show',
+                             'Spectral Median Filter',
+                             'Image Median Filter']
         self.widget = None
 
     def stackUpdated(self):
@@ -135,6 +150,54 @@ def getMethodPixmap(self, name):
     def applyMethod(self, name):
         return self.methodDict[name][0]()
 
+    def _getMedianWidth(self, title):
+        qt = Median2DBrowser.qt
+        if hasattr(qt.QInputDialog, "getInt"):
+            getInt = qt.QInputDialog.getInt
+        else:
+            getInt = qt.QInputDialog.getInteger
+        width, ok = getInt(None, title, "Median filter width (odd):",
+                           3, 3, 99, 2)
+        if not ok:
+            return None
+        width = int(width)
+        if not (width % 2):
+            raise ValueError("Only odd values accepted")
+        return width
+
+    def _getStackNumpyData(self):
+        stack = self.getStackDataObject()
+        if not isinstance(stack.data, numpy.ndarray):
+            text = "This method does not work with dynamically loaded stacks"
+            raise TypeError(text)
+        mcaIndex = stack.info.get('McaIndex', -1)
+        if mcaIndex in [-1, len(stack.data.shape) - 1]:
+            mcaIndex = -1
+        elif mcaIndex != 0:
+            raise ValueError("Invalid 1D index %d" % mcaIndex)
+        return stack, mcaIndex
+
+    def replaceStackWithSpectralMedian(self):
+        stack, mcaIndex = self._getStackNumpyData()
+        width = self._getMedianWidth("Spectral Median Filter")
+        if width is None:
+            return
+        # all the spectra are filtered in place using several threads
+        medfilt1d_stack(stack.data, kernel_size=width, axis=mcaIndex,
+                        output=stack.data)
+        self.setStack(stack)
+
+    def replaceStackWithImageMedian(self):
+        stack, mcaIndex = self._getStackNumpyData()
+        if len(stack.data.shape) != 3:
+            raise ValueError("Only 3D stacks are supported")
+        width = self._getMedianWidth("Image Median Filter")
+        if width is None:
+            return
+        medfilt2d_stack(stack.data, kernel_size=[width, width],
+                        axis=mcaIndex, output=stack.data)
+        self.setStack(stack)
+
     def _showWidget(self):
         if self.widget is None:
             self.widget = Median2DBrowser.Median2DBrowser(parent=None,
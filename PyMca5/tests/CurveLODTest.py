@@ -0,0 +1,187 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import numpy
+
+class testCurveLOD(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.PyMcaGraph import CurveLOD
+            self._module = CurveLOD
+        except:
+            self._module = None
+
+    def testCurveLODImport(self):
+        #"""Test successful import"""
+        self.assertTrue(self._module is not None,
+                        "Unsuccessful PyMca5.PyMcaGraph.CurveLOD import")
+
+    def testMinMaxBlocks(self):
+        self.testCurveLODImport()
+        from PyMca5.PyMcaGraph.ctools import minMaxBlocks
+        numpy.random.seed(1)
+        data = numpy.random.random(1003)
+        data[17] = numpy.nan
+        for dtype in [numpy.float64, numpy.float32, numpy.int32, numpy.uint16]:
+            y = (data * 1000).astype(dtype)
+            minValues, maxValues = minMaxBlocks(y, 8)
+            self.assertEqual(minValues.size, 126)
+            for i in range(minValues.size):
+                block = y[i * 8:(i + 1) * 8]
+                self.assertEqual(minValues[i], numpy.nanmin(block))
+                self.assertEqual(maxValues[i], numpy.nanmax(block))
+
+    def testEnvelope(self):
+        self.testCurveLODImport()
+        numpy.random.seed(2)
+        npoints = 200003
+        x = numpy.arange(npoints) * 0.5
+        y = numpy.cumsum(numpy.random.random(npoints) - 0.5)
+        lod = self._module.CurveLOD(x, y)
+        for xmin, xmax in [(x[0], x[-1]), (1000., 1500.), (-10., 20000.)]:
+            xplot, yplot = lod.getData(xmin, xmax, 1000)
+            # at most two points per block for the visible range and outside
+            self.assertTrue(xplot.size < 8 * 1000 + 100)
+            self.assertTrue(numpy.all(numpy.diff(xplot) >= 0))
+            # the limits of the data are those of the whole curve
+            self.assertEqual(xplot[0], x[0])
+            self.assertEqual(xplot[-1], x[-1])
+            self.assertEqual(yplot.min(), y.min())
+            self.assertEqual(yplot.max(), y.max())
+            # the extrema of the visible range are kept
+            visible = (x >= xmin) & (x <= xmax)
+            idx = (xplot >= xmin) & (xplot <= xmax)
+            self.assertTrue(yplot[idx].max() >= y[visible].max())
+            self.assertTrue(yplot[idx].min() <= y[visible].min())
+        # a narrow range is sent as it is
+        xplot, yplot = lod.getData(1000., 1100., 1000)
+        idx = (x >= 1000.) & (x <= 1100.)
+        self.assertTrue(numpy.array_equal(yplot[(xplot >= 1000.) & \
+                                                (xplot <= 1100.)], y[idx]))
+
+    def testPlotLOD(self):
+        self.testCurveLODImport()
+        from PyMca5.PyMcaGraph import Plot
+        from PyMca5.PyMcaGraph import PlotBackend
+
+        class RecordingBackend(PlotBackend.PlotBackend):
+            def __init__(self, parent=None):
+                PlotBackend.PlotBackend.__init__(self, parent)
+                self.curves = {}
+                self.xLimits = (0., 1.)
+
+            def addCurve(self, x, y, legend, info=None, **kw):
+                self.curves[legend] = (x, y)
+                return legend
+
+            def removeCurve(self, handle, replot=True):
+                self.curves.pop(handle, None)
+
+            def clearCurves(self):
+                self.curves = {}
+
+            def getGraphXLimits(self):
+                return self.xLimits
+
+            def setGraphXLimits(self, xmin, xmax, replot=False):
+                self.xLimits = (xmin, xmax)
+
+            def setGraphYLimits(self, ymin, ymax, replot=False):
+                pass
+
+            def zoom(self, xmin, xmax):
+                self.xLimits = (xmin, xmax)
+                self._callback({'event': 'limitsChanged',
+                                'source': id(self),
+                                'xdata': (xmin, xmax),
+                                'ydata': (0., 1.),
+                                'y2data': None})
+
+            def replot(self):
+                pass
+
+        events = []
+        backend = RecordingBackend()
+        plot = Plot.Plot(backend=backend, callback=events.append)
+        npoints = 2 * plot.curveLODThreshold
+        x = numpy.arange(npoints, dtype=numpy.float64)
+        y = numpy.sin(x * 0.001)
+        plot.addCurve(x, y, legend="big", replot=False)
+        plot.addCurve(x[:10], y[:10], legend="small", replot=False)
+        self.assertTrue(backend.curves["big"][0].size < npoints // 10)
+        self.assertTrue(backend.curves["small"][0].size == 10)
+        self.assertTrue(plot.getCurve("big")[0] is x)
+
+        # zooming sends the points of the visible range
+        backend.zoom(1000., 2000.)
+        self.assertEqual(events[-1]['event'], 'limitsChanged')
+        xplot, yplot = backend.curves["big"]
+        idx = (xplot >= 1000.) & (xplot <= 2000.)
+        self.assertTrue(numpy.array_equal(xplot[idx], x[1000:2001]))
+        self.assertTrue(numpy.array_equal(yplot[idx], y[1000:2001]))
+
+        # the pyramid is not rebuilt when going back to the full range
+        lod = plot._getCurveLOD("big", x, y)
+        backend.zoom(x[0], x[-1])
+        self.assertTrue(plot._getCurveLOD("big", x, y) is lod)
+        self.assertTrue(backend.curves["big"][0].size < npoints // 10)
+
+        # the full curve is sent when disabling the level of detail
+        plot.setCurveLODEnabled(False)
+        self.assertTrue(backend.curves["big"][0] is x)
+        plot.setCurveLODEnabled(True)
+        plot.removeCurve("big")
+        self.assertTrue("big" not in backend.curves)
+        self.assertEqual(len(plot._curveLOD), 0)
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testCurveLOD))
+    else:
+        # use a predefined order
+        testSuite.addTest(testCurveLOD("testCurveLODImport"))
+        testSuite.addTest(testCurveLOD("testMinMaxBlocks"))
+        testSuite.addTest(testCurveLOD("testEnvelope"))
+        testSuite.addTest(testCurveLOD("testPlotLOD"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
@@ -32,6 +32,7 @@
 __copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
 import unittest
 import os
+import sys
 import numpy
 
 DEBUG = 0
@@ -116,6 +117,25 @@ def testPeakIdentification(self):
         self.assertTrue('S' in lines[0]['elements'])
         self.assertTrue('Hg' in lines[0]['elements'])
 
+        # Test vector queries against a brute force search
+        energyList = numpy.linspace(1.0, 30.0, 50)
+        threshold = 0.020
+        lines = self._elements.getcandidates(energyList,
+                                             threshold=threshold,
+                                             targetrays=['K', 'L'])
+        self.assertEqual(len(lines), len(energyList))
+        for i, energy in enumerate(energyList):
+            self.assertEqual(lines[i]['energy'], energy)
+            expected = []
+            for ele in self._elements.ElementList:
+                for rays in ['K xrays', 'L xrays']:
+                    for transition in self._elements.Element[ele][rays]:
+                        e = self._elements.Element[ele][transition]['energy']
+                        if abs(energy - e) < threshold:
+                            if ele not in expected:
+                                expected.append(ele)
+            self.assertEqual(lines[i]['elements'], expected)
+
     def testElementCrossSectionsReadout(self):
         if DEBUG:
             print()
@@ -295,6 +315,221 @@ def testMaterialCrossSectionsCalculation(self):
                     self.assertTrue((100.0 * abs(yTest-yRef)/yRef) < 0.01)
                 energyIndex += 1
 
+    def testVectorizedCrossSections(self):
+        if DEBUG:
+            print()
+            print("Testing vectorized Mass Attenuation Cross Sections")
+
+        # energies below 1 keV, exactly on the tabulated grid (including
+        # absorption edges) and in between
+        xcom = self._elements.getelementmassattcoef("Pb")
+        energyList = [0.5, 0.9] + \
+                     [x for x in xcom["energy"] if (x > 1.0) and (x < 100.)]
+        energyList += [x + 0.001 for x in energyList]
+        for compound in ["Pb", "Pb1C1O3"]:
+            if DEBUG:
+                print("Testing compound %s" % compound)
+            data = self._elements.getmassattcoef(compound, energyList)
+            # repeated calls are served from the cache
+            data2 = self._elements.getmassattcoef(compound, energyList)
+            for energyIndex in [0, 1, 2, 10, 20, len(energyList) - 1]:
+                energy = energyList[energyIndex]
+                refData = self._elements.getmassattcoef(compound, energy)
+                for key in ['coherent', 'compton', 'photo', 'pair', 'total']:
+                    yRef = refData[key][0]
+                    yTest = data[key][energyIndex]
+                    self.assertTrue(abs(yTest - yRef) <= 1.0e-10 * yRef)
+                    self.assertEqual(yTest, data2[key][energyIndex])
+
+    def testThreadedCrossSections(self):
+        if DEBUG:
+            print()
+            print("Testing Mass Attenuation Cross Sections from threads")
+        import threading
+        energies = [2.0 + 0.37 * i for i in range(40)]
+        errors = []
+        results = {}
+        def run(index):
+            try:
+                for repeat in range(5):
+                    for i, energy in enumerate(energies):
+                        data = self._elements.\
+                               getMaterialMassAttenuationCoefficients(\
+                                            "Fe", 1.0, [energy])
+                        results[(index, repeat, i)] = data['total'][0]
+            except:
+                errors.append(sys.exc_info()[1])
+        # a small cache forces evictions while other threads read it
+        cacheSize = self._elements._XCOM_CACHE_SIZE
+        self._elements._XCOM_CACHE_SIZE = 4
+        try:
+            ref = []
+            for energy in energies:
+                ref.append(self._elements.\
+                           getMaterialMassAttenuationCoefficients(\
+                                            "Fe", 1.0, [energy])['total'][0])
+            self.assertTrue(len(self._elements._XCOM_CACHE) <= 4)
+            threads = [threading.Thread(target=run, args=(i,)) \
+                       for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertTrue(len(self._elements._XCOM_CACHE) <= 4)
+        finally:
+            self._elements._XCOM_CACHE_SIZE = cacheSize
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), 8 * 5 * len(energies))
+        for key in results:
+            self.assertEqual(results[key], ref[key[2]])
+
+        # cached values cannot be modified by the callers
+        energy = numpy.array([5.0, 10.0])
+        for array in self._elements._getElementCrossSections("Fe", energy):
+            self.assertFalse(array.flags.writeable)
+        elts, nbs, weights = self._elements._parseFormula("Fe2O3")
+        self.assertEqual((elts, nbs), (("Fe", "O"), (2, 3)))
+        self.assertTrue(isinstance(weights, tuple))
+
+    def testLazyUpdateDict(self):
+        if DEBUG:
+            print()
+            print("Testing deferred update of the emission lines")
+        energy = 12.0
+        self._elements.updateDict(energy=energy)
+        try:
+            for ele in ["Cu", "Ag", "Pb", "U"]:
+                ref = {}
+                for key in self._elements.Element[ele]:
+                    if key not in ref:
+                        ref[key] = self._elements.Element[ele][key]
+                self._elements._updateElementDict(ele, ref, energy=energy)
+                data = self._elements.Element[ele]
+                self.assertEqual(data['buildparameters']['energy'], energy)
+                self.assertEqual(data['rays'], ref['rays'])
+                for rays in ref['rays']:
+                    self.assertEqual(data[rays], ref[rays])
+                    for transition in ref[rays]:
+                        self.assertEqual(data[transition], ref[transition])
+        finally:
+            self._elements.updateDict()
+        self.assertTrue(self._elements.Element["Cu"]['buildparameters']\
+                                                  ['energy'] is None)
+
+    def testEscape(self):
+        if DEBUG:
+            print()
+            print("Testing escape peaks")
+        energyList = [5.0, 11.0, 11.2, 20.0, 60.0]
+        for detector in [["Ge", 5.32, 1.0], ["Cd1Te1", 5.85, 0.1]]:
+            escapeList = self._elements.getEscapeList(detector, energyList,
+                                                      ethreshold=0.010,
+                                                      ithreshold=1.0e-7,
+                                                      nthreshold=4)
+            self.assertEqual(len(escapeList), len(energyList))
+            for energy, escape in zip(energyList, escapeList):
+                ref = self._elements.getEscape(detector, energy,
+                                               ethreshold=0.010,
+                                               ithreshold=1.0e-7,
+                                               nthreshold=4)
+                self.assertEqual(escape, ref)
+                self.assertTrue(len(escape) <= 4)
+                for peak in escape:
+                    self.assertTrue(peak[1] > 0.0)
+        # no germanium K escape below the K edge (11.1 keV)
+        escape = self._elements.getEscapeList(["Ge", 5.32, 1.0],
+                                              [11.0, 11.2],
+                                              ethreshold=0.010,
+                                              ithreshold=1.0e-7)
+        self.assertEqual([x for x in escape[0] if "Ge K" in x[2]], [])
+        self.assertTrue(len([x for x in escape[1] if "Ge K" in x[2]]) > 0)
+
+    def testMultilayerModel(self):
+        from PyMca5.PyMcaPhysics.xrf.MultilayerModel import MultilayerModel
+        if DEBUG:
+            print()
+            print("Testing MultilayerModel")
+        groups = [[8, 'O', 'K'], [20, 'Ca', 'K'], [26, 'Fe', 'K'],
+                  [29, 'Cu', 'K']]
+        calcite = ["Ca1C1O3", 2.7, 0.01]
+        kw = {"weightList": [1.0, 0.3],
+              "beamfilters": [["Al", 2.7, 0.01]],
+              "attenuators": [["Air", 0.0012, 1.0]],
+              "detector": ["Si1", 2.33, 0.5],
+              "cascade": True,
+              "forcepresent": 1}
+        # total, first layer and second layer rates obtained with the
+        # element by element implementation of getMultilayerFluorescence
+        # in use before MultilayerModel
+        reference = {}
+        reference["Fe2O3"] = {"O K": [3.082867428383082e-13,
+                                      3.0828674283683176e-13,
+                                      1.4764303154126057e-24],
+                              "Ca K": [0.0028323790798349697,
+                                       0.0,
+                                       0.0028323790798349697],
+                              "Fe K": [0.08621690579742186,
+                                       0.08621690579742186,
+                                       0.0],
+                              "Cu K": [0.13330890135873266,
+                                       0.09236260396023159,
+                                       0.040946297398501044]}
+        reference["Fe3O4"] = {"O K": [3.018816682398984e-13,
+                                      3.0188166823902687e-13,
+                                      8.714809556118654e-25],
+                              "Ca K": [0.0026931173672853003,
+                                       0.0,
+                                       0.0026931173672853003],
+                              "Fe K": [0.08531760911434909,
+                                       0.08531760911434909,
+                                       0.0],
+                              "Cu K": [0.12867895512159697,
+                                       0.09030975194892013,
+                                       0.03836920317267685]}
+        def check(values, expected):
+            delta = numpy.abs(numpy.asarray(values) - expected)
+            self.assertTrue(numpy.all(delta <= 1.0e-10 * expected),
+                            "Got %s expected %s" % (values, expected))
+
+        model = MultilayerModel([["Fe2O3", 5.2, 0.001], calcite],
+                                [12.0, 20.0], elementsList=groups, **kw)
+        # nominal composition
+        rates = model.getRates()
+        self.assertEqual(len(rates["layers"]), 2)
+        for key in reference["Fe2O3"]:
+            expected = reference["Fe2O3"][key]
+            check(rates["total"][key], expected[0])
+            for i in range(2):
+                check(rates["layers"][i].get(key, 0.0), expected[i + 1])
+
+        # per pixel composition of the first layer
+        composition = self._elements.getMaterialMassFractions(["Fe3O4"],
+                                                              [1.0])
+        npixels = 5
+        massFractions = {}
+        for ele in composition:
+            massFractions[ele] = composition[ele] * numpy.ones(npixels)
+        rates = model.getRates(massFractions={0: massFractions})
+        for key in reference["Fe3O4"]:
+            expected = reference["Fe3O4"][key]
+            self.assertEqual(rates["total"][key].shape, (npixels,))
+            check(rates["total"][key], expected[0])
+
+        # getMultilayerFluorescence output
+        for material in reference:
+            fluo = self._elements.getMultilayerFluorescence(\
+                                [[material, 5.2, 0.001], calcite],
+                                [12.0, 20.0],
+                                elementsList=[g[:] for g in groups],
+                                fulloutput=1, **kw)
+            for z, ele, family in groups:
+                expected = reference[material]["%s %s" % (ele, family)]
+                for i in range(3):
+                    if ele in fluo[i]:
+                        value = fluo[i][ele]['rates'][family + " xrays"]
+                    else:
+                        value = 0.0
+                    check(value, expected[i])
 
 def getSuite(auto=True):
     testSuite = unittest.TestSuite()
@@ -307,6 +542,11 @@ def getSuite(auto=True):
         testSuite.addTest(testElements("testElementCrossSectionsReadout"))
         testSuite.addTest(testElements("testElementCrossSectionsCalculation"))
         testSuite.addTest(testElements("testMaterialCrossSectionsCalculation"))
+        testSuite.addTest(testElements("testVectorizedCrossSections"))
+        testSuite.addTest(testElements("testThreadedCrossSections"))
+        testSuite.addTest(testElements("testLazyUpdateDict"))
+        testSuite.addTest(testElements("testEscape"))
+        testSuite.addTest(testElements("testMultilayerModel"))
     return testSuite
 
 def test(auto=False):
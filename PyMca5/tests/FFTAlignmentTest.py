@@ -0,0 +1,132 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import numpy
+
+class testFFTAlignment(unittest.TestCase):
+    def setUp(self):
+        """
+        import the modules
+        """
+        try:
+            from PyMca5.PyMcaMath import FFTAlignment
+            from PyMca5.PyMcaMath import ImageRegistration
+            self.alignment = FFTAlignment
+            self.registration = ImageRegistration
+        except:
+            self.alignment = None
+
+    def fourierShift(self, image, shift):
+        f0 = numpy.fft.fftfreq(image.shape[0])[:, None]
+        f1 = numpy.fft.fftfreq(image.shape[1])[None, :]
+        phase = numpy.exp(-2j * numpy.pi * (f0 * shift[0] + f1 * shift[1]))
+        return numpy.fft.ifft2(numpy.fft.fft2(image) * phase).real
+
+    def getStack(self, nImages=12):
+        numpy.random.seed(1)
+        reference = numpy.random.random((64, 80)) - 0.5
+        shifts = numpy.random.uniform(-4, 4, (nImages, 2))
+        stack = numpy.array([self.fourierShift(reference, shift) \
+                             for shift in shifts]).astype(numpy.float32)
+        return reference, shifts, stack
+
+    def testFFTAlignmentImport(self):
+        self.assertTrue(self.alignment is not None)
+
+    def testShiftsAsImageRegistration(self):
+        self.testFFTAlignmentImport()
+        reference, shifts, stack = self.getStack()
+        offsets = [5, 7]
+        widths = [50, 60]
+        engine = self.alignment.FFTAlignment(reference,
+                                             offsets=offsets,
+                                             widths=widths,
+                                             nthreads=3,
+                                             blocksize=5)
+        calculated = engine.calculateShifts(stack)
+        window = self.alignment.getRectangularWindow(widths)
+        roi = (slice(offsets[0], offsets[0] + widths[0]),
+               slice(offsets[1], offsets[1] + widths[1]))
+        referenceFFT = numpy.fft.fft2(window * reference[roi])
+        for i in range(stack.shape[0]):
+            expected = self.registration.measure_offset_from_ffts(\
+                            referenceFFT, numpy.fft.fft2(window * stack[i][roi]))
+            self.assertTrue(numpy.allclose(calculated[i], expected,
+                                           atol=1.0e-4))
+
+        # images as last index
+        stack2 = numpy.ascontiguousarray(numpy.rollaxis(stack, 0, 3))
+        calculated2 = engine.calculateShifts(stack2, mcaIndex=2)
+        self.assertTrue(numpy.allclose(calculated, calculated2))
+
+    def testUpsampledShifts(self):
+        self.testFFTAlignmentImport()
+        reference, shifts, stack = self.getStack()
+        engine = self.alignment.FFTAlignment(reference,
+                                             apodization=(0, 0),
+                                             upsampling=50)
+        calculated = engine.calculateShifts(stack)
+        self.assertTrue(abs(calculated - shifts).max() < 0.05)
+
+    def testShiftStack(self):
+        self.testFFTAlignmentImport()
+        reference, shifts, stack = self.getStack()
+        output = numpy.zeros(stack.shape, numpy.float32)
+        self.alignment.shiftStack(stack, shifts, output=output, crop=False,
+                                  nthreads=2, blocksize=5)
+        for i in range(stack.shape[0]):
+            expected = self.registration.shiftBilinear(stack[i], shifts[i])
+            self.assertTrue(numpy.allclose(output[i], expected, atol=1.0e-5))
+        # in place with the images as last index
+        stack2 = numpy.ascontiguousarray(numpy.rollaxis(stack, 0, 3))
+        self.alignment.shiftStack(stack2, shifts, mcaIndex=2, crop=False)
+        self.assertTrue(numpy.allclose(numpy.rollaxis(stack2, 2), output))
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testFFTAlignment))
+    else:
+        # use a predefined order
+        testSuite.addTest(testFFTAlignment("testFFTAlignmentImport"))
+        testSuite.addTest(testFFTAlignment("testShiftsAsImageRegistration"))
+        testSuite.addTest(testFFTAlignment("testUpsampledShifts"))
+        testSuite.addTest(testFFTAlignment("testShiftStack"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,237 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import copy
+import numpy
+
+class testFastConcentrations(unittest.TestCase):
+    def setUp(self):
+        """
+        import the modules
+        """
+        try:
+            from PyMca5.PyMcaPhysics.xrf import FastConcentrations
+            from PyMca5.PyMcaPhysics.xrf import ConcentrationsTool
+            self.fastConcentrations = FastConcentrations
+            self.concentrationsTool = ConcentrationsTool
+        except:
+            self.fastConcentrations = None
+
+    def getConfiguration(self):
+        config = {}
+        config["attenuators"] = {
+                "Matrix": [1, "Ca1C1O3", 2.7, 0.1, 45.0, 45.0],
+                "Detector": [1, "Si1", 2.33, 0.5],
+                "atmosphere": [1, "Air", 0.0012048, 1.0, 1.0],
+                "BeamFilter0": [1, "Al1", 2.7, 0.005, 1.0]}
+        config["peaks"] = {"Ca": "K", "Fe": "K", "Cu": "K", "Pb": ["L", "M"]}
+        config["fit"] = {"energy": [20.0, 15.0],
+                         "energyflag": [1, 1],
+                         "energyweight": [1.0, 0.5],
+                         "strategyflag": 1,
+                         "strategy": "SingleLayerStrategy"}
+        config["concentrations"] = {"usematrix": 0,
+                                    "useattenuators": 1,
+                                    "flux": 1.0e10,
+                                    "time": 1.0,
+                                    "area": 30.0,
+                                    "distance": 10.0,
+                                    "reference": "Auto",
+                                    "mmolarflag": 0}
+        config["SingleLayerStrategy"] = {"layer": "Auto",
+                                         "iterations": 20,
+                                         "completer": "Ca1C1O3",
+                                         "peaks": ["Fe K", "Cu K", "Pb L"],
+                                         "materials": ["Fe2O3", "-", "-"],
+                                         "flags": [1, 1, 1]}
+        return config
+
+    def testFastConcentrationsImport(self):
+        self.assertIsNotNone(self.fastConcentrations,
+                             "Unsuccessful PyMca5.PyMcaPhysics.xrf.FastConcentrations import")
+
+    def testWithoutMatrixIteration(self):
+        config = self.getConfiguration()
+        config["fit"]["strategyflag"] = 0
+        engine = self.fastConcentrations.FastConcentrations(config)
+        groups = engine.getGroups()
+        areas = numpy.array([[1.0e6, 2.0e6], [3.0e6, 1.0e6], [5.0e5, 1.0e5],
+                             [2.0e4, 1.0e4], [3.0e4, 1.0e4]])
+        result = engine.processAreas(areas)
+        self.assertEqual(result["mass fraction"].shape, areas.shape)
+        self.assertTrue(numpy.all(result["converged"]))
+        # same values as the concentrations tool
+        for pixel in range(areas.shape[1]):
+            fitresult = {"result": {"config": config, "groups": groups}}
+            for i, group in enumerate(groups):
+                fitresult["result"][group] = {"fitarea": areas[i, pixel],
+                                              "sigmaarea": 1.0}
+            tool = self.concentrationsTool.ConcentrationsTool()
+            ddict = tool.processFitResult(\
+                                config=copy.deepcopy(config["concentrations"]),
+                                fitresult=fitresult,
+                                elementsfrommatrix=False)
+            for i, group in enumerate(groups):
+                expected = ddict["mass fraction"][group]
+                self.assertTrue(abs(result["mass fraction"][i, pixel] - \
+                                    expected) <= 1.0e-10 * expected)
+
+    def testAutoReference(self):
+        config = self.getConfiguration()
+        config["fit"]["strategyflag"] = 0
+        config["concentrations"]["usematrix"] = 1
+        # two fitted elements in the matrix
+        config["attenuators"]["Matrix"] = [1, "Ca1Fe1O3", 3.0, 0.1,
+                                           45.0, 45.0]
+        engine = self.fastConcentrations.FastConcentrations(config)
+        groups = engine.getGroups()
+        # the largest area is not always the one of the reference
+        for (ca, fe) in [(1.0e6, 2.0e6), (3.0e6, 1.0e6), (1.0e6, 1.0e5)]:
+            areas = numpy.array([ca, fe, 5.0e5, 2.0e4, 3.0e4])
+            result = engine.processAreas(areas[:, None])
+            fitresult = {"result": {"config": config, "groups": groups}}
+            for i, group in enumerate(groups):
+                fitresult["result"][group] = {"fitarea": areas[i],
+                                              "sigmaarea": 1.0}
+            tool = self.concentrationsTool.ConcentrationsTool()
+            ddict, info = tool.processFitResult(\
+                                config=copy.deepcopy(config["concentrations"]),
+                                fitresult=fitresult,
+                                elementsfrommatrix=False,
+                                addinfo=True)
+            self.assertEqual(result["reference"].split()[0],
+                             info["ReferenceElement"])
+            for i, group in enumerate(groups):
+                expected = ddict["mass fraction"][group]
+                self.assertTrue(abs(result["mass fraction"][i, 0] - \
+                                    expected) <= 1.0e-10 * expected)
+
+    def referenceIteration(self, config, groups, areas, iterations):
+        """
+        Concentrations of one pixel from ConcentrationsTool updating the
+        matrix after each iteration as SingleLayerStrategy does
+        """
+        from PyMca5.PyMcaPhysics.xrf import Elements
+        config = copy.deepcopy(config)
+        strategy = config["SingleLayerStrategy"]
+        materialName = "FastConcentrationsTestMaterial"
+        tool = self.concentrationsTool.ConcentrationsTool()
+        for iteration in range(iterations + 1):
+            fitresult = {"result": {"config": config, "groups": groups}}
+            for i, group in enumerate(groups):
+                fitresult["result"][group] = {"fitarea": areas[i],
+                                              "sigmaarea": 1.0}
+            ddict = tool.processFitResult(\
+                                config=copy.deepcopy(config["concentrations"]),
+                                fitresult=fitresult,
+                                elementsfrommatrix=False)
+            if iteration == iterations:
+                break
+            compoundList = []
+            compoundFraction = []
+            for group, material in zip(strategy["peaks"],
+                                       strategy["materials"]):
+                ele = group.split()[0]
+                if material in ["-", ele, ele + "1"]:
+                    material = ele
+                massFraction = Elements.getMaterialMassFractions(\
+                                                    [material], [1.0])[ele]
+                compoundList.append(material)
+                compoundFraction.append(\
+                        max(ddict["mass fraction"][group], 0.0) / massFraction)
+            total = sum(compoundFraction)
+            if total < 1.0:
+                compoundList.append(strategy["completer"])
+                compoundFraction.append(1.0 - total)
+            else:
+                compoundFraction = [x / total for x in compoundFraction]
+            matrix = config["attenuators"]["Matrix"]
+            Elements.Material[materialName] = {"Density": matrix[2],
+                                           "Thickness": matrix[3],
+                                           "CompoundList": compoundList,
+                                           "CompoundFraction": compoundFraction,
+                                           "Comment": "Strategy iteration"}
+            config["attenuators"]["Matrix"] = [1, materialName] + matrix[2:]
+        if materialName in Elements.Material:
+            del Elements.Material[materialName]
+        return ddict
+
+    def testMatrixIteration(self):
+        config = self.getConfiguration()
+        engine = self.fastConcentrations.FastConcentrations(config)
+        groups = engine.getGroups()
+        # a few different pixels repeated to fill several blocks
+        areas = numpy.array([[1.0e6, 2.0e6, 1.5e6], [3.0e6, 1.0e6, 2.0e5],
+                             [5.0e5, 1.0e5, 8.0e5], [2.0e4, 1.0e4, 0.0],
+                             [3.0e4, 1.0e4, 1.0e3]])
+        nPixels = areas.shape[1]
+        tiled = numpy.tile(areas, (1, 40)).reshape(len(groups), 10, 12)
+        result = engine.processAreas(tiled, tolerance=1.0e-10, nthreads=2,
+                                     blocksize=16)
+        self.assertTrue(numpy.all(result["converged"]))
+        self.assertEqual(result["iterations"].shape, (10, 12))
+        # the coefficients of all the elements the strategy can bring into
+        # the matrix were calculated before starting the threads
+        for ele in ["Ca", "C", "O", "Fe", "Cu", "Pb"]:
+            self.assertTrue(ele in engine._model._muCache)
+        massFractions = result["mass fraction"].reshape(len(groups), -1)
+        iterations = result["iterations"].ravel()
+        # same values as the concentrations tool iterating the matrix
+        for pixel in range(nPixels):
+            ddict = self.referenceIteration(config, groups, areas[:, pixel],
+                                            int(iterations[pixel]))
+            for i, group in enumerate(groups):
+                expected = ddict["mass fraction"][group]
+                values = massFractions[i, pixel::nPixels]
+                self.assertTrue(numpy.all(values == values[0]))
+                self.assertTrue(abs(values[0] - expected) <= \
+                                1.0e-6 * max(abs(expected), 1.0e-10))
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testFastConcentrations))
+    else:
+        # use a predefined order
+        testSuite.addTest(testFastConcentrations("testFastConcentrationsImport"))
+        testSuite.addTest(testFastConcentrations("testWithoutMatrixIteration"))
+        testSuite.addTest(testFastConcentrations("testAutoReference"))
+        testSuite.addTest(testFastConcentrations("testMatrixIteration"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
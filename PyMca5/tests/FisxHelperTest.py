@@ -0,0 +1,118 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import copy
+
+class testFisxHelper(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.PyMcaPhysics.xrf import FisxHelper
+            self.fisxHelper = FisxHelper
+        except:
+            self.fisxHelper = None
+
+    def getConfiguration(self):
+        config = {}
+        config["attenuators"] = {
+                "Matrix": [1, "Ca1C1O3", 2.7, 0.01, 45.0, 45.0],
+                "Detector": [1, "Si1", 2.33, 0.5]}
+        config["peaks"] = {"Ca": "K", "Fe": "K"}
+        config["fit"] = {"energy": [15.0],
+                         "energyflag": [1],
+                         "energyweight": [1.0],
+                         "energyscatter": [1],
+                         "escapeflag": 0}
+        config["concentrations"] = {"area": 30.0,
+                                    "distance": 10.0,
+                                    "usemultilayersecondary": 2}
+        config["detector"] = {"detele": "Si", "nthreshold": 4}
+        return config
+
+    def testFisxHelperImport(self):
+        self.assertIsNotNone(self.fisxHelper,
+                             "Unsuccessful import of FisxHelper module")
+
+    def testCorrectionFactorsCache(self):
+        if self.fisxHelper is None:
+            self.skipTest("fisx not available")
+        helper = self.fisxHelper
+        helper.clearCache()
+        config = self.getConfiguration()
+        first = helper.getFisxCorrectionFactorsFromFitConfiguration(config)
+        info = helper.getCacheInfo()
+        self.assertEqual(info["misses"], 1)
+        self.assertEqual(info["hits"], 0)
+
+        # an equivalent configuration has to be found in the cache and the
+        # cached result must not be affected by modifications of the output
+        first["Fe"]["K"]["correction_factor"][1] = -1.0
+        second = helper.getFisxCorrectionFactorsFromFitConfiguration(\
+                                                    copy.deepcopy(config))
+        info = helper.getCacheInfo()
+        self.assertEqual(info["hits"], 1)
+        self.assertTrue(second["Fe"]["K"]["correction_factor"][1] > 1.0)
+
+        # a relevant change has to trigger a new calculation
+        config["attenuators"]["Matrix"][3] = 0.001
+        third = helper.getFisxCorrectionFactorsFromFitConfiguration(config)
+        info = helper.getCacheInfo()
+        self.assertEqual(info["misses"], 2)
+        self.assertEqual(info["size"], 2)
+        self.assertNotEqual(second["Fe"]["K"]["total"],
+                            third["Fe"]["K"]["total"])
+
+        # explicit invalidation
+        helper.clearCache()
+        info = helper.getCacheInfo()
+        self.assertEqual(info["size"], 0)
+        self.assertEqual(info["hits"], 0)
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testFisxHelper))
+    else:
+        # use a predefined order
+        testSuite.addTest(testFisxHelper("testFisxHelperImport"))
+        testSuite.addTest(testFisxHelper("testCorrectionFactorsCache"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,166 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import numpy
+
+class testImagePyramid(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.PyMcaGraph import ImagePyramid
+            self._module = ImagePyramid
+        except:
+            self._module = None
+
+    def testImagePyramidImport(self):
+        #"""Test successful import"""
+        self.assertTrue(self._module is not None,
+                        "Unsuccessful PyMca5.PyMcaGraph.ImagePyramid import")
+
+    def testImagePyramidLevels(self):
+        self.testImagePyramidImport()
+        numpy.random.seed(1)
+        data = numpy.random.random((301, 520)).astype(numpy.float32)
+        pyramid = self._module.ImagePyramid(data, tileSize=64)
+        self.assertEqual(pyramid.getNumberOfLevels(), 5)
+        self.assertTrue(pyramid.getLevel(0) is data)
+        level1 = pyramid.getLevel(1)
+        self.assertEqual(level1.shape, (151, 260))
+        expected = 0.25 * (data[0:300:2, 0::2] + data[1:300:2, 0::2] + \
+                           data[0:300:2, 1::2] + data[1:300:2, 1::2])
+        self.assertTrue(numpy.allclose(level1[:150], expected, atol=1.0e-6))
+        # last odd row is duplicated
+        expected = 0.5 * (data[300, 0::2] + data[300, 1::2])
+        self.assertTrue(numpy.allclose(level1[150], expected, atol=1.0e-6))
+        for level in range(pyramid.getNumberOfLevels()):
+            self.assertEqual(pyramid.getLevel(level).shape,
+                             pyramid.getLevelShape(level))
+        self.assertEqual(max(pyramid.getLevelShape(4)), 33)
+
+        # the viewport is taken from the level matching the resolution
+        image, extent, level = pyramid.getViewport(100, 400, 50, 250,
+                                                   width=75, height=50)
+        self.assertEqual(level, 2)
+        self.assertEqual(extent, (100, 400, 48, 252))
+        self.assertEqual(image.shape, (51, 75))
+        tiles = pyramid.getTiles(1, 0, 200, 0, 100)
+        self.assertEqual(len(tiles), 2)
+        self.assertEqual(tiles[1][1], (0, 64))
+
+        # RGBA images keep their type
+        rgba = (numpy.random.random((100, 90, 4)) * 255).astype(numpy.uint8)
+        pyramid = self._module.ImagePyramid(rgba, tileSize=32)
+        self.assertEqual(pyramid.getLevel(1).dtype, numpy.uint8)
+        self.assertEqual(pyramid.getLevel(1).shape, (50, 45, 4))
+
+    def testImagePyramidStatistics(self):
+        self.testImagePyramidImport()
+        numpy.random.seed(2)
+        data = numpy.random.random((200, 150)) - 0.5
+        data[10, 20] = numpy.nan
+        pyramid = self._module.getPyramid(data, build=True)
+        pyramid.wait()
+        self.assertTrue(pyramid.isBuilt())
+        self.assertTrue(self._module.getPyramid(data) is pyramid)
+        dataMin, dataMinPos, dataMax = pyramid.getStatistics()
+        self.assertEqual(dataMin, numpy.nanmin(data))
+        self.assertEqual(dataMax, numpy.nanmax(data))
+        self.assertEqual(dataMinPos, data[data > 0].min())
+
+        pyramid = self._module.ImagePyramid(data, tileSize=50)
+        dataMin, dataMinPos, dataMax = pyramid.getStatistics(60, 90, 0, 40)
+        tiles = data[0:50, 50:100]
+        self.assertEqual(dataMin, numpy.nanmin(tiles))
+        self.assertEqual(dataMax, numpy.nanmax(tiles))
+        self.assertEqual(dataMinPos, tiles[tiles > 0].min())
+
+        negative = -numpy.ones((10, 10))
+        self.assertEqual(self._module.ImagePyramid(negative).getStatistics(),
+                         (-1.0, None, -1.0))
+
+    def testImagePyramidInvalidate(self):
+        self.testImagePyramidImport()
+        numpy.random.seed(3)
+        data = numpy.random.random((120, 80))
+        pyramid = self._module.getPyramid(data, build=True)
+        pyramid.wait()
+        self.assertEqual(pyramid.getStatistics()[2], data.max())
+        # modified in place, the cached statistics are outdated
+        data[5, 7] = 10.0
+        data[50, 60] = -3.0
+        self._module.invalidate(data)
+        pyramid = self._module.getPyramid(data)
+        dataMin, dataMinPos, dataMax = pyramid.getStatistics()
+        self.assertEqual(dataMin, -3.0)
+        self.assertEqual(dataMax, 10.0)
+        self.assertEqual(dataMinPos, data[data > 0].min())
+        # nothing to forget
+        self._module.invalidate(numpy.zeros((3, 3)))
+
+    def testGLPlotColormapUpdateData(self):
+        self.testImagePyramidImport()
+        try:
+            from PyMca5.PyMcaGraph.backends.GLSupport import GLPlotImage
+        except ImportError:
+            self.skipTest("OpenGL not available")
+        data = numpy.arange(100., dtype=numpy.float32).reshape(10, 10)
+        image = GLPlotImage.GLPlotColormap(data, (0., 0.), (1., 1.),
+                                           "gray")
+        self.assertEqual(image.cmapRange, (0., 99.))
+        # same array modified in place
+        data[2, 3] = 500.
+        data[4, 5] = -20.
+        image.updateData(data)
+        self.assertEqual(image.cmapRange, (-20., 500.))
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testImagePyramid))
+    else:
+        # use a predefined order
+        testSuite.addTest(testImagePyramid("testImagePyramidImport"))
+        testSuite.addTest(testImagePyramid("testImagePyramidLevels"))
+        testSuite.addTest(testImagePyramid("testImagePyramidStatistics"))
+        testSuite.addTest(testImagePyramid("testImagePyramidInvalidate"))
+        testSuite.addTest(testImagePyramid("testGLPlotColormapUpdateData"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
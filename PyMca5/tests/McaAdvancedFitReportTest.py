@@ -0,0 +1,149 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import os
+import tempfile
+import shutil
+import numpy
+
+class testMcaAdvancedFitReport(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.PyMcaPhysics.xrf import McaAdvancedFitReport
+            self._module = McaAdvancedFitReport
+        except:
+            self._module = None
+        self._tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpDir)
+
+    def _getFitFiles(self, n):
+        from PyMca5 import PyMcaDataDir
+        from PyMca5.PyMcaIO import ConfigDict
+        from PyMca5.PyMcaPhysics.xrf import ClassMcaTheory
+        config = ConfigDict.ConfigDict()
+        config.read(os.path.join(PyMcaDataDir.PYMCA_DATA_DIR, "McaTheory.cfg"))
+        config['peaks'] = {'Fe':'K', 'Cu':'K'}
+        config['detector']['zero'] = 0.0
+        config['detector']['gain'] = 0.02
+        config['fit']['xmin'] = 100
+        config['fit']['xmax'] = 600
+        mcaFit = ClassMcaTheory.McaTheory()
+        mcaFit.configure(config)
+        numpy.random.seed(1)
+        x = numpy.arange(1024.)
+        energy = 0.02 * x
+        fitfiles = []
+        for i in range(n):
+            y = 10 + 1000. * numpy.exp(-0.5 * ((energy - 6.4) / 0.07) ** 2) +\
+                     500. * numpy.exp(-0.5 * ((energy - 8.04) / 0.08) ** 2)
+            y = numpy.random.poisson(y).astype(numpy.float64)
+            mcaFit.setData(x, y, xmin=100, xmax=600)
+            mcaFit.estimate()
+            mcaFit.startfit(digest=1)
+            fitfile = os.path.join(self._tmpDir, "spectrum_%d.fit" % i)
+            mcaFit.digestresult(outfile=fitfile,
+                                info={'SourceName':'test', 'Key':'%d' % i})
+            fitfiles.append(fitfile)
+        return fitfiles
+
+    def _read(self, filename):
+        f = open(filename, 'rb')
+        text = f.read().decode('utf-8')
+        f.close()
+        return text
+
+    def testMcaAdvancedFitReportImport(self):
+        #"""Test successful import"""
+        self.assertTrue(self._module is not None,
+                "Unsuccessful PyMca5.PyMcaPhysics.xrf.McaAdvancedFitReport import")
+
+    def testMcaAdvancedFitReportWriter(self):
+        self.testMcaAdvancedFitReportImport()
+        from PyMca5.PyMcaCore import HtmlIndex
+        fitfiles = self._getFitFiles(3)
+        htmldir = os.path.join(self._tmpDir, "HTML")
+        for summary, nProcesses in [(False, 0), (True, 1)]:
+            directory = os.path.join(htmldir, "spectra%d_HTMLDIR" % summary)
+            writer = self._module.McaAdvancedFitReportWriter(htmldir,
+                                summary=summary, nProcesses=nProcesses)
+            outfiles = []
+            for fitfile in fitfiles:
+                outfile = os.path.basename(fitfile)[:-4] + ".html"
+                outfile = os.path.join(directory, outfile)
+                writer.addFitFile(fitfile, outfile)
+                outfiles.append(outfile)
+            writer.close()
+            self.assertEqual(writer.nErrors, 0)
+            index = self._read(os.path.join(directory, "index.html"))
+            self.assertEqual(index.count(HtmlIndex.ENTRIES_END), 1)
+            for outfile in outfiles:
+                self.assertTrue(os.path.exists(outfile))
+                self.assertEqual(os.path.exists(outfile + ".png"),
+                                 not summary)
+                link = os.path.basename(outfile)
+                self.assertTrue(("href=%s>" % link) in index)
+            if summary:
+                self.assertTrue("Chi&nbsp; square" in index)
+                self.assertEqual(index.count("<TR><TD"), len(fitfiles))
+                self.assertTrue(index.index(HtmlIndex.ENTRIES_END) <
+                                index.rindex(self._module.SUMMARY_SUFFIX))
+        mainIndex = self._read(os.path.join(htmldir, "index.html"))
+        # the workers do not inherit the state of the calling process
+        context = self._module._getContext()
+        if hasattr(context, "get_start_method"):
+            self.assertEqual(context.get_start_method(), "spawn")
+        for summary in [False, True]:
+            link = "./spectra%d_HTMLDIR/index.html" % summary
+            self.assertEqual(mainIndex.count("href=%s>" % link), 1)
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testMcaAdvancedFitReport))
+    else:
+        # use a predefined order
+        testSuite.addTest(testMcaAdvancedFitReport("testMcaAdvancedFitReportImport"))
+        testSuite.addTest(testMcaAdvancedFitReport("testMcaAdvancedFitReportWriter"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
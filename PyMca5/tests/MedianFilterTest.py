@@ -0,0 +1,123 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import numpy
+
+class testMedianFilter(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.PyMcaMath.PyMcaSciPy.signal import median
+            self.median = median
+        except:
+            self.median = None
+
+    def referenceMedian1D(self, spectrum, width, conditional=0):
+        # the single spectrum filter applied as a 2D filter on a column
+        column = numpy.array(spectrum, copy=True).reshape(-1, 1)
+        return self.median.mediantools._medfilt2d(column, [width, 1],
+                                                  conditional).ravel()
+
+    def testMedianImport(self):
+        self.assertTrue(self.median is not None)
+
+    def testMedianStack1D(self):
+        self.testMedianImport()
+        numpy.random.seed(0)
+        for nChannels in [1, 4, 9, 30, 300]:
+            for width in [1, 3, 5, 9, 15, 51]:
+                for conditional in [0, 1]:
+                    # repeated values exercise the handling of ties
+                    data = numpy.random.randint(0, 8, (5, nChannels))
+                    data = data.astype(numpy.float64)
+                    result = self.median.medfilt1d_stack(data, width,
+                                                         conditional,
+                                                         nthreads=2,
+                                                         blocksize=2)
+                    for i in range(data.shape[0]):
+                        expected = self.referenceMedian1D(data[i], width,
+                                                          conditional)
+                        self.assertTrue(numpy.array_equal(result[i],
+                                                          expected))
+
+    def testMedianStack1DAxis(self):
+        self.testMedianImport()
+        numpy.random.seed(1)
+        stack = numpy.random.random((6, 7, 64)).astype(numpy.float32)
+        for axis in [0, 1, 2]:
+            result = self.median.medfilt1d_stack(stack, 11, axis=axis)
+            self.assertEqual(result.dtype, stack.dtype)
+            expected = numpy.apply_along_axis(self.referenceMedian1D,
+                                              axis, stack, 11)
+            self.assertTrue(numpy.array_equal(result, expected))
+        # integer data and in place operation
+        data = (stack * 1000).astype(numpy.uint16)
+        expected = numpy.apply_along_axis(self.referenceMedian1D,
+                                          2, data, 11)
+        self.median.medfilt1d_stack(data, 11, output=data)
+        self.assertTrue(numpy.array_equal(data, expected))
+
+    def testMedianStack2D(self):
+        self.testMedianImport()
+        numpy.random.seed(2)
+        stack = numpy.random.random((5, 20, 30))
+        result = self.median.medfilt2d_stack(stack, [3, 5], conditional=1)
+        for i in range(stack.shape[0]):
+            expected = self.median.medfilt2d(stack[i], [3, 5], conditional=1)
+            self.assertTrue(numpy.array_equal(result[i], expected))
+        stack2 = numpy.ascontiguousarray(numpy.rollaxis(stack, 0, 3))
+        result2 = self.median.medfilt2d_stack(stack2, [3, 5],
+                                              conditional=1, axis=-1)
+        self.assertTrue(numpy.array_equal(numpy.rollaxis(result2, 2),
+                                          result))
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testMedianFilter))
+    else:
+        # use a predefined order
+        testSuite.addTest(testMedianFilter("testMedianImport"))
+        testSuite.addTest(testMedianFilter("testMedianStack1D"))
+        testSuite.addTest(testMedianFilter("testMedianStack1DAxis"))
+        testSuite.addTest(testMedianFilter("testMedianStack2D"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
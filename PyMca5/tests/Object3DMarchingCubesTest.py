@@ -0,0 +1,121 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import numpy
+
+class testObject3DMarchingCubes(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.Object3D import Object3DMarchingCubes
+            self._module = Object3DMarchingCubes
+        except:
+            self._module = None
+
+    def testObject3DMarchingCubesImport(self):
+        #"""Test successful import"""
+        self.assertTrue(self._module is not None,
+                        "Unsuccessful PyMca5.Object3D.Object3DMarchingCubes import")
+
+    def testObject3DMarchingCubesSphere(self):
+        self.testObject3DMarchingCubesImport()
+        x = numpy.linspace(-1.0, 1.0, 41)
+        y = numpy.linspace(-1.2, 1.2, 45)
+        z = numpy.linspace(-1.0, 1.0, 31)
+        values = (x[:, None, None] ** 2 + y[None, :, None] ** 2 + \
+                  z[None, None, :] ** 2).astype(numpy.float32)
+        vertices, normals, indices = self._module.marchingCubes(values, 0.5,
+                                                    x, y, z, nThreads=1)
+        self.assertEqual(vertices.dtype, numpy.float32)
+        self.assertEqual(normals.shape, vertices.shape)
+        self.assertEqual(indices.dtype, numpy.uint32)
+        self.assertTrue(indices.max() < vertices.shape[0])
+        # closed surface without duplicated vertices
+        self.assertEqual(vertices.shape[0] - indices.shape[0] // 2, 2)
+        radius = numpy.sqrt((vertices * vertices).sum(axis=1))
+        self.assertTrue(numpy.abs(radius - numpy.sqrt(0.5)).max() < 0.02)
+        # normals along the gradient
+        cosine = (normals * vertices).sum(axis=1) / radius
+        self.assertTrue(cosine.min() > 0.95)
+
+        # same triangles in several threads
+        result = self._module.marchingCubes(values, 0.5, x, y, z, nThreads=3)
+        self.assertEqual(result[2].shape, indices.shape)
+        triangles = numpy.sort(vertices[indices].reshape(-1, 9), axis=0)
+        expected = numpy.sort(result[0][result[2]].reshape(-1, 9), axis=0)
+        self.assertTrue(numpy.allclose(triangles, expected))
+
+        # preview
+        preview = self._module.marchingCubes(values, 0.5, x, y, z, step=4)
+        self.assertTrue(0 < preview[2].shape[0] < indices.shape[0] // 8)
+        radius = numpy.sqrt((preview[0] * preview[0]).sum(axis=1))
+        self.assertTrue(numpy.abs(radius - numpy.sqrt(0.5)).max() < 0.2)
+
+        # nothing to be found
+        result = self._module.marchingCubes(values, 10.0)
+        self.assertEqual(result[2].shape, (0, 3))
+
+    def testObject3DMarchingCubesCache(self):
+        self.testObject3DMarchingCubesImport()
+        values = numpy.random.random((10, 11, 12)).astype(numpy.float32)
+        cache = self._module.IsosurfaceCache(maxSize=2)
+        surface = cache.getIsosurface(values, 0.5)
+        self.assertTrue(cache.getIsosurface(values, 0.5) is surface)
+        self.assertTrue(cache.getIsosurface(values, 0.5, step=2) is not surface)
+        self.assertTrue(cache.getKey(values, 0.5) in cache)
+        cache.getIsosurface(values, 0.25)
+        self.assertEqual(len(cache), 2)
+        # the least recently used surface is discarded
+        self.assertFalse(cache.getKey(values, 0.5) in cache)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testObject3DMarchingCubes))
+    else:
+        # use a predefined order
+        testSuite.addTest(testObject3DMarchingCubes("testObject3DMarchingCubesImport"))
+        testSuite.addTest(testObject3DMarchingCubes("testObject3DMarchingCubesSphere"))
+        testSuite.addTest(testObject3DMarchingCubes("testObject3DMarchingCubesCache"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,160 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import numpy
+
+class testPlot(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.PyMcaGraph import Plot
+            self._module = Plot
+        except:
+            self._module = None
+
+    def testPlotImport(self):
+        #"""Test successful import"""
+        self.assertTrue(self._module is not None,
+                        "Unsuccessful PyMca5.PyMcaGraph.Plot import")
+
+    def testPlotUpdateCurveData(self):
+        self.testPlotImport()
+        from PyMca5.PyMcaGraph import PlotBackend
+
+        class RecordingBackend(PlotBackend.PlotBackend):
+            def __init__(self, parent=None):
+                PlotBackend.PlotBackend.__init__(self, parent)
+                self.curves = {}
+                self.nAdded = 0
+                self.nUpdated = 0
+                self.nResetZoom = 0
+                self.inPlace = True
+                self.requests = []
+
+            def addCurve(self, x, y, legend, info=None, **kw):
+                self.curves[legend] = (x, y, kw["color"])
+                self.nAdded += 1
+                return legend
+
+            def updateCurveData(self, handle, x, y, replot=True):
+                if not self.inPlace:
+                    return False
+                self.curves[handle] = (x, y, self.curves[handle][2])
+                self.nUpdated += 1
+                return True
+
+            def removeCurve(self, handle, replot=True):
+                self.curves.pop(handle, None)
+
+            def clearCurves(self):
+                self.curves = {}
+
+            def requestReplot(self, callback):
+                # delayed until the test calls it
+                self.requests.append(callback)
+
+            def resetZoom(self, dataMargins=None):
+                self.nResetZoom += 1
+
+            def replot(self):
+                pass
+
+        backend = RecordingBackend()
+        plot = self._module.Plot(backend=backend)
+        x = numpy.arange(100.)
+        plot.addCurve(x, x * 2, legend="a", replot=False)
+        plot.addCurve(x, x * 3, legend="b", replot=False)
+        color = backend.curves["a"][2]
+        self.assertEqual(backend.nAdded, 2)
+        self.assertEqual(plot._getAllLimits(), (0., 0., 99., 297.))
+
+        # several updates give a single zoom reset
+        for i in range(5):
+            plot.updateCurveData("a", x, x * (10 + i))
+        self.assertEqual(backend.nAdded, 2)
+        self.assertEqual(backend.nUpdated, 5)
+        self.assertEqual(len(backend.requests), 1)
+        backend.requests.pop()()
+        self.assertEqual(backend.nResetZoom, 1)
+        self.assertEqual(plot._getAllLimits(), (0., 0., 99., 99. * 14))
+        self.assertTrue(numpy.array_equal(plot.getCurve("a")[1], x * 14))
+        self.assertEqual(plot.getCurve("a")[3]["plot_color"], color)
+
+        # appending updates the limits from the new points only
+        plot.appendCurveData("b", [100., 101.], [-5., 1000.], replot=False)
+        self.assertEqual(backend.curves["b"][0].size, 102)
+        self.assertEqual(plot._getAllLimits(), (0., -5., 101., 1386.))
+        self.assertEqual(plot._curveLimits["b"], (0., -5., 101., 1000.))
+
+        # the attributes are kept if the backend cannot update in place
+        backend.inPlace = False
+        info = {"extra": 1}
+        plot.updateCurveData("a", x[:10], x[:10], info=info, replot=False)
+        self.assertEqual(backend.curves["a"][2], color)
+        self.assertTrue(plot.getCurve("a")[3] is info)
+        self.assertEqual(info["plot_color"], color)
+        self.assertEqual(backend.curves["a"][0].size, 10)
+
+        # a call to addCurve only changing the data can use the fast path
+        self.assertTrue(plot._isCurveDataUpdate("a", x, x))
+        self.assertTrue(plot._isCurveDataUpdate("a", x, x,
+                                                info={"plot_color": color}))
+        # without color addCurve would give a new one
+        self.assertFalse(plot._isCurveDataUpdate("a", x, x, info={}))
+        self.assertFalse(plot._isCurveDataUpdate("a", x, x, color="red"))
+        self.assertFalse(plot._isCurveDataUpdate("a", x, x, yaxis="right"))
+        self.assertFalse(plot._isCurveDataUpdate("c", x, x))
+
+        # a new curve is added
+        plot.updateCurveData("c", x, x, replot=False)
+        self.assertEqual(backend.nAdded, 4)
+        self.assertTrue("c" in backend.curves)
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testPlot))
+    else:
+        # use a predefined order
+        testSuite.addTest(testPlot("testPlotImport"))
+        testSuite.addTest(testPlot("testPlotUpdateCurveData"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,207 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import copy
+import numpy
+from math import exp, log
+
+ATOMIC_SHELLS = ['M5', 'M4', 'M3', 'M2', 'M1', 'L3', 'L2', 'L1', 'K']
+
+class testPyMcaEPDL97(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.PyMcaPhysics.xrf import PyMcaEPDL97
+            self._module = PyMcaEPDL97
+        except:
+            self._module = None
+
+    def referenceCrossSections(self, element, x, binding=None,
+                               forced_shells=None):
+        # energy by energy evaluation as done before getCrossSectionsArray
+        if forced_shells is None:
+            forced_shells = []
+        if binding is None:
+            binding = self._module.EPDL97_DICT[element]['binding']
+        self._module._initializeElement(element)
+        wdata = self._module.EPDL97_DICT[element]['EPDL97']
+        xdata = wdata['energy']
+        ddict = {}
+        for key in ['coherent', 'compton', 'pair', 'all other'] + \
+                   ATOMIC_SHELLS + ['photo', 'total']:
+            ddict[key] = 0.0
+        j0 = numpy.max(numpy.nonzero(xdata < x))
+        j1 = j0 + 1
+        x0 = xdata[j0]
+        x1 = xdata[j1]
+        if (x == x1) and ((j1 + 1) < len(xdata)) and (x1 == xdata[j1 + 1]):
+            j0 = j1
+            j1 += 1
+            x0 = xdata[j0]
+            x1 = xdata[j1]
+        for key in ['coherent', 'compton', 'pair', 'all other']:
+            y0 = wdata[key][j0]
+            y1 = wdata[key][j1]
+            if ((x1 - x0) < 5.E-10) or ((x1 - x) < 5.E-10):
+                ddict[key] = y1
+            elif (y0 > 0) and (y1 > 0):
+                ddict[key] = exp((log(y0) * log(x1 / x) + \
+                                  log(y1) * log(x / x0)) / log(x1 / x0))
+            elif (y1 > 0) and ((x - x0) > 1.E-5):
+                ddict[key] = exp((log(y1) * log(x / x0)) / log(x1 / x0))
+        for key in ATOMIC_SHELLS:
+            y0 = wdata[key][j0]
+            if (y0 > 0.0) and (x >= binding[key]):
+                y1 = wdata[key][j1]
+                if ((x1 - x0) < 5.E-10) or ((x1 - x) < 5.E-10):
+                    ddict[key] = y1
+                else:
+                    ddict[key] = exp((log(y0) * log(x1 / x) + \
+                                      log(y1) * log(x / x0)) / log(x1 / x0))
+            elif (key in forced_shells) or (x >= binding[key]):
+                l = numpy.nonzero(wdata[key] > 0.0)[0]
+                if not len(l):
+                    continue
+                j00 = l[0]
+                x00 = xdata[j00]
+                x01 = xdata[j00 + 1]
+                y0 = wdata[key][j00]
+                y1 = wdata[key][j00 + 1]
+                ddict[key] = exp((log(y0) * log(x01 / x) + \
+                                  log(y1) * log(x / x00)) / log(x01 / x00))
+        for key in ['all other'] + ATOMIC_SHELLS:
+            ddict['photo'] += ddict[key]
+        for key in ['coherent', 'compton', 'photo']:
+            ddict['total'] += ddict[key]
+        return ddict
+
+    def getEnergies(self, elements):
+        # both sides of the binding energies and of the tabulated edges
+        energies = list(numpy.linspace(1.5, 90.0, 60))
+        for element in elements:
+            self._module._initializeElement(element)
+            xdata = self._module.EPDL97_DICT[element]['EPDL97']['energy']
+            binding = self._module.EPDL97_DICT[element]['binding']
+            for key in ATOMIC_SHELLS:
+                edge = binding[key]
+                if edge > 1.1:
+                    energies.extend([edge - 1.0e-3, edge, edge + 1.0e-3])
+            repeated = xdata[1:][xdata[1:] == xdata[:-1]]
+            for edge in repeated:
+                if edge > 1.1:
+                    energies.extend([edge * 0.999, edge, edge * 1.001])
+        energies.sort()
+        return numpy.array(energies)
+
+    def checkArray(self, values, element, energies, binding=None,
+                   forced_shells=None):
+        keys = self._module._KEYS + ['photo', 'total']
+        for j, x in enumerate(energies):
+            expected = self.referenceCrossSections(element, x,
+                                            binding=binding,
+                                            forced_shells=forced_shells)
+            for i, key in enumerate(keys):
+                self.assertTrue(abs(values[i, j] - expected[key]) <= \
+                                1.0e-10 * abs(expected[key]),
+                                "%s %s at %f keV: got %g expected %g" % \
+                                (element, key, x, values[i, j],
+                                 expected[key]))
+
+    def testPyMcaEPDL97Import(self):
+        self.assertTrue(self._module is not None)
+
+    def testCrossSectionsArray(self):
+        self.testPyMcaEPDL97Import()
+        elements = ["Si", "Fe", "Cu", "Ag", "Pb"]
+        energies = self.getEnergies(elements)
+        values = self._module.getCrossSectionsArray(elements, energies)
+        self.assertEqual(values.shape, (len(elements),
+                                        len(self._module._KEYS) + 2,
+                                        energies.size))
+        for i, element in enumerate(elements):
+            self.checkArray(values[i], element, energies)
+            # the per element function gives the same values
+            ddict = self._module.getElementCrossSections(element, energies)
+            for k, key in enumerate(self._module._KEYS + ['photo', 'total']):
+                self.assertTrue(numpy.allclose(ddict[key], values[i, k],
+                                               rtol=1.0e-12, atol=0.0))
+        # forced excitation below the edges
+        values = self._module.getCrossSectionsArray(["Pb"], energies,
+                                                    forced_shells=["L3", "K"])
+        self.checkArray(values[0], "Pb", energies, forced_shells=["L3", "K"])
+
+    def testBindingOverride(self):
+        self.testPyMcaEPDL97Import()
+        original = copy.deepcopy(self._module.EPDL97_DICT['Fe']['binding'])
+        binding = copy.deepcopy(original)
+        # K edge moved above and L3 edge moved below the tabulated ones
+        binding['K'] = 7.5
+        binding['L3'] = 0.65
+        energies = numpy.array([1.5, 7.0, 7.1, 7.2, 7.4, 7.5, 7.6, 10.0])
+        values = self._module.getCrossSectionsArray(["Fe", "Fe"], energies,
+                                                    binding=[binding, None])
+        self.checkArray(values[0], "Fe", energies, binding=binding)
+        self.checkArray(values[1], "Fe", energies)
+        k = self._module._KEYS.index('K')
+        # the K shell is only excited above the given binding energy
+        self.assertTrue(numpy.all(values[0, k][energies < 7.5] == 0.0))
+        self.assertTrue(numpy.all(values[0, k][energies >= 7.5] > 0.0))
+        self.assertTrue(numpy.all(values[1, k][energies > 7.2] > 0.0))
+        self.assertTrue(numpy.all(values[0, k][energies >= 7.5] == \
+                                  values[1, k][energies >= 7.5]))
+        # the binding energies of the element are not modified
+        self.assertEqual(self._module.EPDL97_DICT['Fe']['binding'], original)
+        ddict = self._module.getElementCrossSections("Fe", energies,
+                                                     binding=binding)
+        self.assertTrue(numpy.allclose(ddict['K'], values[0, k],
+                                       rtol=1.0e-12, atol=0.0))
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testPyMcaEPDL97))
+    else:
+        # use a predefined order
+        testSuite.addTest(testPyMcaEPDL97("testPyMcaEPDL97Import"))
+        testSuite.addTest(testPyMcaEPDL97("testCrossSectionsArray"))
+        testSuite.addTest(testPyMcaEPDL97("testBindingOverride"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,129 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import os
+import tempfile
+import shutil
+import numpy
+
+class testPyMcaMatplotlibBatchSave(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.PyMcaCore import PyMcaMatplotlibBatchSave
+            self._module = PyMcaMatplotlibBatchSave
+        except:
+            self._module = None
+        self._tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpDir)
+
+    def testPyMcaMatplotlibBatchSaveImport(self):
+        #"""Test successful import"""
+        self.assertTrue(self._module is not None,
+                "Unsuccessful PyMca5.PyMcaCore.PyMcaMatplotlibBatchSave import")
+
+    def testPyMcaMatplotlibBatchSaveReuse(self):
+        self.testPyMcaMatplotlibBatchSaveImport()
+        from matplotlib import image
+        from PyMca5.PyMcaCore import PyMcaMatplotlibSave
+        numpy.random.seed(5)
+        a = numpy.random.random((40, 60))
+        b = numpy.random.random((40, 60)) * 7 + 3
+        config = {"colorbar": "vertical", "colormap": "temperature",
+                  "xaxis": "on", "yaxis": "on", "title": "a"}
+        saver = self._module.PyMcaMatplotlibBatchSaveImage()
+        saver.setParameters(config)
+        saver.setImage(a)
+        saver.saveImage(os.path.join(self._tmpDir, "a.png"))
+        reference = PyMcaMatplotlibSave.PyMcaMatplotlibSaveImage(b)
+        reference.setParameters(config)
+        for ddict in [{"title": "b"},
+                      {"linlogcolormap": "log"},
+                      {"valuemin": 4.0, "valuemax": 6.0},
+                      # limits and zoom do not carry over to the next image
+                      {"xlimits": [10, 30], "ylimits": [5, 20]},
+                      {"xlimits": None, "ylimits": None},
+                      {"zoomxmin": 2, "zoomxmax": 50,
+                       "zoomymin": 0, "zoomymax": 12},
+                      {"zoomxmin": None, "zoomxmax": None,
+                       "zoomymin": None, "zoomymax": None}]:
+            saver.setParameters(ddict)
+            saver.setImage(b)
+            saver.saveImage(os.path.join(self._tmpDir, "reused.png"))
+            reference.setParameters(ddict)
+            reference.saveImage(os.path.join(self._tmpDir, "new.png"))
+            reused = image.imread(os.path.join(self._tmpDir, "reused.png"))
+            new = image.imread(os.path.join(self._tmpDir, "new.png"))
+            self.assertTrue(numpy.array_equal(reused, new),
+                            "Different output for %s" % ddict)
+
+    def testPyMcaMatplotlibBatchSaveImages(self):
+        self.testPyMcaMatplotlibBatchSaveImport()
+        images = [numpy.arange(200.).reshape(10, 20) * i for i in range(1, 4)]
+        names = [os.path.join(self._tmpDir, "image%d" % i) for i in range(3)]
+        written = self._module.saveImages(images, names,
+                        config={"colorbar": "horizontal",
+                                "colormap": "gray"},
+                        configList=[{"title": x} for x in names],
+                        formats=["png", "svg"],
+                        nProcesses=1)
+        self.assertEqual(len(written), 6)
+        for name in names:
+            for ext in ["png", "svg"]:
+                filename = name + "." + ext
+                self.assertTrue(filename in written)
+                self.assertTrue(os.path.getsize(filename) > 0)
+        self.assertRaises(ValueError, self._module.saveImages,
+                          images, names[:2])
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testPyMcaMatplotlibBatchSave))
+    else:
+        # use a predefined order
+        testSuite.addTest(testPyMcaMatplotlibBatchSave("testPyMcaMatplotlibBatchSaveImport"))
+        testSuite.addTest(testPyMcaMatplotlibBatchSave("testPyMcaMatplotlibBatchSaveReuse"))
+        testSuite.addTest(testPyMcaMatplotlibBatchSave("testPyMcaMatplotlibBatchSaveImages"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,142 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import numpy
+
+class testRGBCorrelatorCore(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.PyMcaCore import RGBCorrelatorCore
+            self._module = RGBCorrelatorCore
+        except:
+            self._module = None
+
+    def testRGBCorrelatorCoreImport(self):
+        #"""Test successful import"""
+        self.assertTrue(self._module is not None,
+                        "Unsuccessful PyMca5.PyMcaCore.RGBCorrelatorCore import")
+
+    def testRGBCorrelatorCoreExpression(self):
+        self.testRGBCorrelatorCoreImport()
+        numpy.random.seed(2)
+        a = numpy.random.random((50, 70)) + 0.5
+        b = numpy.random.random((50, 70)) + 0.5
+        core = self._module.RGBCorrelatorCore(blockSize=1000)
+        core.addImage(a, "a")
+        core.addImage(b, "b")
+        result = core.evaluate("numpy.log({1}) * {2} + sqrt({2}) / (2 * pi)")
+        expected = numpy.log(a) * b + numpy.sqrt(b) / (2 * numpy.pi)
+        self.assertEqual(result.shape, a.shape)
+        self.assertTrue(numpy.allclose(result, expected))
+        result = core.evaluate("where({1} > {2}, {1}, {2})", labels=["b", "a"])
+        self.assertTrue(numpy.allclose(result, numpy.maximum(a, b)))
+        # compiled once
+        self.assertTrue(core.compileExpression("{1} + 1") is \
+                        core.compileExpression("{1} + 1"))
+        # non element wise operations are rejected
+        for text in ["{1}.sum()", "sum({1})", "__import__('os')",
+                     "numpy.mean({1})", "{1}[0]", "{1} +"]:
+            self.assertRaises(self._module.ExpressionError,
+                              self._module.ImageExpression, text)
+
+    def testRGBCorrelatorCoreStatistics(self):
+        self.testRGBCorrelatorCoreImport()
+        numpy.random.seed(3)
+        data = numpy.random.random((200, 300))
+        data[0, 0] = numpy.nan
+        core = self._module.RGBCorrelatorCore()
+        core.addImage(data, "data")
+        ddict = core.getStatistics("data")
+        self.assertEqual(ddict["min"], numpy.nanmin(data))
+        self.assertEqual(ddict["max"], numpy.nanmax(data))
+        self.assertEqual(ddict["size"], data.size - 1)
+        width = (ddict["max"] - ddict["min"]) / len(ddict["histogram"])
+        for q in [1, 25, 50, 99]:
+            self.assertTrue(abs(core.getPercentile("data", q) - \
+                                numpy.nanpercentile(data, q)) <= width)
+
+        channel = core.getChannel("data", 0.25, 0.75)
+        self.assertEqual(channel.dtype, numpy.uint8)
+        self.assertEqual(channel[0, 0], 0)
+        expected = numpy.clip((data - 0.25) * (255. / 0.5), 0, 255)
+        diff = numpy.abs(channel[1:].astype(numpy.float64) - expected[1:])
+        self.assertTrue(diff.max() <= 1.0)
+
+        rgb = core.getRGBImage(red=("data", None, None))
+        self.assertEqual(rgb.shape, data.shape + (3,))
+        self.assertEqual(rgb[:, :, 1].max(), 0)
+        self.assertEqual(rgb[:, :, 0].max(), 255)
+
+    def testRGBCorrelatorCoreDensity(self):
+        self.testRGBCorrelatorCoreImport()
+        numpy.random.seed(4)
+        x = numpy.random.normal(0.0, 1.0, (300, 400))
+        y = x + numpy.random.normal(0.0, 0.5, (300, 400))
+        core = self._module.RGBCorrelatorCore(blockSize=10000)
+        core.addImage(x, "x")
+        core.addImage(y, "y")
+        counts, xEdges, yEdges = core.getDensity("x", "y", bins=(40, 30))
+        expected = numpy.histogram2d(x.ravel(), y.ravel(), bins=(40, 30))
+        self.assertTrue(numpy.array_equal(counts, expected[0]))
+        self.assertTrue(numpy.allclose(xEdges, expected[1]))
+        self.assertTrue(numpy.allclose(yEdges, expected[2]))
+        # cached
+        self.assertTrue(core.getDensity("x", "y", bins=(40, 30))[0] is counts)
+        mask = numpy.zeros(x.shape, numpy.uint8)
+        mask[100:200] = 1
+        counts = core.getDensity("x", "y", bins=(40, 30), mask=mask)[0]
+        expected = numpy.histogram2d(x[100:200].ravel(), y[100:200].ravel(),
+                                     bins=(xEdges, yEdges))[0]
+        self.assertTrue(numpy.array_equal(counts, expected))
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testRGBCorrelatorCore))
+    else:
+        # use a predefined order
+        testSuite.addTest(testRGBCorrelatorCore("testRGBCorrelatorCoreImport"))
+        testSuite.addTest(testRGBCorrelatorCore("testRGBCorrelatorCoreExpression"))
+        testSuite.addTest(testRGBCorrelatorCore("testRGBCorrelatorCoreStatistics"))
+        testSuite.addTest(testRGBCorrelatorCore("testRGBCorrelatorCoreDensity"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
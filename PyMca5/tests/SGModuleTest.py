@@ -0,0 +1,161 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import numpy
+
+class testSGModule(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.PyMcaMath import SGModule
+            self._module = SGModule
+        except:
+            self._module = None
+
+    def referenceSmooth1D(self, spectrum, npoints, degree, order):
+        # one numpy.convolve call per spectrum, edges as documented
+        coeff = self._module.calc_coeff(npoints, degree, order)
+        N = numpy.size(coeff - 1) // 2
+        result = numpy.array(spectrum, dtype=numpy.float64, copy=True)
+        result[N:-N] = numpy.convolve(result, coeff, mode='valid')
+        if order > 0:
+            result[:N] = result[N]
+            result[-N:] = result[-(N + 1)]
+        return result
+
+    def testSGModuleImport(self):
+        self.assertTrue(self._module is not None)
+
+    def testGetSavitzkyGolay(self):
+        self.testSGModuleImport()
+        numpy.random.seed(0)
+        # short (block path) and long (numpy.convolve path) spectra
+        for nChannels in [50, 2000]:
+            for (npoints, degree, order) in [(3, 2, 0), (5, 3, 1)]:
+                coeff = self._module.calc_coeff(npoints, degree, order)
+                N = numpy.size(coeff - 1) // 2
+                spectrum = numpy.random.random(nChannels)
+                expected = self.referenceSmooth1D(spectrum, npoints,
+                                                  degree, order)
+                if order > 0:
+                    expected[:N] = 0.0
+                    expected[-N:] = 0.0
+                result = self._module.getSavitzkyGolay(spectrum, npoints,
+                                                       degree, order)
+                self.assertTrue(numpy.allclose(result, expected))
+                stack = numpy.random.random((4, 3, nChannels))
+                result = self._module.getSavitzkyGolay(stack, npoints,
+                                                       degree, order)
+                for i in range(stack.shape[0]):
+                    for j in range(stack.shape[1]):
+                        expected = self.referenceSmooth1D(stack[i, j],
+                                                          npoints, degree,
+                                                          order)
+                        if order > 0:
+                            expected[:N] = 0.0
+                            expected[-N:] = 0.0
+                        self.assertTrue(numpy.allclose(result[i, j],
+                                                       expected))
+
+    def testSmoothStack(self):
+        self.testSGModuleImport()
+        numpy.random.seed(1)
+        stack = numpy.random.random((7, 8, 50, 9))
+        for axis in [0, 1, 2, 3, -1]:
+            for (npoints, degree, order) in [(2, 1, 0), (3, 2, 1)]:
+                expected = numpy.apply_along_axis(self.referenceSmooth1D,
+                                                  axis, stack, npoints,
+                                                  degree, order)
+                for blocksize in [None, 7]:
+                    data = stack.copy()
+                    result = self._module.smoothStack(data, npoints, degree,
+                                                      order, axis=axis,
+                                                      blocksize=blocksize)
+                    # in place
+                    self.assertTrue(result is data)
+                    self.assertTrue(numpy.allclose(result, expected))
+
+        # float32 data keep their type
+        data = stack.astype(numpy.float32)
+        expected = numpy.apply_along_axis(self.referenceSmooth1D,
+                                          1, data, 3, 2, 0)
+        self._module.smoothStack(data, 3, 2, 0, axis=1)
+        self.assertEqual(data.dtype, numpy.float32)
+        self.assertTrue(numpy.allclose(data, expected, atol=1.0e-5))
+
+    def testSmoothStackNonContiguous(self):
+        self.testSGModuleImport()
+        numpy.random.seed(2)
+        for axis in [0, 1, 2]:
+            # transposed view of a stack
+            stack = numpy.random.random((8, 60, 9))
+            view = stack.transpose(2, 1, 0)
+            expected = numpy.apply_along_axis(self.referenceSmooth1D,
+                                              axis, view, 3, 2, 1)
+            self._module.smoothStack(view, 3, 2, 1, axis=axis)
+            self.assertTrue(numpy.allclose(view, expected))
+            self.assertTrue(numpy.allclose(stack.transpose(2, 1, 0),
+                                           expected))
+
+            # strided view, the rest of the stack must not change
+            stack = numpy.random.random((16, 60, 9))
+            original = stack.copy()
+            view = stack[::2, ::3, 1:8]
+            expected = numpy.apply_along_axis(self.referenceSmooth1D,
+                                              axis, view, 3, 2, 1)
+            self._module.smoothStack(view, 3, 2, 1, axis=axis)
+            self.assertTrue(numpy.allclose(stack[::2, ::3, 1:8], expected))
+            mask = numpy.ones(stack.shape, dtype=numpy.bool_)
+            mask[::2, ::3, 1:8] = False
+            self.assertTrue(numpy.array_equal(stack[mask], original[mask]))
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testSGModule))
+    else:
+        # use a predefined order
+        testSuite.addTest(testSGModule("testSGModuleImport"))
+        testSuite.addTest(testSGModule("testGetSavitzkyGolay"))
+        testSuite.addTest(testSGModule("testSmoothStack"))
+        testSuite.addTest(testSGModule("testSmoothStackNonContiguous"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
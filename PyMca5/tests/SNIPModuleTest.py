@@ -0,0 +1,201 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import numpy
+
+class testSNIPModule(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.PyMcaMath import SNIPModule
+            self._module = SNIPModule
+        except:
+            self._module = None
+
+    def getStack(self, shape, seed=0):
+        # smooth background plus random peaks
+        numpy.random.seed(seed)
+        grids = numpy.meshgrid(*[numpy.linspace(0.0, 1.0, n) for n in shape],
+                               indexing="ij")
+        data = 100.0 + 50.0 * grids[0] + 20.0 * grids[1] * grids[2]
+        data += 200.0 * (numpy.random.random(shape) > 0.97)
+        data += numpy.random.random(shape)
+        return data
+
+    def testSNIPModuleImport(self):
+        self.assertTrue(self._module is not None)
+
+    def testSnip1DStack(self):
+        self.testSNIPModuleImport()
+        stack = self.getStack((4, 5, 80))
+        expected = numpy.zeros(stack.shape)
+        for i in range(stack.shape[0]):
+            for j in range(stack.shape[1]):
+                expected[i, j] = self._module.snip1d(stack[i, j], 10, 2)
+        # no region of interest
+        data = stack.copy()
+        self._module.replaceStackWithSnip1DBackground(data, 10, roi_max=None,
+                                                      smoothing=2)
+        self.assertTrue(numpy.allclose(data, expected))
+        data = stack.copy()
+        self._module.subtractSnip1DBackgroundFromStack(data, 10,
+                                                       smoothing=2)
+        self.assertTrue(numpy.allclose(data, stack - expected))
+
+    def testSnip2DStack(self):
+        self.testSNIPModuleImport()
+        stack = self.getStack((6, 30, 40), seed=1)
+        for index in [0, 1, 2]:
+            data = numpy.ascontiguousarray(numpy.rollaxis(stack, 0,
+                                                          index + 1))
+            self.assertEqual(data.shape[index], 6)
+            for (roi_min, roi_max) in [(None, None), ((0, 0), None),
+                                       ((3, 5), (25, 37))]:
+                # per image reference
+                expected = data.copy()
+                for i in range(6):
+                    key = [slice(None), slice(None)]
+                    key.insert(index, i)
+                    key = tuple(key)
+                    expected[key] = self._module.getImageBackground(\
+                                            data[key], 6, roi_min=roi_min,
+                                            roi_max=roi_max, smoothing=1)
+                for nthreads in [1, 3]:
+                    output = numpy.zeros(data.shape)
+                    result = self._module.snip2DStack(data, 6,
+                                                      roi_min=roi_min,
+                                                      roi_max=roi_max,
+                                                      index=index,
+                                                      output=output,
+                                                      nthreads=nthreads)
+                    self.assertTrue(result is output)
+                    self.assertTrue(numpy.allclose(output, expected))
+                # in place subtraction, data outside the region of interest
+                # are not modified
+                work = data.copy()
+                self._module.subtractSnip2DBackgroundFromStack(work, 6,
+                                                        roi_min=roi_min,
+                                                        roi_max=roi_max,
+                                                        index=index,
+                                                        nthreads=2)
+                inside = numpy.zeros(data.shape, dtype=numpy.bool_)
+                if roi_max is None:
+                    inside[:] = True
+                else:
+                    roi = [slice(roi_min[0], roi_max[0]),
+                           slice(roi_min[1], roi_max[1])]
+                    roi.insert(index, slice(None))
+                    inside[tuple(roi)] = True
+                self.assertTrue(numpy.array_equal(work[~inside],
+                                                  data[~inside]))
+                self.assertTrue(numpy.allclose(work[inside],
+                                               (data - expected)[inside]))
+
+    def testSnip3DSymmetry(self):
+        self.testSNIPModuleImport()
+        volume = self.getStack((12, 14, 16), seed=2)
+        background = self._module.snip3d(volume, 3, 1)
+        self.assertEqual(background.shape, volume.shape)
+        # the SNIP clipping does not depend on the direction of the axes
+        for axis in [0, 1, 2]:
+            flipped = numpy.ascontiguousarray(numpy.flip(volume, axis))
+            result = self._module.snip3d(flipped, 3, 1)
+            self.assertTrue(numpy.allclose(numpy.flip(result, axis),
+                                           background))
+
+    def testSnip3DStack(self):
+        self.testSNIPModuleImport()
+        volume = self.getStack((20, 12, 14), seed=3)
+        for (roi_min, roi_max) in [(None, None), ((0, 0, 0), None),
+                                   ((2, 1, 3), (17, 11, 12))]:
+            if roi_min is None:
+                roi_min0 = (0, 0, 0)
+            else:
+                roi_min0 = roi_min
+            if roi_max is None:
+                roi_max0 = volume.shape
+            else:
+                roi_max0 = roi_max
+            roi = tuple([slice(roi_min0[i], roi_max0[i]) for i in range(3)])
+            # whole region of interest processed at once
+            expected = volume.copy()
+            expected[roi] = self._module.snip3d(volume[roi], 3, 1)
+            for (nthreads, tilesize) in [(1, None), (3, None), (2, 2)]:
+                output = numpy.zeros(volume.shape)
+                result = self._module.snip3DStack(volume, 3, roi_min=roi_min,
+                                                  roi_max=roi_max,
+                                                  output=output,
+                                                  nthreads=nthreads,
+                                                  tilesize=tilesize)
+                self.assertTrue(result is output)
+                self.assertTrue(numpy.allclose(output, expected))
+                # in place
+                data = volume.copy()
+                self._module.snip3DStack(data, 3, roi_min=roi_min,
+                                         roi_max=roi_max, nthreads=nthreads,
+                                         tilesize=tilesize)
+                self.assertTrue(numpy.allclose(data, expected))
+            # subtraction leaves the data outside the region of interest
+            data = volume.copy()
+            self._module.subtractSnip3DBackgroundFromStack(data, 3,
+                                                           roi_min=roi_min,
+                                                           roi_max=roi_max,
+                                                           nthreads=2)
+            inside = numpy.zeros(volume.shape, dtype=numpy.bool_)
+            inside[roi] = True
+            self.assertTrue(numpy.array_equal(data[~inside],
+                                              volume[~inside]))
+            self.assertTrue(numpy.allclose(data[inside],
+                                           (volume - expected)[inside]))
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testSNIPModule))
+    else:
+        # use a predefined order
+        testSuite.addTest(testSNIPModule("testSNIPModuleImport"))
+        testSuite.addTest(testSNIPModule("testSnip1DStack"))
+        testSuite.addTest(testSNIPModule("testSnip2DStack"))
+        testSuite.addTest(testSNIPModule("testSnip3DSymmetry"))
+        testSuite.addTest(testSNIPModule("testSnip3DStack"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
@@ -200,6 +200,66 @@ def testStackBaseStack2DDataHandling(self):
         dummyArray = None
         referenceData = None
 
+    def testStackBaseIncrementalSelection(self):
+        from PyMca5.PyMcaCore import StackBase
+        from PyMca5.PyMcaCore import StackSelectionSum
+        nrows = 40
+        ncolumns = 30
+        nchannels = 64
+        referenceData = numpy.random.poisson(10,
+                        (nrows, ncolumns, nchannels)).astype(numpy.float64)
+        masks = []
+        mask = numpy.zeros((nrows, ncolumns), numpy.uint8)
+        mask[5:10, 5:20] = 1
+        masks.append(mask.copy())
+        # brush stroke
+        mask[10:12, 10:14] = 1
+        masks.append(mask.copy())
+        # erase
+        mask[5:7, :] = 0
+        masks.append(mask.copy())
+        # more than half of the image
+        mask[:, :] = 1
+        mask[30:, 20:] = 0
+        masks.append(mask.copy())
+        mask[:, :] = 0
+        masks.append(mask.copy())
+        mask[0, 0] = 1
+        masks.append(mask.copy())
+
+        for mcaindex in [0, 1, 2]:
+            data = numpy.rollaxis(referenceData, 2, mcaindex).copy()
+            stackBase = StackBase.StackBase()
+            stackBase.setStack(data, mcaindex=mcaindex)
+            for mask in masks:
+                stackBase.setSelectionMask(mask)
+                mcaDataObject = stackBase.calculateMcaDataObject()
+                if mask.sum():
+                    maskedMca = referenceData[mask > 0, :].sum(axis=0)
+                else:
+                    maskedMca = referenceData.sum(axis=0).sum(axis=0)
+                self.assertTrue(numpy.allclose(mcaDataObject.y[0], maskedMca),
+                    "Incorrect incremental mca for mca index %d" % mcaindex)
+
+        # a cancelled calculation does not modify the stored sum
+        selectionSum = StackSelectionSum.StackSelectionSum(referenceData,
+                                                           batchSize=nchannels)
+        selectionSum.update(masks[0])
+        selectionSum.startUpdate(masks[3])
+        selectionSum.cancel()
+        selectionSum.wait()
+        current = selectionSum.getMask()
+        self.assertTrue(numpy.array_equal(current, masks[0] > 0) or \
+                        numpy.array_equal(current, masks[3] > 0),
+                        "Cancelled calculation corrupted the stored mask")
+        self.assertTrue(numpy.allclose(selectionSum.getSum(),
+                                referenceData[current, :].sum(axis=0)),
+                        "Cancelled calculation corrupted the stored sum")
+        selectionSum.startUpdate(masks[1])
+        self.assertTrue(numpy.allclose(selectionSum.getSum(masks[1]),
+                                referenceData[masks[1] > 0, :].sum(axis=0)),
+                        "Incorrect sum from background calculation")
+
 def getSuite(auto=True):
     testSuite = unittest.TestSuite()
     if auto:
@@ -210,6 +270,7 @@ def getSuite(auto=True):
         testSuite.addTest(testStackBase("testStackBaseImport"))
         testSuite.addTest(testStackBase("testStackBaseStack1DDataHandling"))
         testSuite.addTest(testStackBase("testStackBaseStack2DDataHandling"))
+        testSuite.addTest(testStackBase("testStackBaseIncrementalSelection"))
     return testSuite
 
 def test(auto=False):
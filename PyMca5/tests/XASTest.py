@@ -0,0 +1,117 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import numpy
+
+class testXAS(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.PyMcaPhysics.xas import XASClass
+            self.xas = XASClass
+        except:
+            self.xas = None
+
+    def getSpectrum(self, npoints=700, phase=0.0):
+        k = numpy.linspace(0.0, 16.0, npoints)
+        mu = 1.0 + 0.02 * k + \
+             0.3 * numpy.sin(2 * k + phase) * numpy.exp(-0.05 * k * k)
+        return k, mu
+
+    def testXASImport(self):
+        self.assertTrue(self.xas is not None)
+
+    def testPolsplMatrix(self):
+        self.testXASImport()
+        k, mu = self.getSpectrum()
+        for degrees in [(3,), (3, 3), (3, 3, 3), (2, 4, 3, 3)]:
+            nr = len(degrees)
+            xl = numpy.zeros(10)
+            xh = numpy.zeros(10)
+            nc = numpy.zeros(10, numpy.int32)
+            xl[1:nr + 1] = numpy.linspace(2.0, 15.0, nr + 1)[:-1]
+            xh[1:nr + 1] = numpy.linspace(2.0, 15.0, nr + 1)[1:]
+            nc[1:nr + 1] = numpy.array(degrees) + 1
+            goodi = (k >= 2.0) & (k <= 15.0)
+            npts = goodi.sum()
+            xx = numpy.zeros(npts + 1)
+            yy = numpy.zeros(npts + 1)
+            xx[1:] = k[goodi]
+            yy[1:] = mu[goodi]
+            w = numpy.ones(npts + 1)
+            reference = self.xas.polspl(xx, yy, w, npts,
+                                        xl * 1, xh * 1, nr, nc)
+            c = self.xas.polspl_matrix(xx[1:], yy[1:], w[1:],
+                                       xl, xh, nr, nc)
+            ncoef = nc.sum() + 1
+            self.assertTrue(numpy.allclose(c[:ncoef], reference[:ncoef]))
+
+            # several spectra at once give the same coefficients
+            y2 = numpy.array([yy[1:], 2 * yy[1:]]).T
+            c2 = self.xas.polspl_matrix(xx[1:], y2, w[1:], xl, xh, nr, nc)
+            self.assertTrue(numpy.allclose(c2[:, 0], c))
+            self.assertTrue(numpy.allclose(c2[:, 1], 2 * c))
+
+    def testPostEdgeOperatorReuse(self):
+        self.testXASImport()
+        self.xas._POLSPL_OPERATORS.clear()
+        k, mu = self.getSpectrum()
+        fit0 = self.xas.postEdge0(k, mu, 2.0, 15.0, (3, 3, 3))
+        self.assertEqual(len(self.xas._POLSPL_OPERATORS), 1)
+        k, mu2 = self.getSpectrum(phase=0.3)
+        fit1 = self.xas.postEdge0(k, mu2, 2.0, 15.0, (3, 3, 3))
+        self.assertEqual(len(self.xas._POLSPL_OPERATORS), 1)
+        self.xas._POLSPL_OPERATORS.clear()
+        fit2 = self.xas.postEdge0(k, mu2, 2.0, 15.0, (3, 3, 3))
+        self.assertTrue(numpy.allclose(fit1, fit2))
+        self.assertFalse(numpy.allclose(fit0, fit1))
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testXAS))
+    else:
+        # use a predefined order
+        testSuite.addTest(testXAS("testXASImport"))
+        testSuite.addTest(testXAS("testPolsplMatrix"))
+        testSuite.addTest(testXAS("testPostEdgeOperatorReuse"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,196 @@
+#/*##########################################################################
+#
+# The PyMca X-Ray Fluorescence Toolkit
+#
+# Copyright (c) 2004-2017 European Synchrotron Radiation Facility
+#
+# This file is part of the PyMca X-ray Fluorescence Toolkit developed at
+# the ESRF by the Software group.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#############################################################################*/
+__author__ = "V. Armando Sole - ESRF Data Analysis"
+__contact__ = "sole@esrf.fr"
+__license__ = "MIT"
+__copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
+import unittest
+import numpy
+
+class testXRayTubeEbel(unittest.TestCase):
+    def setUp(self):
+        """
+        import the module
+        """
+        try:
+            from PyMca5.PyMcaPhysics.xrf import XRayTubeEbel
+            from PyMca5.PyMcaPhysics.xrf import Elements
+            self._module = XRayTubeEbel
+            self._elements = Elements
+        except:
+            self._module = None
+        else:
+            self._module.clearCache()
+
+    def tearDown(self):
+        if self._module is not None:
+            self._module.clearCache()
+
+    def testXRayTubeEbelImport(self):
+        self.assertTrue(self._module is not None)
+
+    def testContinuumBatch(self):
+        self.testXRayTubeEbelImport()
+        # energies above the tube voltage give NaN in both cases
+        energy = numpy.linspace(1.0, 39.0, 77)
+        voltages = [20.0, 30.0, 40.0]
+        thicknesses = [0.0125, 0.025, 0.05]
+        kw = {"alphae": 70.0, "alphax": 50.0,
+              "filterlist": [["Al", 2.7, 0.002]]}
+        result = self._module.continuumEbelBatch("Ag", voltages, energy,
+                                                 ["Be", 1.848, 0.0],
+                                                 windowthickness=thicknesses,
+                                                 **kw)
+        self.assertEqual(result.shape, (3, energy.size))
+        for i in range(3):
+            expected = self._module.continuumEbel("Ag", voltages[i], energy,
+                                                  ["Be", 1.848,
+                                                   thicknesses[i]], **kw)
+            self.assertTrue(numpy.allclose(result[i], expected,
+                                           rtol=1.0e-10, atol=0.0,
+                                           equal_nan=True))
+        # without window thicknesses one row per voltage
+        window = ["Be", 1.848, 0.0125]
+        result = self._module.continuumEbelBatch(["W", 19.3, 0.1], voltages,
+                                                 energy, window, **kw)
+        self.assertEqual(result.shape, (3, energy.size))
+        for i in range(3):
+            expected = self._module.continuumEbel(["W", 19.3, 0.1],
+                                                  voltages[i], energy,
+                                                  window, **kw)
+            self.assertTrue(numpy.allclose(result[i], expected,
+                                           rtol=1.0e-10, atol=0.0,
+                                           equal_nan=True))
+
+    def testGenerateListsBatch(self):
+        self.testXRayTubeEbelImport()
+        voltages = [25.0, 45.0]
+        thicknesses = [0.0125, 0.05]
+        output = self._module.generateListsBatch("Rh", voltages,
+                                                 ["Be", 1.848, 0.0],
+                                                 alphae=90.0, alphax=45.0,
+                                                 windowthickness=thicknesses)
+        self.assertEqual(len(output), 2)
+        for i in range(2):
+            expected = self._module.generateLists("Rh", voltages[i],
+                                                  ["Be", 1.848,
+                                                   thicknesses[i]],
+                                                  alphae=90.0, alphax=45.0)
+            for j in range(3):
+                self.assertTrue(numpy.array_equal(output[i][j],
+                                                  expected[j]))
+
+    def testCacheCopies(self):
+        self.testXRayTubeEbelImport()
+        energy = numpy.linspace(1.0, 29.0, 29)
+        window = ["Be", 1.848, 0.0125]
+        first = self._module.continuumEbel("Mo", 30.0, energy, window)
+        expected = first.copy()
+        info = self._module.getCacheInfo()
+        self.assertEqual(info["misses"], 1)
+        self.assertEqual(info["hits"], 0)
+        # modifying the returned values does not modify the cache
+        first[:] = 0.0
+        second = self._module.continuumEbel("Mo", 30.0, energy, window)
+        self.assertTrue(numpy.array_equal(second, expected))
+        second[:] = -1.0
+        third = self._module.continuumEbel("Mo", 30.0, energy, window)
+        self.assertTrue(numpy.array_equal(third, expected))
+        info = self._module.getCacheInfo()
+        self.assertEqual(info["misses"], 1)
+        self.assertEqual(info["hits"], 2)
+        self.assertEqual(info["size"], 1)
+
+        lists = self._module.generateLists("Mo", 30.0, window)
+        expected = [x.copy() for x in lists]
+        for x in lists:
+            x[:] = 0
+        lists = self._module.generateLists("Mo", 30.0, window)
+        for j in range(3):
+            self.assertTrue(numpy.array_equal(lists[j], expected[j]))
+
+        self._module.clearCache()
+        info = self._module.getCacheInfo()
+        self.assertEqual((info["hits"], info["misses"], info["size"]),
+                         (0, 0, 0))
+
+    def testMaterialRedefinition(self):
+        self.testXRayTubeEbelImport()
+        energy = numpy.linspace(1.0, 39.0, 39)
+        name = "XRayTubeEbelTestWindow"
+        self._elements.Material[name] = {"Density": 2.0,
+                                         "Thickness": 0.01,
+                                         "CompoundList": ["Be"],
+                                         "CompoundFraction": [1.0],
+                                         "Comment": "Test window"}
+        try:
+            window = [name, 2.0, 0.01]
+            beryllium = self._module.continuumEbel("Ag", 40.0, energy,
+                                                   window)
+            self.assertTrue(numpy.allclose(beryllium,
+                                self._module.continuumEbel("Ag", 40.0, energy,
+                                                           ["Be", 2.0, 0.01])))
+            # same name, different composition
+            self._elements.Material[name] = {"Density": 2.0,
+                                             "Thickness": 0.01,
+                                             "CompoundList": ["Al"],
+                                             "CompoundFraction": [1.0],
+                                             "Comment": "Test window"}
+            misses = self._module.getCacheInfo()["misses"]
+            aluminium = self._module.continuumEbel("Ag", 40.0, energy,
+                                                   window)
+            # the previous result is not used
+            self.assertEqual(self._module.getCacheInfo()["misses"],
+                             misses + 1)
+            expected = self._module.continuumEbel("Ag", 40.0, energy,
+                                                  ["Al", 2.0, 0.01])
+            self.assertTrue(numpy.allclose(aluminium, expected))
+            self.assertFalse(numpy.allclose(aluminium, beryllium))
+        finally:
+            del self._elements.Material[name]
+
+def getSuite(auto=True):
+    testSuite = unittest.TestSuite()
+    if auto:
+        testSuite.addTest(\
+            unittest.TestLoader().loadTestsFromTestCase(testXRayTubeEbel))
+    else:
+        # use a predefined order
+        testSuite.addTest(testXRayTubeEbel("testXRayTubeEbelImport"))
+        testSuite.addTest(testXRayTubeEbel("testContinuumBatch"))
+        testSuite.addTest(testXRayTubeEbel("testGenerateListsBatch"))
+        testSuite.addTest(testXRayTubeEbel("testCacheCopies"))
+        testSuite.addTest(testXRayTubeEbel("testMaterialRedefinition"))
+    return testSuite
+
+def test(auto=False):
+    unittest.TextTestRunner(verbosity=2).run(getSuite(auto=auto))
+
+if __name__ == '__main__':
+    test()